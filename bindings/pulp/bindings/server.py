@@ -1,8 +1,12 @@
 from types import NoneType
 import base64
+import errno
+import httplib
 import locale
 import logging
 import os
+import socket
+import threading
 import urllib
 try:
     import oauth2 as oauth
@@ -248,12 +252,31 @@ class PulpConnection(object):
         return path
 
 
+# Maximum number of idle connections to the server kept open by each HTTPSServerWrapper
+POOL_SIZE = 10
+
+# Errors raised when sending a request on a connection the server closed while it was idle
+_STALE_CONNECTION_ERRORS = (httplib.HTTPException, socket.error, SSL.SSLError)
+
+# Methods of the requests that may be sent again whenever they fail on an idle connection. Other
+# requests, which may dispatch tasks, are only sent again when the server did not receive them.
+_RESENDABLE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# SSL contexts, and the modification times of the files they were loaded from, by configuration
+_ssl_contexts = {}
+_ssl_contexts_lock = threading.Lock()
+
+
 class HTTPSServerWrapper(object):
     """
     Used by the PulpConnection class to make an invocation against the server.
     This abstraction is used to simplify mocking. In this implementation, the
     intricacies (read: ugliness) of invoking and getting the response from
     the HTTPConnection class are hidden in favor of a simpler API to mock.
+
+    Connections are kept alive and reused by the following requests, and new connections
+    resume the TLS session of the previous ones. Requests may be made concurrently from many
+    threads; each uses its own connection.
     """
 
     def __init__(self, pulp_connection):
@@ -262,12 +285,19 @@ class HTTPSServerWrapper(object):
         :type pulp_connection: PulpConnection
         """
         self.pulp_connection = pulp_connection
+        self._lock = threading.Lock()
+        # idle connections, most recently used last
+        self._idle = []
+        # SSL context of the idle connections and TLS session to resume
+        self._ssl_context = None
+        self._session = None
 
     def request(self, method, url, body):
         """
         Make the request against the Pulp server, returning a tuple of (status_code, respose_body).
-        This method creates a new connection each time since HTTPSConnection has problems
-        reusing a connection for multiple calls (as claimed by a prior comment in this module).
+        The request is sent on an idle connection when there is one, and sent again on a new
+        connection if the server closed the idle connection. Requests that are not read-only are
+        only sent again when they failed before the server could have processed them.
 
         :param method: The HTTP method to be used for the request (GET, POST, etc.)
         :type  method: str
@@ -283,34 +313,12 @@ class HTTPSServerWrapper(object):
         """
         headers = dict(self.pulp_connection.headers)  # copy so we don't affect the calling method
 
-        # Despite the confusing name, 'sslv23' configures m2crypto to use any available protocol in
-        # the underlying openssl implementation.
-        ssl_context = SSL.Context('sslv23')
-        # This restricts the protocols we are willing to do by configuring m2 not to do SSLv2.0 or
-        # SSLv3.0. EL 5 does not have support for TLS > v1.0, so we have to leave support for
-        # TLSv1.0 enabled.
-        ssl_context.set_options(m2.SSL_OP_NO_SSLv2 | m2.SSL_OP_NO_SSLv3)
-
-        if self.pulp_connection.verify_ssl:
-            ssl_context.set_verify(SSL.verify_peer, depth=100)
-            # We need to stat the ca_path to see if it exists (error if it doesn't), and if so
-            # whether it is a file or a directory. m2crypto has different directives depending on
-            # which type it is.
-            if os.path.isfile(self.pulp_connection.ca_path):
-                ssl_context.load_verify_locations(cafile=self.pulp_connection.ca_path)
-            elif os.path.isdir(self.pulp_connection.ca_path):
-                ssl_context.load_verify_locations(capath=self.pulp_connection.ca_path)
-            else:
-                # If it's not a file and it's not a directory, it's not a valid setting
-                raise exceptions.MissingCAPathException(self.pulp_connection.ca_path)
-        ssl_context.set_session_timeout(self.pulp_connection.timeout)
+        ssl_context = _get_ssl_context(self.pulp_connection)
 
         if self.pulp_connection.username and self.pulp_connection.password:
             raw = ':'.join((self.pulp_connection.username, self.pulp_connection.password))
             encoded = base64.b64encode(raw)
             headers['Authorization'] = 'Basic ' + encoded
-        elif self.pulp_connection.cert_filename:
-            ssl_context.load_cert(self.pulp_connection.cert_filename)
 
         # oauth configuration. This block is only True if oauth is not None, so it won't run on RHEL
         # 5.
@@ -331,14 +339,24 @@ class HTTPSServerWrapper(object):
             headers.update(oauth_header)
             headers['pulp-user'] = self.pulp_connection.oauth_user
 
-        connection = httpslib.HTTPSConnection(
-            self.pulp_connection.host, self.pulp_connection.port, ssl_context=ssl_context)
-
+        connection, reused = self._acquire(ssl_context)
         try:
-            # Request against the server
-            connection.request(method, url, body=body, headers=headers)
-            response = connection.getresponse()
+            while True:
+                sent = False
+                try:
+                    connection.request(method, url, body=body, headers=headers)
+                    sent = True
+                    response = connection.getresponse()
+                    break
+                except _STALE_CONNECTION_ERRORS, err:
+                    if not (reused and _can_resend(method, err, sent)):
+                        raise
+                    connection.close()
+                    connection = self._connect(ssl_context)
+                    reused = False
+            response_body = response.read()
         except SSL.SSLError, err:
+            connection.close()
             # Translate stale login certificate to an auth exception
             if 'sslv3 alert certificate expired' == str(err):
                 raise exceptions.ClientCertificateExpiredException(
@@ -347,12 +365,200 @@ class HTTPSServerWrapper(object):
                 raise exceptions.CertificateVerificationException()
             else:
                 raise exceptions.ConnectionException(None, str(err), None)
+        except Exception:
+            connection.close()
+            raise
+        self._release(ssl_context, connection, response)
 
         # Attempt to deserialize the body (should pass unless the server is busted)
-        response_body = response.read()
-
         try:
             response_body = json.loads(response_body)
         except Exception:
             pass
         return response.status, response_body
+
+    def close(self):
+        """
+        Close the idle connections.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+
+    def _acquire(self, ssl_context):
+        """
+        Take an idle connection made with an SSL context, or make a new one.
+
+        :param ssl_context: SSL context of the connection
+        :type  ssl_context: M2Crypto.SSL.Context
+        :return:            the connection and whether it was idle
+        :rtype:             tuple
+        """
+        with self._lock:
+            if ssl_context is not self._ssl_context:
+                # The SSL configuration changed; connections and session can't be used anymore.
+                stale, self._idle = self._idle, []
+                self._ssl_context = ssl_context
+                self._session = None
+            else:
+                stale = []
+            connection = self._idle.pop() if self._idle else None
+        for idle in stale:
+            idle.close()
+        if connection is not None:
+            return connection, True
+        return self._connect(ssl_context), False
+
+    def _connect(self, ssl_context):
+        """
+        Make a new connection, which resumes the last TLS session established with the same SSL
+        context. The connection is established when the first request is sent on it.
+
+        :param ssl_context: SSL context of the connection
+        :type  ssl_context: M2Crypto.SSL.Context
+        :return:            the connection
+        :rtype:             M2Crypto.httpslib.HTTPSConnection
+        """
+        connection = httpslib.HTTPSConnection(
+            self.pulp_connection.host, self.pulp_connection.port, ssl_context=ssl_context)
+        with self._lock:
+            if ssl_context is self._ssl_context and self._session is not None:
+                connection.set_session(self._session)
+        return connection
+
+    def _release(self, ssl_context, connection, response):
+        """
+        Keep a connection whose response was read to send the following requests, unless the
+        server is closing it or enough connections are idle.
+
+        :param ssl_context: SSL context of the connection
+        :type  ssl_context: M2Crypto.SSL.Context
+        :param connection:  connection to the server
+        :type  connection:  M2Crypto.httpslib.HTTPSConnection
+        :param response:    response read from the connection
+        :type  response:    httplib.HTTPResponse
+        """
+        if response.will_close:
+            connection.close()
+            return
+        with self._lock:
+            if ssl_context is self._ssl_context:
+                if connection.sock is not None:
+                    self._session = connection.get_session()
+                if len(self._idle) < POOL_SIZE:
+                    self._idle.append(connection)
+                    return
+        connection.close()
+
+
+def _can_resend(method, error, sent):
+    """
+    Tell whether a request that failed on an idle connection may be sent again on a new one.
+    Read-only requests are sent again unless they timed out. Other requests are only sent again
+    when the connection was found closed while sending them, or when it was closed without any
+    response, in which case the server did not process them.
+
+    :param method: The HTTP method of the request
+    :type  method: str
+    :param error:  The error raised by the request
+    :type  error:  Exception
+    :param sent:   Whether the request was sent entirely before the error
+    :type  sent:   bool
+    :return:       True if the request may be sent again
+    :rtype:        bool
+    """
+    if isinstance(error, socket.timeout):
+        return False
+    if method.upper() in _RESENDABLE_METHODS:
+        return True
+    if sent:
+        return isinstance(error, httplib.BadStatusLine)
+    return isinstance(error, socket.error) and error.errno in (errno.EPIPE, errno.ECONNRESET)
+
+
+def _get_ssl_context(pulp_connection):
+    """
+    Get the SSL context for the SSL configuration of a connection. Contexts are shared by the
+    connections having the same configuration and made again when the CA or client certificate
+    files are modified.
+
+    :param pulp_connection: A pulp connection object.
+    :type  pulp_connection: PulpConnection
+    :return:                the SSL context
+    :rtype:                 M2Crypto.SSL.Context
+
+    :raises MissingCAPathException: if SSL is verified and the CA path is not a file or directory
+    """
+    ca_path = pulp_connection.ca_path if pulp_connection.verify_ssl else None
+    cert_filename = None
+    if not (pulp_connection.username and pulp_connection.password):
+        cert_filename = pulp_connection.cert_filename
+    configuration = (ca_path, cert_filename, pulp_connection.timeout)
+    mtimes = (_mtime(ca_path), _mtime(cert_filename))
+    with _ssl_contexts_lock:
+        cached = _ssl_contexts.get(configuration)
+        if cached is not None and cached[0] == mtimes:
+            return cached[1]
+        ssl_context = _create_ssl_context(ca_path, cert_filename, pulp_connection.timeout)
+        _ssl_contexts[configuration] = (mtimes, ssl_context)
+        return ssl_context
+
+
+def _create_ssl_context(ca_path, cert_filename, timeout):
+    """
+    Create an SSL context.
+
+    :param ca_path:       The CA file or directory verifying the server certificate, or None to
+                          not verify it
+    :type  ca_path:       str
+    :param cert_filename: The client certificate file, or None
+    :type  cert_filename: str
+    :param timeout:       The timeout of the TLS sessions, in seconds
+    :type  timeout:       int
+    :return:              the SSL context
+    :rtype:               M2Crypto.SSL.Context
+
+    :raises MissingCAPathException: if the CA path is not a file or directory
+    """
+    # Despite the confusing name, 'sslv23' configures m2crypto to use any available protocol in
+    # the underlying openssl implementation.
+    ssl_context = SSL.Context('sslv23')
+    # This restricts the protocols we are willing to do by configuring m2 not to do SSLv2.0 or
+    # SSLv3.0. EL 5 does not have support for TLS > v1.0, so we have to leave support for
+    # TLSv1.0 enabled.
+    ssl_context.set_options(m2.SSL_OP_NO_SSLv2 | m2.SSL_OP_NO_SSLv3)
+
+    if ca_path is not None:
+        ssl_context.set_verify(SSL.verify_peer, depth=100)
+        # We need to stat the ca_path to see if it exists (error if it doesn't), and if so
+        # whether it is a file or a directory. m2crypto has different directives depending on
+        # which type it is.
+        if os.path.isfile(ca_path):
+            ssl_context.load_verify_locations(cafile=ca_path)
+        elif os.path.isdir(ca_path):
+            ssl_context.load_verify_locations(capath=ca_path)
+        else:
+            # If it's not a file and it's not a directory, it's not a valid setting
+            raise exceptions.MissingCAPathException(ca_path)
+    ssl_context.set_session_timeout(timeout)
+
+    if cert_filename:
+        ssl_context.load_cert(cert_filename)
+    return ssl_context
+
+
+def _mtime(path):
+    """
+    :param path: A file or directory path, or None
+    :type  path: str
+    :return:     the modification time of the path, or None if there is no path or it does not
+                 exist
+    :rtype:      float
+    """
+    if not path:
+        return None
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
@@ -1,8 +1,11 @@
 """
 This module contains tests for the pulp.bindings.server module.
 """
+import errno
+import httplib
 import locale
 import logging
+import socket
 import unittest
 
 from M2Crypto import m2, SSL
@@ -16,6 +19,9 @@ class TestHTTPSServerWrapper(unittest.TestCase):
     """
     This class contains tests for the HTTPSServerWrapper class.
     """
+    def setUp(self):
+        server._ssl_contexts.clear()
+
     @mock.patch('pulp.bindings.server.httpslib.HTTPSConnection.request')
     def test_request_handles_untrusted_server_cert(self, request):
         """
@@ -76,6 +82,7 @@ class TestHTTPSServerWrapper(unittest.TestCase):
                 return '{}'
 
             status = 200
+            will_close = True
 
         getresponse.return_value = FakeResponse()
 
@@ -128,6 +135,7 @@ class TestHTTPSServerWrapper(unittest.TestCase):
                 return '{}'
 
             status = 200
+            will_close = True
 
         getresponse.return_value = FakeResponse()
 
@@ -161,6 +169,7 @@ class TestHTTPSServerWrapper(unittest.TestCase):
                 return '{"it": "worked!"}'
 
             status = 200
+            will_close = True
 
         getresponse.return_value = FakeResponse()
 
@@ -173,6 +182,275 @@ class TestHTTPSServerWrapper(unittest.TestCase):
         load_verify_locations.assert_called_once_with(cafile=ca_path)
 
 
+@mock.patch('pulp.bindings.server.httpslib.HTTPSConnection')
+@mock.patch('pulp.bindings.server._get_ssl_context')
+class TestHTTPSServerWrapperPool(unittest.TestCase):
+    """
+    This class contains tests for the connection pool of the HTTPSServerWrapper class.
+    """
+    def setUp(self):
+        self.conn = server.PulpConnection('host', verify_ssl=False)
+        self.wrapper = server.HTTPSServerWrapper(self.conn)
+
+    @staticmethod
+    def connection(will_close=False):
+        """
+        Return a mock connection whose response has the given will_close flag.
+        """
+        connection = mock.MagicMock()
+        response = connection.getresponse.return_value
+        response.status = 200
+        response.read.return_value = '{}'
+        response.will_close = will_close
+        return connection
+
+    def test_reused(self, get_ssl_context, HTTPSConnection):
+        """
+        Test that a connection is reused and resumes nothing, since it stays open.
+        """
+        connection = self.connection()
+        HTTPSConnection.return_value = connection
+
+        self.assertEqual(self.wrapper.request('GET', '/api/', ''), (200, {}))
+        self.assertEqual(self.wrapper.request('GET', '/api/', ''), (200, {}))
+
+        HTTPSConnection.assert_called_once_with('host', 443,
+                                                ssl_context=get_ssl_context.return_value)
+        self.assertEqual(connection.request.call_count, 2)
+        self.assertFalse(connection.close.called)
+        self.assertEqual(self.wrapper._idle, [connection])
+
+    def test_closed_by_server(self, get_ssl_context, HTTPSConnection):
+        """
+        Test that a connection the server closes is not reused and that the next connection
+        resumes the TLS session.
+        """
+        first = self.connection(will_close=True)
+        second = self.connection()
+        HTTPSConnection.side_effect = [first, second]
+        # the session is kept from a response that leaves the connection open
+        self.wrapper._ssl_context = get_ssl_context.return_value
+        self.wrapper._session = 'session'
+
+        self.wrapper.request('GET', '/api/', '')
+        self.wrapper.request('GET', '/api/', '')
+
+        first.close.assert_called_once_with()
+        second.set_session.assert_called_once_with('session')
+        self.assertEqual(self.wrapper._idle, [second])
+        self.assertEqual(self.wrapper._session, second.get_session.return_value)
+
+    def test_stale_connection(self, get_ssl_context, HTTPSConnection):
+        """
+        Test that a request failing on an idle connection is sent again on a new connection.
+        """
+        stale = self.connection()
+        stale.getresponse.side_effect = httplib.BadStatusLine('')
+        fresh = self.connection()
+        HTTPSConnection.return_value = fresh
+        self.wrapper._ssl_context = get_ssl_context.return_value
+        self.wrapper._idle = [stale]
+
+        self.assertEqual(self.wrapper.request('POST', '/api/', '{}'), (200, {}))
+
+        stale.close.assert_called_once_with()
+        fresh.request.assert_called_once_with('POST', '/api/', body='{}', headers=mock.ANY)
+        self.assertEqual(self.wrapper._idle, [fresh])
+
+    def test_stale_connection_read_only(self, get_ssl_context, HTTPSConnection):
+        """
+        Test that a read-only request failing on an idle connection after it was sent is sent
+        again on a new connection.
+        """
+        stale = self.connection()
+        stale.getresponse.side_effect = socket.error(errno.ECONNRESET, 'reset')
+        fresh = self.connection()
+        HTTPSConnection.return_value = fresh
+        self.wrapper._ssl_context = get_ssl_context.return_value
+        self.wrapper._idle = [stale]
+
+        self.assertEqual(self.wrapper.request('GET', '/api/', ''), (200, {}))
+
+        stale.close.assert_called_once_with()
+        fresh.request.assert_called_once_with('GET', '/api/', body='', headers=mock.ANY)
+
+    def test_stale_connection_not_sent(self, get_ssl_context, HTTPSConnection):
+        """
+        Test that a request failing on an idle connection while it is sent is sent again on a new
+        connection.
+        """
+        stale = self.connection()
+        stale.request.side_effect = socket.error(errno.EPIPE, 'broken pipe')
+        fresh = self.connection()
+        HTTPSConnection.return_value = fresh
+        self.wrapper._ssl_context = get_ssl_context.return_value
+        self.wrapper._idle = [stale]
+
+        self.assertEqual(self.wrapper.request('POST', '/api/', '{}'), (200, {}))
+
+        fresh.request.assert_called_once_with('POST', '/api/', body='{}', headers=mock.ANY)
+
+    def test_stale_connection_sent(self, get_ssl_context, HTTPSConnection):
+        """
+        Test that a request which is not read-only is not sent again when it failed on an idle
+        connection after it was sent.
+        """
+        stale = self.connection()
+        stale.getresponse.side_effect = socket.error(errno.ECONNRESET, 'reset')
+        self.wrapper._ssl_context = get_ssl_context.return_value
+        self.wrapper._idle = [stale]
+
+        self.assertRaises(socket.error, self.wrapper.request, 'POST', '/api/', '{}')
+
+        self.assertFalse(HTTPSConnection.called)
+        stale.close.assert_called_once_with()
+
+    def test_stale_connection_ssl_error(self, get_ssl_context, HTTPSConnection):
+        """
+        Test that a request which is not read-only is not sent again when reading its response
+        on an idle connection raised an SSL error.
+        """
+        stale = self.connection()
+        stale.getresponse.side_effect = SSL.SSLError('unexpected eof')
+        self.wrapper._ssl_context = get_ssl_context.return_value
+        self.wrapper._idle = [stale]
+
+        self.assertRaises(exceptions.ConnectionException, self.wrapper.request, 'DELETE',
+                          '/api/', '')
+
+        self.assertFalse(HTTPSConnection.called)
+
+    def test_stale_connection_timeout(self, get_ssl_context, HTTPSConnection):
+        """
+        Test that a request timing out on an idle connection is not sent again.
+        """
+        stale = self.connection()
+        stale.getresponse.side_effect = socket.timeout('timed out')
+        self.wrapper._ssl_context = get_ssl_context.return_value
+        self.wrapper._idle = [stale]
+
+        self.assertRaises(socket.timeout, self.wrapper.request, 'GET', '/api/', '')
+
+        self.assertFalse(HTTPSConnection.called)
+
+    def test_new_connection_error(self, get_ssl_context, HTTPSConnection):
+        """
+        Test that a request failing on a new connection is not sent again.
+        """
+        connection = self.connection()
+        connection.getresponse.side_effect = httplib.BadStatusLine('')
+        HTTPSConnection.return_value = connection
+
+        self.assertRaises(httplib.BadStatusLine, self.wrapper.request, 'GET', '/api/', '')
+
+        self.assertEqual(HTTPSConnection.call_count, 1)
+        connection.close.assert_called_once_with()
+        self.assertEqual(self.wrapper._idle, [])
+
+    def test_ssl_context_changed(self, get_ssl_context, HTTPSConnection):
+        """
+        Test that idle connections made with another SSL context are closed.
+        """
+        idle = self.connection()
+        self.wrapper._ssl_context = mock.Mock()
+        self.wrapper._session = 'session'
+        self.wrapper._idle = [idle]
+        connection = self.connection()
+        HTTPSConnection.return_value = connection
+
+        self.wrapper.request('GET', '/api/', '')
+
+        idle.close.assert_called_once_with()
+        self.assertFalse(connection.set_session.called)
+        self.assertEqual(self.wrapper._idle, [connection])
+
+    @mock.patch('pulp.bindings.server.POOL_SIZE', 1)
+    def test_pool_size(self, get_ssl_context, HTTPSConnection):
+        """
+        Test that connections beyond the pool size are closed once their response is read.
+        """
+        idle = self.connection()
+        self.wrapper._ssl_context = get_ssl_context.return_value
+        self.wrapper._idle = [idle]
+        connection = self.connection()
+
+        self.wrapper._release(get_ssl_context.return_value, connection,
+                              connection.getresponse.return_value)
+
+        connection.close.assert_called_once_with()
+        self.assertEqual(self.wrapper._idle, [idle])
+
+    def test_close(self, get_ssl_context, HTTPSConnection):
+        """
+        Test that close() closes the idle connections.
+        """
+        idle = self.connection()
+        self.wrapper._idle = [idle]
+
+        self.wrapper.close()
+
+        idle.close.assert_called_once_with()
+        self.assertEqual(self.wrapper._idle, [])
+
+
+class TestGetSSLContext(unittest.TestCase):
+    """
+    This class contains tests for the _get_ssl_context() function.
+    """
+    def setUp(self):
+        server._ssl_contexts.clear()
+
+    @mock.patch('pulp.bindings.server._create_ssl_context')
+    def test_cached(self, create_ssl_context):
+        """
+        Test that connections with the same SSL configuration share an SSL context.
+        """
+        first = server._get_ssl_context(server.PulpConnection('host', verify_ssl=False))
+        second = server._get_ssl_context(server.PulpConnection('other', verify_ssl=False))
+
+        self.assertTrue(first is second)
+        create_ssl_context.assert_called_once_with(None, None, 120)
+
+    @mock.patch('pulp.bindings.server._create_ssl_context')
+    def test_configuration_changed(self, create_ssl_context):
+        """
+        Test that a connection with another SSL configuration gets another SSL context.
+        """
+        server._get_ssl_context(server.PulpConnection('host', verify_ssl=False))
+        server._get_ssl_context(server.PulpConnection('host', verify_ssl=False,
+                                                      cert_filename='/path/to/cert'))
+
+        self.assertEqual(create_ssl_context.mock_calls, [
+            mock.call(None, None, 120), mock.call(None, '/path/to/cert', 120)])
+
+    @mock.patch('pulp.bindings.server.os.stat')
+    @mock.patch('pulp.bindings.server._create_ssl_context')
+    def test_cert_modified(self, create_ssl_context, stat):
+        """
+        Test that the SSL context is created again when the client certificate is modified.
+        """
+        conn = server.PulpConnection('host', verify_ssl=False, cert_filename='/path/to/cert')
+        stat.return_value.st_mtime = 1
+        server._get_ssl_context(conn)
+        server._get_ssl_context(conn)
+        stat.return_value.st_mtime = 2
+        server._get_ssl_context(conn)
+
+        self.assertEqual(create_ssl_context.call_count, 2)
+
+    @mock.patch('pulp.bindings.server._create_ssl_context')
+    def test_basic_auth(self, create_ssl_context):
+        """
+        Test that the client certificate is not loaded when a username and password are set.
+        """
+        conn = server.PulpConnection('host', verify_ssl=False, username='u', password='p',
+                                     cert_filename='/path/to/cert')
+
+        server._get_ssl_context(conn)
+
+        create_ssl_context.assert_called_once_with(None, None, 120)
+
+
 class TestPulpConnection(unittest.TestCase):
     """
     This class contains tests for the PulpConnection object.
@@ -7,13 +7,20 @@ client-side tracking of upload requests on the server.
 
 import copy
 import errno
+import hashlib
 import os
 import pickle
+import Queue
+import sys
+import threading
+import time
 
 from pulp.common.lock import LockFile
 
 
 DEFAULT_CHUNKSIZE = 1048576  # 1 MB per upload call
+DEFAULT_CONCURRENCY = 4  # upload calls in flight at once
+TRACKER_SAVE_INTERVAL = 5  # seconds between saves of the tracker file while uploading
 
 
 class ManagerUninitializedException(Exception):
@@ -71,7 +78,8 @@ class UploadManager(object):
     on disk state files.
     """
 
-    def __init__(self, upload_working_dir, bindings, chunk_size=DEFAULT_CHUNKSIZE):
+    def __init__(self, upload_working_dir, bindings, chunk_size=DEFAULT_CHUNKSIZE,
+                 concurrency=DEFAULT_CONCURRENCY):
         """
         @param upload_working_dir: directory in which to store client-side files
                to track upload requests; if it doesn't exist it will be created
@@ -84,10 +92,14 @@ class UploadManager(object):
         @param chunk_size: size in bytes of data to upload on each call to the
                server
         @type  chunk_size: int
+
+        @param concurrency: number of upload calls to the server in flight at once
+        @type  concurrency: int
         """
         self.upload_working_dir = upload_working_dir
         self.bindings = bindings
         self.chunk_size = chunk_size
+        self.concurrency = concurrency
 
         # Internal state
         self.tracker_files = {}
@@ -111,7 +123,9 @@ class UploadManager(object):
         upload_working_dir = os.path.join(context.config['filesystem']['upload_working_dir'],
                                           'default')
         upload_working_dir = os.path.expanduser(upload_working_dir)
-        return cls(upload_working_dir, context.server)
+        concurrency = context.config.get('server', {}).get('upload_concurrency',
+                                                           DEFAULT_CONCURRENCY)
+        return cls(upload_working_dir, context.server, concurrency=int(concurrency))
 
     def initialize(self):
         """
@@ -179,18 +193,23 @@ class UploadManager(object):
 
         return upload_id
 
-    def upload(self, upload_id, callback_func=None, force=False):
+    def upload(self, upload_id, callback_func=None, force=False, checksum_type=None):
         """
         Begins or resumes the upload process for the given upload request.
         This call will not return until the upload is complete. The other
         expected exit point is a KeyboardError to kill the process. The
-        client-side on disk tracker files will store the current offset and
-        resume the upload from where it left off on the next call to this method.
+        client-side on disk tracker files will store the chunks uploaded so
+        far and resume the upload with the other chunks on the next call to
+        this method.
+
+        The file is read once, in order, while up to "concurrency" chunks are
+        being uploaded, so chunks may complete out of order. The tracker file
+        is saved every TRACKER_SAVE_INTERVAL seconds and when the upload stops.
 
         The callback_func is used to get feedback on the upload process. After
         each successful upload segment call to the server, this function
-        will be invoked with the new offset in the file and the file size
-        (intended to be fed into a progress indicator). As this is called
+        will be invoked with the number of bytes uploaded so far and the file
+        size (intended to be fed into a progress indicator). As this is called
         after each upload segment call, the granularity at which it is called
         depends on the chunk_size value for this instance.
 
@@ -212,6 +231,15 @@ class UploadManager(object):
                uploads
         @type  force: bool
 
+        @param checksum_type: optional hashlib algorithm name; if specified, the
+               checksum of the file is calculated while it is read and stored in
+               the tracker file
+        @type  checksum_type: str
+
+        @return: hex digest of the file's checksum if checksum_type is specified;
+                 None otherwise
+        @rtype:  str
+
         @raise MissingUploadRequestException: if a tracker file for upload_id
                cannot be found
         @raise ConcurrentUploadException: if an upload is already in progress
@@ -234,24 +262,23 @@ class UploadManager(object):
             tracker_file.save()
 
             source_file_size = os.path.getsize(tracker_file.source_filename)
+            tracker_file.init_chunks(self.chunk_size, source_file_size)
 
-            f = open(tracker_file.source_filename, 'r')
-            while True:
-                # Load the chunk to upload
-                f.seek(tracker_file.offset)
-                data = f.read(self.chunk_size)
-                if not data:
-                    break
-
-                # Server request
-                self.bindings.uploads.upload_segment(upload_id, tracker_file.offset, data)
-
-                # Status update and callback notification
-                tracker_file.offset = min(tracker_file.offset + self.chunk_size, source_file_size)
-                tracker_file.save()
-
-                callback_func(tracker_file.offset, source_file_size)
+            checksum = None
+            if checksum_type:
+                checksum = hashlib.new(checksum_type)
 
+            uploader = ChunkUploader(self.bindings, tracker_file, self.concurrency,
+                                     checksum=checksum, callback_func=callback_func)
+            f = open(tracker_file.source_filename, 'r')
+            try:
+                uploader.run(f)
+            finally:
+                f.close()
+
+            if checksum is not None:
+                tracker_file.checksum_type = checksum_type
+                tracker_file.checksum = checksum.hexdigest()
             tracker_file.is_finished_uploading = True
         finally:
             # Regardless of how this ends, it's no longer running, so make sure
@@ -259,6 +286,9 @@ class UploadManager(object):
             tracker_file.is_running = False
             tracker_file.save()
 
+        if checksum_type:
+            return tracker_file.checksum
+
     def import_upload(self, upload_id):
         """
         Once the file is finished uploading, this call will request the server
@@ -385,6 +415,143 @@ class UploadManager(object):
         return self.tracker_files.values()
 
 
+class ChunkUploader(object):
+    """
+    Uploads the chunks of a file that its tracker doesn't mark as uploaded.
+    The file is read once, in order, by the calling thread while worker
+    threads send up to "concurrency" chunks to the server at once. The
+    tracker, callback and checksum are only used from the calling thread.
+    """
+
+    def __init__(self, bindings, tracker_file, concurrency, checksum=None, callback_func=None):
+        """
+        @param bindings: server bindings from the client context
+        @type  bindings: Bindings
+
+        @param tracker_file: tracker of the upload request, whose chunks are
+               initialized
+        @type  tracker_file: UploadTracker
+
+        @param concurrency: number of upload calls to the server in flight at once
+        @type  concurrency: int
+
+        @param checksum: optional hashlib object to update with the whole file
+        @type  checksum: object
+
+        @param callback_func: optional method to be called with the number of
+               bytes uploaded and the file size after each upload call
+        @type  callback_func: func
+        """
+        self.bindings = bindings
+        self.tracker_file = tracker_file
+        self.concurrency = max(concurrency, 1)
+        self.checksum = checksum
+        self.callback_func = callback_func
+
+        # (index, offset, data) of the chunks to upload, None stops a worker
+        self._pending = Queue.Queue()
+        # (index, error) of the chunks uploaded; error is the sys.exc_info()
+        # of a failed upload call
+        self._done = Queue.Queue()
+        self._in_flight = 0
+        self._uploaded = 0
+        self._saved = None
+        self._error = None
+
+    def run(self, f):
+        """
+        Uploads the chunks. If an upload call fails, no other chunk is sent
+        and the error is raised once the calls in flight complete.
+
+        @param f: the file to upload, at its start
+        @type  f: file
+        """
+        tracker = self.tracker_file
+        self._uploaded = tracker.uploaded_size()
+        self._saved = time.time()
+
+        workers = []
+        for i in range(self.concurrency):
+            worker = threading.Thread(target=self._work)
+            worker.daemon = True
+            worker.start()
+            workers.append(worker)
+
+        try:
+            position = 0
+            for index in range(tracker.chunk_count()):
+                uploaded = tracker.is_uploaded(index)
+                if uploaded and self.checksum is None:
+                    continue
+                offset = index * tracker.chunk_size
+                if position != offset:
+                    f.seek(offset)
+                data = f.read(tracker.chunk_length(index))
+                position = offset + len(data)
+                if self.checksum is not None:
+                    self.checksum.update(data)
+                if uploaded:
+                    continue
+                while self._in_flight >= self.concurrency:
+                    self._wait()
+                if self._error is not None:
+                    break
+                self._pending.put((index, offset, data))
+                self._in_flight += 1
+
+            while self._in_flight:
+                self._wait()
+        finally:
+            for worker in workers:
+                self._pending.put(None)
+
+        if self._error is not None:
+            raise self._error[0], self._error[1], self._error[2]
+
+    def _wait(self):
+        """
+        Waits for an upload call to complete and records its chunk as uploaded.
+        """
+        while True:
+            # The timeout keeps the wait interruptible by ctrl+c.
+            try:
+                index, error = self._done.get(timeout=1)
+                break
+            except Queue.Empty:
+                pass
+        self._in_flight -= 1
+
+        if error is not None:
+            if self._error is None:
+                self._error = error
+            return
+
+        self.tracker_file.set_uploaded(index)
+        self._uploaded += self.tracker_file.chunk_length(index)
+        if time.time() - self._saved >= TRACKER_SAVE_INTERVAL:
+            self.tracker_file.save()
+            self._saved = time.time()
+        if self.callback_func:
+            self.callback_func(self._uploaded, self.tracker_file.file_size)
+
+    def _work(self):
+        """
+        Worker thread uploading the pending chunks.
+        """
+        upload_id = self.tracker_file.upload_id
+        while True:
+            chunk = self._pending.get()
+            if chunk is None:
+                return
+            index, offset, data = chunk
+            try:
+                self.bindings.uploads.upload_segment(upload_id, offset, data)
+            except Exception:
+                self._done.put((index, sys.exc_info()))
+            else:
+                self._done.put((index, None))
+
+
 class UploadTracker(object):
     """
     Client-side file to carry all information related to a single upload
@@ -397,7 +564,7 @@ class UploadTracker(object):
         # Upload call information
         self.upload_id = None
         self.location = None  # URL to the upload request on the server
-        self.offset = None  # start of next chunk to upload
+        self.offset = None  # end of the chunks uploaded from the start of the file
         self.source_filename = None  # path on disk to the file to upload
 
         # Import call information
@@ -406,10 +573,98 @@ class UploadTracker(object):
         self.unit_key = None
         self.unit_metadata = None
 
+        # Chunk information; uploaded_chunks is a bitmap of the uploaded chunks
+        self.file_size = None
+        self.chunk_size = None
+        self.uploaded_chunks = None
+        self.checksum_type = None
+        self.checksum = None
+
         # State information
         self.is_running = False
         self.is_finished_uploading = False
 
+    def __setstate__(self, state):
+        # Tracker files saved by older versions lack the attributes added since.
+        self.__init__(state['filename'])
+        self.__dict__.update(state)
+
+    def init_chunks(self, chunk_size, file_size):
+        """
+        Prepares the tracking of the uploaded chunks of the file. A tracker
+        already tracking the chunks of a file of that size keeps its chunk size.
+        For a tracker saved by an older version, the chunks before its offset
+        are the uploaded ones.
+
+        @param chunk_size: size in bytes of the chunks
+        @type  chunk_size: int
+
+        @param file_size: size in bytes of the file to upload
+        @type  file_size: int
+        """
+        if self.uploaded_chunks is not None:
+            if self.file_size == file_size:
+                return
+            # The file changed since the upload started.
+            self.offset = 0
+        self.file_size = file_size
+        self.chunk_size = chunk_size
+        self.uploaded_chunks = bytearray((self.chunk_count() + 7) // 8)
+        offset, self.offset = self.offset or 0, 0
+        for index in range(self.chunk_count()):
+            if index * chunk_size + self.chunk_length(index) > offset:
+                break
+            self.set_uploaded(index)
+
+    def chunk_count(self):
+        """
+        @return: number of chunks in the file
+        @rtype:  int
+        """
+        return (self.file_size + self.chunk_size - 1) // self.chunk_size
+
+    def chunk_length(self, index):
+        """
+        @param index: index of a chunk
+        @type  index: int
+
+        @return: size in bytes of the chunk
+        @rtype:  int
+        """
+        return min(self.chunk_size, self.file_size - index * self.chunk_size)
+
+    def is_uploaded(self, index):
+        """
+        @param index: index of a chunk
+        @type  index: int
+
+        @return: true if the chunk was uploaded
+        @rtype:  bool
+        """
+        return bool(self.uploaded_chunks[index // 8] & (1 << (index % 8)))
+
+    def set_uploaded(self, index):
+        """
+        Marks a chunk as uploaded and advances the offset past the chunks
+        uploaded from the start of the file.
+
+        @param index: index of a chunk
+        @type  index: int
+        """
+        self.uploaded_chunks[index // 8] |= 1 << (index % 8)
+        index = self.offset // self.chunk_size
+        while index < self.chunk_count() and self.is_uploaded(index):
+            self.offset = index * self.chunk_size + self.chunk_length(index)
+            index += 1
+
+    def uploaded_size(self):
+        """
+        @return: number of bytes uploaded
+        @rtype:  int
+        """
+        return sum(self.chunk_length(index) for index in range(self.chunk_count())
+                   if self.is_uploaded(index))
+
     def save(self):
         """
         Saves the current state of the tracker file. This will lock on the file
@@ -1,4 +1,5 @@
 import errno
+import hashlib
 import math
 import os
 import shutil
@@ -236,6 +237,8 @@ class UploadManagerTests(unittest.TestCase):
     def test_upload_multiple_passes(self):
         # Setup
         self.upload_manager.chunk_size = 100
+        # one chunk in flight at a time, so they are uploaded in order
+        self.upload_manager.concurrency = 1
         self.upload_manager.initialize()
         upload_id = self.upload_manager.initialize_upload(TEST_RPM_FILENAME, 'repo-1', 'type-1',
                                                           {'k': 'v'}, 'm-1')
@@ -289,6 +292,141 @@ class UploadManagerTests(unittest.TestCase):
         tracker = self.upload_manager._get_tracker_file_by_id(upload_id)
         self.assertEqual(rpm_size, tracker.offset)
 
+    def test_upload_parallel(self):
+        # Setup
+        self.upload_manager.chunk_size = 100
+        self.upload_manager.concurrency = 4
+        upload_id = self.upload_manager.initialize_upload(TEST_RPM_FILENAME, 'repo-1', 'type-1',
+                                                          {'k': 'v'}, 'm-1')
+        mock_callback = mock.Mock()
+
+        # Test
+        self.upload_manager.upload(upload_id, mock_callback.update_status)
+
+        # Verify the file was uploaded exactly once, whatever the order
+        rpm_size = os.path.getsize(TEST_RPM_FILENAME)
+        with open(TEST_RPM_FILENAME) as f:
+            expected = f.read()
+        segments = {}
+        for single_call_args in self.mock_upload_bindings.upload_segment.call_args_list:
+            self.assertEqual(upload_id, single_call_args[0][0])
+            segments[single_call_args[0][1]] = single_call_args[0][2]
+        self.assertEqual(len(segments),
+                         self.mock_upload_bindings.upload_segment.call_count)
+        self.assertEqual(''.join(segments[o] for o in sorted(segments)), expected)
+
+        # Verify the progress only increases, up to the size of the file
+        progress = [c[0][0] for c in mock_callback.update_status.call_args_list]
+        self.assertEqual(progress, sorted(progress))
+        self.assertEqual(rpm_size, progress[-1])
+
+        tracker = upload_util.UploadTracker.load(self.upload_manager._tracker_filename(upload_id))
+        self.assertEqual(rpm_size, tracker.offset)
+        self.assertEqual(tracker.uploaded_size(), rpm_size)
+        self.assertTrue(tracker.is_finished_uploading)
+
+    def test_upload_resume_out_of_order(self):
+        # Setup
+        self.upload_manager.chunk_size = 1000
+        upload_id = self.upload_manager.initialize_upload(TEST_RPM_FILENAME, 'repo-1', 'type-1',
+                                                          {'k': 'v'}, 'm-1')
+        rpm_size = os.path.getsize(TEST_RPM_FILENAME)
+        tracker = self.upload_manager._get_tracker_file_by_id(upload_id)
+        tracker.init_chunks(1000, rpm_size)
+        tracker.set_uploaded(1)
+        tracker.set_uploaded(2)
+        self.assertEqual(0, tracker.offset)
+
+        # Test
+        self.upload_manager.upload(upload_id)
+
+        # Verify the uploaded chunks were skipped
+        offsets = sorted(c[0][1] for c in
+                         self.mock_upload_bindings.upload_segment.call_args_list)
+        expected = [0] + range(3000, rpm_size, 1000)
+        self.assertEqual(expected, offsets)
+        self.assertEqual(rpm_size, tracker.offset)
+
+    def test_upload_resume_old_tracker(self):
+        # Setup
+        self.upload_manager.chunk_size = 1000
+        upload_id = self.upload_manager.initialize_upload(TEST_RPM_FILENAME, 'repo-1', 'type-1',
+                                                          {'k': 'v'}, 'm-1')
+        tracker = self.upload_manager._get_tracker_file_by_id(upload_id)
+        # Trackers saved by older versions only have the offset
+        for name in ('file_size', 'chunk_size', 'uploaded_chunks', 'checksum_type', 'checksum'):
+            delattr(tracker, name)
+        tracker.offset = 1500
+        tracker.save()
+        self.upload_manager.tracker_files = {}
+        self.upload_manager.list_uploads()
+
+        # Test
+        self.upload_manager.upload(upload_id)
+
+        # Verify the chunks before the offset were skipped
+        rpm_size = os.path.getsize(TEST_RPM_FILENAME)
+        offsets = sorted(c[0][1] for c in
+                         self.mock_upload_bindings.upload_segment.call_args_list)
+        self.assertEqual(range(1000, rpm_size, 1000), offsets)
+
+    def test_upload_error(self):
+        # Setup
+        self.upload_manager.chunk_size = 1000
+        self.upload_manager.concurrency = 2
+        upload_id = self.upload_manager.initialize_upload(TEST_RPM_FILENAME, 'repo-1', 'type-1',
+                                                          {'k': 'v'}, 'm-1')
+
+        def upload_segment(upload_id, offset, data):
+            if offset == 1000:
+                raise NotFoundException({})
+            return Response(200, {})
+
+        self.mock_upload_bindings.upload_segment.side_effect = upload_segment
+
+        # Test
+        self.assertRaises(NotFoundException, self.upload_manager.upload, upload_id)
+
+        # Verify the chunk uploaded before the error is remembered
+        tracker = upload_util.UploadTracker.load(self.upload_manager._tracker_filename(upload_id))
+        self.assertTrue(tracker.is_uploaded(0))
+        self.assertFalse(tracker.is_uploaded(1))
+        self.assertFalse(tracker.is_running)
+        self.assertFalse(tracker.is_finished_uploading)
+
+    def test_upload_checksum(self):
+        # Setup
+        self.upload_manager.chunk_size = 1000
+        upload_id = self.upload_manager.initialize_upload(TEST_RPM_FILENAME, 'repo-1', 'type-1',
+                                                          {'k': 'v'}, 'm-1')
+        tracker = self.upload_manager._get_tracker_file_by_id(upload_id)
+        tracker.init_chunks(1000, os.path.getsize(TEST_RPM_FILENAME))
+        tracker.set_uploaded(0)
+
+        # Test
+        checksum = self.upload_manager.upload(upload_id, checksum_type='sha256')
+
+        # Verify the uploaded chunks are part of the checksum
+        with open(TEST_RPM_FILENAME) as f:
+            expected = hashlib.sha256(f.read()).hexdigest()
+        self.assertEqual(expected, checksum)
+        self.assertEqual('sha256', tracker.checksum_type)
+        self.assertEqual(expected, tracker.checksum)
+
+    @mock.patch('pulp.client.upload.manager.UploadTracker.save')
+    def test_upload_tracker_saves(self, mock_save):
+        # Setup
+        self.upload_manager.chunk_size = 100
+        upload_id = self.upload_manager.initialize_upload(TEST_RPM_FILENAME, 'repo-1', 'type-1',
+                                                          {'k': 'v'}, 'm-1')
+        mock_save.reset_mock()
+
+        # Test
+        self.upload_manager.upload(upload_id)
+
+        # Verify the tracker is saved when the upload starts and stops only
+        self.assertEqual(2, mock_save.call_count)
+
     def test_upload_concurrent_upload(self):
         # Setup
         self.upload_manager.initialize()
@@ -1,58 +1,91 @@
+from operator import itemgetter
+
 from pulp_node import constants
+from pulp_node.manifest import UnitIterator, unit_key_digest
 
 
-class UniqueKey(object):
+def unique(entries):
     """
-    A unique unit key consisting of a unit's type_id & unit_key.
-    The unit key is sorted to ensure consistency.
-    :ivar uid: The unique ID.
-    :type uid: A tuple of: (type_id, unit_key)
+    Filter entries sorted by unit key digest so that only the last
+    entry having a given digest remains.
+    :param entries: Entries sorted by digest.  The digest is the 1st item of each entry.
+    :type entries: iterable
+    :return: The filtered entries.
+    :rtype: generator
     """
-
-    def __init__(self, unit):
-        """
-        :param unit: A content unit.
-        :type unit: dict
-        """
-        type_id = unit['type_id']
-        unit_key = tuple(sorted(unit['unit_key'].items()))
-        self.uid = (type_id, unit_key)
-
-    def __hash__(self):
-        return hash(self.uid)
-
-    def __eq__(self, other):
-        return self.uid == other.uid
-
-    def __ne__(self, other):
-        return self.uid != other.uid
+    previous = None
+    for entry in entries:
+        if previous is not None and previous[0] != entry[0]:
+            yield previous
+        previous = entry
+    if previous is not None:
+        yield previous
 
 
 class UnitInventory(object):
     """
     The unit inventory contains both the parent and child inventory
-    of content units associated with a specific repository.  Each is contained
-    within a dictionary keyed by {UnitKey} to ensure uniqueness.
+    of content units associated with a specific repository.  Units are
+    identified by the digest of their {type_id, unit_key}.  Both inventories
+    are sorted by digest and compared in a single pass (merge-join).  When the
+    parent units are indexed, only the units found on the parent only or updated
+    on the parent are read from the units file.
     """
 
     @staticmethod
-    def _import_parent_units(units):
-        _units = {}
+    def _parent_entries(units):
+        """
+        Get the parent units sorted by unit key digest.
+        :param units: The content units in the parent node.
+        :type units: iterable
+        :return: A generator of: (digest, last_updated, unit, ref).  The unit
+            is None when it has not been read from the units file.
+        :rtype: generator
+        """
+        if isinstance(units, UnitIterator) and units.index is not None:
+            for entry in units.index:
+                yield entry.digest, entry.last_updated, None, units.ref(entry)
+            return
+        _units = []
         for unit, ref in units:
             unit.pop('metadata', None)
-            key = UniqueKey(unit)
-            _units[key] = (unit, ref)
-        return _units
+            last_updated = unit.get(constants.LAST_UPDATED, 0)
+            _units.append((unit_key_digest(unit), last_updated, unit, ref))
+        _units.sort(key=itemgetter(0))
+        for entry in _units:
+            yield entry
 
     @staticmethod
-    def _import_child_units(units):
-        _units = {}
+    def _child_entries(units):
+        """
+        Get the child units sorted by unit key digest.
+        :param units: The content units in the child node.
+        :type units: iterable
+        :return: A list of: (digest, unit).
+        :rtype: list
+        """
+        _units = []
         for unit in units:
             unit.pop('metadata', None)
-            key = UniqueKey(unit)
-            _units[key] = unit
+            _units.append((unit_key_digest(unit), unit))
+        _units.sort(key=itemgetter(0))
         return _units
 
+    @staticmethod
+    def _parent_unit(entry):
+        """
+        Get the parent unit of an entry, reading it when needed.
+        :param entry: A parent entry.
+        :type entry: tuple
+        :return: (unit, ref).
+        :rtype: tuple
+        """
+        digest, last_updated, unit, ref = entry
+        if unit is None:
+            unit = ref.fetch()
+            unit.pop('metadata', None)
+        return unit, ref
+
     def __init__(self, base_URL, parent_units, child_units):
         """
         :param base_URL: The base URL for downloading parent units.
@@ -62,8 +95,36 @@ class UnitInventory(object):
         :type child_units: iterable
         """
         self.base_URL = base_URL
-        self.parent_units = self._import_parent_units(parent_units)
-        self.child_units = self._import_child_units(child_units)
+        self.parent_only = []
+        self.child_only = []
+        self.updated = []
+        self._merge(parent_units, child_units)
+
+    def _merge(self, parent_units, child_units):
+        """
+        Compare the parent and child inventories.
+        :param parent_units: The content units in the parent node.
+        :type parent_units: iterable
+        :param child_units: The content units in the child node.
+        :type child_units: iterable
+        """
+        parent = unique(self._parent_entries(parent_units))
+        child = unique(self._child_entries(child_units))
+        p = next(parent, None)
+        c = next(child, None)
+        while p is not None or c is not None:
+            if c is None or (p is not None and p[0] < c[0]):
+                self.parent_only.append(self._parent_unit(p))
+                p = next(parent, None)
+            elif p is None or c[0] < p[0]:
+                self.child_only.append(c[1])
+                c = next(child, None)
+            else:
+                child_last_updated = c[1].get(constants.LAST_UPDATED, 0)
+                if p[1] > child_last_updated:
+                    self.updated.append(self._parent_unit(p))
+                p = next(parent, None)
+                c = next(child, None)
 
     def units_on_parent_only(self):
         """
@@ -72,7 +133,7 @@ class UnitInventory(object):
         :return: List of (unit, ref).
         :rtype: list
         """
-        return [r for k, r in self.parent_units.items() if k not in self.child_units]
+        return self.parent_only
 
     def units_on_child_only(self):
         """
@@ -81,7 +142,7 @@ class UnitInventory(object):
         :return: List of units that need to be purged.
         :rtype: list
         """
-        return [u for k, u in self.child_units.items() if k not in self.parent_units]
+        return self.child_only
 
     def updated_units(self):
         """
@@ -89,13 +150,4 @@ class UnitInventory(object):
         :return: List of (unit, ref).
         :rtype: list
         """
-        updated = []
-        for key, (unit, ref) in self.parent_units.items():
-            child_unit = self.child_units.get(key)
-            if child_unit is None:
-                continue
-            parent_last_updated = unit.get(constants.LAST_UPDATED, 0)
-            child_last_updated = child_unit.get(constants.LAST_UPDATED, 0)
-            if parent_last_updated > child_last_updated:
-                updated.append((unit, ref))
-        return updated
+        return self.updated
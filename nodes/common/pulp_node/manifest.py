@@ -14,19 +14,29 @@ Provides classes for managing the content unit manifest.
 The manifest is a json encoded file that defines content units
 associated with repository.  The units themselves are stored in a separate
 json encoded file.  For performance reasons, the unit files are compressed.
+The units file may be accompanied by a binary index of fixed size records sorted
+by unit key, used to compare inventories without loading the units.  The index is
+optional so that the manifest remains readable by nodes that do not use it.
 """
 
 import os
 import gzip
+import mmap
 import errno
+import struct
 
+from collections import namedtuple
+from hashlib import sha1
 from logging import getLogger
+from operator import itemgetter
+from threading import RLock
 
 from nectar.request import DownloadRequest
 from nectar.listener import AggregatingEventListener
 
 from pulp.server.compat import json
 
+from pulp_node import constants
 from pulp_node import pathlib
 from pulp_node.error import ManifestDownloadError
 
@@ -39,6 +49,7 @@ log = getLogger(__name__)
 MANIFEST_VERSION = 2
 MANIFEST_FILE_NAME = 'manifest.json'
 UNITS_FILE_NAME = 'units.json.gz'
+INDEX_FILE_NAME = 'units.idx'
 
 ID = 'id'
 VERSION = 'version'
@@ -48,6 +59,17 @@ UNITS = 'units'
 UNITS_PATH = 'path'
 UNITS_TOTAL = 'total'
 UNITS_SIZE = 'size'
+UNITS_INDEX_SIZE = 'index_size'
+
+# The index starts with a header of: (magic, number of records).
+# Each record is: (unit key digest, last_updated, offset, length) where the offset
+# and length locate the unit within the uncompressed units file.
+INDEX_MAGIC = 'PULPNIDX'
+INDEX_HEADER = struct.Struct('>8sI')
+INDEX_RECORD = struct.Struct('>20sdQI')
+DIGEST_SIZE = 20
+
+IndexEntry = namedtuple('IndexEntry', ['digest', 'last_updated', 'offset', 'length'])
 
 
 # --- utils -----------------------------------------------------------------------------
@@ -76,6 +98,19 @@ def unzip(path, destination, bfrlen=65535):
         fp_in.close()
 
 
+def unit_key_digest(unit):
+    """
+    Get the digest of a unit's type_id & unit_key.
+    The unit key is sorted to ensure consistency.
+    :param unit: A content unit.
+    :type unit: dict
+    :return: The SHA-1 digest (20 bytes).
+    :rtype: str
+    """
+    key = json.dumps([unit['type_id'], unit['unit_key']], sort_keys=True, separators=(',', ':'))
+    return sha1(key).digest()
+
+
 # --- manifest --------------------------------------------------------------------------
 
 
@@ -151,7 +186,11 @@ class Manifest(object):
         if total:
             path = self.units_path()
             path = self.unzip_units(path)
-            return UnitIterator(path, total)
+            if self.has_index():
+                index = UnitIndex(self.index_path())
+            else:
+                index = None
+            return UnitIterator(path, total, index)
         else:
             return []
 
@@ -163,6 +202,7 @@ class Manifest(object):
         """
         self.units[UNITS_TOTAL] = unit_writer.total_units
         self.units[UNITS_SIZE] = unit_writer.bytes_written
+        self.units[UNITS_INDEX_SIZE] = unit_writer.index_bytes_written
 
     def published(self, details):
         """
@@ -184,16 +224,31 @@ class Manifest(object):
         except AttributeError:
             return False
 
+    def has_index(self):
+        """
+        Get whether the units are indexed.
+        The units are indexed when the manifest records the size of the index.
+        Manifests published by older nodes have no index.
+        :return: True if indexed.
+        :rtype: bool
+        """
+        return self.units.get(UNITS_INDEX_SIZE) is not None
+
     def has_valid_units(self):
         """
         Validate the associated units file by comparing the size of the
-        units file to units_size in the manifest.
+        units file to units_size in the manifest.  The index is validated
+        the same way.
         :return: True if valid.
         :rtype: bool
         """
         try:
             path = self.units_path()
             size = os.path.getsize(path)
+            if self.has_index():
+                index_size = os.path.getsize(self.index_path())
+                if index_size != self.units[UNITS_INDEX_SIZE]:
+                    return False
             return size == self.units[UNITS_SIZE]
         except OSError, e:
             if e.errno != errno.ENOENT:
@@ -229,6 +284,12 @@ class Manifest(object):
         """
         return self.units[UNITS_PATH] or pathlib.join(os.path.dirname(self.path), UNITS_FILE_NAME)
 
+    def index_path(self):
+        """
+        Get the absolute path to the associated units index file.
+        """
+        return pathlib.join(os.path.dirname(self.path), INDEX_FILE_NAME)
+
     def __eq__(self, other):
         if isinstance(other, Manifest):
             return self.id == other.id
@@ -282,12 +343,17 @@ class RemoteManifest(Manifest):
         :raise ValueError: on json decoding errors
         """
         base_url = self.url.rsplit('/', 1)[0]
-        url = pathlib.join(base_url, UNITS_FILE_NAME)
-        destination = pathlib.join(os.path.dirname(self.path), UNITS_FILE_NAME)
-        request = DownloadRequest(str(url), destination)
+        file_names = [UNITS_FILE_NAME]
+        if self.has_index():
+            file_names.append(INDEX_FILE_NAME)
+        request_list = []
+        for file_name in file_names:
+            url = pathlib.join(base_url, file_name)
+            destination = pathlib.join(os.path.dirname(self.path), file_name)
+            request_list.append(DownloadRequest(str(url), destination))
         listener = AggregatingEventListener()
         self.downloader.event_listener = listener
-        self.downloader.download([request])
+        self.downloader.download(request_list)
         if listener.failed_reports:
             report = listener.failed_reports[0]
             raise ManifestDownloadError(self.url, report.error_msg)
@@ -297,15 +363,20 @@ class UnitWriter(object):
     """
     Writes json encoded content units to a file.
     This approach is 30x faster than opening, appending, and closing for each unit.
+    The index of the units is written to the same directory when the file is closed.
     :ivar path:  The absolute path to a file or directory.  When a directory is specified,
         the standard file name is appended.
     :type path: str
+    :ivar index_path: The absolute path to the index file.
+    :type index_path: str
     :ivar fp: The file pointer used to write units to the file.
     :type fp: A python file object.
     :ivar total_units: Tracks the total number of units written.
     :type total_units: int
     :ivar bytes_written: The total number of bytes written.
     :type bytes_written: int
+    :ivar index_bytes_written: The total number of bytes written to the index.
+    :type index_bytes_written: int
     """
 
     def __init__(self, path):
@@ -318,9 +389,13 @@ class UnitWriter(object):
         if os.path.isdir(path):
             path = pathlib.join(path, UNITS_FILE_NAME)
         self.path = path
+        self.index_path = pathlib.join(os.path.dirname(path), INDEX_FILE_NAME)
         self.fp = gzip.open(path, 'wb')
         self.total_units = 0
         self.bytes_written = 0
+        self.index_bytes_written = 0
+        self.records = []
+        self.offset = 0
 
     @property
     def closed(self):
@@ -349,18 +424,39 @@ class UnitWriter(object):
         json_unit = json.dumps(unit)
         self.fp.write(json_unit)
         self.fp.write('\n')
+        length = len(json_unit) + 1
+        last_updated = unit.get(constants.LAST_UPDATED) or 0
+        record = INDEX_RECORD.pack(unit_key_digest(unit), last_updated, self.offset, length)
+        self.records.append(record)
+        self.offset += length
 
     def close(self):
         """
-        Close and compress the associated file.  This method is idempotent.
+        Close and compress the associated file and write the index.
+        This method is idempotent.
         :return: The number of units written.
         :rtype: int
         """
         if not self.closed:
             self.fp.close()
             self.bytes_written = os.path.getsize(self.path)
+            self.write_index()
         return self.total_units
 
+    def write_index(self):
+        """
+        Write the index of the units sorted by unit key digest.
+        Units with the same unit key remain in the order written.
+        :raise IOError: on I/O errors.
+        """
+        self.records.sort(key=itemgetter(slice(0, DIGEST_SIZE)))
+        with open(self.index_path, 'wb') as fp:
+            fp.write(INDEX_HEADER.pack(INDEX_MAGIC, len(self.records)))
+            for record in self.records:
+                fp.write(record)
+        self.records = []
+        self.index_bytes_written = os.path.getsize(self.index_path)
+
     def __enter__(self):
         return self
 
@@ -369,15 +465,106 @@ class UnitWriter(object):
         return False
 
 
+class UnitIndex(object):
+    """
+    The index of a units file.
+    The index contains fixed size records sorted by unit key digest and
+    is read one record at a time to ensure a small memory footprint.
+    :ivar path: The absolute path to the index file.
+    :type path: str
+    """
+
+    def __init__(self, path):
+        """
+        :param path: The absolute path to the index file.
+        :type path: str
+        """
+        self.path = path
+
+    @staticmethod
+    def read_header(fp):
+        """
+        Read the index header.
+        :param fp: An open index file.
+        :type fp: file
+        :return: The number of records.
+        :rtype: int
+        :raise ValueError: when not an index file.
+        """
+        header = fp.read(INDEX_HEADER.size)
+        if len(header) != INDEX_HEADER.size:
+            raise ValueError('index header truncated')
+        magic, count = INDEX_HEADER.unpack(header)
+        if magic != INDEX_MAGIC:
+            raise ValueError('not a units index')
+        return count
+
+    def __iter__(self):
+        """
+        Iterate the index records.
+        :return: A generator of IndexEntry.
+        :rtype: generator
+        :raise IOError: on I/O errors.
+        :raise ValueError: when not an index file.
+        """
+        with open(self.path, 'rb') as fp:
+            count = self.read_header(fp)
+            for n in xrange(count):
+                record = fp.read(INDEX_RECORD.size)
+                yield IndexEntry(*INDEX_RECORD.unpack(record))
+
+    def __len__(self):
+        with open(self.path, 'rb') as fp:
+            return self.read_header(fp)
+
+
+class UnitFile(object):
+    """
+    Provides random access to the units in an uncompressed units file.
+    The file is memory mapped once and shared by the units references
+    rather than opened for each unit.
+    :ivar path: The absolute path to the units file.
+    :type path: str
+    """
+
+    def __init__(self, path):
+        """
+        :param path: The absolute path to the units file.
+        :type path: str
+        """
+        self.path = path
+        self.mapped = None
+        self.lock = RLock()
+
+    def read(self, offset, length):
+        """
+        Read a unit.
+        :param offset: The offset of the unit within the file.
+        :type offset: int
+        :param length: The length of the unit within the file.
+        :type length: int
+        :return: The json encoded unit.
+        :rtype: str
+        :raise IOError: on I/O errors.
+        """
+        with self.lock:
+            if self.mapped is None:
+                with open(self.path, 'rb') as fp:
+                    self.mapped = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.mapped[offset:offset + length]
+
+
 class UnitIterator:
     """
     Used to iterate content units inventory file associated with a manifest.
     The file contains (1) json encoded unit per line.  The total number
     of units in the file is reported by __len__().
+    :ivar index: The index of the units file, when indexed.
+    :type index: UnitIndex
     """
 
     @staticmethod
-    def get_units(path):
+    def get_units(path, unit_file=None):
         with open(path) as fp:
             while True:
                 begin = fp.tell()
@@ -386,20 +573,35 @@ class UnitIterator:
                 if json_unit:
                     unit = json.loads(json_unit)
                     length = (end - begin)
-                    ref = UnitRef(path, begin, length)
+                    ref = UnitRef(path, begin, length, unit_file)
                     yield (unit, ref)
                 else:
                     break
 
-    def __init__(self, path, total_units):
+    def __init__(self, path, total_units, index=None):
         """
         :param path: The absolute path to the units file to be iterated.
         :type path: str
         :param total_units: The number of units contained in the units file.
         :type total_units: int
+        :param index: The index of the units file, when indexed.
+        :type index: UnitIndex
         """
-        self.unit_generator = UnitIterator.get_units(path)
+        self.path = path
+        self.unit_file = UnitFile(path)
+        self.unit_generator = UnitIterator.get_units(path, self.unit_file)
         self.total_units = total_units
+        self.index = index
+
+    def ref(self, entry):
+        """
+        Get a reference to the unit described by an index entry.
+        :param entry: An index entry.
+        :type entry: IndexEntry
+        :return: A reference to the unit.
+        :rtype: UnitRef
+        """
+        return UnitRef(self.path, entry.offset, entry.length, self.unit_file)
 
     def next(self):
         return self.unit_generator.next()
@@ -420,9 +622,11 @@ class UnitRef(object):
     :type offset: int
     :ivar length: The length of a specific unit within the file.
     :type length: int
+    :ivar unit_file: An optional shared units file used to read the unit.
+    :type unit_file: UnitFile
     """
 
-    def __init__(self, path, offset, length):
+    def __init__(self, path, offset, length, unit_file=None):
         """
         :param path: The absolute path to the units file.
         :type path: str
@@ -430,10 +634,13 @@ class UnitRef(object):
         :type offset: int
         :param length: The length of a specific unit within the file.
         :type length: int
+        :param unit_file: An optional shared units file used to read the unit.
+        :type unit_file: UnitFile
         """
         self.path = path
         self.offset = offset
         self.length = length
+        self.unit_file = unit_file
 
     def fetch(self):
         """
@@ -443,6 +650,9 @@ class UnitRef(object):
         :raise IOError: on I/O errors.
         :raise ValueError: json decoding errors
         """
+        if self.unit_file is not None:
+            json_unit = self.unit_file.read(self.offset, self.length)
+            return json.loads(json_unit)
         with open(self.path) as fp:
             fp.seek(self.offset)
             json_unit = fp.read(self.length)
@@ -12,8 +12,6 @@
 from base import ServerTests
 from operator import itemgetter
 
-import mock
-
 from pulp.plugins.loader import api as plugin_api
 from pulp.server.managers import factory as managers
 from pulp.plugins.types import database as unit_db
@@ -65,8 +63,7 @@ def add_units(num_units=10):
             manager.add_content_unit(type_id, unit_id, unit)
             manager = managers.repo_unit_association_manager()
             # associate unit
-            with mock.patch('pulp.server.managers.repo.unit_association.repo_controller'):
-                manager.associate_unit_by_id(REPO_ID, type_id, unit_id)
+            manager.associate_unit_by_id(REPO_ID, type_id, unit_id, update_repo_metadata=False)
             units.append(unit)
             n += 1
     return units
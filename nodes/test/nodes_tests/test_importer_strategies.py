@@ -9,7 +9,7 @@ from mock import Mock, patch
 from pulp.plugins.model import Unit
 from pulp.server.config import config as pulp_conf
 
-from pulp_node import constants, error
+from pulp_node import constants, error, manifest
 from pulp_node.importers import strategies
 from pulp_node.importers.inventory import UnitInventory
 from pulp_node.importers.reports import SummaryReport, ProgressListener
@@ -80,6 +80,63 @@ MANIFEST_ERROR = error.ManifestDownloadError('http://redhat.com/manifest', DOWNL
 UNIT_ERROR = error.UnitDownloadError('http://redhat.com/unit', REPO_ID, DOWNLOADER_ERROR_REPORT)
 
 
+class TestUnitInventory(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    @staticmethod
+    def unit(n, last_updated=0):
+        return dict(unit_id=str(n), type_id='T', unit_key={'n': n}, metadata={},
+                    last_updated=last_updated)
+
+    def units_on_parent(self, units):
+        path = os.path.join(self.tmp_dir, manifest.UNITS_FILE_NAME)
+        with manifest.UnitWriter(path) as writer:
+            for unit in units:
+                writer.add(unit)
+        m = manifest.Manifest(self.tmp_dir, 'abc')
+        m.units_published(writer)
+        m.write()
+        return m.get_units()
+
+    def verify(self, inventory):
+        parent_only = sorted(u['unit_id'] for u, r in inventory.units_on_parent_only())
+        self.assertEqual(parent_only, ['1', '4'])
+        for unit, ref in inventory.units_on_parent_only():
+            self.assertFalse('metadata' in unit)
+            self.assertEqual(ref.fetch()['unit_id'], unit['unit_id'])
+        child_only = sorted(u['unit_id'] for u in inventory.units_on_child_only())
+        self.assertEqual(child_only, ['5'])
+        updated = [u['unit_id'] for u, r in inventory.updated_units()]
+        self.assertEqual(updated, ['3'])
+
+    def test_indexed(self):
+        parent_units = self.units_on_parent(
+            [self.unit(1), self.unit(2, 10), self.unit(3, 20), self.unit(4)])
+        child_units = [self.unit(5), self.unit(3, 10), self.unit(2, 10)]
+        inventory = UnitInventory(BASE_URL, parent_units, child_units)
+        self.verify(inventory)
+
+    def test_not_indexed(self):
+        parent_units = [self.unit(1), self.unit(2, 10), self.unit(3, 20), self.unit(4)]
+        parent_units = [(u, TestUnitRef(dict(u))) for u in parent_units]
+        child_units = [self.unit(5), self.unit(3, 10), self.unit(2, 10)]
+        inventory = UnitInventory(BASE_URL, parent_units, child_units)
+        self.verify(inventory)
+
+    def test_duplicates(self):
+        parent_units = self.units_on_parent([self.unit(1, 10), self.unit(1, 20)])
+        child_units = [self.unit(1, 10)]
+        inventory = UnitInventory(BASE_URL, parent_units, child_units)
+        self.assertEqual(inventory.units_on_parent_only(), [])
+        updated = [u['last_updated'] for u, r in inventory.updated_units()]
+        self.assertEqual(updated, [20])
+
+
 class TestBase(TestCase):
 
     @classmethod
@@ -120,3 +120,81 @@ class TestManifest(TestCase):
             _unit = ref.fetch()
             self.assertEqual(unit, _unit)
         self.verify(units, units_in)
+
+    def test_index(self):
+        # Setup
+        units = []
+        manifest_path = os.path.join(self.tmp_dir, manifest.MANIFEST_FILE_NAME)
+        for i in range(0, self.NUM_UNITS):
+            unit = dict(unit_id=i, type_id='T', unit_key={'n': i}, last_updated=i)
+            units.append(unit)
+        # Test
+        units_path = os.path.join(self.tmp_dir, manifest.UNITS_FILE_NAME)
+        with manifest.UnitWriter(units_path) as writer:
+            for u in units:
+                writer.add(u)
+        m = manifest.Manifest(manifest_path, self.MANIFEST_ID)
+        m.units_published(writer)
+        m.write()
+        # Verify
+        index_path = os.path.join(self.tmp_dir, manifest.INDEX_FILE_NAME)
+        self.assertEqual(m.units[manifest.UNITS_INDEX_SIZE], os.path.getsize(index_path))
+        self.assertTrue(m.has_index())
+        self.assertTrue(m.has_valid_units())
+        iterator = m.get_units()
+        self.assertEqual(len(iterator.index), self.NUM_UNITS)
+        entries = list(iterator.index)
+        digests = [e.digest for e in entries]
+        self.assertEqual(digests, sorted(digests))
+        for entry in entries:
+            unit = iterator.ref(entry).fetch()
+            self.assertEqual(entry.digest, manifest.unit_key_digest(unit))
+            self.assertEqual(entry.last_updated, unit['last_updated'])
+            self.assertEqual(unit, units[unit['unit_id']])
+
+    def test_invalid_index(self):
+        # Setup
+        units_path = os.path.join(self.tmp_dir, manifest.UNITS_FILE_NAME)
+        with manifest.UnitWriter(units_path) as writer:
+            writer.add(dict(unit_id=1, type_id='T', unit_key={}))
+        manifest_path = os.path.join(self.tmp_dir, manifest.MANIFEST_FILE_NAME)
+        m = manifest.Manifest(manifest_path, self.MANIFEST_ID)
+        m.units_published(writer)
+        with open(writer.index_path, 'a') as fp:
+            fp.write('garbage')
+        # Test
+        self.assertFalse(m.has_valid_units())
+        with open(writer.index_path, 'w') as fp:
+            fp.write('garbage')
+        self.assertRaises(ValueError, list, manifest.UnitIndex(writer.index_path))
+
+    def test_no_index(self):
+        # Setup
+        units = []
+        manifest_path = os.path.join(self.tmp_dir, manifest.MANIFEST_FILE_NAME)
+        for i in range(0, self.NUM_UNITS):
+            unit = dict(unit_id=i, type_id='T', unit_key={})
+            units.append(unit)
+        units_path = os.path.join(self.tmp_dir, manifest.UNITS_FILE_NAME)
+        with manifest.UnitWriter(units_path) as writer:
+            for u in units:
+                writer.add(u)
+        os.unlink(writer.index_path)
+        m = manifest.Manifest(manifest_path, self.MANIFEST_ID)
+        m.units_published(writer)
+        del m.units[manifest.UNITS_INDEX_SIZE]
+        m.write()
+        # Test
+        m = manifest.Manifest(manifest_path)
+        m.read()
+        # Verify
+        self.assertTrue(m.is_valid())
+        self.assertFalse(m.has_index())
+        self.assertTrue(m.has_valid_units())
+        iterator = m.get_units()
+        self.assertTrue(iterator.index is None)
+        units_in = []
+        for unit, ref in iterator:
+            units_in.append(unit)
+            self.assertEqual(unit, ref.fetch())
+        self.verify(units, units_in)
@@ -38,7 +38,8 @@ from pulp.common.config import Config
 from pulp.server.managers import factory as managers
 from pulp.server.content.sources.model import Request as DownloadRequest
 from pulp.agent.lib.conduit import Conduit
-from pulp_node.manifest import Manifest, RemoteManifest, MANIFEST_FILE_NAME, UNITS_FILE_NAME
+from pulp_node.manifest import (Manifest, RemoteManifest, MANIFEST_FILE_NAME, UNITS_FILE_NAME,
+                                INDEX_FILE_NAME)
 from pulp_node.handlers.strategies import Mirror, Additive
 from pulp_node import error
 from pulp_node import constants
@@ -527,8 +528,7 @@ class TestDistributor(PluginTestBase):
         for key in (constants.MANIFEST_URL_KEYWORD, constants.STRATEGY_KEYWORD):
             self.assertTrue(key in importers[0]['config'])
 
-    @patch('pulp.server.managers.repo.unit_association.repo_controller')
-    def test_publish(self, mock_repo_ctrl):
+    def test_publish(self):
         # Setup
         self.populate()
 
@@ -705,10 +705,12 @@ class ImporterTest(PluginTestBase):
             publisher = dist.publisher(repo, configuration)
             manifest_path = publisher.manifest_path()
             units_path = os.path.join(os.path.dirname(manifest_path), UNITS_FILE_NAME)
+            index_path = os.path.join(os.path.dirname(manifest_path), INDEX_FILE_NAME)
             manifest = Manifest(manifest_path)
             manifest.read()
             shutil.copy(manifest_path, os.path.join(working_dir, MANIFEST_FILE_NAME))
             shutil.copy(units_path, os.path.join(working_dir, UNITS_FILE_NAME))
+            shutil.copy(index_path, os.path.join(working_dir, INDEX_FILE_NAME))
             # Test
             importer = NodesHttpImporter()
             manifest_url = pathlib.url_join(publisher.base_url, manifest_path)
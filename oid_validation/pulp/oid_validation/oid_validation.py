@@ -19,6 +19,7 @@ from ConfigParser import NoOptionError, SafeConfigParser, NoSectionError
 
 from rhsm import certificate
 
+from pulp.repoauth.cache import FileCache, LRUCache, fingerprint
 from pulp.repoauth.protected_repo_utils import ProtectedRepoUtils
 from pulp.repoauth.repo_cert_utils import RepoCertUtils
 
@@ -26,6 +27,11 @@ from pulp.repoauth.repo_cert_utils import RepoCertUtils
 # separate config file for repo auth purposes is used.
 CONFIG_FILENAME = '/etc/pulp/repo_auth.conf'
 
+# Parsed client certificates keyed by their fingerprint. A parsed entitlement certificate holds
+# the entitled paths compiled into a lookup structure, so checking a path against a cached
+# certificate does not walk the certificate extensions again.
+ENTITLEMENT_CACHE = LRUCache()
+
 
 def authenticate(environ, config=None):
     '''
@@ -62,11 +68,19 @@ def authenticate(environ, config=None):
 
 
 def _config():
+    return _config_cache.get(CONFIG_FILENAME)
+
+
+def _load_config(path):
     config = SafeConfigParser()
-    config.read(CONFIG_FILENAME)
+    config.read(path)
     return config
 
 
+# The config is only parsed again when it changes on disk.
+_config_cache = FileCache(_load_config)
+
+
 class OidValidator:
     def __init__(self, config):
         self.config = config
@@ -145,8 +159,8 @@ class OidValidator:
 
     def _matching_repo_bundle(self, dest, repo_url_prefixes):
 
-        # Load the path -> repo ID mappings
-        prot_repos = self.protected_repo_utils.read_protected_repo_listings()
+        # Load the index of path -> repo ID mappings
+        prot_repos = self.protected_repo_utils.read_protected_repo_index()
 
         repo_id = None
         for prefix in repo_url_prefixes:
@@ -155,16 +169,11 @@ class OidValidator:
             #   Repo Portion: /my-repo/pulp/fedora-13/i386/repodata/repomd.xml
             repo_url = dest[dest.find(prefix) + len(prefix):]
 
-            # If the repo portion of the URL starts with any of the protected relative URLs,
-            # it is considered to be a request against that protected repo
-            for relative_repo_url in prot_repos.keys():
-
-                # Relative URL is inconsistent in Pulp, so a simple "startswith" tends to
-                # break. Changing this to a find helps remove issues where the leading /
-                # is missing, present, or duplicated.
-                if repo_url.find(relative_repo_url) != -1:
-                    repo_id = prot_repos[relative_repo_url]
-                    break
+            # If the repo portion of the URL contains any of the protected relative URLs,
+            # it is considered to be a request against that protected repo. Relative URL is
+            # inconsistent in Pulp, so the index matches on path segments, ignoring leading,
+            # trailing or duplicated slashes.
+            repo_id = prot_repos.find(repo_url)
 
             # break out of checking URLs once we find a matching repo id
             if repo_id:
@@ -191,7 +200,7 @@ class OidValidator:
         :return: True iff request is authorized, else False
         :rtype:  bool
         """
-        cert = certificate.create_from_pem(cert_pem)
+        cert = self._entitlement_certificate(cert_pem)
 
         valid = False
         for prefix in repo_url_prefixes:
@@ -213,6 +222,22 @@ class OidValidator:
 
         return valid
 
+    def _entitlement_certificate(self, cert_pem):
+        """
+        Get the parsed client certificate, parsing it only if it is not cached.
+
+        :param cert_pem: certificate as PEM
+        :type  cert_pem: str
+        :return: the parsed certificate
+        :rtype:  rhsm.certificate2.Certificate
+        """
+        key = fingerprint(cert_pem)
+        cert = ENTITLEMENT_CACHE.get(key)
+        if cert is None:
+            cert = certificate.create_from_pem(cert_pem)
+            ENTITLEMENT_CACHE.set(key, cert)
+        return cert
+
     def _get_repo_url_prefixes_from_config(self, config):
         """
         Obtain the list of repo URLs prefixes from the conf file. If none
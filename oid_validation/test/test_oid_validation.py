@@ -17,6 +17,7 @@ from M2Crypto import X509
 import mock
 
 import pulp.oid_validation.oid_validation as oid_validation
+from pulp.repoauth.protected_repo_utils import ProtectedRepoIndex
 from pulp.repoauth.repo_cert_utils import RepoCertUtils
 
 DATA_DIR = os.path.abspath(os.path.dirname(__file__)) + '/data'
@@ -107,16 +108,16 @@ class TestOidValidation(unittest.TestCase):
                 return_value=True)
     @mock.patch('pulp.oid_validation.oid_validation.RepoCertUtils.validate_certificate_pem')
     @mock.patch(
-        'pulp.repoauth.protected_repo_utils.ProtectedRepoUtils.read_protected_repo_listings')
+        'pulp.repoauth.protected_repo_utils.ProtectedRepoUtils.read_protected_repo_index')
     @mock.patch('pulp.repoauth.repo_cert_utils.RepoCertUtils.read_consumer_cert_bundle')
-    def test_is_valid_verify_ssl_false(self, mock_read_bundle, mock_read_listings,
+    def test_is_valid_verify_ssl_false(self, mock_read_bundle, mock_read_index,
                                        validate_certificate_pem, _check_extensions):
         """
         Test is_valid when verify_ssl is false.
         """
         self.config.set('main', 'verify_ssl', 'false')
         repo_x_bundle = {'ca': OTHER_CA, 'key': KEY, 'cert': CERT, }
-        mock_read_listings.return_value = {'/pulp/pulp/fedora-14/x86_64': 'repo-x'}
+        mock_read_index.return_value = ProtectedRepoIndex({'/pulp/pulp/fedora-14/x86_64': 'repo-x'})
         mock_read_bundle.return_value = repo_x_bundle
         request_x = mock_environ(E_FULL,
                                  'https://localhost/pulp/repos/repos/pulp/pulp/fedora-14/x86_64/')
@@ -132,16 +133,16 @@ class TestOidValidation(unittest.TestCase):
     @mock.patch('pulp.oid_validation.oid_validation.RepoCertUtils.validate_certificate_pem',
                 return_value=False)
     @mock.patch(
-        'pulp.repoauth.protected_repo_utils.ProtectedRepoUtils.read_protected_repo_listings')
+        'pulp.repoauth.protected_repo_utils.ProtectedRepoUtils.read_protected_repo_index')
     @mock.patch('pulp.repoauth.repo_cert_utils.RepoCertUtils.read_consumer_cert_bundle')
-    def test_is_valid_verify_ssl_true(self, mock_read_bundle, mock_read_listings,
+    def test_is_valid_verify_ssl_true(self, mock_read_bundle, mock_read_index,
                                       validate_certificate_pem, _check_extensions):
         """
         Test is_valid when verify_ssl is true.
         """
         self.config.set('main', 'verify_ssl', 'true')
         repo_x_bundle = {'ca': OTHER_CA, 'key': KEY, 'cert': CERT, }
-        mock_read_listings.return_value = {'/pulp/pulp/fedora-14/x86_64': 'repo-x'}
+        mock_read_index.return_value = ProtectedRepoIndex({'/pulp/pulp/fedora-14/x86_64': 'repo-x'})
         mock_read_bundle.return_value = repo_x_bundle
         request_x = mock_environ(E_FULL,
                                  'https://localhost/pulp/repos/repos/pulp/pulp/fedora-14/x86_64/')
@@ -159,16 +160,16 @@ class TestOidValidation(unittest.TestCase):
     @mock.patch('pulp.oid_validation.oid_validation.RepoCertUtils.validate_certificate_pem',
                 return_value=False)
     @mock.patch(
-        'pulp.repoauth.protected_repo_utils.ProtectedRepoUtils.read_protected_repo_listings')
+        'pulp.repoauth.protected_repo_utils.ProtectedRepoUtils.read_protected_repo_index')
     @mock.patch('pulp.repoauth.repo_cert_utils.RepoCertUtils.read_consumer_cert_bundle')
-    def test_is_valid_verify_ssl_undefined(self, mock_read_bundle, mock_read_listings,
+    def test_is_valid_verify_ssl_undefined(self, mock_read_bundle, mock_read_index,
                                            validate_certificate_pem, _check_extensions):
         """
         Test is_valid when verify_ssl is undefined.
         """
         self.config.remove_option('main', 'verify_ssl')
         repo_x_bundle = {'ca': OTHER_CA, 'key': KEY, 'cert': CERT, }
-        mock_read_listings.return_value = {'/pulp/pulp/fedora-14/x86_64': 'repo-x'}
+        mock_read_index.return_value = ProtectedRepoIndex({'/pulp/pulp/fedora-14/x86_64': 'repo-x'})
         mock_read_bundle.return_value = repo_x_bundle
         request_x = mock_environ(E_FULL,
                                  'https://localhost/pulp/repos/repos/pulp/pulp/fedora-14/x86_64/')
@@ -241,10 +242,10 @@ class TestOidValidation(unittest.TestCase):
         self.assertTrue(response_y)
 
     @mock.patch(
-        'pulp.repoauth.protected_repo_utils.ProtectedRepoUtils.read_protected_repo_listings')
+        'pulp.repoauth.protected_repo_utils.ProtectedRepoUtils.read_protected_repo_index')
     @mock.patch('pulp.repoauth.repo_cert_utils.RepoCertUtils.read_consumer_cert_bundle')
     @mock.patch('pulp.repoauth.repo_cert_utils.RepoCertUtils.read_global_cert_bundle')
-    def test_scenario_2(self, mock_read_global_bundle, mock_read_bundle, mock_read_listings):
+    def test_scenario_2(self, mock_read_global_bundle, mock_read_bundle, mock_read_index):
         """
         Setup
         - Global auth disabled
@@ -257,7 +258,7 @@ class TestOidValidation(unittest.TestCase):
         """
         mock_read_global_bundle.return_value = None
         repo_x_bundle = {'ca': OTHER_CA, 'key': KEY, 'cert': CERT, }
-        mock_read_listings.return_value = {'/pulp/pulp/fedora-14/x86_64': 'repo-x'}
+        mock_read_index.return_value = ProtectedRepoIndex({'/pulp/pulp/fedora-14/x86_64': 'repo-x'})
         mock_read_bundle.return_value = repo_x_bundle
 
         # Test
@@ -274,10 +275,10 @@ class TestOidValidation(unittest.TestCase):
         self.assertTrue(response_y)
 
     @mock.patch(
-        'pulp.repoauth.protected_repo_utils.ProtectedRepoUtils.read_protected_repo_listings')
+        'pulp.repoauth.protected_repo_utils.ProtectedRepoUtils.read_protected_repo_index')
     @mock.patch('pulp.repoauth.repo_cert_utils.RepoCertUtils.read_consumer_cert_bundle')
     @mock.patch('pulp.repoauth.repo_cert_utils.RepoCertUtils.read_global_cert_bundle')
-    def test_scenario_3(self, mock_read_global_bundle, mock_read_bundle, mock_read_listings):
+    def test_scenario_3(self, mock_read_global_bundle, mock_read_bundle, mock_read_index):
         """
         Setup
         - Global auth disabled
@@ -291,7 +292,7 @@ class TestOidValidation(unittest.TestCase):
         mock_read_global_bundle.return_value = None
 
         repo_y_bundle = {'ca': VALID_CA, 'key': KEY, 'cert': CERT, }
-        mock_read_listings.return_value = {'/pulp/pulp/fedora-13/x86_64': 'repo-x'}
+        mock_read_index.return_value = ProtectedRepoIndex({'/pulp/pulp/fedora-13/x86_64': 'repo-x'})
         mock_read_bundle.return_value = repo_y_bundle
 
         # Test
@@ -707,11 +708,31 @@ class TestOidValidation(unittest.TestCase):
     def test_config(self, mock_config_parser):
         mock_config_parser_instance = mock.Mock()
         mock_config_parser.return_value = mock_config_parser_instance
+        oid_validation._config_cache.invalidate()
 
         oid_validation._config()
 
         mock_config_parser_instance.read.assert_called_once_with('/etc/pulp/repo_auth.conf')
 
+    @mock.patch('pulp.oid_validation.oid_validation.certificate')
+    def test_check_extensions_cached(self, mock_certificate_module):
+        """
+        Assert client certificates are only parsed once
+        """
+        mock_cert = mock.Mock()
+        mock_cert.check_path.return_value = True
+        mock_certificate_module.create_from_pem.return_value = mock_cert
+        oid_validation.ENTITLEMENT_CACHE.clear()
+        validator = oid_validation.OidValidator(self.config)
+
+        for name in ('a.rpm', 'b.rpm'):
+            path = '/pulp/repos/content/' + name
+            self.assertTrue(validator._check_extensions(E_FULL, path, mock.Mock(),
+                                                        ['/pulp/repos']))
+
+        mock_certificate_module.create_from_pem.assert_called_once_with(E_FULL)
+        self.assertEqual(mock_cert.check_path.call_count, 2)
+
     def test_get_repo_url_prefixes_from_config(self):
         mock_config = mock.Mock()
         mock_config.get.return_value = "a,b"
@@ -781,10 +802,11 @@ class TestOidValidation(unittest.TestCase):
         ]
         mock_cert = mock.Mock()
         mock_certificate_module.create_from_pem.return_value = mock_cert
+        oid_validation.ENTITLEMENT_CACHE.clear()
         validator = oid_validation.OidValidator(self.config)
 
         for path in prefixed_paths:
-            validator._check_extensions(mock.Mock(), path, mock.Mock(), path_prefixes)
+            validator._check_extensions(E_FULL, path, mock.Mock(), path_prefixes)
 
         for call in mock_cert.check_path.call_args_list:
             self.assertEqual(unprefixed_path, call[0][0])
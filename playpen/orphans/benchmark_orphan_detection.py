@@ -0,0 +1,117 @@
+#!/usr/bin/env python2
+"""
+Compare per-unit and bulk orphan detection on a synthetic data set.
+
+The script creates a throwaway database holding a single content unit collection and a
+repo_content_units collection in which a configurable fraction of the units are associated with
+a repository. It then times the historical detection algorithm (one count() query per unit)
+against OrphanManager.generate_orphan_pages() and checks that both find the same orphans.
+
+It needs a running MongoDB reachable with the settings in /etc/pulp/server.conf. The database
+named with --database is dropped when the run is over.
+
+Example:
+
+    ./benchmark_orphan_detection.py --units 1000000 --orphan-ratio 0.1
+"""
+
+import optparse
+import random
+import time
+import uuid
+
+from pulp.server.db import connection
+from pulp.server.db.model.repository import RepoContentUnit
+from pulp.server.managers.content.orphan import ORPHAN_PAGE_SIZE, OrphanManager
+
+
+UNIT_COLLECTION = 'units_benchmark_orphan'
+INSERT_BATCH_SIZE = 10000
+
+
+def parse_args():
+    parser = optparse.OptionParser()
+    parser.add_option('--units', type='int', default=1000000,
+                      help='number of content units to generate [default: %default]')
+    parser.add_option('--orphan-ratio', type='float', default=0.1,
+                      help='fraction of the units left without a repository [default: %default]')
+    parser.add_option('--page-size', type='int', default=ORPHAN_PAGE_SIZE,
+                      help='page size used by the bulk detection [default: %default]')
+    parser.add_option('--database', default='pulp_orphan_benchmark',
+                      help='name of the throwaway database [default: %default]')
+    parser.add_option('--skip-per-unit', action='store_true', default=False,
+                      help='only time the bulk detection; the per-unit one takes a long time')
+    options, args = parser.parse_args()
+    return options
+
+
+def populate(units_collection, associations_collection, num_units, orphan_ratio):
+    units = []
+    associations = []
+    for i in xrange(num_units):
+        unit_id = str(uuid.uuid4())
+        units.append({'_id': unit_id, 'name': 'unit-%d' % i})
+        if random.random() >= orphan_ratio:
+            associations.append({'repo_id': 'benchmark-repo', 'unit_id': unit_id,
+                                 'unit_type_id': 'benchmark_orphan'})
+        if len(units) >= INSERT_BATCH_SIZE:
+            units_collection.insert_many(units, ordered=False)
+            units = []
+        if len(associations) >= INSERT_BATCH_SIZE:
+            associations_collection.insert_many(associations, ordered=False)
+            associations = []
+    if units:
+        units_collection.insert_many(units, ordered=False)
+    if associations:
+        associations_collection.insert_many(associations, ordered=False)
+
+
+def per_unit_orphans(units_collection, associations_collection):
+    """
+    The detection algorithm OrphanManager used before the bulk engine was introduced.
+    """
+    orphans = set()
+    for unit in units_collection.find({}, projection=['_id']).batch_size(100):
+        if associations_collection.find({'unit_id': unit['_id']}).count() > 0:
+            continue
+        orphans.add(unit['_id'])
+    return orphans
+
+
+def bulk_orphans(units_collection, page_size):
+    orphans = set()
+    for page in OrphanManager.generate_orphan_pages(units_collection, page_size=page_size):
+        orphans.update(unit['_id'] for unit in page)
+    return orphans
+
+
+def timed(label, func, *args):
+    start = time.time()
+    result = func(*args)
+    elapsed = time.time() - start
+    print '%-10s %10d orphans in %10.2fs' % (label, len(result), elapsed)
+    return result
+
+
+def main():
+    options = parse_args()
+    connection.initialize(name=options.database)
+    try:
+        units_collection = connection.get_collection(UNIT_COLLECTION, create=True)
+        associations_collection = RepoContentUnit.get_collection()
+
+        print 'Generating %d units...' % options.units
+        populate(units_collection, associations_collection, options.units, options.orphan_ratio)
+
+        bulk = timed('bulk', bulk_orphans, units_collection, options.page_size)
+        if not options.skip_per_unit:
+            per_unit = timed('per-unit', per_unit_orphans, units_collection,
+                             associations_collection)
+            if per_unit != bulk:
+                print 'ERROR: the two algorithms found different orphans'
+    finally:
+        connection._CONNECTION.drop_database(options.database)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python2
+"""
+Compare the polling and the event-driven placement of reserved tasks.
+
+The script dispatches a number of reserved tasks, spread over a number of resources, to fake
+workers running as threads in this process. Each fake worker runs its tasks in order, sleeping for
+a random duration, and releases the reservation of each task when done, as _release_resource()
+does.
+
+The tasks are placed twice: first with the algorithm the resource manager used before the
+reservation scheduler was introduced (query the database and sleep for 0.25 seconds when no worker
+is available), then with the ReservationScheduler, which is woken up by release events. Events are
+delivered in-process instead of through the broker.
+
+It needs a running MongoDB reachable with the settings in /etc/pulp/server.conf. The database
+named with --database is dropped when the run is over.
+
+Example:
+
+    ./benchmark_reservations.py --tasks 10000 --workers 8 --resources 200
+"""
+
+from datetime import datetime
+from Queue import Empty, Queue
+import optparse
+import random
+import threading
+import time
+import uuid
+
+from pulp.server.async import reservations
+from pulp.server.db import connection
+from pulp.server.db.model import ReservedResource, Worker
+
+
+WORKER_NAME = 'reserved_resource_worker-%d@benchmark'
+
+
+def parse_args():
+    parser = optparse.OptionParser()
+    parser.add_option('--tasks', type='int', default=10000,
+                      help='number of reserved tasks to dispatch [default: %default]')
+    parser.add_option('--workers', type='int', default=8,
+                      help='number of fake workers [default: %default]')
+    parser.add_option('--resources', type='int', default=200,
+                      help='number of distinct resources reserved [default: %default]')
+    parser.add_option('--duration', type='float', default=0.005,
+                      help='mean task duration in seconds [default: %default]')
+    parser.add_option('--poll-interval', type='float', default=0.25,
+                      help='sleep between polls of the polling algorithm [default: %default]')
+    parser.add_option('--database', default='pulp_reservation_benchmark',
+                      help='name of the throwaway database [default: %default]')
+    parser.add_option('--skip-polling', action='store_true', default=False,
+                      help='only time the event-driven scheduler')
+    options, args = parser.parse_args()
+    return options
+
+
+class LocalEvents(object):
+    """
+    Reservation events delivered through an in-process queue.
+    """
+
+    def __init__(self):
+        self.queue = Queue()
+
+    def publish(self, event_type, **fields):
+        fields['type'] = event_type
+        self.queue.put(fields)
+
+    def wait(self, timeout):
+        events = []
+        while True:
+            try:
+                events.append(self.queue.get(block=bool(timeout) and not events, timeout=timeout))
+            except Empty:
+                return events
+
+
+class FakeWorker(threading.Thread):
+    """
+    Runs the tasks placed on a worker in order and releases their reservations.
+    """
+
+    def __init__(self, name, duration, events=None):
+        super(FakeWorker, self).__init__(name=name)
+        self.daemon = True
+        self.queue = Queue()
+        self.duration = duration
+        self.events = events
+
+    def run(self):
+        while True:
+            task_id = self.queue.get()
+            if task_id is None:
+                return
+            time.sleep(random.expovariate(1.0 / self.duration))
+            ReservedResource.objects(task_id=task_id).delete()
+            if self.events is not None:
+                self.events.publish(reservations.RELEASED, task_id=task_id)
+
+
+def polling_reserve(scheduler, task_id, resource_id, poll_interval):
+    """
+    The placement algorithm used by _queue_reserved_task before the reservation scheduler: read
+    the workers and reservations from the database on every attempt and sleep when no worker is
+    available. The scheduler only holds the state read from the database and selects the worker.
+    """
+    while True:
+        scheduler.sync()
+        worker_name = scheduler._place(resource_id)
+        if worker_name is not None:
+            break
+        time.sleep(poll_interval)
+    ReservedResource(task_id=task_id, worker_name=worker_name, resource_id=resource_id).save()
+    return worker_name
+
+
+def run(label, options, reserve, events=None):
+    ReservedResource.objects.delete()
+    workers = {}
+    for n in range(options.workers):
+        worker = FakeWorker(WORKER_NAME % n, options.duration, events)
+        workers[worker.name] = worker
+        worker.start()
+    resource_ids = ['repo-%d' % n for n in range(options.resources)]
+    latencies = []
+    start = time.time()
+    for n in xrange(options.tasks):
+        task_id = str(uuid.uuid4())
+        started = time.time()
+        worker_name = reserve(task_id, random.choice(resource_ids))
+        latencies.append(time.time() - started)
+        workers[worker_name].queue.put(task_id)
+    dispatched = time.time() - start
+    for worker in workers.values():
+        worker.queue.put(None)
+    for worker in workers.values():
+        worker.join()
+    elapsed = time.time() - start
+    latencies.sort()
+    print '%-10s dispatched in %8.2fs, done in %8.2fs, latency mean %.4fs p99 %.4fs max %.4fs' % (
+        label, dispatched, elapsed, sum(latencies) / len(latencies),
+        latencies[int(len(latencies) * 0.99)], latencies[-1])
+
+
+def main():
+    options = parse_args()
+    connection.initialize(name=options.database)
+    try:
+        for n in range(options.workers):
+            Worker(name=WORKER_NAME % n, last_heartbeat=datetime.utcnow()).save()
+
+        if not options.skip_polling:
+            polling = reservations.ReservationScheduler(LocalEvents())
+            run('polling', options,
+                lambda task_id, resource_id: polling_reserve(
+                    polling, task_id, resource_id, options.poll_interval))
+
+        events = LocalEvents()
+        scheduler = reservations.ReservationScheduler(events)
+        run('events', options, scheduler.reserve, events)
+    finally:
+        connection._CONNECTION.drop_database(options.database)
+
+
+if __name__ == '__main__':
+    main()
@@ -7,6 +7,8 @@ doesn't care at all about repo authentication.
 
 from ConfigParser import SafeConfigParser
 
+from pulp.repoauth.cache import FileCache
+
 # This needs to be accessible on both Pulp and the CDS instances, so a
 # separate config file for repo auth purposes is used.
 CONFIG_FILENAME = '/etc/pulp/repo_auth.conf'
@@ -30,6 +32,14 @@ def authenticate(environ):
 
 
 def _config():
+    return _config_cache.get(CONFIG_FILENAME)
+
+
+def _load_config(path):
     config = SafeConfigParser()
-    config.read(CONFIG_FILENAME)
+    config.read(path)
     return config
+
+
+# The config is only parsed again when it changes on disk.
+_config_cache = FileCache(_load_config)
@@ -0,0 +1,211 @@
+"""
+Per-process caches for the files read by repo authentication.
+
+Repo authentication runs on every content request. The files it reads (the repo auth config,
+the protected repo listing and the cert bundles) rarely change, so their parsed contents are
+kept in memory and only reloaded when the file changes on disk. A file is considered changed
+when its modification time, size or inode changes, which costs a single stat() per request.
+"""
+import os
+import time
+from collections import OrderedDict
+from hashlib import sha256
+from threading import RLock
+
+
+def file_stamp(path):
+    """
+    Get the stamp used to detect changes to a file.
+
+    :param path: absolute path to the file
+    :type  path: str
+    :return:     (mtime, size, inode) of the file, or None if it does not exist
+    :rtype:      tuple or None
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime, stat.st_size, stat.st_ino
+
+
+def fingerprint(data):
+    """
+    Get the fingerprint used to key caches by the contents of PEM encoded data.
+
+    :param data: PEM encoded certificates or keys
+    :type  data: str
+    :return:     SHA-256 hex digest of the data
+    :rtype:      str
+    """
+    return sha256(data).hexdigest()
+
+
+def read_file(path):
+    """
+    Read the contents of a file.
+
+    :param path: absolute path to the file
+    :type  path: str
+    :return:     the contents of the file, or None if it does not exist
+    :rtype:      str or None
+    """
+    try:
+        with open(path, 'r') as f:
+            return f.read()
+    except IOError:
+        return None
+
+
+class FileCache(object):
+    """
+    Cache of values loaded from files, keyed by the absolute path of the file. A file is
+    loaded again when its stamp changes.
+    """
+
+    def __init__(self, load):
+        """
+        :param load: called with the path of a file to load its value, including when the
+                     file does not exist
+        :type  load: callable
+        """
+        self.load = load
+        self._entries = {}
+        self._lock = RLock()
+
+    def get(self, path):
+        """
+        Get the value loaded from a file, loading it when the file changed since it was last
+        loaded.
+
+        :param path: absolute path to the file
+        :type  path: str
+        :return:     the value loaded from the file
+        """
+        stamp = file_stamp(path)
+        entry = self._entries.get(path)
+        if entry is not None and entry[0] == stamp:
+            return entry[1]
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == stamp:
+                return entry[1]
+            value = self.load(path)
+            self._entries[path] = (stamp, value)
+            return value
+
+    def invalidate(self, path=None):
+        """
+        Forget the value loaded from a file, or from all files.
+
+        :param path: absolute path to the file; all files if None
+        :type  path: str
+        """
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(path, None)
+
+
+class BoundedCache(object):
+    """
+    Cache of values keyed by hashable keys, holding at most a given number of values. The
+    cache is emptied when it is full, since its keys are expected to rarely change.
+    """
+
+    def __init__(self, max_size=128):
+        """
+        :param max_size: maximum number of values held
+        :type  max_size: int
+        """
+        self.max_size = max_size
+        self._values = {}
+        self._lock = RLock()
+
+    def get(self, key):
+        """
+        Get the value of a key.
+
+        :param key: the key
+        :type  key: hashable
+        :return:    the value of the key, or None if it is not cached
+        """
+        return self._values.get(key)
+
+    def set(self, key, value):
+        """
+        Set the value of a key.
+
+        :param key:   the key
+        :type  key:   hashable
+        :param value: the value of the key
+        """
+        with self._lock:
+            if len(self._values) >= self.max_size:
+                self._values.clear()
+            self._values[key] = value
+
+    def clear(self):
+        """
+        Forget all the values.
+        """
+        with self._lock:
+            self._values.clear()
+
+
+class LRUCache(object):
+    """
+    Cache of values keyed by hashable keys, holding at most a given number of values. The least
+    recently used value is dropped when the cache is full. Values may expire at a given time.
+    """
+
+    def __init__(self, max_size=1024):
+        """
+        :param max_size: maximum number of values held
+        :type  max_size: int
+        """
+        self.max_size = max_size
+        self._values = OrderedDict()
+        self._lock = RLock()
+
+    def get(self, key):
+        """
+        Get the value of a key.
+
+        :param key: the key
+        :type  key: hashable
+        :return:    the value of the key, or None if it is not cached or expired
+        """
+        with self._lock:
+            try:
+                expires, value = self._values.pop(key)
+            except KeyError:
+                return None
+            if expires is not None and expires <= time.time():
+                return None
+            self._values[key] = (expires, value)
+            return value
+
+    def set(self, key, value, expires=None):
+        """
+        Set the value of a key.
+
+        :param key:     the key
+        :type  key:     hashable
+        :param value:   the value of the key
+        :param expires: time (seconds since the epoch) at which the value expires; never if None
+        :type  expires: float
+        """
+        with self._lock:
+            self._values.pop(key, None)
+            self._values[key] = (expires, value)
+            while len(self._values) > self.max_size:
+                self._values.popitem(last=False)
+
+    def clear(self):
+        """
+        Forget all the values.
+        """
+        with self._lock:
+            self._values.clear()
@@ -6,6 +6,8 @@ repo information.
 import os
 from threading import RLock
 
+from pulp.repoauth.cache import FileCache
+
 # -- constants ----------------------------------------------------------------------
 
 WRITE_LOCK = RLock()
@@ -39,6 +41,7 @@ class ProtectedRepoUtils:
             f.load()
             f.add_protected_repo_path(repo_relative_path, repo_id)
             f.save()
+            LISTING_CACHE.invalidate(f.filename)
         finally:
             WRITE_LOCK.release()
 
@@ -61,6 +64,7 @@ class ProtectedRepoUtils:
             f.load()
             f.remove_protected_repo_path(repo_relative_path)
             f.save()
+            LISTING_CACHE.invalidate(f.filename)
         finally:
             WRITE_LOCK.release()
 
@@ -74,9 +78,17 @@ class ProtectedRepoUtils:
         @return: mapping of relative path URL to repo ID
         @rtype:  dict {str, str}
         '''
-        f = ProtectedRepoListingFile(self.config.get('repos', 'protected_repo_listing_file'))
-        f.load()
-        return f.listings
+        return dict(self.read_protected_repo_index().listings)
+
+    def read_protected_repo_index(self):
+        '''
+        Returns the index used to find the protected repo matching a request URL. The
+        listings file is only read again when it changes on disk.
+
+        @return: index of the protected repo listings
+        @rtype:  ProtectedRepoIndex
+        '''
+        return LISTING_CACHE.get(self.config.get('repos', 'protected_repo_listing_file'))
 
 
 # -- classes -------------------------------------------------------------------------
@@ -173,3 +185,66 @@ class ProtectedRepoListingFile:
         @type  relative_path_url: str
         '''
         self.listings.pop(relative_path_url, None)  # will not error if key isn't present
+
+
+class ProtectedRepoIndex:
+    '''
+    Index of the protected repo listings by the path segments of their relative paths,
+    used to find the protected repo matching a request URL without scanning all the
+    listings.
+    '''
+
+    def __init__(self, listings):
+        '''
+        @param listings: mapping of relative path URL to repo ID
+        @type  listings: dict {str, str}
+        '''
+        self.listings = listings
+        self.max_depth = 0
+        self._index = {}
+        for relative_path, repo_id in listings.items():
+            segments = _path_segments(relative_path)
+            if not segments:
+                continue
+            self._index[segments] = repo_id
+            self.max_depth = max(self.max_depth, len(segments))
+
+    def find(self, repo_url):
+        '''
+        Finds the ID of the protected repo whose relative path appears in the given URL.
+        Relative paths are matched on whole path segments, so leading, trailing and
+        duplicated slashes are ignored. The longest matching relative path wins.
+
+        @param repo_url: repo portion of a request URL
+        @type  repo_url: str
+
+        @return: ID of the matching protected repo; None if no protected repo matches
+        @rtype:  str
+        '''
+        segments = _path_segments(repo_url)
+        for length in range(min(self.max_depth, len(segments)), 0, -1):
+            for start in range(len(segments) - length + 1):
+                repo_id = self._index.get(segments[start:start + length])
+                if repo_id is not None:
+                    return repo_id
+        return None
+
+
+# -- functions -----------------------------------------------------------------------
+
+def _path_segments(path):
+    '''
+    @return: the non-empty segments of a URL path
+    @rtype:  tuple of str
+    '''
+    return tuple(segment for segment in path.split('/') if segment)
+
+
+def _load_protected_repo_index(filename):
+    f = ProtectedRepoListingFile(filename)
+    f.load()
+    return ProtectedRepoIndex(f.listings)
+
+
+# Parsed listing files keyed by filename; a file is only read again when it changes.
+LISTING_CACHE = FileCache(_load_protected_repo_index)
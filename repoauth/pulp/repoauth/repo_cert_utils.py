@@ -30,6 +30,7 @@ The validate_cert_bundle method is used to ensure that only these keys are prese
 in a cert bundle dict.
 '''
 
+import calendar
 import logging
 import shutil
 import time
@@ -38,6 +39,7 @@ import os
 
 from M2Crypto import X509, BIO
 from pulp.common.util import encode_unicode
+from pulp.repoauth.cache import BoundedCache, FileCache, LRUCache, fingerprint, read_file
 from pulp.repoauth.openssl import Certificate
 
 
@@ -55,6 +57,18 @@ WRITE_LOCK = RLock()
 
 GLOBAL_BUNDLE_PREFIX = 'pulp-global-repo'
 
+# Contents of the cert bundle files keyed by filename; a file is only read again
+# when it changes on disk.
+BUNDLE_FILE_CACHE = FileCache(read_file)
+
+# Parsed CA certificate chains keyed by their PEM encoded contents.
+CA_CHAIN_CACHE = BoundedCache()
+
+# Verification results keyed by (certificate fingerprint, CA chain fingerprint, max chain length).
+# The CA chain fingerprint is the revision of the CA bundle, so results are not reused once the
+# bundle changes.
+VERIFICATION_CACHE = LRUCache()
+
 
 class RepoCertUtils:
     def __init__(self, config):
@@ -62,6 +76,7 @@ class RepoCertUtils:
         self.log_failed_cert = True
         self.log_failed_cert_verbose = False
         self.max_num_certs_in_chain = 100
+        self.verification_cache_ttl = 300
         try:
             self.log_failed_cert = self.config.getboolean('main', 'log_failed_cert')
         except Exception:
@@ -74,6 +89,10 @@ class RepoCertUtils:
             self.max_num_certs_in_chain = self.config.getint('main', 'max_num_certs_in_chain')
         except Exception:
             pass
+        try:
+            self.verification_cache_ttl = self.config.getint('main', 'verification_cache_ttl')
+        except Exception:
+            pass
 
     def delete_for_repo(self, repo_id):
         '''
@@ -90,6 +109,7 @@ class RepoCertUtils:
         if os.path.exists(repo_dir):
             LOG.info('Deleting certificate bundles at [%s]' % repo_dir)
             shutil.rmtree(repo_dir)
+            BUNDLE_FILE_CACHE.invalidate()
 
     def delete_global_cert_bundle(self):
         '''
@@ -123,10 +143,8 @@ class RepoCertUtils:
         for suffix in pieces:
             filename = os.path.join(cert_dir, '%s.%s' % (GLOBAL_BUNDLE_PREFIX, suffix))
 
-            if os.path.exists(filename):
-                f = open(filename, 'r')
-                contents = f.read()
-                f.close()
+            contents = BUNDLE_FILE_CACHE.get(filename)
+            if contents is not None:
                 result = result or {}
                 result[suffix] = contents
             elif self.log_failed_cert_verbose and log_func:
@@ -176,10 +194,8 @@ class RepoCertUtils:
         for suffix in pieces:
             filename = os.path.join(cert_dir, 'consumer-%s.%s' % (repo_id, suffix))
 
-            if os.path.exists(filename):
-                f = open(filename, 'r')
-                contents = f.read()
-                f.close()
+            contents = BUNDLE_FILE_CACHE.get(filename)
+            if contents is not None:
                 result = result or {}
                 result[suffix] = contents
 
@@ -285,9 +301,26 @@ class RepoCertUtils:
         '''
         if not log_func:
             log_func = LOG.info
+        verification_key = (fingerprint(cert_pem), fingerprint(ca_pem),
+                            self.max_num_certs_in_chain)
+        if self.verification_cache_ttl > 0:
+            verified = VERIFICATION_CACHE.get(verification_key)
+            if verified is not None:
+                return verified
         cert = X509.load_cert_string(cert_pem)
-        ca_chain = self.get_certs_from_string(ca_pem, log_func)
-        return self.x509_verify_cert(cert, ca_chain, log_func=log_func)
+        key = (ca_pem, self.max_num_certs_in_chain)
+        ca_chain = CA_CHAIN_CACHE.get(key)
+        if ca_chain is None:
+            ca_chain = self.get_certs_from_string(ca_pem, log_func)
+            CA_CHAIN_CACHE.set(key, ca_chain)
+        verified = self.x509_verify_cert(cert, ca_chain, log_func=log_func)
+        if self.verification_cache_ttl > 0:
+            expires = time.time() + self.verification_cache_ttl
+            not_after = self._not_after(cert)
+            if not_after is not None:
+                expires = min(expires, not_after)
+            VERIFICATION_CACHE.set(verification_key, verified, expires)
+        return verified
 
     def x509_verify_cert(self, cert, ca_certs, log_func=None):
         """
@@ -433,6 +466,22 @@ class RepoCertUtils:
 
     # -- private ----------------------------------------------------------------------------
 
+    def _not_after(self, cert):
+        '''
+        Returns the time after which a certificate expires.
+
+        @param cert: a X509 certificate
+        @type  cert: M2Crypto.X509.X509
+
+        @return: seconds since the epoch; None if it cannot be determined
+        @rtype:  float
+        '''
+        try:
+            not_after = cert.get_not_after().get_datetime()
+            return float(calendar.timegm(not_after.utctimetuple()))
+        except Exception:
+            return None
+
     def _write_cert_bundle(self, file_prefix, cert_dir, bundle):
         '''
         Writes the files represented by the cert bundle to a directory on the
@@ -491,6 +540,8 @@ class RepoCertUtils:
                 except Exception:
                     LOG.exception('Error storing certificate file [%s]' % filename)
                     raise Exception('Error storing certificate file [%s]' % filename)
+                finally:
+                    BUNDLE_FILE_CACHE.invalidate(filename)
 
             return cert_files
 
@@ -1,11 +1,19 @@
 from ConfigParser import SafeConfigParser
+from threading import RLock
+
 from pkg_resources import iter_entry_points
 
 from pulp.repoauth import auth_enabled_validation
+from pulp.repoauth.cache import FileCache
 
 AUTH_ENTRY_POINT = 'pulp_content_authenticators'
 CONFIG_FILENAME = '/etc/pulp/repo_auth.conf'
 
+# The authenticators are loaded once per process since the entry points can
+# only change when packages are installed, which requires a restart anyway.
+_authenticators = None
+_authenticators_lock = RLock()
+
 
 def allow_access(environ, host):
     """
@@ -29,9 +37,7 @@ def allow_access(environ, host):
         return True
 
     # find all of the authenticator methods we need to try
-    authenticators = {}
-    for ep in iter_entry_points(group=AUTH_ENTRY_POINT):
-        authenticators.update({ep.name: ep.load()})
+    authenticators = _get_authenticators()
 
     # load our list of disabled authenticators
     disabled_authenticators = _get_disabled_authenticators()
@@ -47,12 +53,53 @@ def allow_access(environ, host):
     return True
 
 
+def _get_authenticators():
+    """
+    Get the authenticators registered with the authenticator entry point, loading them the
+    first time they are needed.
+
+    :return: authenticator functions keyed by entry point name
+    :rtype:  dict
+    """
+    global _authenticators
+    if _authenticators is None:
+        with _authenticators_lock:
+            if _authenticators is None:
+                authenticators = {}
+                for ep in iter_entry_points(group=AUTH_ENTRY_POINT):
+                    authenticators.update({ep.name: ep.load()})
+                _authenticators = authenticators
+    return _authenticators
+
+
 def _get_disabled_authenticators():
+    """
+    Get the names of the authenticators disabled in the repo auth config. The config is only
+    parsed again when it changes on disk.
+
+    :return: names of the disabled authenticators
+    :rtype:  list
+    """
+    return _disabled_authenticators.get(CONFIG_FILENAME)
+
+
+def _load_disabled_authenticators(path):
+    """
+    Parse the names of the disabled authenticators from the repo auth config.
+
+    :param path: absolute path to the repo auth config
+    :type  path: str
+    :return:     names of the disabled authenticators
+    :rtype:      list
+    """
     disabled_authenticators = []
     config = SafeConfigParser()
-    config.read(CONFIG_FILENAME)
+    config.read(path)
 
     if config.has_option('main', 'disabled_authenticators'):
         disabled_authenticators = config.get('main', 'disabled_authenticators').split(',')
 
     return disabled_authenticators
+
+
+_disabled_authenticators = FileCache(_load_disabled_authenticators)
@@ -10,6 +10,7 @@ class TestAuthEnabledValiation(unittest.TestCase):
     def test_config_read(self, mock_parser):
         mock_parser_instance = mock.Mock()
         mock_parser.return_value = mock_parser_instance
+        auth_enabled_validation._config_cache.invalidate()
 
         auth_enabled_validation._config()
 
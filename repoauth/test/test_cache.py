@@ -0,0 +1,181 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from pulp.repoauth.cache import (BoundedCache, FileCache, LRUCache, file_stamp, fingerprint,
+                                 read_file)
+
+
+class TestFileCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'file')
+        self.load = mock.Mock(side_effect=read_file)
+        self.cache = FileCache(self.load)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write(self, contents):
+        with open(self.path, 'w') as f:
+            f.write(contents)
+
+    def test_get_cached(self):
+        """
+        Test that a file is only loaded once while it does not change.
+        """
+        self.write('abc')
+
+        self.assertEqual(self.cache.get(self.path), 'abc')
+        self.assertEqual(self.cache.get(self.path), 'abc')
+
+        self.load.assert_called_once_with(self.path)
+
+    def test_get_changed(self):
+        """
+        Test that a file is loaded again when it changes.
+        """
+        self.write('abc')
+        self.assertEqual(self.cache.get(self.path), 'abc')
+
+        self.write('abcdef')
+
+        self.assertEqual(self.cache.get(self.path), 'abcdef')
+        self.assertEqual(self.load.call_count, 2)
+
+    def test_get_missing(self):
+        """
+        Test that missing files are loaded, and loaded again when they are created.
+        """
+        self.assertEqual(self.cache.get(self.path), None)
+        self.assertEqual(self.cache.get(self.path), None)
+        self.assertEqual(self.load.call_count, 1)
+
+        self.write('abc')
+
+        self.assertEqual(self.cache.get(self.path), 'abc')
+        self.assertEqual(self.load.call_count, 2)
+
+    def test_invalidate(self):
+        """
+        Test that invalidated files are loaded again.
+        """
+        self.write('abc')
+        self.cache.get(self.path)
+
+        self.cache.invalidate(self.path)
+        self.cache.get(self.path)
+        self.cache.invalidate()
+        self.cache.get(self.path)
+
+        self.assertEqual(self.load.call_count, 3)
+
+    def test_file_stamp(self):
+        """
+        Test that the stamp of a file changes with its size, and is None for missing files.
+        """
+        self.assertEqual(file_stamp(self.path), None)
+        self.write('abc')
+        stamp = file_stamp(self.path)
+        self.write('abcdef')
+        self.assertNotEqual(file_stamp(self.path), stamp)
+
+
+class TestBoundedCache(unittest.TestCase):
+
+    def test_get_set(self):
+        """
+        Test that values are cached by key.
+        """
+        cache = BoundedCache()
+
+        cache.set('a', 1)
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('b'), None)
+
+    def test_max_size(self):
+        """
+        Test that the cache is emptied when it is full.
+        """
+        cache = BoundedCache(max_size=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+
+        cache.set('c', 3)
+
+        self.assertEqual(cache.get('a'), None)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_clear(self):
+        cache = BoundedCache()
+        cache.set('a', 1)
+
+        cache.clear()
+
+        self.assertEqual(cache.get('a'), None)
+
+
+class TestLRUCache(unittest.TestCase):
+
+    def test_get_set(self):
+        """
+        Test that values are cached by key.
+        """
+        cache = LRUCache()
+
+        cache.set('a', 1)
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('b'), None)
+
+    def test_least_recently_used(self):
+        """
+        Test that the least recently used value is dropped when the cache is full.
+        """
+        cache = LRUCache(max_size=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+
+        cache.set('c', 3)
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('c'), 3)
+
+    @mock.patch('pulp.repoauth.cache.time.time')
+    def test_expires(self, mock_time):
+        """
+        Test that expired values are dropped.
+        """
+        cache = LRUCache()
+        mock_time.return_value = 100.0
+        cache.set('a', 1, expires=110.0)
+        cache.set('b', 2)
+
+        mock_time.return_value = 110.0
+
+        self.assertEqual(cache.get('a'), None)
+        self.assertEqual(cache.get('b'), 2)
+
+    def test_clear(self):
+        cache = LRUCache()
+        cache.set('a', 1)
+
+        cache.clear()
+
+        self.assertEqual(cache.get('a'), None)
+
+
+class TestFingerprint(unittest.TestCase):
+
+    def test_fingerprint(self):
+        self.assertEqual(fingerprint('abc'), fingerprint('abc'))
+        self.assertNotEqual(fingerprint('abc'), fingerprint('abd'))
+        self.assertEqual(len(fingerprint('abc')), 64)
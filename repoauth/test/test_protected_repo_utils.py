@@ -5,7 +5,8 @@ import os
 import shutil
 import unittest
 
-from pulp.repoauth.protected_repo_utils import ProtectedRepoListingFile, ProtectedRepoUtils
+from pulp.repoauth.protected_repo_utils import (ProtectedRepoIndex, ProtectedRepoListingFile,
+                                                ProtectedRepoUtils)
 
 
 # -- constants -----------------------------------------------------------------------
@@ -68,6 +69,57 @@ class TestProtectedRepoUtils(unittest.TestCase):
 
         self.assertEqual(0, len(listings))
 
+    def test_read_protected_repo_index(self):
+        """
+        Tests that the index is only read again when the listings change.
+        """
+
+        # Setup
+        self.utils.add_protected_repo('path-1', 'prot-repo-1')
+
+        # Test
+        index = self.utils.read_protected_repo_index()
+        same_index = self.utils.read_protected_repo_index()
+        self.utils.add_protected_repo('path-2', 'prot-repo-2')
+        new_index = self.utils.read_protected_repo_index()
+
+        # Verify
+        self.assertTrue(index is same_index)
+        self.assertEqual(index.listings, {'path-1': 'prot-repo-1'})
+        self.assertEqual(new_index.listings, {'path-1': 'prot-repo-1', 'path-2': 'prot-repo-2'})
+
+
+class TestProtectedRepoIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = ProtectedRepoIndex({
+            '/pulp/fedora-14/x86_64': 'repo-1',
+            'pulp/fedora-14/': 'repo-2',
+            '//rhel/7': 'repo-3',
+            '/': 'repo-4',
+        })
+
+    def test_find(self):
+        """
+        Tests that relative paths are found anywhere in the URL, ignoring slashes.
+        """
+        self.assertEqual(self.index.find('/repos/rhel/7/os/repomd.xml'), 'repo-3')
+        self.assertEqual(self.index.find('rhel//7'), 'repo-3')
+        self.assertEqual(self.index.find('/pulp/fedora-14/i386/'), 'repo-2')
+
+    def test_find_longest(self):
+        """
+        Tests that the longest matching relative path wins.
+        """
+        self.assertEqual(self.index.find('/repos/pulp/fedora-14/x86_64/a.rpm'), 'repo-1')
+
+    def test_find_whole_segments(self):
+        """
+        Tests that relative paths only match whole path segments.
+        """
+        self.assertEqual(self.index.find('/pulp/fedora-14-updates/x86_64/'), None)
+        self.assertEqual(self.index.find('/rhel/70/'), None)
+        self.assertEqual(self.index.find('/'), None)
+
 
 class TestProtectedRepoListingFile(unittest.TestCase):
     def setUp(self):
@@ -4,6 +4,7 @@ import os
 import unittest
 
 from M2Crypto import X509
+import mock
 
 from pulp.repoauth import repo_cert_utils
 
@@ -388,6 +389,79 @@ class TestCertVerify(unittest.TestCase):
         # Test
         self.assertTrue(not self.utils.validate_certificate_pem(cert, ca))
 
+    @mock.patch('pulp.repoauth.repo_cert_utils.X509')
+    @mock.patch('pulp.repoauth.repo_cert_utils.RepoCertUtils.x509_verify_cert')
+    @mock.patch('pulp.repoauth.repo_cert_utils.RepoCertUtils.get_certs_from_string')
+    def test_validate_certificate_pem_caches_ca_chain(self, get_certs, verify, mock_x509):
+        """
+        Tests that a CA chain is only parsed once.
+        """
+        repo_cert_utils.CA_CHAIN_CACHE.clear()
+        repo_cert_utils.VERIFICATION_CACHE.clear()
+        get_certs.return_value = ['ca']
+
+        self.utils.validate_certificate_pem('cert-1', 'ca-pem')
+        self.utils.validate_certificate_pem('cert-2', 'ca-pem')
+
+        self.assertEqual(get_certs.call_count, 1)
+        self.assertEqual(verify.call_count, 2)
+        verify.assert_called_with(mock_x509.load_cert_string.return_value, ['ca'],
+                                  log_func=mock.ANY)
+
+    @mock.patch('pulp.repoauth.repo_cert_utils.X509')
+    @mock.patch('pulp.repoauth.repo_cert_utils.RepoCertUtils.x509_verify_cert')
+    @mock.patch('pulp.repoauth.repo_cert_utils.RepoCertUtils.get_certs_from_string')
+    def test_validate_certificate_pem_caches_result(self, get_certs, verify, mock_x509):
+        """
+        Tests that the verification result of a certificate is cached for its CA chain.
+        """
+        repo_cert_utils.VERIFICATION_CACHE.clear()
+        verify.side_effect = [True, False]
+
+        self.assertTrue(self.utils.validate_certificate_pem('cert', 'ca-1'))
+        self.assertTrue(self.utils.validate_certificate_pem('cert', 'ca-1'))
+        self.assertFalse(self.utils.validate_certificate_pem('cert', 'ca-2'))
+
+        self.assertEqual(verify.call_count, 2)
+        self.assertEqual(mock_x509.load_cert_string.call_count, 2)
+
+    @mock.patch('pulp.repoauth.repo_cert_utils.time.time')
+    @mock.patch('pulp.repoauth.repo_cert_utils.X509')
+    @mock.patch('pulp.repoauth.repo_cert_utils.RepoCertUtils.x509_verify_cert')
+    @mock.patch('pulp.repoauth.repo_cert_utils.RepoCertUtils.get_certs_from_string')
+    def test_validate_certificate_pem_result_expires(self, get_certs, verify, mock_x509,
+                                                     mock_time):
+        """
+        Tests that cached verification results expire no later than the certificate.
+        """
+        repo_cert_utils.VERIFICATION_CACHE.clear()
+        verify.return_value = True
+        mock_time.return_value = 1000.0
+        self.utils._not_after = mock.Mock(return_value=1100.0)
+
+        with mock.patch('pulp.repoauth.repo_cert_utils.VERIFICATION_CACHE') as cache:
+            cache.get.return_value = None
+            self.utils.validate_certificate_pem('cert', 'ca')
+
+        cache.set.assert_called_once_with(mock.ANY, True, 1100.0)
+
+    def test_validate_certificate_pem_no_cache(self):
+        """
+        Tests that verification results are not cached when the cache is disabled.
+        """
+        self.utils.verification_cache_ttl = 0
+        self.utils.x509_verify_cert = mock.Mock(return_value=True)
+        self.utils.get_certs_from_string = mock.Mock(return_value=[])
+
+        with mock.patch('pulp.repoauth.repo_cert_utils.X509'):
+            with mock.patch('pulp.repoauth.repo_cert_utils.VERIFICATION_CACHE') as cache:
+                self.utils.validate_certificate_pem('cert', 'ca')
+                self.utils.validate_certificate_pem('cert', 'ca')
+
+        self.assertFalse(cache.get.called)
+        self.assertFalse(cache.set.called)
+        self.assertEqual(self.utils.x509_verify_cert.call_count, 2)
+
     def test_get_certs_from_string_empty(self):
         certs = self.utils.get_certs_from_string("")
         self.assertEquals(len(certs), 0)
@@ -1,6 +1,7 @@
 import unittest
 import mock
 
+from pulp.repoauth import wsgi
 from pulp.repoauth.wsgi import allow_access, _get_disabled_authenticators
 
 
@@ -23,6 +24,10 @@ class TestWsgi(unittest.TestCase):
 
         self.entrypoint_list = [entrypoint_one, entrypoint_two]
 
+        # the authenticators and config are cached per process
+        wsgi._authenticators = None
+        wsgi._disabled_authenticators.invalidate()
+
     @mock.patch('pulp.repoauth.auth_enabled_validation.authenticate')
     def test_auth_disabled(self, auth_enabled):
         """
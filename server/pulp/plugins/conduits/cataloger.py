@@ -1,9 +1,16 @@
 from pulp.server.managers import factory as managers
 
 
+# The number of added entries buffered before they are written to the catalog.
+BATCH_SIZE = 1000
+
+
 class CatalogerConduit(object):
     """
     Provides access to pulp platform API.
+    Added entries are buffered and written to the catalog in batches.  The
+    buffer is flushed when it is full, before an entry is deleted and when
+    flush() is called.  Added entries are counted once written.
     """
 
     def __init__(self, source_id, expires):
@@ -18,6 +25,7 @@ class CatalogerConduit(object):
         self.expires = expires
         self.added_count = 0
         self.deleted_count = 0
+        self.pending = []
 
     def add_entry(self, type_id, unit_key, url):
         """
@@ -29,9 +37,9 @@ class CatalogerConduit(object):
         :param url: The URL used to download content associated with the unit.
         :type url: str
         """
-        manager = managers.content_catalog_manager()
-        manager.add_entry(self.source_id, self.expires, type_id, unit_key, url)
-        self.added_count += 1
+        self.pending.append((type_id, unit_key, url))
+        if len(self.pending) >= BATCH_SIZE:
+            self.flush()
 
     def delete_entry(self, type_id, unit_key):
         """
@@ -41,13 +49,27 @@ class CatalogerConduit(object):
         :param unit_key: The content unit key.
         :type unit_key: dict
         """
+        self.flush()
         manager = managers.content_catalog_manager()
         manager.delete_entry(self.source_id, type_id, unit_key)
         self.deleted_count += 1
 
+    def flush(self):
+        """
+        Write the buffered entries to the content catalog.
+        """
+        if not self.pending:
+            return
+        pending = self.pending
+        self.pending = []
+        manager = managers.content_catalog_manager()
+        manager.add_entries(self.source_id, self.expires, pending)
+        self.added_count += len(pending)
+
     def reset(self):
         """
-        Reset statistics.
+        Reset statistics and discard the buffered entries.
         """
         self.added_count = 0
         self.deleted_count = 0
+        self.pending = []
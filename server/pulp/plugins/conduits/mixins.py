@@ -5,10 +5,10 @@ import sys
 from pymongo.errors import DuplicateKeyError
 
 from pulp.plugins.model import Unit, PublishReport
+from pulp.server.async import progress
 from pulp.server.async.tasks import get_current_task_id
 from pulp.server.controllers import units as units_controller
 from pulp.server.db import model
-from pulp.server.db.model import TaskStatus
 from pulp.server import exceptions as pulp_exceptions
 import pulp.plugins.conduits._common as common_utils
 import pulp.server.managers.factory as manager_factory
@@ -172,6 +172,25 @@ class SingleRepoUnitsMixin(object):
         """
         return do_get_repo_units(self.repo_id, criteria, self.exception_class, as_generator)
 
+    def get_units_page(self, criteria=None):
+        """
+        Returns one page of the content units associated with the repository
+        being operated on. The limit of the criteria is the page size; pass the
+        returned token as the page_token of the criteria to get the next page.
+
+        Units returned from this call will have the id field populated and are
+        usable in any calls in this conduit that require the id field.
+
+        :param criteria: used to scope the returned results or the data within;
+               the Criteria class can be imported from this module
+        :type  criteria: UnitAssociationCriteria
+
+        :return: list of unit instances, and the token of the next page or None
+                 when no unit follows the page
+        :rtype:  tuple of (list of AssociatedUnit, str or None)
+        """
+        return do_get_repo_units_page(self.repo_id, criteria, self.exception_class)
+
 
 class MultipleRepoUnitsMixin(object):
 
@@ -195,6 +214,25 @@ class MultipleRepoUnitsMixin(object):
         """
         return do_get_repo_units(repo_id, criteria, self.exception_class, as_generator)
 
+    def get_units_page(self, repo_id, criteria=None):
+        """
+        Returns one page of the content units associated with the given
+        repository. The limit of the criteria is the page size; pass the
+        returned token as the page_token of the criteria to get the next page.
+
+        Units returned from this call will have the id field populated and are
+        usable in any calls in this conduit that require the id field.
+
+        :param criteria: used to scope the returned results or the data within;
+               the Criteria class can be imported from this module
+        :type  criteria: UnitAssociationCriteria
+
+        :return: list of unit instances, and the token of the next page or None
+                 when no unit follows the page
+        :rtype:  tuple of (list of AssociatedUnit, str or None)
+        """
+        return do_get_repo_units_page(repo_id, criteria, self.exception_class)
+
 
 class SearchUnitsMixin(object):
 
@@ -492,9 +530,10 @@ class AddUnitMixin(object):
             pulp_unit = common_utils.to_pulp_unit(unit)
             unit.id = self._update_unit(unit, pulp_unit)
 
-            # Associate it with the repo
+            # Associate it with the repo; the caller of the plugin rebuilds the unit counts
+            # and updates the last unit added field once the plugin is done
             association_manager.associate_unit_by_id(
-                self.repo_id, unit.type_id, unit.id)
+                self.repo_id, unit.type_id, unit.id, update_repo_metadata=False)
 
             return unit
         except Exception, e:
@@ -612,8 +651,7 @@ class StatusMixin(object):
 
         try:
             self.progress_report[self.report_id] = status
-            TaskStatus.objects(task_id=self.task_id).update_one(
-                set__progress_report=self.progress_report)
+            progress.writer.update(self.task_id, self.report_id, status)
         except Exception, e:
             _logger.exception(
                 'Exception from server setting progress for report [%s]' % self.report_id)
@@ -685,25 +723,51 @@ def do_get_repo_units(repo_id, criteria, exception_class, as_generator=False):
         # Use a get_units as_generator here and cast to a list later, if necessary.
         units = association_query_manager.get_units(repo_id, criteria=criteria, as_generator=True)
 
-        # Transfer object generator.
-        def _transfer_object_generator():
-            unit_key_fields_cache = {}
-            for u in units:
-                type_id = u['unit_type_id']
-                if type_id not in unit_key_fields_cache:
-                    fields = units_controller.get_unit_key_fields_for_type(type_id)
-                    unit_key_fields_cache[type_id] = fields
-
-                yield common_utils.to_plugin_associated_unit(u, type_id,
-                                                             unit_key_fields_cache[type_id])
-
         if as_generator:
-            return _transfer_object_generator()
+            return _transfer_object_generator(units)
 
         # Maintain legacy behavior by default.
-        return list(_transfer_object_generator())
+        return list(_transfer_object_generator(units))
 
     except Exception, e:
         _logger.exception(
             'Exception from server requesting all content units for repository [%s]' % repo_id)
         raise exception_class(e), None, sys.exc_info()[2]
+
+
+def do_get_repo_units_page(repo_id, criteria, exception_class):
+    """
+    Performs a repo unit association query for one page of units. This is split
+    apart so we can have custom mixins with different signatures.
+    """
+    try:
+        association_query_manager = manager_factory.repo_unit_association_query_manager()
+        units, next_page_token = association_query_manager.get_units_page(repo_id,
+                                                                          criteria=criteria)
+        return list(_transfer_object_generator(units)), next_page_token
+
+    except Exception, e:
+        _logger.exception(
+            'Exception from server requesting a page of content units for repository [%s]' %
+            repo_id)
+        raise exception_class(e), None, sys.exc_info()[2]
+
+
+def _transfer_object_generator(units):
+    """
+    Converts unit associations returned by the association query manager into
+    the plugin representation.
+
+    :param units: unit associations, with the unit under the 'metadata' key
+    :type  units: iterable of dict
+    :return: generator of the plugin representation of the units
+    :rtype:  generator of pulp.plugins.model.AssociatedUnit
+    """
+    unit_key_fields_cache = {}
+    for u in units:
+        type_id = u['unit_type_id']
+        if type_id not in unit_key_fields_cache:
+            fields = units_controller.get_unit_key_fields_for_type(type_id)
+            unit_key_fields_cache[type_id] = fields
+
+        yield common_utils.to_plugin_associated_unit(u, type_id, unit_key_fields_cache[type_id])
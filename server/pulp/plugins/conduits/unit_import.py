@@ -74,13 +74,40 @@ class ImportUnitConduit(ImporterScratchPadMixin, RepoScratchPadMixin,
         """
 
         try:
+            # associate_from_repo rebuilds the unit counts once the import is done
             self.__association_manager.associate_unit_by_id(
-                self.dest_repo_id, unit.type_id, unit.id)
+                self.dest_repo_id, unit.type_id, unit.id, update_repo_metadata=False)
             return unit
         except Exception, e:
             _logger.exception(_('Content unit association failed [%s]' % str(unit)))
             raise ImporterConduitException(e), None, sys.exc_info()[2]
 
+    def associate_units(self, units):
+        """
+        Associates the given units with the destination repository for the import.
+
+        The associations are written in bulk. This call is idempotent. Associations
+        that already exist are left in place.
+
+        :param units: unit objects returned from the init_unit call
+        :type  units: iterable of pulp.plugins.model.Unit
+
+        :return: object references to the provided units
+        :rtype:  list of pulp.plugins.model.Unit
+        """
+        try:
+            units = list(units)
+            unit_ids = {}
+            for unit in units:
+                unit_ids.setdefault(unit.type_id, []).append(unit.id)
+            for unit_type_id, ids in unit_ids.items():
+                self.__association_manager.associate_all_by_ids(
+                    self.dest_repo_id, unit_type_id, ids, update_repo_metadata=False)
+            return units
+        except Exception, e:
+            _logger.exception(_('Content unit association failed'))
+            raise ImporterConduitException(e), None, sys.exc_info()[2]
+
     def get_source_units(self, criteria=None, as_generator=False):
         """
         Returns the collection of content units associated with the source
@@ -10,7 +10,7 @@ from pulp.common.plugins.distributor_constants import MANIFEST_FILENAME
 from pulp.common.plugins.progress import ProgressReport
 from pulp.plugins.distributor import Distributor
 from pulp.server.managers.repo import _common as common_utils
-from pulp.server.util import copytree
+from pulp.server.util import copytree_to_all
 
 BUILD_DIRNAME = 'build'
 
@@ -97,8 +97,7 @@ class FileDistributor(Distributor):
             self.unpublish_repo(repo, config)
 
             hosting_locations = self.get_hosting_locations(repo, config)
-            for location in hosting_locations:
-                copytree(build_dir, location, symlinks=True)
+            copytree_to_all(build_dir, hosting_locations, symlinks=True)
 
             self.post_repo_publish(repo, config)
 
@@ -11,6 +11,7 @@ from pulp.plugins.distributor import Distributor
 from pulp.plugins.file.distributor import FilePublishProgressReport
 from pulp.server.controllers import repository as repo_controller
 from pulp.server.managers.repo import _common as common_utils
+from pulp.server.util import copytree_to_all
 
 
 BUILD_DIRNAME = 'build'
@@ -97,8 +98,7 @@ class FileDistributor(Distributor):
             self.unpublish_repo(repo, config)
 
             hosting_locations = self.get_hosting_locations(repo_model, config)
-            for location in hosting_locations:
-                shutil.copytree(build_dir, location, symlinks=True)
+            copytree_to_all(build_dir, hosting_locations, symlinks=True)
 
             self.post_repo_publish(repo_model, config)
 
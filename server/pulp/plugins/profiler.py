@@ -241,3 +241,43 @@ class Profiler(object):
         :rtype:               list of str
         """
         raise NotImplementedError()
+
+    def calculate_applicable_units_delta(self, unit_profile, bound_repo_id, applicability,
+                                         added_units, removed_units, config, conduit):
+        """
+        Calculate and return the content unit ids applicable to consumers with given
+        unit_profile, given the applicability calculated by calculate_applicable_units and the
+        units associated to or removed from the bound repository since then. Implementing this
+        method is optional; Pulp calls calculate_applicable_units when it is not implemented.
+
+        The added units include the units whose association was refreshed, for instance by a
+        sync, since the applicability was calculated. Units that were removed and associated
+        again are only included in the added units. This method is not called when none of the
+        units of the types handled by this profiler were added or removed.
+
+        :param unit_profile:  a consumer unit profile
+        :type  unit_profile:  object
+        :param bound_repo_id: repo id of a repository to be used to calculate applicability
+                              against the given consumer profile
+        :type  bound_repo_id: str
+        :param applicability: the applicability previously calculated for the consumer profile
+                              and the bound repository, mapping content type ids to lists of
+                              content unit ids
+        :type  applicability: dict
+        :param added_units:   the ids of the units associated to the bound repository since the
+                              applicability was calculated, keyed by content type id. Only the
+                              types handled by this profiler are included.
+        :type  added_units:   dict
+        :param removed_units: the ids of the units removed from the bound repository since the
+                              applicability was calculated, keyed by content type id. Only the
+                              types handled by this profiler are included.
+        :type  removed_units: dict
+        :param config:        plugin configuration
+        :type  config:        pulp.server.plugins.config.PluginCallConfiguration
+        :param conduit:       provides access to relevant Pulp functionality
+        :type  conduit:       pulp.plugins.conduits.profile.ProfilerConduit
+        :return:              the applicable content unit ids keyed by content type id, in the
+                              same format as calculate_applicable_units
+        :rtype:               dict
+        """
+        raise NotImplementedError()
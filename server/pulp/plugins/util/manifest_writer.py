@@ -1,12 +1,9 @@
 import csv
-import hashlib
 import os
 
 from pulp.common.plugins.distributor_constants import MANIFEST_FILENAME
-
-
-# not much science behind this
-CHUNK_SIZE = 2 ** 16
+from pulp.server import checksums
+from pulp.server.util import TYPE_SHA256
 
 
 def make_manifest_for_dir(path):
@@ -20,14 +17,16 @@ def make_manifest_for_dir(path):
     """
     file_paths = [os.path.join(path, filename) for filename in os.listdir(path)
                   if filename != MANIFEST_FILENAME]
+    file_paths = filter(os.path.isfile, file_paths)
+    # the files are hashed in parallel before the manifest is written
+    file_checksums = checksums.calculate_many(file_paths, [TYPE_SHA256])
     with open(os.path.join(path, MANIFEST_FILENAME), 'w') as open_file:
         writer = csv.writer(open_file)
-        for fullpath in filter(os.path.isfile, file_paths):
+        for fullpath, checksum in zip(file_paths, file_checksums):
             size = os.path.getsize(fullpath)
             filename = os.path.basename(fullpath)
-            checksum = get_sha256_checksum(fullpath)
 
-            writer.writerow([filename, checksum, size])
+            writer.writerow([filename, checksum[TYPE_SHA256], size])
 
 
 def get_sha256_checksum(path):
@@ -40,10 +39,4 @@ def get_sha256_checksum(path):
     :return:    sha256 checksum
     :rtype:     basestring
     """
-    hasher = hashlib.sha256()
-    with open(path) as open_file:
-        chunk = open_file.read(CHUNK_SIZE)
-        while chunk:
-            hasher.update(chunk)
-            chunk = open_file.read(CHUNK_SIZE)
-    return hasher.hexdigest()
+    return checksums.calculate(path, [TYPE_SHA256])[TYPE_SHA256]
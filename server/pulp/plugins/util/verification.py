@@ -2,7 +2,7 @@
 Functions for verifying files.
 """
 
-from pulp.server.util import calculate_checksums
+from pulp.server import checksums
 
 
 class VerificationException(ValueError):
@@ -52,7 +52,7 @@ def verify_checksum(file_object, checksum_type, checksum_value):
 
     :raises ValueError: if the checksum_type isn't one of the TYPE_* constants
     """
-    calculated_sum = calculate_checksums(file_object, [checksum_type])[checksum_type]
+    calculated_sum = checksums.calculate_file(file_object, [checksum_type])[checksum_type]
 
     if calculated_sum != checksum_value:
         raise VerificationException(calculated_sum)
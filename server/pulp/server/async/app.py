@@ -115,8 +115,8 @@ class HeartbeatStep(bootsteps.StartStopStep):
         :type  consumer: celery.worker.consumer.Consumer
         """
         name = consumer.hostname
-        # Update the worker record timestamp and handle logging new workers
-        worker_watcher.handle_worker_heartbeat(name)
+        # Update the worker record timestamp and concurrency and handle logging new workers
+        worker_watcher.handle_worker_heartbeat(name, consumer.controller.concurrency)
 
         # If the worker is a resource manager, update the associated ResourceManagerLock timestamp
         if name.startswith(constants.RESOURCE_MANAGER_WORKER_NAME):
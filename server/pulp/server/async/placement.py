@@ -0,0 +1,168 @@
+"""
+Worker selection policies used by the ReservationScheduler.
+
+A task that reserves a resource already reserved by a worker is always placed on that worker, so
+the tasks reserving a resource run one after the other. A policy selects the worker for the other
+tasks, among the online workers that can accept another task: the workers whose queue depth, the
+number of reserved tasks queued or running on the worker, is below their concurrency.
+
+The policy used by the resource manager is configured with the 'worker_selection' setting of the
+[tasks] section of server.conf. Other policies can be added to POLICIES.
+"""
+
+from collections import OrderedDict
+from gettext import gettext as _
+import logging
+
+from pulp.server.config import config
+
+
+_logger = logging.getLogger(__name__)
+
+
+class Candidate(object):
+    """
+    An online worker that can accept another reserved task.
+
+    :ivar name: The worker name.
+    :type name: basestring
+    :ivar queue_depth: The number of reserved tasks queued or running on the worker.
+    :type queue_depth: int
+    :ivar concurrency: The number of tasks the worker runs at the same time.
+    :type concurrency: int
+    """
+
+    def __init__(self, name, queue_depth, concurrency):
+        """
+        :param name: The worker name.
+        :type  name: basestring
+        :param queue_depth: The number of reserved tasks queued or running on the worker.
+        :type  queue_depth: int
+        :param concurrency: The number of tasks the worker runs at the same time.
+        :type  concurrency: int
+        """
+        self.name = name
+        self.queue_depth = queue_depth
+        self.concurrency = concurrency
+
+    @property
+    def load(self):
+        """
+        :return: The queue depth relative to the concurrency of the worker.
+        :rtype:  float
+        """
+        return float(self.queue_depth) / self.concurrency
+
+
+class WorkerSelectionPolicy(object):
+    """
+    Base class for worker selection policies.
+    """
+
+    def select(self, resource_id, candidates):
+        """
+        Select the worker on which a task reserving the resource is placed.
+
+        :param resource_id: The resource the task reserves.
+        :type  resource_id: basestring
+        :param candidates: The workers that can accept the task. Never empty.
+        :type  candidates: list of Candidate
+        :return: The name of the selected worker.
+        :rtype:  basestring
+        """
+        raise NotImplementedError()
+
+    def placed(self, resource_id, worker_name):
+        """
+        Called when a task reserving the resource has been placed on a worker.
+
+        :param resource_id: The resource the task reserves.
+        :type  resource_id: basestring
+        :param worker_name: The name of the worker.
+        :type  worker_name: basestring
+        """
+        pass
+
+
+class LeastOutstandingPolicy(WorkerSelectionPolicy):
+    """
+    Select the worker with the fewest reserved tasks queued or running.
+    """
+
+    def select(self, resource_id, candidates):
+        return min(candidates, key=lambda c: (c.queue_depth, c.name)).name
+
+
+class WeightedPolicy(WorkerSelectionPolicy):
+    """
+    Select the worker with the lowest queue depth relative to its concurrency, preferring the
+    workers that run more tasks at the same time.
+    """
+
+    def select(self, resource_id, candidates):
+        return min(candidates, key=lambda c: (c.load, -c.concurrency, c.name)).name
+
+
+class AffinityPolicy(LeastOutstandingPolicy):
+    """
+    Select the worker that last ran a task reserving the resource, which is likely to still have
+    the repository working directory and content in its page cache. When that worker cannot accept
+    the task, select the worker with the fewest reserved tasks.
+
+    :ivar history: The name of the worker that last ran a task, keyed by resource. The least
+                   recently placed resources are forgotten first.
+    :type history: collections.OrderedDict
+    :ivar max_size: The maximum number of resources remembered.
+    :type max_size: int
+    """
+
+    def __init__(self, max_size=10000):
+        """
+        :param max_size: The maximum number of resources remembered.
+        :type  max_size: int
+        """
+        self.history = OrderedDict()
+        self.max_size = max_size
+
+    def select(self, resource_id, candidates):
+        previous = self.history.get(resource_id)
+        for candidate in candidates:
+            if candidate.name == previous:
+                return candidate.name
+        return super(AffinityPolicy, self).select(resource_id, candidates)
+
+    def placed(self, resource_id, worker_name):
+        self.history.pop(resource_id, None)
+        self.history[resource_id] = worker_name
+        while len(self.history) > self.max_size:
+            self.history.popitem(last=False)
+
+
+POLICIES = {
+    'least-outstanding': LeastOutstandingPolicy,
+    'repo-affinity': AffinityPolicy,
+    'weighted': WeightedPolicy,
+}
+
+DEFAULT_POLICY = 'least-outstanding'
+
+
+def get_policy(name=None):
+    """
+    Create a worker selection policy.
+
+    :param name: The policy name, a key of POLICIES. Defaults to the 'worker_selection' setting.
+                 An unknown name is logged and the default policy is used instead.
+    :type  name: basestring
+    :return: A new policy.
+    :rtype:  WorkerSelectionPolicy
+    """
+    if name is None:
+        name = config.get('tasks', 'worker_selection')
+    try:
+        policy_class = POLICIES[name]
+    except KeyError:
+        msg = _('Unknown worker selection policy "%(name)s", using "%(default)s" instead.')
+        _logger.error(msg % {'name': name, 'default': DEFAULT_POLICY})
+        policy_class = POLICIES[DEFAULT_POLICY]
+    return policy_class()
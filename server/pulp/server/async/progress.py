@@ -0,0 +1,229 @@
+"""
+Coalesces the progress reported by the tasks running in this process before it is written to the
+TaskStatus collection.
+
+Steps and conduits may report progress many times per second. The writer keeps the latest progress
+report of each task and writes it at most once per 'progress_interval' seconds, a setting of the
+[tasks] section of server.conf. A timer writes the reports still pending when a task stops
+reporting. A report that changes the value of a 'state' key anywhere within it is written
+immediately, so that polling clients see state transitions without delay. Only the parts of a
+report that changed since it was last written are updated, with $set on dotted paths.
+"""
+import copy
+import logging
+import threading
+import time
+
+from pulp.server.config import config
+from pulp.server.db.model import TaskStatus
+
+
+_logger = logging.getLogger(__name__)
+
+# Key of the progress report values whose changes are written immediately.
+STATE_KEY = 'state'
+
+# Name of the TaskStatus field holding the progress reports.
+FIELD = 'progress_report'
+
+# Stands for the keys missing from a sub-document when comparing it to its new value.
+_MISSING = object()
+
+
+class ProgressWriter(object):
+    """
+    Writes the progress reports of the tasks running in this process.
+
+    The progress report of a task maps report IDs to the progress reported under them, as set by
+    pulp.plugins.conduits.mixins.StatusMixin.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        # progress reports not written yet, by task ID
+        self._pending = {}
+        # progress reports last written, by task ID
+        self._written = {}
+        # time the progress report was last written, by task ID
+        self._write_times = {}
+        self._timer = None
+
+    def update(self, task_id, report_id, progress):
+        """
+        Update the progress reported by a task under a report ID. The progress report of the task
+        is written when the interval elapsed since it was last written or when a state changed.
+        Otherwise, it is written later.
+
+        :param task_id: ID of the task
+        :type  task_id: basestring
+        :param report_id: ID of the report
+        :type  report_id: basestring
+        :param progress: the progress; it may be modified by the caller afterwards
+        :type  progress: object
+
+        :raises Exception: if the progress report cannot be written
+        """
+        progress = copy.deepcopy(progress)
+        with self._lock:
+            written = self._written.get(task_id)
+            report = self._pending.get(task_id)
+            if report is None:
+                report = dict(written or {})
+                self._pending[task_id] = report
+            report[report_id] = progress
+            elapsed = time.time() - self._write_times.get(task_id, 0)
+            if written is None or elapsed >= interval():
+                self._write(task_id)
+            elif _states(written.get(report_id)) != _states(progress):
+                self._write(task_id)
+            else:
+                self._schedule()
+
+    def flush(self, task_id=None):
+        """
+        Write the pending progress report of a task, or of all tasks.
+
+        :param task_id: ID of the task, or None for all tasks
+        :type  task_id: basestring
+
+        :raises Exception: if a progress report cannot be written
+        """
+        with self._lock:
+            if task_id is None:
+                task_ids = self._pending.keys()
+            else:
+                task_ids = [task_id]
+            for task_id in task_ids:
+                self._write(task_id)
+
+    def finish(self, task_id):
+        """
+        Write the pending progress report of a task that is finishing and forget about it.
+
+        :param task_id: ID of the task
+        :type  task_id: basestring
+
+        :raises Exception: if the progress report cannot be written
+        """
+        with self._lock:
+            try:
+                self._write(task_id)
+            finally:
+                self._pending.pop(task_id, None)
+                self._written.pop(task_id, None)
+                self._write_times.pop(task_id, None)
+
+    def _write(self, task_id):
+        """
+        Write the pending progress report of a task. The whole report is written the first time,
+        then only the parts that changed since it was last written.
+
+        :param task_id: ID of the task
+        :type  task_id: basestring
+
+        :raises Exception: if the progress report cannot be written
+        """
+        report = self._pending.pop(task_id, None)
+        if report is None:
+            return
+        written = self._written.get(task_id)
+        if written is None:
+            TaskStatus.objects(task_id=task_id).update_one(set__progress_report=report)
+        else:
+            changes = {}
+            _changes(FIELD, written, report, changes)
+            if changes:
+                TaskStatus._get_collection().update_one({'task_id': task_id}, {'$set': changes})
+        self._written[task_id] = report
+        self._write_times[task_id] = time.time()
+
+    def _schedule(self):
+        """
+        Start the timer writing the pending progress reports, unless it is already started.
+        """
+        if self._timer is not None and self._timer.is_alive():
+            return
+        self._timer = threading.Timer(interval(), self._flush_pending)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _flush_pending(self):
+        """
+        Write the pending progress reports. Called by the timer.
+        """
+        try:
+            self.flush()
+        except Exception:
+            _logger.exception('Failed to write the progress of tasks.')
+
+
+def interval():
+    """
+    :return: the minimum number of seconds between writes of the progress report of a task
+    :rtype:  float
+    """
+    return config.getfloat('tasks', 'progress_interval')
+
+
+def _states(progress):
+    """
+    Get the values of the 'state' keys found within a progress report.
+
+    :param progress: progress report
+    :type  progress: object
+
+    :return: the values, in the order they are found
+    :rtype:  list
+    """
+    states = []
+    if isinstance(progress, dict):
+        for key, value in sorted(progress.items()):
+            if key == STATE_KEY:
+                states.append(value)
+            else:
+                states.extend(_states(value))
+    elif isinstance(progress, (list, tuple)):
+        for value in progress:
+            states.extend(_states(value))
+    return states
+
+
+def _changes(path, old, new, changes):
+    """
+    Find the $set operations updating a sub-document from its old to its new value. Dictionaries
+    that only gained or changed keys are updated key by key. Other values, and dictionaries whose
+    keys cannot be used in a dotted path, are replaced.
+
+    :param path: dotted path to the sub-document
+    :type  path: basestring
+    :param old: value last written
+    :type  old: object
+    :param new: value to write
+    :type  new: object
+    :param changes: the $set operations found, by dotted path
+    :type  changes: dict
+    """
+    if old == new:
+        return
+    dicts = isinstance(old, dict) and isinstance(new, dict)
+    if dicts and set(old) <= set(new) and all(_is_path_key(key) for key in new):
+        for key, value in new.items():
+            _changes('%s.%s' % (path, key), old.get(key, _MISSING), value, changes)
+        return
+    changes[path] = new
+
+
+def _is_path_key(key):
+    """
+    :param key: dictionary key
+    :type  key: object
+
+    :return: True if the key can be used in a dotted path
+    :rtype:  bool
+    """
+    if not isinstance(key, basestring) or key == '':
+        return False
+    return '.' not in key and not key.startswith('$')
+
+
+writer = ProgressWriter()
@@ -0,0 +1,465 @@
+"""
+The resource manager places reserved tasks on workers with the ReservationScheduler defined here.
+
+The scheduler keeps the online workers and the resources they have reserved in memory. Instead of
+polling the database until a worker becomes available, it waits for events published to a
+dedicated broker queue when a reservation is released, a worker is discovered or a worker is
+deleted. The in-memory state is synchronized with the database periodically and whenever an event
+may have been missed.
+"""
+
+from collections import deque, OrderedDict
+from gettext import gettext as _
+from Queue import Empty
+from threading import Condition
+import logging
+import time
+
+from pulp.common.constants import SCHEDULER_WORKER_NAME
+from pulp.server.async.celery_instance import celery, RESOURCE_MANAGER_QUEUE
+from pulp.server.async.placement import Candidate, get_policy
+from pulp.server.constants import PULP_PROCESS_HEARTBEAT_INTERVAL
+from pulp.server.db.model import Worker, ReservedResource
+
+
+_logger = logging.getLogger(__name__)
+
+# The broker queue to which reservation events are published.
+EVENT_QUEUE = 'pulp.reservation_events'
+
+# Event types.
+RELEASED = 'released'
+WORKER_DISCOVERED = 'worker_discovered'
+WORKER_DELETED = 'worker_deleted'
+
+# How often, in seconds, the scheduler synchronizes with the database. This is also how long it
+# waits for an event before synchronizing when a task cannot be placed.
+SYNC_INTERVAL = PULP_PROCESS_HEARTBEAT_INTERVAL
+
+
+def _is_worker(worker_name):
+    """
+    Strip out workers that should never be assigned work. We need to check
+    via "startswith()" since we do not know which host the worker is running on.
+    """
+
+    if worker_name.startswith(SCHEDULER_WORKER_NAME) or \
+       worker_name.startswith(RESOURCE_MANAGER_QUEUE):
+        return False
+    return True
+
+
+class ReservationEvents(object):
+    """
+    The events that wake up the resource manager while it waits to place a task.
+
+    Events are small dictionaries with a 'type' key and published to the EVENT_QUEUE on the
+    broker. Publishing never raises: an event that cannot be sent is only logged, and the
+    scheduler eventually notices the change when it synchronizes with the database.
+    """
+
+    def __init__(self):
+        self._connection = None
+        self._queue = None
+
+    @staticmethod
+    def publish(event_type, **fields):
+        """
+        Publish an event.
+
+        :param event_type: The event type. One of RELEASED, WORKER_DISCOVERED or WORKER_DELETED.
+        :type  event_type: basestring
+        :param fields: Additional event fields.
+        :type  fields: dict
+        """
+        fields['type'] = event_type
+        try:
+            with celery.connection_or_acquire() as connection:
+                queue = connection.SimpleQueue(EVENT_QUEUE)
+                try:
+                    queue.put(fields, serializer='json')
+                finally:
+                    queue.close()
+        except Exception:
+            _logger.exception(_('Failed to publish reservation event: %(e)s') % {'e': fields})
+
+    def wait(self, timeout):
+        """
+        Wait for events.
+
+        :param timeout: The maximum number of seconds to wait for the first event.
+                        Zero (0) only collects the events already published.
+        :type  timeout: float
+        :return: All the events received, possibly none.
+        :rtype:  list
+        """
+        events = []
+        try:
+            queue = self._get_queue()
+            while True:
+                try:
+                    message = queue.get(block=bool(timeout) and not events, timeout=timeout)
+                except Empty:
+                    break
+                message.ack()
+                events.append(message.payload)
+        except Exception:
+            # Fall back to waiting for the timeout. The caller synchronizes with the database
+            # when no event is received.
+            _logger.exception(_('Failed to receive reservation events.'))
+            self._close()
+            time.sleep(timeout)
+        return events
+
+    def _get_queue(self):
+        """
+        Get the queue from which events are consumed, connecting to the broker on first use.
+
+        :return: The queue.
+        :rtype:  kombu.simple.SimpleQueue
+        """
+        if self._queue is None:
+            self._connection = celery.connection()
+            self._queue = self._connection.SimpleQueue(EVENT_QUEUE)
+        return self._queue
+
+    def _close(self):
+        """
+        Close the queue and its connection. A new connection is made on next use.
+        """
+        queue, self._queue = self._queue, None
+        connection, self._connection = self._connection, None
+        try:
+            if queue is not None:
+                queue.close()
+            if connection is not None:
+                connection.release()
+        except Exception:
+            _logger.debug(_('Failed to close the reservation event queue.'), exc_info=True)
+
+
+class Reservation(object):
+    """
+    A resource reserved on a worker.
+
+    :ivar worker_name: The name of the worker that has reserved the resource.
+    :type worker_name: basestring
+    :ivar task_ids: The tasks holding the reservation.
+    :type task_ids: set
+    """
+
+    def __init__(self, worker_name):
+        """
+        :param worker_name: The name of the worker that has reserved the resource.
+        :type  worker_name: basestring
+        """
+        self.worker_name = worker_name
+        self.task_ids = set()
+
+
+class Ticket(object):
+    """
+    A task waiting to be placed.
+
+    :ivar task_id: The task ID.
+    :type task_id: basestring
+    :ivar resource_id: The resource the task reserves.
+    :type resource_id: basestring
+    :ivar worker_name: The name of the worker on which the task was placed, once placed.
+    :type worker_name: basestring
+    :ivar error: The exception raised while recording the reservation, if any.
+    :type error: Exception
+    """
+
+    def __init__(self, task_id, resource_id):
+        """
+        :param task_id: The task ID.
+        :type  task_id: basestring
+        :param resource_id: The resource the task reserves.
+        :type  resource_id: basestring
+        """
+        self.task_id = task_id
+        self.resource_id = resource_id
+        self.worker_name = None
+        self.error = None
+
+
+class ReservationScheduler(object):
+    """
+    Places reserved tasks on workers.
+
+    A task that reserves a resource already reserved by a worker is placed on that worker. Other
+    tasks are placed on a worker selected by the worker selection policy among the workers whose
+    queue depth is below their concurrency. Tasks that cannot be placed wait in one queue per
+    resource, and the queues are served in turn so that a busy resource does not
+    delay the tasks waiting for other resources.
+
+    While tasks are waiting, one of the waiting threads consumes the reservation events and
+    places the tasks as soon as workers become available.
+
+    :ivar events: The source of reservation events.
+    :type events: ReservationEvents
+    :ivar policy: The worker selection policy.
+    :type policy: pulp.server.async.placement.WorkerSelectionPolicy
+    :ivar sync_interval: How often, in seconds, the state is synchronized with the database.
+    :type sync_interval: float
+    :ivar workers: The online workers, keyed by name. Each value is the set of IDs of the tasks
+                   holding reservations on the worker.
+    :type workers: dict
+    :ivar concurrency: The concurrency of the online workers, keyed by name.
+    :type concurrency: dict
+    :ivar resources: The reserved resources. Each value is a Reservation.
+    :type resources: dict
+    :ivar tasks: The resource reserved by each task, keyed by task ID.
+    :type tasks: dict
+    """
+
+    def __init__(self, events=None, sync_interval=SYNC_INTERVAL, policy=None):
+        """
+        :param events: The source of reservation events.
+        :type  events: ReservationEvents
+        :param sync_interval: How often, in seconds, the state is synchronized with the database.
+        :type  sync_interval: float
+        :param policy: The worker selection policy. Defaults to the configured policy.
+        :type  policy: pulp.server.async.placement.WorkerSelectionPolicy
+        """
+        self.events = events or ReservationEvents()
+        self.policy = policy or get_policy()
+        self.sync_interval = sync_interval
+        self.workers = {}
+        self.concurrency = {}
+        self.resources = {}
+        self.tasks = {}
+        self._waiting = OrderedDict()
+        self._condition = Condition()
+        self._consuming = False
+        self._last_sync = None
+
+    def reserve(self, task_id, resource_id):
+        """
+        Reserve the resource for the task, waiting until the task can be placed on a worker.
+        The reservation is recorded in the database before returning.
+
+        :param task_id: The task ID.
+        :type  task_id: basestring
+        :param resource_id: The resource to reserve.
+        :type  resource_id: basestring
+        :return: The name of the worker on which the task must run.
+        :rtype:  basestring
+        """
+        ticket = Ticket(task_id, resource_id)
+        with self._condition:
+            self._apply(self.events.wait(0))
+            if self._last_sync is None or time.time() - self._last_sync >= self.sync_interval:
+                self.sync()
+            self._waiting.setdefault(resource_id, deque()).append(ticket)
+            self._dispatch()
+            while ticket.worker_name is None and ticket.error is None:
+                if self._consuming:
+                    self._condition.wait()
+                else:
+                    self._consume()
+            if ticket.error is not None:
+                raise ticket.error
+            return ticket.worker_name
+
+    def release(self, task_id):
+        """
+        Release the reservation held by a task.
+
+        :param task_id: The task ID.
+        :type  task_id: basestring
+        """
+        with self._condition:
+            self._release(task_id)
+            self._dispatch()
+
+    def sync(self):
+        """
+        Replace the in-memory state with the online workers and the reservations stored in the
+        database. The queue depth of the workers is corrected when it does not match their
+        reservations.
+        """
+        with self._condition:
+            workers = {}
+            concurrency = {}
+            queue_depth = {}
+            query_set = Worker.objects.get_online().only('name', 'queue_depth', 'concurrency')
+            for worker in query_set:
+                if _is_worker(worker.name):
+                    workers[worker.name] = set()
+                    concurrency[worker.name] = max(worker.concurrency or 1, 1)
+                    queue_depth[worker.name] = worker.queue_depth
+            resources = {}
+            tasks = {}
+            query_set = ReservedResource.objects.only('task_id', 'worker_name', 'resource_id')
+            for reserved in query_set.no_cache():
+                reservation = resources.get(reserved.resource_id)
+                if reservation is None:
+                    reservation = Reservation(reserved.worker_name)
+                    resources[reserved.resource_id] = reservation
+                reservation.task_ids.add(reserved.task_id)
+                tasks[reserved.task_id] = reserved.resource_id
+                if reserved.worker_name in workers:
+                    workers[reserved.worker_name].add(reserved.task_id)
+            for name, task_ids in workers.iteritems():
+                if queue_depth[name] != len(task_ids):
+                    Worker.objects(name=name).update_one(set__queue_depth=len(task_ids))
+            self.workers = workers
+            self.concurrency = concurrency
+            self.resources = resources
+            self.tasks = tasks
+            self._last_sync = time.time()
+            self._dispatch()
+
+    def waiting(self):
+        """
+        :return: The number of tasks waiting to be placed.
+        :rtype:  int
+        """
+        with self._condition:
+            return sum(len(q) for q in self._waiting.itervalues())
+
+    def _consume(self):
+        """
+        Wait for reservation events and place the waiting tasks.
+        Called with the condition held. The condition is released while waiting.
+        """
+        self._consuming = True
+        try:
+            self._condition.release()
+            try:
+                events = self.events.wait(self.sync_interval)
+            finally:
+                self._condition.acquire()
+            if events:
+                self._apply(events)
+            else:
+                self.sync()
+            self._dispatch()
+        finally:
+            self._consuming = False
+            self._condition.notify_all()
+
+    def _apply(self, events):
+        """
+        Apply reservation events to the in-memory state.
+
+        :param events: A list of events.
+        :type  events: list
+        """
+        sync = False
+        for event in events:
+            event_type = event.get('type')
+            if event_type == RELEASED:
+                self._release(event['task_id'])
+            elif event_type in (WORKER_DISCOVERED, WORKER_DELETED):
+                sync = True
+        if sync:
+            self.sync()
+
+    def _release(self, task_id):
+        """
+        Remove a task reservation from the in-memory state.
+
+        :param task_id: The task ID.
+        :type  task_id: basestring
+        """
+        resource_id = self.tasks.pop(task_id, None)
+        if resource_id is None:
+            return
+        reservation = self.resources[resource_id]
+        reservation.task_ids.discard(task_id)
+        if not reservation.task_ids:
+            del self.resources[resource_id]
+        self.workers.get(reservation.worker_name, set()).discard(task_id)
+
+    def _place(self, resource_id):
+        """
+        Select the worker for a task that reserves the resource.
+
+        :param resource_id: The resource.
+        :type  resource_id: basestring
+        :return: The worker name, or None when no worker is available.
+        :rtype:  basestring
+        """
+        reservation = self.resources.get(resource_id)
+        if reservation is not None:
+            return reservation.worker_name
+        candidates = []
+        for name, task_ids in self.workers.iteritems():
+            concurrency = self.concurrency.get(name, 1)
+            if len(task_ids) < concurrency:
+                candidates.append(Candidate(name, len(task_ids), concurrency))
+        if candidates:
+            return self.policy.select(resource_id, candidates)
+
+    def _dispatch(self):
+        """
+        Place the waiting tasks. The waiting queues are served in turn, one task at a time,
+        until no more tasks can be placed.
+        """
+        placed = False
+        progress = True
+        while progress:
+            progress = False
+            for resource_id in list(self._waiting):
+                worker_name = self._place(resource_id)
+                if worker_name is None:
+                    continue
+                queue = self._waiting.pop(resource_id)
+                self._hold(queue.popleft(), worker_name)
+                if queue:
+                    self._waiting[resource_id] = queue
+                placed = progress = True
+        if placed:
+            self._condition.notify_all()
+
+    def _hold(self, ticket, worker_name):
+        """
+        Record the reservation of a ticket placed on a worker and increment the queue depth of
+        the worker. When the reservation cannot be saved, the error is recorded on the ticket
+        instead.
+
+        :param ticket: The ticket.
+        :type  ticket: Ticket
+        :param worker_name: The name of the worker.
+        :type  worker_name: basestring
+        """
+        reserved = ReservedResource(
+            task_id=ticket.task_id, worker_name=worker_name, resource_id=ticket.resource_id)
+        try:
+            reserved.save()
+        except Exception as e:
+            ticket.error = e
+            return
+        try:
+            Worker.objects(name=worker_name).update_one(inc__queue_depth=1)
+        except Exception:
+            # The queue depth is corrected on the next synchronization.
+            _logger.exception(_('Failed to update the queue depth of %(w)s.') % {'w': worker_name})
+        self.policy.placed(ticket.resource_id, worker_name)
+        reservation = self.resources.get(ticket.resource_id)
+        if reservation is None:
+            reservation = Reservation(worker_name)
+            self.resources[ticket.resource_id] = reservation
+        reservation.task_ids.add(ticket.task_id)
+        self.tasks[ticket.task_id] = ticket.resource_id
+        self.workers.setdefault(worker_name, set()).add(ticket.task_id)
+        ticket.worker_name = worker_name
+
+
+_scheduler = None
+
+
+def get_scheduler():
+    """
+    Get the reservation scheduler of this process, creating it on first use.
+
+    :return: The reservation scheduler.
+    :rtype:  ReservationScheduler
+    """
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = ReservationScheduler()
+    return _scheduler
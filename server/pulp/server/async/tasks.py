@@ -5,7 +5,6 @@ from gettext import gettext as _
 import logging
 import os
 import signal
-import time
 import traceback
 import uuid
 
@@ -19,10 +18,14 @@ from mongoengine.queryset import DoesNotExist
 
 from pulp.common.constants import RESOURCE_MANAGER_WORKER_NAME, SCHEDULER_WORKER_NAME
 from pulp.common import constants, dateutils, tags
+from pulp.plugins.util import misc
+from pulp.server.async import progress
 from pulp.server.async.celery_instance import celery, RESOURCE_MANAGER_QUEUE, \
     DEDICATED_QUEUE_EXCHANGE
+from pulp.server.async.reservations import get_scheduler, ReservationEvents, RELEASED, \
+    WORKER_DELETED
 from pulp.server.exceptions import PulpException, MissingResource, \
-    NoWorkers, PulpCodedException, error_codes
+    PulpCodedException, error_codes
 from pulp.server.config import config
 from pulp.server.db.model import Worker, ReservedResource, TaskStatus, \
     ResourceManagerLock, CeleryBeatLock
@@ -34,6 +37,9 @@ from pulp.server.managers.schedule import utils
 controller = control.Control(app=celery)
 _logger = logging.getLogger(__name__)
 
+# Number of tasks revoked by each broadcast when a task group is canceled
+REVOKE_BATCH_SIZE = 1000
+
 
 class PulpTask(CeleryTask):
     """
@@ -117,8 +123,8 @@ def _queue_reserved_task(name, task_id, resource_id, inner_args, inner_kwargs):
     and keyword arguments using the * and ** operators.
 
     The inner task is dispatched into a dedicated queue for a worker that is decided at dispatch
-    time. The logic deciding which queue receives a task is controlled through the
-    find_worker function.
+    time by the reservation scheduler of the resource manager. When no worker is available, the
+    scheduler waits until a reservation is released or a new worker is discovered.
 
     :param name:          The name of the task to be called
     :type name:           basestring
@@ -133,101 +139,19 @@ def _queue_reserved_task(name, task_id, resource_id, inner_args, inner_kwargs):
 
     :return: None
     """
-    while True:
-        try:
-            worker = get_worker_for_reservation(resource_id)
-        except NoWorkers:
-            pass
-        else:
-            break
-
-        try:
-            worker = _get_unreserved_worker()
-        except NoWorkers:
-            pass
-        else:
-            break
-
-        # No worker is ready for this work, so we need to wait
-        time.sleep(0.25)
-
-    ReservedResource(task_id=task_id, worker_name=worker['name'], resource_id=resource_id).save()
+    worker_name = get_scheduler().reserve(task_id, resource_id)
 
-    inner_kwargs['routing_key'] = worker.name
+    inner_kwargs['routing_key'] = worker_name
     inner_kwargs['exchange'] = DEDICATED_QUEUE_EXCHANGE
     inner_kwargs['task_id'] = task_id
 
     try:
         celery.tasks[name].apply_async(*inner_args, **inner_kwargs)
     finally:
-        _release_resource.apply_async((task_id, ), routing_key=worker.name,
+        _release_resource.apply_async((task_id, ), routing_key=worker_name,
                                       exchange=DEDICATED_QUEUE_EXCHANGE)
 
 
-def _is_worker(worker_name):
-    """
-    Strip out workers that should never be assigned work. We need to check
-    via "startswith()" since we do not know which host the worker is running on.
-    """
-
-    if worker_name.startswith(SCHEDULER_WORKER_NAME) or \
-       worker_name.startswith(RESOURCE_MANAGER_QUEUE):
-        return False
-    return True
-
-
-def get_worker_for_reservation(resource_id):
-    """
-    Return the Worker instance that is associated with a reservation of type resource_id. If
-    there are no workers with that reservation_id type a pulp.server.exceptions.NoWorkers
-    exception is raised.
-
-    :param resource_id:    The name of the resource you wish to reserve for your task.
-
-    :raises NoWorkers:     If all workers have reserved_resource entries associated with them.
-
-    :type resource_id:     basestring
-    :returns:              The Worker instance that has a reserved_resource entry of type
-                           `resource_id` associated with it.
-    :rtype:                pulp.server.db.model.resources.Worker
-    """
-    reservation = ReservedResource.objects(resource_id=resource_id).first()
-    if reservation:
-        return Worker.objects(name=reservation['worker_name']).first()
-    else:
-        raise NoWorkers()
-
-
-def _get_unreserved_worker():
-    """
-    Return the Worker instance that has no reserved_resource entries
-    associated with it. If there are no unreserved workers a
-    pulp.server.exceptions.NoWorkers exception is raised.
-
-    :raises NoWorkers: If all workers have reserved_resource entries associated with them.
-
-    :returns:          The Worker instance that has no reserved_resource
-                       entries associated with it.
-    :rtype:            pulp.server.db.model.resources.Worker
-    """
-
-    # Build a mapping of queue names to Worker objects
-    workers_dict = dict((worker['name'], worker) for worker in Worker.objects.get_online())
-    worker_names = workers_dict.keys()
-    reserved_names = [r['worker_name'] for r in ReservedResource.objects.all()]
-
-    # Find an unreserved worker using set differences of the names, and filter
-    # out workers that should not be assigned work.
-    # NB: this is a little messy but set comprehensions are in python 2.7+
-    unreserved_workers = set(filter(_is_worker, worker_names)) - set(reserved_names)
-
-    try:
-        return workers_dict[unreserved_workers.pop()]
-    except KeyError:
-        # All workers are reserved
-        raise NoWorkers()
-
-
 def _delete_worker(name, normal_shutdown=False):
     """
     Delete the Worker with _id name from the database, cancel any associated tasks and reservations
@@ -272,6 +196,9 @@ def _delete_worker(name, normal_shutdown=False):
                                           state__in=constants.CALL_INCOMPLETE_STATES):
         cancel(task_status['task_id'], revoke_task=False)
 
+    # Let the resource manager know the worker and its reservations are gone
+    ReservationEvents.publish(WORKER_DELETED, worker_name=name)
+
 
 @task(base=PulpTask)
 def _release_resource(task_id):
@@ -280,7 +207,8 @@ def _release_resource(task_id):
     the _queue_reserved_task task.
 
     When a resource-reserving task is complete, this method releases the resource by removing the
-    ReservedResource object by UUID.
+    ReservedResource object by UUID, decrements the queue depth of the worker, and notifies the
+    resource manager so that tasks waiting for a worker can be placed right away.
 
     :param task_id: The UUID of the task that requested the reservation
     :type  task_id: basestring
@@ -294,7 +222,10 @@ def _release_resource(task_id):
             traceback = None
 
         new_task.on_failure(exception, task_id, (), {}, MyEinfo)
-    ReservedResource.objects(task_id=task_id).delete()
+    reservation = ReservedResource.objects(task_id=task_id).modify(remove=True)
+    if reservation is not None:
+        Worker.objects(name=reservation.worker_name).update_one(dec__queue_depth=1)
+    ReservationEvents.publish(RELEASED, task_id=task_id)
 
 
 class TaskResult(object):
@@ -547,6 +478,7 @@ class Task(PulpTask, ReservedTaskMixin):
                              % {'id': kwargs['scheduled_call_id']})
                 utils.reset_failure_count(kwargs['scheduled_call_id'])
         if not self.request.called_directly:
+            self._finish_progress(task_id)
             now = datetime.now(dateutils.utc_tz())
             finish_time = dateutils.format_iso8601_datetime(now)
             task_status = TaskStatus.objects.get(task_id=task_id)
@@ -600,6 +532,7 @@ class Task(PulpTask, ReservedTaskMixin):
         if kwargs.get('scheduled_call_id') is not None:
             utils.increment_failure_count(kwargs['scheduled_call_id'])
         if not self.request.called_directly:
+            self._finish_progress(task_id)
             now = datetime.now(dateutils.utc_tz())
             finish_time = dateutils.format_iso8601_datetime(now)
             task_status = TaskStatus.objects.get(task_id=task_id)
@@ -613,6 +546,19 @@ class Task(PulpTask, ReservedTaskMixin):
             self._handle_cProfile(task_id)
             common_utils.delete_working_directory()
 
+    @staticmethod
+    def _finish_progress(task_id):
+        """
+        Write the progress last reported by the task, before its status is updated.
+
+        :param task_id: the id of the task
+        :type task_id: unicode
+        """
+        try:
+            progress.writer.finish(task_id)
+        except Exception:
+            _logger.exception(_('Failed to write the progress of task [%s]') % task_id)
+
     def _handle_cProfile(self, task_id):
         """
         If cProfiling is enabled, stop the profiler and write out the data.
@@ -658,13 +604,7 @@ def cancel(task_id, revoke_task=True):
         return
 
     if task_status['worker_name'] == 'agent':
-        tag_dict = dict(
-            [
-                tags.parse_resource_tag(t) for t in task_status['tags'] if tags.is_resource_tag(t)
-            ])
-        agent_manager = managers.consumer_agent_manager()
-        consumer_id = tag_dict.get(tags.RESOURCE_CONSUMER_TYPE)
-        agent_manager.cancel_request(consumer_id, task_id)
+        _cancel_agent_request(task_status)
     else:
         if revoke_task:
             controller.revoke(task_id, terminate=True)
@@ -677,6 +617,57 @@ def cancel(task_id, revoke_task=True):
     _logger.info(msg)
 
 
+def cancel_group(group_id, revoke_task=True):
+    """
+    Cancel the tasks of a task group that are not in a complete state. The tasks are revoked
+    with one broadcast per REVOKE_BATCH_SIZE tasks and their states are updated at once.
+
+    :param group_id: The ID of the task group you wish to cancel
+    :type  group_id: basestring
+
+    :param revoke_task: Whether to perform a celery revoke() on the tasks in addition to
+                        cancelling them
+    :type  revoke_task: bool
+
+    :return: The number of tasks canceled
+    :rtype:  int
+    """
+    qs = TaskStatus.objects(group_id=group_id, state__nin=constants.CALL_COMPLETE_STATES)
+
+    task_ids = []
+    for task_status in qs.only('task_id', 'worker_name', 'tags'):
+        if task_status['worker_name'] == 'agent':
+            _cancel_agent_request(task_status)
+        else:
+            task_ids.append(task_status['task_id'])
+
+    if revoke_task:
+        for page in misc.paginate(task_ids, REVOKE_BATCH_SIZE):
+            controller.revoke(list(page), terminate=True)
+
+    canceled = qs.update(set__state=constants.CALL_CANCELED_STATE)
+
+    msg = _('Canceled %(count)d tasks of task group: %(group_id)s.')
+    _logger.info(msg % {'count': canceled, 'group_id': group_id})
+    return canceled
+
+
+def _cancel_agent_request(task_status):
+    """
+    Cancel the request sent to the agent of a consumer for a task.
+
+    :param task_status: The status of a task run by an agent
+    :type  task_status: pulp.server.db.model.TaskStatus
+    """
+    tag_dict = dict(
+        [
+            tags.parse_resource_tag(t) for t in task_status['tags'] if tags.is_resource_tag(t)
+        ])
+    agent_manager = managers.consumer_agent_manager()
+    consumer_id = tag_dict.get(tags.RESOURCE_CONSUMER_TYPE)
+    agent_manager.cancel_request(consumer_id, task_status['task_id'])
+
+
 def get_current_task_id():
     """"
     Get the current task id from celery. If this is called outside of a running
@@ -17,6 +17,7 @@ from datetime import datetime, timedelta
 from gettext import gettext as _
 import logging
 
+from pulp.server.async.reservations import ReservationEvents, WORKER_DISCOVERED
 from pulp.server.async.tasks import _delete_worker
 from pulp.server.constants import PULP_PROCESS_HEARTBEAT_INTERVAL
 from pulp.server.db.model import Worker
@@ -25,7 +26,7 @@ from pulp.server.db.model import Worker
 _logger = logging.getLogger(__name__)
 
 
-def handle_worker_heartbeat(worker_name):
+def handle_worker_heartbeat(worker_name, concurrency=None):
     """
     This is a generic function for updating worker heartbeat records.
 
@@ -34,6 +35,8 @@ def handle_worker_heartbeat(worker_name):
 
     :param worker_name: The hostname of the worker
     :type  worker_name: basestring
+    :param concurrency: The number of tasks the worker runs at the same time, if known
+    :type  concurrency: int
     """
     start = datetime.utcnow()
     existing_worker = Worker.objects(name=worker_name).first()
@@ -47,8 +50,14 @@ def handle_worker_heartbeat(worker_name):
                                                                          name=worker_name)
     _logger.debug(msg)
 
-    Worker.objects(name=worker_name).update_one(set__last_heartbeat=timestamp,
-                                                upsert=True)
+    update = {'set__last_heartbeat': timestamp}
+    if concurrency:
+        update['set__concurrency'] = concurrency
+    Worker.objects(name=worker_name).update_one(upsert=True, **update)
+
+    if not existing_worker:
+        # Let the resource manager place waiting tasks on the new worker
+        ReservationEvents.publish(WORKER_DISCOVERED, worker_name=worker_name)
 
     if(datetime.utcnow() - start > timedelta(seconds=PULP_PROCESS_HEARTBEAT_INTERVAL)):
         sec = (datetime.utcnow() - start).total_seconds()
@@ -0,0 +1,179 @@
+"""
+Per-process cache of the permissions resolved for each user.
+
+Resolving whether a user may perform an operation on a resource used to take a query for the
+user plus one permission query for each prefix of the resource path. Instead, the permissions
+granted to a user, directly or through the roles it belongs to, are loaded once and compiled
+into a trie of resource path segments.
+
+The cached permissions are shared by all the processes serving requests through a generation
+counter stored in the database. Every change to permissions, roles or role membership made
+through the managers increments the counter, and each process resolves the permissions of a
+user again when the counter no longer matches the one they were cached at. Checking the
+counter costs a single query per authorization.
+"""
+from collections import namedtuple
+from threading import RLock
+from uuid import uuid4
+
+from pulp.server.db import model
+from pulp.server.db.model.auth import Permission, PermissionGeneration, Role
+
+
+# _id of the single document of the generation collection
+GENERATION_ID = 'permissions'
+
+# The permissions resolved for a user.
+# generation: the generation the permissions were resolved at
+# user: the pulp.server.db.model.User the permissions were resolved for
+# permissions: the PermissionTrie of the operations granted to the user
+UserPermissions = namedtuple('UserPermissions', ['generation', 'user', 'permissions'])
+
+_entries = {}
+_lock = RLock()
+
+
+class PermissionTrie(object):
+    """
+    Operations granted on resources, organized by the segments of the resource paths. The
+    operations granted on a resource are also granted on every resource below it.
+    """
+
+    def __init__(self):
+        self.operations = set()
+        self.children = {}
+
+    def add(self, resource, operations):
+        """
+        Grant operations on a resource.
+
+        :param resource:   uri path representing a pulp resource
+        :type  resource:   str
+        :param operations: operations granted on the resource
+        :type  operations: list of int
+        """
+        node = self
+        for segment in _segments(resource):
+            node = node.children.setdefault(segment, PermissionTrie())
+        node.operations.update(operations)
+
+    def allows(self, resource, operation):
+        """
+        Check whether an operation is granted on a resource or any of its base resources.
+
+        :param resource:  uri path representing a pulp resource
+        :type  resource:  str
+        :param operation: operation to be performed on the resource
+        :type  operation: int
+        :return:          True if the operation is granted, False otherwise
+        :rtype:           bool
+        """
+        node = self
+        if operation in node.operations:
+            return True
+        for segment in _segments(resource):
+            node = node.children.get(segment)
+            if node is None:
+                return False
+            if operation in node.operations:
+                return True
+        return False
+
+
+def _segments(resource):
+    """
+    Split a resource path into its segments.
+
+    :param resource: uri path representing a pulp resource
+    :type  resource: str
+    :return:         the non-empty segments of the path
+    :rtype:          list of str
+    """
+    return [s for s in resource.split('/') if s]
+
+
+def current_generation():
+    """
+    Get the current generation of permissions, creating the counter if it does not exist.
+
+    :return: the token and value of the counter
+    :rtype:  tuple
+    """
+    collection = PermissionGeneration.get_collection()
+    document = collection.find_one({'_id': GENERATION_ID})
+    if document is None:
+        collection.update_one({'_id': GENERATION_ID},
+                              {'$setOnInsert': {'token': uuid4().hex, 'generation': 0}},
+                              upsert=True)
+        document = collection.find_one({'_id': GENERATION_ID})
+    return document['token'], document['generation']
+
+
+def invalidate():
+    """
+    Increment the generation of permissions, causing every process to resolve the
+    permissions of users again. Must be called after permissions, roles or role membership
+    are changed.
+    """
+    PermissionGeneration.get_collection().update_one(
+        {'_id': GENERATION_ID},
+        {'$inc': {'generation': 1}, '$setOnInsert': {'token': uuid4().hex}},
+        upsert=True)
+
+
+def get(login):
+    """
+    Get the permissions resolved for a user, resolving them again when permissions changed
+    since they were cached.
+
+    :param login: login of the user
+    :type  login: str
+    :return:      the permissions of the user
+    :rtype:       UserPermissions
+
+    :raise MissingResource: if the user does not exist
+    """
+    generation = current_generation()
+    entry = _entries.get(login)
+    if entry is not None and entry.generation == generation:
+        return entry
+    # The generation is read before the permissions so that a change made while they are
+    # resolved leaves the entry stale rather than tagged with the newer generation.
+    entry = _resolve(login, generation)
+    with _lock:
+        _entries[login] = entry
+    return entry
+
+
+def clear():
+    """
+    Forget the permissions resolved by this process.
+    """
+    with _lock:
+        _entries.clear()
+
+
+def _resolve(login, generation):
+    """
+    Resolve the permissions granted to a user, directly or through its roles.
+
+    :param login:      login of the user
+    :type  login:      str
+    :param generation: the generation of permissions being resolved
+    :type  generation: tuple
+    :return:           the permissions of the user
+    :rtype:            UserPermissions
+
+    :raise MissingResource: if the user does not exist
+    """
+    user = model.User.objects.get_or_404(login=login)
+    permissions = PermissionTrie()
+    for permission in Permission.get_collection().find({'users.username': login}):
+        for item in permission['users']:
+            if item['username'] == login:
+                permissions.add(permission['resource'], item['permissions'])
+    if user.roles:
+        for role in Role.get_collection().find({'id': {'$in': user.roles}}):
+            for item in role['permissions']:
+                permissions.add(item['resource'], item.get('permission', []))
+    return UserPermissions(generation, user, permissions)
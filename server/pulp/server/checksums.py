@@ -0,0 +1,175 @@
+"""
+Calculates the checksums of files, remembering them so that they are not calculated again while
+the files are unchanged.
+
+The checksums calculated for a file are stored in the FileChecksum collection, keyed by the host,
+device and inode of the file, along with its size and modification time. They are reused while
+the size and modification time of the file are unchanged, and are removed by the reaper after the
+number of days set by the file_checksums setting of the [data_reaping] section of server.conf.
+"""
+from multiprocessing.pool import ThreadPool
+from stat import S_ISREG
+import logging
+import os
+import socket
+
+from mongoengine import NotUniqueError
+
+from pulp.server.db import model
+from pulp.server.util import calculate_checksums
+
+
+_logger = logging.getLogger(__name__)
+
+# Number of files hashed in parallel by calculate_many. Hashing releases the GIL, so threads hash
+# files in parallel without forking, which the daemonic celery worker processes cannot do.
+CHECKSUM_THREADS = 4
+
+
+def calculate(path, checksum_types):
+    """
+    Calculate multiple checksums of a file.
+
+    :param path: absolute path to the file
+    :type  path: basestring
+    :param checksum_types: list of checksum types. Must be in pulp.server.util.CHECKSUM_FUNCTIONS.
+    :type  checksum_types: list
+
+    :return:    dict where keys are checksum types and values are checksum values.
+    :rtype:     dict
+
+    :raises IOError: if the file cannot be read
+    :raises pulp.server.util.InvalidChecksumType: if a checksum type is not supported
+    """
+    with open(path, 'rb') as file_object:
+        return calculate_file(file_object, checksum_types)
+
+
+def calculate_many(paths, checksum_types):
+    """
+    Calculate multiple checksums of each of the files, hashing several files in parallel.
+
+    :param paths: absolute paths to the files
+    :type  paths: list of basestring
+    :param checksum_types: list of checksum types. Must be in pulp.server.util.CHECKSUM_FUNCTIONS.
+    :type  checksum_types: list
+
+    :return:    the checksums of each file, in the order of paths, as returned by calculate()
+    :rtype:     list of dict
+
+    :raises IOError: if a file cannot be read
+    :raises pulp.server.util.InvalidChecksumType: if a checksum type is not supported
+    """
+    if len(paths) < 2:
+        return [calculate(path, checksum_types) for path in paths]
+    pool = ThreadPool(min(CHECKSUM_THREADS, len(paths)))
+    try:
+        return pool.map(lambda path: calculate(path, checksum_types), paths)
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def calculate_file(file_object, checksum_types):
+    """
+    Calculate multiple checksums of an open file. The checksums of files on disk are reused
+    while the file is unchanged.
+
+    :param file_object: an open file
+    :type  file_object: file
+    :param checksum_types: list of checksum types. Must be in pulp.server.util.CHECKSUM_FUNCTIONS.
+    :type  checksum_types: list
+
+    :return:    dict where keys are checksum types and values are checksum values.
+    :rtype:     dict
+
+    :raises pulp.server.util.InvalidChecksumType: if a checksum type is not supported
+    """
+    stat = _stat(file_object)
+    if stat is None:
+        return calculate_checksums(file_object, checksum_types)
+
+    cached = _find(stat)
+    if cached is not None and all(t in cached.checksums for t in checksum_types):
+        return dict((t, cached.checksums[t]) for t in checksum_types)
+
+    checksums = calculate_checksums(file_object, checksum_types)
+    # Only keep the checksums if the file did not change while it was read.
+    if _unchanged(stat, _stat(file_object)):
+        _save(stat, cached, checksums)
+    return checksums
+
+
+def _stat(file_object):
+    """
+    Get the status of an open file on disk.
+
+    :param file_object: an open file
+    :type  file_object: file
+
+    :return:    the status of the file, or None if it is not a regular file on disk
+    :rtype:     posix.stat_result or None
+    """
+    try:
+        stat = os.fstat(file_object.fileno())
+    except (AttributeError, EnvironmentError, ValueError):
+        return None
+    if not S_ISREG(stat.st_mode):
+        return None
+    return stat
+
+
+def _unchanged(stat, current):
+    """
+    Check whether a file is unchanged.
+
+    :param stat: the status of the file when its checksums were calculated
+    :type  stat: posix.stat_result
+    :param current: the current status of the file
+    :type  current: posix.stat_result or None
+
+    :return:    True if the size and modification time of the file are the same
+    :rtype:     bool
+    """
+    return (current is not None and current.st_size == stat.st_size and
+            current.st_mtime == stat.st_mtime)
+
+
+def _find(stat):
+    """
+    Find the checksums calculated for a file while it was unchanged.
+
+    :param stat: the status of the file
+    :type  stat: posix.stat_result
+
+    :return:    the checksums of the file, or None if they were not calculated
+    :rtype:     pulp.server.db.model.FileChecksum or None
+    """
+    return model.FileChecksum.objects(host=socket.gethostname(), device=stat.st_dev,
+                                      inode=stat.st_ino, size=stat.st_size,
+                                      mtime=stat.st_mtime).first()
+
+
+def _save(stat, cached, checksums):
+    """
+    Save the checksums calculated for a file, replacing the ones calculated before it changed.
+
+    :param stat: the status of the file when its checksums were calculated
+    :type  stat: posix.stat_result
+    :param cached: the checksums already calculated for the unchanged file
+    :type  cached: pulp.server.db.model.FileChecksum or None
+    :param checksums: the checksums calculated for the file
+    :type  checksums: dict
+    """
+    if cached is not None:
+        cached.checksums.update(checksums)
+        cached.save()
+        return
+    query_set = model.FileChecksum.objects(host=socket.gethostname(), device=stat.st_dev,
+                                           inode=stat.st_ino)
+    try:
+        query_set.update_one(set__size=stat.st_size, set__mtime=stat.st_mtime,
+                             set__checksums=checksums, upsert=True)
+    except NotUniqueError:
+        # another process saved the checksums of the same file first
+        _logger.debug('Checksums of inode %s already saved.' % stat.st_ino)
@@ -63,6 +63,7 @@ _default_values = {
         'repo_group_publish_history': '60',
         'task_status_history': '7',
         'task_result_history': '3',
+        'file_checksums': '30',
     },
     'database': {
         'name': 'pulp_database',
@@ -131,6 +132,10 @@ _default_values = {
         'certfile': '/etc/pki/pulp/qpid/client.crt',
         'login_method': '',
         'worker_timeout': '30',
+        'worker_selection': 'least-outstanding',
+        'applicability_batch_duration': '60',
+        'progress_interval': '1',
+        'group_summary_ttl': '0',
     },
     'lazy': {
         'redirect_host': socket.getfqdn(),
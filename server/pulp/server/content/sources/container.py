@@ -7,15 +7,21 @@ from nectar.listener import DownloadEventListener
 from nectar.report import DownloadReport as NectarDownloadReport, DOWNLOAD_SUCCEEDED
 from nectar.request import DownloadRequest
 
+from pulp.plugins.util.misc import paginate
 from pulp.server.content.sources.event import Started, Succeeded, Failed
 from pulp.server.content.sources.model import ContentSource, PrimarySource, \
-    DownloadReport, DownloadDetails, RefreshReport
+    DownloadReport, DownloadDetails, RefreshReport, Request
 from pulp.server.managers import factory as managers
 
 
 log = getLogger(__name__)
 
 
+# The number of download requests for which the content
+# sources are found using a single catalog search.
+FIND_SOURCES_PAGE_SIZE = 1000
+
+
 class DownloadFailed(Exception):
     """
     A serial download has failed.
@@ -213,6 +219,20 @@ class Batch(object):
         """
         return self.container.sources
 
+    def resolved(self):
+        """
+        Iterate the requests after finding their content sources.
+        The sources of the requests are found one page of requests at a time
+        so the catalog is searched once per page instead of once per request.
+
+        :return: An iterator of: pulp.server.content.sources.model.Request.
+        :rtype: iterator
+        """
+        for page in paginate(self.requests, FIND_SOURCES_PAGE_SIZE):
+            Request.find_all_sources(page, self.primary, self.sources)
+            for request in page:
+                yield request
+
     def __call__(self):
         """
         Begin processing the batch of requests.
@@ -248,10 +268,9 @@ class Serial(Batch):
         """
         report = DownloadReport()
         report.total_sources = len(self.sources)
-        for request in self.requests:
+        for request in self.resolved():
             event = Started(request)
             event(self.listener)
-            request.find_sources(self.primary, self.sources)
             for source, url in request.sources:
                 details = report.downloads.setdefault(source.id, DownloadDetails())
                 try:
@@ -425,8 +444,7 @@ class Threaded(Batch):
         report.total_sources = len(self.sources)
 
         try:
-            for request in self.requests:
-                request.find_sources(self.primary, self.sources)
+            for request in self.resolved():
                 self.dispatch(request)
                 count += 1
         finally:
@@ -23,6 +23,7 @@ from pulp.plugins.conduits.cataloger import CatalogerConduit
 from pulp.plugins.loader import api as plugins
 from pulp.server.content.sources import constants
 from pulp.server.content.sources.descriptor import is_valid, to_seconds, DEFAULT
+from pulp.server.db.model.content import ContentCatalog
 from pulp.server.managers import factory as managers
 
 
@@ -81,7 +82,29 @@ class Request(object):
         self.errors = []
         self.data = None
 
-    def find_sources(self, primary, alternates):
+    @staticmethod
+    def find_all_sources(requests, primary, alternates):
+        """
+        Find and set the list of content sources for each of the requests.
+        The catalog is searched once for all the requests of each content type.
+        :param requests: A list of: Request.
+        :type requests: list
+        :param primary: The primary content source.
+        :type primary: ContentSource
+        :param alternates: A list of alternative sources.
+        :type alternates: dict
+        """
+        by_type = {}
+        for request in requests:
+            by_type.setdefault(request.type_id, []).append(request)
+        catalog = managers.content_catalog_manager()
+        for type_id, typed_requests in by_type.items():
+            found = catalog.find_many(type_id, [r.unit_key for r in typed_requests])
+            for request in typed_requests:
+                locator = ContentCatalog.get_locator(type_id, request.unit_key)
+                request.find_sources(primary, alternates, found.get(locator, []))
+
+    def find_sources(self, primary, alternates, entries=None):
         """
         Find and set the list of content sources in the order they are to
         be used to satisfy the request.  The alternate sources are
@@ -90,10 +113,15 @@ class Request(object):
         :type primary: ContentSource
         :param alternates: A list of alternative sources.
         :type alternates: dict
+        :param entries: The catalog entries matching the request when already
+            known.  The catalog is searched when not specified.
+        :type entries: list
         """
         resolved = [(primary, self.url)]
-        catalog = managers.content_catalog_manager()
-        for entry in catalog.find(self.type_id, self.unit_key):
+        if entries is None:
+            catalog = managers.content_catalog_manager()
+            entries = catalog.find(self.type_id, self.unit_key)
+        for entry in entries:
             source_id = entry[constants.SOURCE_ID]
             source = alternates.get(source_id)
             if source is None:
@@ -309,6 +337,7 @@ class ContentSource(object):
             log.info(REFRESHING, self.id, url)
             try:
                 plugin.refresh(conduit, self.descriptor, url)
+                conduit.flush()
                 log.info(REFRESH_SUCCEEDED, self.id, conduit.added_count, conduit.deleted_count)
                 report.succeeded = True
                 report.added_count = conduit.added_count
@@ -15,6 +15,8 @@ from nectar.config import DownloaderConfig
 from nectar.request import DownloadRequest
 from nectar.downloaders.threaded import HTTPThreadedDownloader
 from nectar.listener import DownloadEventListener
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 
 from pulp.common import dateutils, error_codes, tags
 from pulp.common.config import parse_bool, Unparsable
@@ -26,7 +28,7 @@ from pulp.plugins.config import PluginCallConfiguration
 from pulp.plugins.loader import api as plugin_api
 from pulp.plugins.loader import exceptions as plugin_exceptions
 from pulp.plugins.model import SyncReport
-from pulp.plugins.util.misc import paginate
+from pulp.plugins.util.misc import paginate, DEFAULT_PAGE_SIZE
 from pulp.plugins.util.verification import VerificationException, verify_checksum
 from pulp.server import exceptions as pulp_exceptions
 from pulp.server.async.tasks import (PulpTask, register_sigterm_handler, Task, TaskResult,
@@ -39,6 +41,7 @@ from pulp.server.controllers import consumer as consumer_controller
 from pulp.server.controllers import distributor as dist_controller
 from pulp.server.controllers import importer as importer_controller
 from pulp.server.db import connection, model
+from pulp.server.db.model.consumer import RepoProfileApplicability
 from pulp.server.db.model.repository import (
     RepoContentUnit, RepoSyncResult, RepoPublishResult)
 from pulp.server.exceptions import PulpCodedTaskException
@@ -62,6 +65,9 @@ def get_associated_unit_ids(repo_id, unit_type, repo_content_unit_q=None):
     """
     Return a generator of unit IDs within the given repo that match the type and query
 
+    The IDs are fetched in pages ordered by unit ID, so the generator can be consumed slowly
+    without keeping a database cursor open.
+
     :param repo_id:     ID of the repo whose units should be queried
     :type  repo_id:     str
     :param unit_type:   ID of the unit type which should be retrieved
@@ -75,8 +81,44 @@ def get_associated_unit_ids(repo_id, unit_type, repo_content_unit_q=None):
     qs = model.RepositoryContentUnit.objects(q_obj=repo_content_unit_q,
                                              repo_id=repo_id,
                                              unit_type_id=unit_type)
-    for assoc in qs.only('unit_id').as_pymongo():
-        yield assoc['unit_id']
+    for page in _paginate_query_set(qs.only('unit_id'), 'unit_id'):
+        for assoc in page:
+            yield assoc['unit_id']
+
+
+def _paginate_query_set(query_set, field, db_field=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Page through the raw documents of a query set in the order of a unique field.
+
+    Each page is fetched with its own query, starting after the last value of the field in the
+    previous page, so no database cursor stays open while the caller processes a page and
+    documents removed in the meantime do not shift the following pages.
+
+    :param query_set: The query set to page through.
+    :type  query_set: mongoengine.queryset.QuerySet
+    :param field:     The name of a unique field of the documents.
+    :type  field:     str
+    :param db_field:  The name of the field in the database, when it differs from its name.
+    :type  db_field:  str
+    :param page_size: The maximum number of documents in a page.
+    :type  page_size: int
+
+    :return: A generator of lists of raw documents.
+    :rtype:  generator
+    """
+    db_field = db_field or field
+    query_set = query_set.order_by(field)
+    last = None
+    while True:
+        page_query_set = query_set
+        if last is not None:
+            page_query_set = query_set.filter(**{field + '__gt': last})
+        page = list(page_query_set.limit(page_size).as_pymongo())
+        if page:
+            yield page
+        if len(page) < page_size:
+            return
+        last = page[-1][db_field]
 
 
 def get_unit_model_querysets(repo_id, model_class, repo_content_unit_q=None):
@@ -334,6 +376,145 @@ def associate_single_unit(repository, unit):
         upsert=True)
 
 
+def associate_units(repository, unit_iterable, update_repo_metadata=True):
+    """
+    Associate all units in the iterable to a repository.
+
+    The associations are upserted with unordered bulk writes, one page of units at a time. Units
+    that are already associated to the repository only have the `updated` timestamp of their
+    association refreshed.
+
+    :param repository: The repository to update.
+    :type repository: pulp.server.db.model.Repository
+    :param unit_iterable: The units to associate to the repository.
+    :type unit_iterable: iterable of pulp.server.db.model.ContentUnit
+    :param update_repo_metadata: if True, the content unit counts of the repository are rebuilt
+                                 and the last unit added timestamp is updated once all the units
+                                 are associated, if any association was created. Set this to
+                                 False when the caller updates them itself.
+    :type update_repo_metadata: bool
+
+    :return: The number of associations created.
+    :rtype: int
+    """
+    unit_keys = ((unit._content_type_id, unit.id) for unit in unit_iterable)
+    created = _associate_unit_keys(repository.repo_id, unit_keys)
+    if created and update_repo_metadata:
+        rebuild_content_unit_counts(repository)
+        update_last_unit_added(repository.repo_id)
+    return created
+
+
+def associate_unit_ids(repo_id, unit_type_id, unit_ids, update_repo_metadata=True):
+    """
+    Associate units of a single type, identified by their IDs, to a repository.
+
+    See associate_units for semantics. The repository is only retrieved when its metadata is
+    updated.
+
+    :param repo_id: ID of the repository to update.
+    :type repo_id: basestring
+    :param unit_type_id: The type of the units.
+    :type unit_type_id: basestring
+    :param unit_ids: The IDs of the units to associate to the repository.
+    :type unit_ids: iterable of basestring
+    :param update_repo_metadata: if True, the content unit counts and the last unit added
+                                 timestamp of the repository are updated.
+    :type update_repo_metadata: bool
+
+    :return: The number of associations created.
+    :rtype: int
+
+    :raise pulp_exceptions.MissingResource: if the repository metadata is updated and the
+                                            repository does not exist
+    """
+    unit_keys = ((unit_type_id, unit_id) for unit_id in unit_ids)
+    created = _associate_unit_keys(repo_id, unit_keys)
+    if created and update_repo_metadata:
+        rebuild_content_unit_counts(model.Repository.objects.get_repo_or_missing_resource(repo_id))
+        update_last_unit_added(repo_id)
+    return created
+
+
+def _associate_unit_keys(repo_id, unit_keys):
+    """
+    Upsert the associations between a repository and units, one page at a time.
+
+    :param repo_id: ID of the repository to update.
+    :type repo_id: basestring
+    :param unit_keys: (unit_type_id, unit_id) of the units to associate to the repository.
+    :type unit_keys: iterable of tuple
+
+    :return: The number of associations created.
+    :rtype: int
+    """
+    collection = model.RepositoryContentUnit._get_collection()
+    created = 0
+    for page in paginate(unit_keys):
+        formatted_datetime = dateutils.format_iso8601_utc_timestamp(
+            dateutils.now_utc_timestamp())
+        requests = [
+            UpdateOne({'repo_id': repo_id,
+                       'unit_type_id': unit_type_id,
+                       'unit_id': unit_id},
+                      {'$setOnInsert': {'created': formatted_datetime},
+                       '$set': {'updated': formatted_datetime}},
+                      upsert=True)
+            for unit_type_id, unit_id in page]
+        try:
+            created += collection.bulk_write(requests, ordered=False).upserted_count
+        except BulkWriteError as e:
+            # Concurrent upserts of the same association fail on the unique index, in which case
+            # the association exists and was created by the other writer.
+            details = e.details
+            if details.get('writeConcernErrors') or \
+                    any(error['code'] != 11000 for error in details['writeErrors']):
+                raise
+            created += details['nUpserted']
+    return created
+
+
+def disassociate_unit_ids(repo_id, unit_type_id, unit_ids, update_repo_metadata=True):
+    """
+    Disassociate units of a single type, identified by their IDs, from a repository.
+
+    The associations are deleted one page of units at a time. The repository is only retrieved
+    when its metadata is updated.
+
+    :param repo_id: ID of the repository to update.
+    :type repo_id: basestring
+    :param unit_type_id: The type of the units.
+    :type unit_type_id: basestring
+    :param unit_ids: The IDs of the units to disassociate from the repository.
+    :type unit_ids: iterable of basestring
+    :param update_repo_metadata: if True, the content unit counts of the repository are rebuilt
+                                 and the last unit removed timestamp is updated once all the
+                                 units are disassociated, if any association was removed.
+    :type update_repo_metadata: bool
+
+    :return: The number of associations removed.
+    :rtype: int
+
+    :raise pulp_exceptions.MissingResource: if the repository metadata is updated and the
+                                            repository does not exist
+    """
+    collection = model.RepositoryContentUnit._get_collection()
+    removed = 0
+    for page in paginate(unit_ids):
+        spec = {'repo_id': repo_id,
+                'unit_type_id': unit_type_id,
+                'unit_id': {'$in': list(page)}}
+        deleted_count = collection.delete_many(spec).deleted_count
+        if deleted_count:
+            _record_unit_removals(repo_id, ((unit_type_id, unit_id) for unit_id in page))
+        removed += deleted_count
+
+    if removed and update_repo_metadata:
+        rebuild_content_unit_counts(model.Repository.objects.get_repo_or_missing_resource(repo_id))
+        update_last_unit_removed(repo_id)
+    return removed
+
+
 def disassociate_units(repository, unit_iterable):
     """
     Disassociate all units in the iterable from the repository.
@@ -351,12 +532,37 @@ def disassociate_units(repository, unit_iterable):
         qs = model.RepositoryContentUnit.objects(
             repo_id=repository.repo_id, unit_id__in=unit_id_list)
         # queryset delete returns the number of records deleted
-        units_removed += qs.delete()
+        deleted_count = qs.delete()
+        if deleted_count:
+            _record_unit_removals(repository.repo_id,
+                                  ((unit._content_type_id, unit.id) for unit in unit_group))
+        units_removed += deleted_count
 
     if units_removed:
         update_last_unit_removed(repository.repo_id)
 
 
+def _record_unit_removals(repo_id, unit_keys):
+    """
+    Record that units were disassociated from a repository, so that applicability regeneration
+    only has to consider the units removed since the applicability was last regenerated.
+
+    :param repo_id: ID of the repository the units were disassociated from.
+    :type repo_id: basestring
+    :param unit_keys: (unit_type_id, unit_id) of the disassociated units.
+    :type unit_keys: iterable of tuple
+    """
+    formatted_datetime = dateutils.format_iso8601_utc_timestamp(dateutils.now_utc_timestamp())
+    documents = [{'repo_id': repo_id,
+                  'unit_type_id': unit_type_id,
+                  'unit_id': unit_id,
+                  'removed': formatted_datetime,
+                  '_ns': 'repo_content_unit_removals'}
+                 for unit_type_id, unit_id in unit_keys]
+    if documents:
+        model.RepositoryContentUnitRemoval._get_collection().insert_many(documents, ordered=False)
+
+
 def create_repo(repo_id, display_name=None, description=None, notes=None, importer_type_id=None,
                 importer_repo_plugin_config=None, distributor_list=None):
     """
@@ -542,6 +748,10 @@ def delete(repo_id):
         RepoSyncResult.get_collection().remove({'repo_id': repo_id})
         RepoPublishResult.get_collection().remove({'repo_id': repo_id})
         RepoContentUnit.get_collection().remove({'repo_id': repo_id})
+        model.RepositoryContentUnitRemoval.objects(repo_id=repo_id).delete()
+        # Applicability recorded for the repository is regenerated incrementally, which would be
+        # wrong for a new repository created with the same ID.
+        RepoProfileApplicability.get_collection().remove({'repo_id': repo_id})
     except Exception, e:
         msg = _('Error updating one or more database collections while removing repo [%(r)s]')
         msg = msg % {'r': repo_id}
@@ -1434,85 +1644,153 @@ def download_repo(repo_id, verify_all_units=False):
 
 def _get_deferred_content_units():
     """
-    Retrieve a list of units that have been added to the DeferredDownload collection.
+    Retrieve the units that have been added to the DeferredDownload collection.
+
+    The entries are read in pages and the units of each page are fetched with one query per
+    unit type.
 
     :return: A generator of content units that correspond to DeferredDownload entries.
     :rtype:  generator of pulp.server.db.model.FileContentUnit
     """
-    for deferred_download in model.DeferredDownload.objects.filter():
-        try:
-            unit_model = plugin_api.get_unit_model_by_id(deferred_download.unit_type_id)
+    query_set = model.DeferredDownload.objects.only('unit_id', 'unit_type_id')
+    for page in _paginate_query_set(query_set, 'id', db_field='_id'):
+        unit_ids = {}
+        for deferred_download in page:
+            unit_ids.setdefault(deferred_download['unit_type_id'], []).append(
+                deferred_download['unit_id'])
+        for unit_type_id, ids in unit_ids.iteritems():
+            unit_model = plugin_api.get_unit_model_by_id(unit_type_id)
             if unit_model is None:
                 _logger.error(_('Unable to find the model object for the {type} type.').format(
-                    type=deferred_download.unit_type_id))
-            else:
-                unit = unit_model.objects.filter(id=deferred_download.unit_id).get()
-                yield unit
-        except DoesNotExist:
-            # This is normal if the content unit in question has been purged during an
-            # orphan cleanup.
-            _logger.debug(_('Unable to find the {type}:{id} content unit.').format(
-                type=deferred_download.unit_type_id, id=deferred_download.unit_id))
+                    type=unit_type_id))
+                continue
+            units = dict((unit.id, unit) for unit in unit_model.objects.filter(id__in=ids))
+            for unit_id in ids:
+                if unit_id in units:
+                    yield units[unit_id]
+                else:
+                    # This is normal if the content unit in question has been purged during an
+                    # orphan cleanup.
+                    _logger.debug(_('Unable to find the {type}:{id} content unit.').format(
+                        type=unit_type_id, id=unit_id))
 
 
 def _create_download_requests(content_units):
     """
-    Make a list of Nectar DownloadRequests for the given content units using
+    Generate Nectar DownloadRequests for the given content units using
     the lazy catalog.
 
-    :param content_units: The content units to build a list of DownloadRequests for.
-    :type  content_units: list of pulp.server.db.model.FileContentUnit
+    The units are processed in pages. The catalog entries of all the files of the
+    units in a page are fetched with a single query, and the requests are generated
+    as the downloader consumes them, so only one page of units is held in memory.
 
-    :return: A list of DownloadRequests; each request includes a ``data``
+    :param content_units: The content units to generate DownloadRequests for.
+    :type  content_units: iterable of pulp.server.db.model.FileContentUnit
+
+    :return: A generator of DownloadRequests; each request includes a ``data``
              instance variable which is a dict containing the FileContentUnit,
              the list of files in the unit, and the downloaded file's storage
              path.
-    :rtype:  list of nectar.request.DownloadRequest
+    :rtype:  generator of nectar.request.DownloadRequest
     """
-    requests = []
     working_dir = common_utils.get_working_directory()
     signing_key = Key.load(pulp_conf.get('authentication', 'rsa_key'))
+    streamer_location = _get_streamer_location()
+
+    for page in paginate(content_units):
+        files = [(content_unit, content_unit.list_files()) for content_unit in page]
+        catalog = _get_catalog_entries(files)
+        for content_unit, file_paths in files:
+            # Generate the requests of a unit only once all of them are in unit_files,
+            # so the unit is not marked downloaded before its last file is.
+            for request in _create_unit_download_requests(
+                    content_unit, file_paths, catalog, working_dir, signing_key,
+                    streamer_location):
+                yield request
+
+
+def _get_catalog_entries(files):
+    """
+    Fetch the lazy catalog entries of the given files with a single query. When a
+    file has several entries, the entry with the lowest revision is used.
+
+    :param files: The files of each unit, as (content unit, list of file paths) tuples.
+    :type  files: list of tuple
+
+    :return: The catalog entries keyed by (unit type ID, unit ID, path).
+    :rtype:  dict
+    """
+    paths = [file_path for content_unit, file_paths in files for file_path in file_paths]
+    unit_ids = [content_unit.id for content_unit, file_paths in files]
+    catalog = {}
+    if not paths:
+        return catalog
+    qs = model.LazyCatalogEntry.objects.filter(path__in=paths, unit_id__in=unit_ids)
+    for catalog_entry in qs:
+        key = (catalog_entry.unit_type_id, catalog_entry.unit_id, catalog_entry.path)
+        current = catalog.get(key)
+        if current is None or catalog_entry.revision < current.revision:
+            catalog[key] = catalog_entry
+    return catalog
+
+
+def _create_unit_download_requests(content_unit, file_paths, catalog, working_dir, signing_key,
+                                   streamer_location):
+    """
+    Make the list of Nectar DownloadRequests for the files of a content unit that
+    have a catalog entry.
+
+    :param content_unit:      The content unit.
+    :type  content_unit:      pulp.server.db.model.FileContentUnit
+    :param file_paths:        The paths of the files in the unit.
+    :type  file_paths:        list of str
+    :param catalog:           The catalog entries keyed by (unit type ID, unit ID, path).
+    :type  catalog:           dict
+    :param working_dir:       The working directory of the task.
+    :type  working_dir:       str
+    :param signing_key:       The server private RSA key to sign the URLs with.
+    :type  signing_key:       M2Crypto.RSA.RSA
+    :param streamer_location: The scheme, network location and path prefix of the streamer.
+    :type  streamer_location: tuple
+
+    :return: The download requests of the unit.
+    :rtype:  list of nectar.request.DownloadRequest
+    """
+    requests = []
+    # All files in the unit; every request for a unit has a reference to this dict.
+    unit_files = {}
+    unit_working_dir = os.path.join(working_dir, content_unit.id)
+    for file_path in file_paths:
+        catalog_entry = catalog.get((content_unit.type_id, content_unit.id, file_path))
+        if catalog_entry is None:
+            continue
+        signed_url = _get_streamer_url(catalog_entry, signing_key, streamer_location)
+
+        temporary_destination = os.path.join(
+            unit_working_dir,
+            os.path.basename(catalog_entry.path)
+        )
+        mkdir(unit_working_dir)
+        unit_files[temporary_destination] = {
+            CATALOG_ENTRY: catalog_entry,
+            PATH_DOWNLOADED: None,
+        }
 
-    for content_unit in content_units:
-        # All files in the unit; every request for a unit has a reference to this dict.
-        unit_files = {}
-        unit_working_dir = os.path.join(working_dir, content_unit.id)
-        for file_path in content_unit.list_files():
-            qs = model.LazyCatalogEntry.objects.filter(
-                unit_id=content_unit.id,
-                unit_type_id=content_unit.type_id,
-                path=file_path
-            )
-            catalog_entry = qs.order_by('revision').first()
-            if catalog_entry is None:
-                continue
-            signed_url = _get_streamer_url(catalog_entry, signing_key)
-
-            temporary_destination = os.path.join(
-                unit_working_dir,
-                os.path.basename(catalog_entry.path)
-            )
-            mkdir(unit_working_dir)
-            unit_files[temporary_destination] = {
-                CATALOG_ENTRY: catalog_entry,
-                PATH_DOWNLOADED: None,
-            }
-
-            request = DownloadRequest(signed_url, temporary_destination)
-            # For memory reasons, only hold onto the id and type_id so we can reload the unit
-            # once it's successfully downloaded.
-            request.data = {
-                TYPE_ID: content_unit.type_id,
-                UNIT_ID: content_unit.id,
-                UNIT_FILES: unit_files,
-                REQUEST: request
-            }
-            requests.append(request)
+        request = DownloadRequest(signed_url, temporary_destination)
+        # For memory reasons, only hold onto the id and type_id so we can reload the unit
+        # once it's successfully downloaded.
+        request.data = {
+            TYPE_ID: content_unit.type_id,
+            UNIT_ID: content_unit.id,
+            UNIT_FILES: unit_files,
+            REQUEST: request
+        }
+        requests.append(request)
 
     return requests
 
 
-def _get_streamer_url(catalog_entry, signing_key):
+def _get_streamer_url(catalog_entry, signing_key, streamer_location=None):
     """
     Build a URL that can be used to retrieve the file in the catalog entry from
     the lazy streamer.
@@ -1521,10 +1799,27 @@ def _get_streamer_url(catalog_entry, signing_key):
     :type  catalog_entry: pulp.server.db.model.LazyCatalogEntry
     :param signing_key: The server private RSA key to sign the url with.
     :type  signing_key: M2Crypto.RSA.RSA
+    :param streamer_location: The location returned by _get_streamer_location(), to
+                              avoid reading the configuration for every URL.
+    :type  streamer_location: tuple
 
     :return: The signed streamer URL which corresponds to the catalog entry.
     :rtype:  str
     """
+    retrieval_scheme, netloc, path_prefix = streamer_location or _get_streamer_location()
+    path = os.path.join(path_prefix, catalog_entry.path.lstrip('/'))
+    unsigned_url = urlunsplit((retrieval_scheme, netloc, path, None, None))
+    # Sign the URL for a year to avoid the URL expiring before the task completes
+    return str(URL(unsigned_url).sign(signing_key, expiration=31536000))
+
+
+def _get_streamer_location():
+    """
+    Read the location of the lazy streamer from the configuration.
+
+    :return: The scheme, network location and path prefix of the streamer URLs.
+    :rtype:  tuple
+    """
     try:
         https_retrieval = parse_bool(pulp_conf.get('lazy', 'https_retrieval'))
     except Unparsable:
@@ -1535,10 +1830,7 @@ def _get_streamer_url(catalog_entry, signing_key):
     port = pulp_conf.get('lazy', 'redirect_port')
     path_prefix = pulp_conf.get('lazy', 'redirect_path')
     netloc = (host + ':' + port) if port else host
-    path = os.path.join(path_prefix, catalog_entry.path.lstrip('/'))
-    unsigned_url = urlunsplit((retrieval_scheme, netloc, path, None, None))
-    # Sign the URL for a year to avoid the URL expiring before the task completes
-    return str(URL(unsigned_url).sign(signing_key, expiration=31536000))
+    return retrieval_scheme, netloc, path_prefix
 
 
 class LazyUnitDownloadStep(DownloadEventListener):
@@ -1546,8 +1838,11 @@ class LazyUnitDownloadStep(DownloadEventListener):
     A Step that downloads all the given requests. The downloader is configured
     to download from the Pulp Streamer components.
 
+    The requests may be generated as the downloader consumes them, in which case
+    the total number of items reported grows as they are generated.
+
     :ivar download_requests: The download requests the step will process.
-    :type download_requests: list of nectar.request.DownloadRequest
+    :type download_requests: iterable of nectar.request.DownloadRequest
     :ivar download_config:   The keyword args used to initialize the Nectar
                              downloader configuration.
     :type download_config:   dict
@@ -1559,8 +1854,8 @@ class LazyUnitDownloadStep(DownloadEventListener):
         """
         Initializes a Step that downloads all the download requests provided.
 
-        :param download_requests:   List of download requests to process.
-        :type  download_requests:   list of nectar.request.DownloadRequest
+        :param download_requests:   Download requests to process.
+        :type  download_requests:   iterable of nectar.request.DownloadRequest
         """
         self.description = step_description
         self.download_requests = download_requests
@@ -1582,7 +1877,8 @@ class LazyUnitDownloadStep(DownloadEventListener):
         self.progress_successes = 0
         self.progress_failures = 0
         self.error_details = []
-        self.total_units = len(download_requests)
+        self.total_units = 0
+        self.requests_generated = False
         self.last_report_time = 0
         self.last_reported_state = self.state
         self.timestamp = str(time.time())
@@ -1594,7 +1890,20 @@ class LazyUnitDownloadStep(DownloadEventListener):
         """
         self.state = reporting_constants.STATE_RUNNING
         self.report()
-        self.downloader.download(self.download_requests)
+        self.downloader.download(self._count_requests())
+        self.report()
+
+    def _count_requests(self):
+        """
+        Yield the download requests, counting them as they are handed to the downloader.
+
+        :return: A generator of download requests.
+        :rtype:  generator of nectar.request.DownloadRequest
+        """
+        for request in self.download_requests:
+            self.total_units += 1
+            yield request
+        self.requests_generated = True
 
     def report(self):
         """
@@ -1603,7 +1912,7 @@ class LazyUnitDownloadStep(DownloadEventListener):
         progress reporting system when that has been implemented.
         """
         total_processed = self.progress_successes + self.progress_failures
-        if self.total_units == total_processed:
+        if self.requests_generated and self.total_units == total_processed:
             self.state = reporting_constants.STATE_COMPLETE
 
         if self.progress_failures > 0:
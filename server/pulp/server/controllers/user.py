@@ -3,9 +3,10 @@ from gettext import gettext as _
 from mongoengine import NotUniqueError, ValidationError
 
 from pulp.server import exceptions as pulp_exceptions
+from pulp.server.auth import permission_cache
 from pulp.server.constants import SUPER_USER_ROLE
 from pulp.server.db import model
-from pulp.server.db.model.auth import Permission, Role
+from pulp.server.db.model.auth import Role
 from pulp.server.managers import factory as manager_factory
 
 
@@ -85,6 +86,7 @@ def update_user(login, delta):
     except ValidationError, e:
         raise pulp_exceptions.InvalidValue(e.to_dict().keys())
 
+    permission_cache.invalidate()
     return user
 
 
@@ -107,6 +109,7 @@ def delete_user(login):
     permission_manager = manager_factory.permission_manager()
     permission_manager.revoke_all_permissions_from_user(login)
     user.delete()
+    permission_cache.invalidate()
 
 
 def is_last_super_user(login):
@@ -149,25 +152,27 @@ def is_authorized(resource, login, operation):
     :return: True if the user is authorized for the operation on the resource, False otherwise
     :rtype: bool
     """
-    user = model.User.objects.get_or_404(login=login)
-    if user.is_superuser():
-        return True
-
-    permission_query_manager = manager_factory.permission_query_manager()
-
-    # User is authorized if they have access to the resource or any of the its base resources.
-    parts = [p for p in resource.split('/') if p]
-    while parts:
-        current_resource = '/%s/' % '/'.join(parts)
-        permission = permission_query_manager.find_by_resource(current_resource)
-        if permission is not None:
-            if operation in permission_query_manager.find_user_permission(permission, login):
-                return True
-        parts = parts[:-1]
-
-    permission = Permission.get_collection().find_one({'resource': '/'})
-    return (permission is not None and
-            operation in permission_query_manager.find_user_permission(permission, login))
+    return is_authorized_entry(permission_cache.get(login), resource, operation)
+
+
+def is_authorized_entry(entry, resource, operation):
+    """
+    Check to see if a user is authorized to perform an operation on a resource, given the entry
+    already looked up in the permission cache for that user.
+
+    :param entry: cached user and permissions of the user to check
+    :type  entry: pulp.server.auth.permission_cache.UserPermissions
+    :param resource: pulp resource url
+    :type  resource: str
+    :param operation: operation to be performed on resource
+    :type  operation: int
+
+    :return: True if the user is authorized for the operation on the resource, False otherwise
+    :rtype: bool
+    """
+    # Users are authorized if they have access to the resource or any of its base resources,
+    # which the cached permissions resolve without querying each of them.
+    return entry.user.is_superuser() or entry.permissions.allows(resource, operation)
 
 
 def find_users_belonging_to_role(role_id):
@@ -160,6 +160,7 @@ def ensure_database_indexes():
 
     model.Importer.ensure_indexes()
     model.RepositoryContentUnit.ensure_indexes()
+    model.RepositoryContentUnitRemoval.ensure_indexes()
     model.Repository.ensure_indexes()
     model.ReservedResource.ensure_indexes()
     model.TaskStatus.ensure_indexes()
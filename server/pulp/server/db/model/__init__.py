@@ -9,7 +9,7 @@ from gettext import gettext as _
 from hashlib import sha256
 from hmac import HMAC
 
-from mongoengine import (BooleanField, DictField, Document, DynamicField, IntField,
+from mongoengine import (BooleanField, DictField, Document, DynamicField, FloatField, IntField,
                          ListField, StringField, UUIDField, ValidationError, QuerySetNoCache)
 from mongoengine import signals
 
@@ -221,12 +221,57 @@ class RepositoryContentUnit(AutoRetryDocument):
                 {
                     # Used for reverse lookup of units to repositories
                     'fields': ['unit_id']
+                },
+                {
+                    # Used to find the units associated since applicability was regenerated
+                    'fields': ['repo_id', 'updated']
                 }
             ],
             'queryset_class': RepositoryContentUnitQuerySet
             }
 
 
+class RepositoryContentUnitRemoval(AutoRetryDocument):
+    """
+    Records that a unit was disassociated from a repository, so that the applicability data of
+    the repository can be updated with the units removed since it was last regenerated.
+
+    Defines the schema for the documents in repo_content_unit_removals collection.
+
+    :ivar repo_id: string representation of the repository id
+    :type repo_id: mongoengine.StringField
+    :ivar unit_id: string representation of content unit id
+    :type unit_id: mongoengine.StringField
+    :ivar unit_type_id: string representation of content unit type
+    :type unit_type_id: mongoengine.StringField
+    :ivar removed: ISO8601 representation of the time the association was removed
+    :type removed: pulp.server.db.fields.ISO8601StringField
+    :ivar _ns: The namespace field (Deprecated), reading
+    :type _ns: mongoengine.StringField
+    """
+
+    repo_id = StringField(required=True)
+    unit_id = StringField(required=True)
+    unit_type_id = StringField(required=True)
+
+    removed = ISO8601StringField(
+        required=True,
+        default=lambda: dateutils.format_iso8601_utc_timestamp(
+            dateutils.now_utc_timestamp())
+    )
+
+    # For backward compatibility
+    _ns = StringField(default='repo_content_unit_removals')
+
+    meta = {'collection': 'repo_content_unit_removals',
+            'allow_inheritance': False,
+            'indexes': [
+                {
+                    'fields': ['repo_id', 'removed']
+                }
+            ]}
+
+
 class Importer(AutoRetryDocument):
     """
     Defines schema for an Importer in the `repo_importers` collection.
@@ -402,9 +447,15 @@ class Worker(AutoRetryDocument):
     :type name:    mongoengine.StringField
     :ivar last_heartbeat:  A timestamp of the last heartbeat from the Worker
     :type last_heartbeat:  UTCDateTimeField
+    :ivar queue_depth: The number of reserved tasks queued or running on the Worker
+    :type queue_depth: mongoengine.IntField
+    :ivar concurrency: The number of tasks the Worker runs at the same time
+    :type concurrency: mongoengine.IntField
     """
     name = StringField(primary_key=True)
     last_heartbeat = UTCDateTimeField()
+    queue_depth = IntField(default=0)
+    concurrency = IntField(default=1)
 
     # For backward compatibility
     _ns = StringField(default='workers')
@@ -1136,6 +1187,42 @@ class DeferredDownload(AutoRetryDocument):
     _ns = StringField(default='deferred_download')
 
 
+class FileChecksum(AutoRetryDocument, ReaperMixin):
+    """
+    The checksums calculated for a file, so that they are not calculated again while the file is
+    unchanged. A file is identified by its device and inode on the host it was read from, and is
+    considered unchanged while its size and modification time are.
+
+    :ivar host: The name of the host the file was read from.
+    :type host: basestring
+    :ivar device: The device the file is stored on.
+    :type device: int
+    :ivar inode: The inode of the file.
+    :type inode: int
+    :ivar size: The size of the file, in bytes, when the checksums were calculated.
+    :type size: int
+    :ivar mtime: The modification time of the file when the checksums were calculated.
+    :type mtime: float
+    :ivar checksums: The checksums of the file, keyed by checksum type.
+    :type checksums: dict
+    :ivar _ns: (Deprecated), Contains the name of the collection this model represents
+    :type _ns: mongoengine.StringField
+    """
+    host = StringField(required=True)
+    device = IntField(required=True)
+    inode = IntField(required=True)
+    size = IntField(required=True)
+    mtime = FloatField(required=True)
+    checksums = DictField()
+
+    # For backward compatibility
+    _ns = StringField(default='file_checksums')
+
+    meta = {'collection': 'file_checksums',
+            'allow_inheritance': False,
+            'indexes': [{'fields': ['host', 'device', 'inode'], 'unique': True}]}
+
+
 class User(AutoRetryDocument):
     """
     :ivar login: user's login name, must be unique for each user
@@ -47,9 +47,28 @@ class Permission(Model):
 
     collection_name = 'permissions'
     unique_indices = ('resource',)
+    search_indices = ('users.username',)
 
     def __init__(self, resource, users=None):
         super(Permission, self).__init__()
 
         self.resource = resource
         self.users = users or []
+
+
+class PermissionGeneration(Model):
+    """
+    Single document collection holding a counter that is incremented whenever permissions,
+    roles or role membership change. Processes caching resolved permissions compare it with
+    the counter they cached them at to know when to resolve them again.
+
+    @ivar generation: incremented on every change
+    @type generation: int
+
+    @ivar token: random value set when the document is created, so that a counter recreated
+                 after the collection is dropped is not mistaken for the previous one
+    @type token: str
+    """
+
+    collection_name = 'permission_generation'
+    unique_indices = ()
@@ -185,7 +185,8 @@ class RepoProfileApplicability(Model):
         ('repo_id',),
     )
 
-    def __init__(self, profile_hash, repo_id, profile, applicability, _id=None, **kwargs):
+    def __init__(self, profile_hash, repo_id, profile, applicability, _id=None, regenerated=None,
+                 duration=None, **kwargs):
         """
         Construct a RepoProfileApplicability object.
 
@@ -200,6 +201,14 @@ class RepoProfileApplicability(Model):
         :type  applicability: dict
         :param _id:           The MongoDB ID for this object, if it exists in the database
         :type  _id:           bson.objectid.ObjectId
+        :param regenerated:   ISO8601 representation of the time the applicability data started
+                              being calculated. The units associated to or removed from the repo
+                              since then are not reflected in the applicability data. None if
+                              unknown.
+        :type  regenerated:   basestring
+        :param duration:      The number of seconds the applicability data took to calculate the
+                              last time it was regenerated. None if unknown.
+        :type  duration:      float
         :param kwargs:        unused, but collected to allow instantiation from Mongo query results
         :type  kwargs:        dict
         """
@@ -210,6 +219,8 @@ class RepoProfileApplicability(Model):
         self.profile = profile
         self.applicability = applicability
         self._id = _id
+        self.regenerated = regenerated
+        self.duration = duration
 
         # The superclass puts an unnecessary (and confusingly named) id attribute on this model.
         # Let's remove it.
@@ -229,7 +240,8 @@ class RepoProfileApplicability(Model):
         # If this object's _id attribute is not None, then it represents an existing DB object.
         # Else, we need to create an object with this object's attributes
         new_document = {'profile_hash': self.profile_hash, 'repo_id': self.repo_id,
-                        'profile': self.profile, 'applicability': self.applicability}
+                        'profile': self.profile, 'applicability': self.applicability,
+                        'regenerated': self.regenerated, 'duration': self.duration}
         if self._id is not None:
             self.get_collection().update({'_id': self._id}, new_document)
         else:
@@ -101,7 +101,8 @@ class UnitAssociationCriteria(Model):
 
     def __init__(self, type_ids=None, association_filters=None, unit_filters=None,
                  association_sort=None, unit_sort=None, limit=None, skip=None,
-                 association_fields=None, unit_fields=None, remove_duplicates=False):
+                 association_fields=None, unit_fields=None, remove_duplicates=False,
+                 page_token=None):
         """
         There are a number of entry points into creating one of these instances:
         multiple REST interfaces, the plugins, etc. As such, this constructor
@@ -144,6 +145,10 @@ class UnitAssociationCriteria(Model):
         @param remove_duplicates: if True, units with multiple associations will
                only return a single association; defaults to False
         @type  remove_duplicates: bool
+
+        @param page_token: opaque token returned with a page of results, from
+               which the next page is resumed; only used by paged searches
+        @type  page_token: str
         """
         super(UnitAssociationCriteria, self).__init__()
 
@@ -177,6 +182,8 @@ class UnitAssociationCriteria(Model):
 
         self.remove_duplicates = remove_duplicates
 
+        self.page_token = page_token
+
     def to_dict(self):
         """
         :return:    the UnitAssociationCriteria as a dict, suitable for serialization by
@@ -196,7 +203,8 @@ class UnitAssociationCriteria(Model):
             'skip': self.skip,
             'association_fields': self.association_fields,
             'unit_fields': self.unit_fields,
-            'remove_duplicates': self.remove_duplicates
+            'remove_duplicates': self.remove_duplicates,
+            'page_token': self.page_token
         }
 
     @classmethod
@@ -219,7 +227,8 @@ class UnitAssociationCriteria(Model):
                    input_dictionary['unit_filters'], input_dictionary['association_sort'],
                    input_dictionary['unit_sort'], input_dictionary['limit'],
                    input_dictionary['skip'], input_dictionary['association_fields'],
-                   input_dictionary['unit_fields'], input_dictionary['remove_duplicates'])
+                   input_dictionary['unit_fields'], input_dictionary['remove_duplicates'],
+                   input_dictionary.get('page_token'))
 
     @classmethod
     def from_client_input(cls, query):
@@ -244,7 +253,8 @@ class UnitAssociationCriteria(Model):
             "unit" : ["name", "version", "arch"],
             "association" : ["created"]
           },
-          "remove_duplicates" : True
+          "remove_duplicates" : True,
+          "page_token" : <next_page_token returned with the previous page>
         }
 
         @param query: user-provided query details
@@ -288,6 +298,8 @@ class UnitAssociationCriteria(Model):
 
         remove_duplicates = bool(query.pop('remove_duplicates', False))
 
+        page_token = _validate_page_token(query.pop('page_token', None))
+
         # report any superfluous doc key, value pairs as errors
         for d in (query, filters, sort, fields):
             if d:
@@ -305,7 +317,7 @@ class UnitAssociationCriteria(Model):
                    unit_filters=unit_filters, association_sort=association_sort,
                    unit_sort=unit_sort, limit=limit, skip=skip,
                    association_fields=association_fields, unit_fields=unit_fields,
-                   remove_duplicates=remove_duplicates)
+                   remove_duplicates=remove_duplicates, page_token=page_token)
 
     @property
     def association_spec(self):
@@ -343,6 +355,8 @@ class UnitAssociationCriteria(Model):
             s += 'Assoc Fields [%s] ' % self.association_fields
         if self.unit_fields:
             s += 'Unit Fields [%s] ' % self.unit_fields
+        if self.page_token:
+            s += 'Page Token [%s] ' % self.page_token
         s += 'Remove Duplicates [%s]' % self.remove_duplicates
         return s
 
@@ -400,6 +414,14 @@ def _validate_limit(limit):
         return limit
 
 
+def _validate_page_token(page_token):
+    if page_token is None:
+        return None
+    if not isinstance(page_token, basestring):
+        raise pulp_exceptions.InvalidValue(['page_token'])
+    return page_token or None
+
+
 def _validate_skip(skip):
     if isinstance(skip, bool):
         raise pulp_exceptions.InvalidValue(['skip']), None, sys.exc_info()[2]
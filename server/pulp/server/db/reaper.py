@@ -21,6 +21,7 @@ _COLLECTION_TIMEDELTAS = {
     repository.RepoPublishResult: 'repo_publish_history',
     repo_group.RepoGroupPublishResult: 'repo_group_publish_history',
     celery_result.CeleryResult: 'task_result_history',
+    model.FileChecksum: 'file_checksums',
 }
 
 
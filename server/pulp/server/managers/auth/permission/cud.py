@@ -8,7 +8,7 @@ from gettext import gettext as _
 from celery import task
 
 from pulp.server.async.tasks import Task
-from pulp.server.auth import authorization
+from pulp.server.auth import authorization, permission_cache
 from pulp.server.db import model
 from pulp.server.db.model.auth import Permission
 from pulp.server.exceptions import (
@@ -76,6 +76,7 @@ class PermissionManager(object):
             raise PulpDataException(_("Update Keyword [%s] is not supported" % key))
 
         Permission.get_collection().save(found)
+        permission_cache.invalidate()
 
     @staticmethod
     def delete_permission(resource_uri):
@@ -98,6 +99,7 @@ class PermissionManager(object):
             raise MissingResource(resource_uri)
 
         Permission.get_collection().remove({'resource': resource_uri})
+        permission_cache.invalidate()
 
     @staticmethod
     def grant(resource, login, operations):
@@ -139,6 +141,7 @@ class PermissionManager(object):
             current_ops.append(o)
 
         Permission.get_collection().save(permission)
+        permission_cache.invalidate()
 
     @staticmethod
     def revoke(resource, login, operations):
@@ -186,6 +189,7 @@ class PermissionManager(object):
             return
 
         Permission.get_collection().save(permission)
+        permission_cache.invalidate()
 
     def grant_automatic_permissions_for_resource(self, resource):
         """
@@ -254,6 +258,7 @@ class PermissionManager(object):
             else:
                 # Delete entire permission if there are no more users
                 Permission.get_collection().remove({'resource': permission['resource']})
+        permission_cache.invalidate()
 
     def operation_name_to_value(self, name):
         """
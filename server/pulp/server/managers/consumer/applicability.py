@@ -2,18 +2,23 @@
 Contains content applicability management classes
 """
 
+from collections import namedtuple
+from datetime import datetime
 from gettext import gettext as _
 from logging import getLogger
 from uuid import uuid4
+import time
 
 from celery import task
 from pymongo.errors import DuplicateKeyError
 
+from pulp.common import dateutils
 from pulp.plugins.conduits.profiler import ProfilerConduit
 from pulp.plugins.config import PluginCallConfiguration
 from pulp.plugins.loader import api as plugin_api, exceptions as plugin_exceptions
 from pulp.plugins.profiler import Profiler
-from pulp.server.async.tasks import Task
+from pulp.server.async.tasks import get_current_task_id, Task
+from pulp.server.config import config
 from pulp.server.db import model
 from pulp.server.db.model.consumer import Bind, RepoProfileApplicability, UnitProfile
 from pulp.server.db.model.criteria import Criteria
@@ -25,6 +30,22 @@ from pulp.plugins.util.misc import paginate
 _logger = getLogger(__name__)
 
 
+# The units associated to a repository and the units removed from it since a given time, as
+# lists of (ISO8601 timestamp, unit_type_id, unit_id) tuples, and the time they were queried.
+RepoContentChanges = namedtuple('RepoContentChanges', ['queried', 'added', 'removed'])
+
+# The maximum number of profiles regenerated by a batch_regenerate_applicability_for_profiles task
+MAX_BATCH_PROFILES = 100
+
+# The expected number of seconds it takes to regenerate an applicability when no regeneration
+# duration is known
+DEFAULT_REGENERATION_DURATION = 1.0
+
+# The number of consumer sets whose applicability is queried at once by
+# stream_consumer_applicability
+APPLICABILITY_REPORT_PAGE_SIZE = 100
+
+
 class ApplicabilityRegenerationManager(object):
     @staticmethod
     def regenerate_applicability_for_consumers(consumer_criteria):
@@ -127,23 +148,9 @@ class ApplicabilityRegenerationManager(object):
             # more details.
             existing_applicabilities = RepoProfileApplicability.get_collection().find(
                 {'repo_id': repo_id}).batch_size(5)
-            for existing_applicability in existing_applicabilities:
-                existing_applicability = RepoProfileApplicability(**dict(existing_applicability))
-                profile_hash = existing_applicability['profile_hash']
-                unit_profile = UnitProfile.get_collection().find_one({'profile_hash': profile_hash},
-                                                                     projection=['id',
-                                                                                 'content_type'])
-                if unit_profile is None:
-                    # Unit profiles change whenever packages are installed or removed on consumers,
-                    # and it is possible that existing_applicability references a UnitProfile
-                    # that no longer exists. This is harmless, as Pulp has a monthly cleanup task
-                    # that will identify these dangling references and remove them.
-                    continue
-
-                # Regenerate applicability data for given unit_profile and repo id
-                ApplicabilityRegenerationManager.regenerate_applicability(
-                    profile_hash, unit_profile['content_type'], unit_profile['id'], repo_id,
-                    existing_applicability)
+            for batch in paginate(existing_applicabilities, 5):
+                ApplicabilityRegenerationManager._regenerate_existing_applicabilities(repo_id,
+                                                                                      batch)
 
     @staticmethod
     def queue_regenerate_applicability_for_repos(repo_criteria):
@@ -151,6 +158,12 @@ class ApplicabilityRegenerationManager(object):
         Queue a group of tasks to generate and save applicability data affected by given updated
         repositories.
 
+        The existing applicabilities of the repositories are grouped by profile hash, so each
+        task loads a profile once and regenerates its applicability for all the repositories.
+        The profiles are batched by the time their applicabilities took to regenerate the last
+        time, so that each task runs for about the 'applicability_batch_duration' setting of
+        the [tasks] section of server.conf.
+
         :param repo_criteria: The repo selection criteria
         :type repo_criteria: dict
         """
@@ -162,14 +175,90 @@ class ApplicabilityRegenerationManager(object):
 
         task_group_id = uuid4()
 
-        for repo_id in repo_ids:
-            profile_hashes = RepoProfileApplicability.get_collection().find(
-                {'repo_id': repo_id}, {'profile_hash': 1})
-            for batch in paginate(profile_hashes, 10):
-                batch_regenerate_applicability_task.apply_async((repo_id, batch),
-                                                                **{'group_id': task_group_id})
+        profile_repos = ApplicabilityRegenerationManager._get_profile_repo_matrix(repo_ids)
+        batch_duration = config.getfloat('tasks', 'applicability_batch_duration')
+        for batch in _plan_profile_batches(profile_repos, batch_duration):
+            batch_regenerate_applicability_for_profiles_task.apply_async(
+                (batch,), **{'group_id': task_group_id})
         return task_group_id
 
+    @staticmethod
+    def _get_profile_repo_matrix(repo_ids):
+        """
+        Find the existing applicabilities of the given repositories.
+
+        :param repo_ids: The repo ids of the repositories
+        :type  repo_ids: list of basestring
+        :return:         For each profile hash, the repo ids of the repositories it has
+                         applicability for and the number of seconds each took to regenerate the
+                         last time, as a dict mapping repo ids to a float or None if unknown
+        :rtype:          dict
+        """
+        profile_repos = {}
+        if not repo_ids:
+            return profile_repos
+        applicabilities = RepoProfileApplicability.get_collection().find(
+            {'repo_id': {'$in': repo_ids}}, projection=['profile_hash', 'repo_id', 'duration'])
+        for applicability in applicabilities:
+            profile_repos.setdefault(applicability['profile_hash'], {})[
+                applicability['repo_id']] = applicability.get('duration')
+        return profile_repos
+
+    @staticmethod
+    def batch_regenerate_applicability_for_profiles(profile_repo_ids):
+        """
+        Regenerate and save the existing applicabilities of a batch of profiles. Each profile is
+        loaded once and its applicability is regenerated for all the given repositories.
+
+        The progress is reported in the 'applicability' key of the progress report of the task.
+
+        :param profile_repo_ids: The profile hashes and the repo ids of the repositories to
+                                 regenerate their applicability for
+        :type  profile_repo_ids: list of [profile_hash, list of repo ids] pairs
+        """
+        progress = RegenerationProgress(get_current_task_id(), profile_repo_ids)
+        progress.report()
+
+        profile_hashes = [profile_hash for profile_hash, repo_ids in profile_repo_ids]
+        repo_ids = set(repo_id for profile_hash, repo_ids in profile_repo_ids
+                       for repo_id in repo_ids)
+        collection = RepoProfileApplicability.get_collection()
+        profiles = dict(
+            (p['_id'], p['profile']) for p in collection.aggregate([
+                {'$match': {'profile_hash': {'$in': profile_hashes}}},
+                {'$group': {'_id': '$profile_hash', 'profile': {'$first': '$profile'}}}]))
+        applicability_documents = collection.find(
+            {'profile_hash': {'$in': profile_hashes}, 'repo_id': {'$in': list(repo_ids)}},
+            projection={'profile': False})
+        existing_applicabilities = {}
+        for document in applicability_documents:
+            existing_applicability = RepoProfileApplicability(
+                profile=profiles.get(document['profile_hash']), **dict(document))
+            existing_applicabilities[(existing_applicability.profile_hash,
+                                      existing_applicability.repo_id)] = existing_applicability
+
+        unit_profiles = ApplicabilityRegenerationManager._get_unit_profiles(profile_hashes)
+        repo_changes = {}
+        for repo_id in repo_ids:
+            repo_changes[repo_id] = ApplicabilityRegenerationManager._get_repo_content_changes(
+                repo_id, [a.regenerated for a in existing_applicabilities.values()
+                          if a.repo_id == repo_id])
+
+        for profile_hash, profile_repo_ids in profile_repo_ids:
+            unit_profile = unit_profiles.get(profile_hash)
+            for repo_id in profile_repo_ids:
+                existing_applicability = existing_applicabilities.get((profile_hash, repo_id))
+                # The unit profile or the applicability may be gone since the batch was planned,
+                # in which case there is nothing to regenerate. Dangling applicabilities are
+                # removed by the monthly cleanup task.
+                if unit_profile is not None and existing_applicability is not None:
+                    ApplicabilityRegenerationManager.regenerate_applicability(
+                        profile_hash, unit_profile['content_type'], unit_profile['id'], repo_id,
+                        existing_applicability, repo_changes[repo_id])
+                progress.evaluated()
+            progress.profile_done()
+        progress.report(force=True)
+
     @staticmethod
     def batch_regenerate_applicability(repo_id, profile_hashes):
         """
@@ -185,12 +274,33 @@ class ApplicabilityRegenerationManager(object):
         profile_hash_list = [phash['profile_hash'] for phash in profile_hashes]
         existing_applicabilities = RepoProfileApplicability.get_collection().find(
             {"repo_id": repo_id, "profile_hash": {"$in": profile_hash_list}})
-        for existing_applicability in list(existing_applicabilities):
-                # Convert cursor to RepoProfileApplicability object
-            existing_applicability = RepoProfileApplicability(**dict(existing_applicability))
-            profile_hash = existing_applicability['profile_hash']
-            unit_profile = UnitProfile.get_collection().find_one({'profile_hash': profile_hash},
-                                                                 projection=['id', 'content_type'])
+        ApplicabilityRegenerationManager._regenerate_existing_applicabilities(
+            repo_id, list(existing_applicabilities))
+
+    @staticmethod
+    def _regenerate_existing_applicabilities(repo_id, applicability_documents):
+        """
+        Regenerate and save a batch of existing applicabilities of a repository.
+
+        The unit profiles of the batch are retrieved with a single query, and so are the units
+        associated to or removed from the repository since the oldest applicability of the batch
+        was regenerated.
+
+        :param repo_id: Repository id for which applicability is being calculated
+        :type repo_id: str
+        :param applicability_documents: RepoProfileApplicability documents of the repository
+        :type applicability_documents: list of dict
+        """
+        existing_applicabilities = [RepoProfileApplicability(**dict(document))
+                                    for document in applicability_documents]
+        unit_profiles = ApplicabilityRegenerationManager._get_unit_profiles(
+            [applicability.profile_hash for applicability in existing_applicabilities])
+        repo_changes = ApplicabilityRegenerationManager._get_repo_content_changes(
+            repo_id, [applicability.regenerated for applicability in existing_applicabilities])
+
+        for existing_applicability in existing_applicabilities:
+            profile_hash = existing_applicability.profile_hash
+            unit_profile = unit_profiles.get(profile_hash)
             if unit_profile is None:
                 # Unit profiles change whenever packages are installed or removed on consumers,
                 # and it is possible that existing_applicability references a UnitProfile
@@ -201,15 +311,19 @@ class ApplicabilityRegenerationManager(object):
             # Regenerate applicability data for given unit_profile and repo id
             ApplicabilityRegenerationManager.regenerate_applicability(
                 profile_hash, unit_profile['content_type'], unit_profile['id'], repo_id,
-                existing_applicability)
+                existing_applicability, repo_changes)
 
     @staticmethod
     def regenerate_applicability(profile_hash, content_type, profile_id,
-                                 bound_repo_id, existing_applicability=None):
+                                 bound_repo_id, existing_applicability=None, repo_changes=None):
         """
         Regenerate and save applicability data for given profile and bound repo id.
         If existing_applicability is not None, replace it with the new applicability data.
 
+        When the units associated to or removed from the bound repo since existing_applicability
+        was regenerated are known from repo_changes, only those units are passed to the
+        profiler, if it implements calculate_applicable_units_delta.
+
         :param profile_hash: hash of the unit profile
         :type profile_hash: basestring
 
@@ -225,7 +339,13 @@ class ApplicabilityRegenerationManager(object):
 
         :param existing_applicability: existing RepoProfileApplicability object to be replaced
         :type existing_applicability: pulp.server.db.model.consumer.RepoProfileApplicability
+
+        :param repo_changes: units associated to or removed from the bound repo, as returned by
+                             _get_repo_content_changes
+        :type repo_changes: RepoContentChanges
         """
+        started = time.time()
+        regenerated = dateutils.format_iso8601_utc_timestamp(dateutils.now_utc_timestamp())
         profiler_conduit = ProfilerConduit()
         # Get the profiler for content_type of given unit_profile
         profiler, profiler_cfg = ApplicabilityRegenerationManager._profiler(content_type)
@@ -241,7 +361,21 @@ class ApplicabilityRegenerationManager(object):
             bound_repo_id)
         # Get the intersection of existing types in the repo and the types that the profiler
         # handles. If the intersection is not empty, regenerate applicability
-        if (set(repo_content_types) & set(profiler.metadata()['types'])):
+        profiler_types = profiler.metadata()['types']
+        if (set(repo_content_types) & set(profiler_types)):
+            delta = None
+            if existing_applicability and repo_changes:
+                delta = ApplicabilityRegenerationManager._get_content_delta(
+                    existing_applicability.regenerated, repo_changes, profiler_types)
+                if delta is not None and not any(delta):
+                    # None of the units the profiler handles were added to or removed from the
+                    # repo, so the applicability data is up to date.
+                    RepoProfileApplicability.get_collection().update(
+                        {'_id': existing_applicability._id},
+                        {'$set': {'regenerated': repo_changes.queried,
+                                  'duration': time.time() - started}})
+                    return
+
             # Get the actual profile for existing_applicability or lookup using profile_id
             if existing_applicability:
                 profile = existing_applicability.profile
@@ -251,22 +385,41 @@ class ApplicabilityRegenerationManager(object):
                 profile = unit_profile['profile']
             call_config = PluginCallConfiguration(plugin_config=profiler_cfg,
                                                   repo_plugin_config=None)
-            try:
-                applicability = profiler.calculate_applicable_units(profile,
-                                                                    bound_repo_id,
-                                                                    call_config,
-                                                                    profiler_conduit)
-            except NotImplementedError:
-                msg = "Profiler for content type [%s] does not support applicability" % content_type
-                _logger.debug(msg)
-                return
-
+            applicability = None
+            if delta is not None:
+                added_units, removed_units = delta
+                try:
+                    applicability = profiler.calculate_applicable_units_delta(
+                        profile, bound_repo_id, existing_applicability.applicability,
+                        added_units, removed_units, call_config, profiler_conduit)
+                except NotImplementedError:
+                    pass
+                else:
+                    # The changes were retrieved before the profiler was called, so the
+                    # applicability reflects the repo at least as it was at that time.
+                    regenerated = repo_changes.queried
+
+            if applicability is None:
+                try:
+                    applicability = profiler.calculate_applicable_units(profile,
+                                                                        bound_repo_id,
+                                                                        call_config,
+                                                                        profiler_conduit)
+                except NotImplementedError:
+                    msg = "Profiler for content type [%s] does not support applicability" % \
+                          content_type
+                    _logger.debug(msg)
+                    return
+
+            duration = time.time() - started
             try:
                 # Create a new RepoProfileApplicability object and save it in the db
                 RepoProfileApplicability.objects.create(profile_hash,
                                                         bound_repo_id,
                                                         profile,
-                                                        applicability)
+                                                        applicability,
+                                                        regenerated,
+                                                        duration)
             except DuplicateKeyError:
                 # Update existing applicability
                 if not existing_applicability:
@@ -274,8 +427,92 @@ class ApplicabilityRegenerationManager(object):
                         {'repo_id': bound_repo_id, 'profile_hash': profile_hash})
                     existing_applicability = RepoProfileApplicability(**applicability_dict)
                 existing_applicability.applicability = applicability
+                existing_applicability.regenerated = regenerated
+                existing_applicability.duration = duration
                 existing_applicability.save()
 
+    @staticmethod
+    def _get_unit_profiles(profile_hashes):
+        """
+        Find one unit profile for each of the given profile hashes.
+
+        :param profile_hashes: unit profile hashes
+        :type  profile_hashes: list of basestring
+        :return:               the id and the content_type of a unit profile, keyed by profile
+                               hash. Hashes without any unit profile are not included.
+        :rtype:                dict
+        """
+        unit_profiles = UnitProfile.get_collection().aggregate([
+            {'$match': {'profile_hash': {'$in': profile_hashes}}},
+            {'$group': {'_id': '$profile_hash',
+                        'id': {'$first': '$id'},
+                        'content_type': {'$first': '$content_type'}}}])
+        return dict((p['_id'], p) for p in unit_profiles)
+
+    @staticmethod
+    def _get_repo_content_changes(repo_id, regenerated_list):
+        """
+        Find the units associated to or removed from a repository since the oldest of the given
+        applicability regeneration times.
+
+        :param repo_id:          The repo_id of the repository
+        :type  repo_id:          basestring
+        :param regenerated_list: ISO8601 regeneration times of applicabilities of the repository,
+                                 None for the applicabilities regenerated at an unknown time
+        :type  regenerated_list: list
+        :return:                 The changes, or None if no regeneration time is known
+        :rtype:                  RepoContentChanges
+        """
+        regenerated_list = [regenerated for regenerated in regenerated_list if regenerated]
+        if not regenerated_list:
+            return None
+        since = min(regenerated_list)
+        queried = dateutils.format_iso8601_utc_timestamp(dateutils.now_utc_timestamp())
+
+        associations = model.RepositoryContentUnit._get_collection().find(
+            {'repo_id': repo_id, 'updated': {'$gte': since}},
+            projection=['unit_type_id', 'unit_id', 'updated'])
+        added = [(a['updated'], a['unit_type_id'], a['unit_id']) for a in associations]
+        removals = model.RepositoryContentUnitRemoval._get_collection().find(
+            {'repo_id': repo_id, 'removed': {'$gte': since}},
+            projection=['unit_type_id', 'unit_id', 'removed'])
+        removed = [(r['removed'], r['unit_type_id'], r['unit_id']) for r in removals]
+        return RepoContentChanges(queried, added, removed)
+
+    @staticmethod
+    def _get_content_delta(regenerated, repo_changes, unit_types):
+        """
+        Select the changes made to a repository since an applicability was regenerated.
+
+        Units are compared to the regeneration time inclusively, since timestamps are stored
+        with a precision of one second. Units that were removed and associated again are only
+        reported as added.
+
+        :param regenerated:  ISO8601 regeneration time of the applicability, or None if unknown
+        :type  regenerated:  basestring
+        :param repo_changes: the units associated to or removed from the repository
+        :type  repo_changes: RepoContentChanges
+        :param unit_types:   the content type ids to report changes for
+        :type  unit_types:   list of basestring
+        :return:             the ids of the added units and the ids of the removed units, each
+                             keyed by content type id, or None if the regeneration time is unknown
+        :rtype:              tuple
+        """
+        if not regenerated:
+            return None
+        unit_types = set(unit_types)
+        added_units = {}
+        for timestamp, unit_type_id, unit_id in repo_changes.added:
+            if timestamp >= regenerated and unit_type_id in unit_types:
+                added_units.setdefault(unit_type_id, set()).add(unit_id)
+        removed_units = {}
+        for timestamp, unit_type_id, unit_id in repo_changes.removed:
+            if timestamp >= regenerated and unit_type_id in unit_types and \
+                    unit_id not in added_units.get(unit_type_id, ()):
+                removed_units.setdefault(unit_type_id, set()).add(unit_id)
+        return (dict((t, sorted(ids)) for t, ids in added_units.items()),
+                dict((t, sorted(ids)) for t, ids in removed_units.items()))
+
     @staticmethod
     def _get_existing_repo_content_types(repo_id):
         """
@@ -344,6 +581,157 @@ regenerate_applicability_for_repos = task(
 batch_regenerate_applicability_task = task(
     ApplicabilityRegenerationManager.batch_regenerate_applicability, base=Task,
     ignore_results=True)
+batch_regenerate_applicability_for_profiles_task = task(
+    ApplicabilityRegenerationManager.batch_regenerate_applicability_for_profiles, base=Task,
+    ignore_result=True)
+
+
+def _plan_profile_batches(profile_repos, batch_duration):
+    """
+    Split the regeneration of the applicability of profiles into batches that are expected to
+    take about batch_duration seconds to regenerate.
+
+    The expected duration of a profile is the sum of the durations of its applicabilities the
+    last time they were regenerated. Applicabilities of unknown duration are expected to take
+    the average known duration, or DEFAULT_REGENERATION_DURATION if no duration is known. A
+    profile is never split across batches, and a batch contains at most MAX_BATCH_PROFILES
+    profiles.
+
+    :param profile_repos:  durations of the applicabilities, keyed by profile hash and repo id,
+                           as returned by ApplicabilityRegenerationManager._get_profile_repo_matrix
+    :type  profile_repos:  dict
+    :param batch_duration: the expected duration of a batch, in seconds
+    :type  batch_duration: float
+    :return:               batches of [profile_hash, list of repo ids] pairs
+    :rtype:                generator of list
+    """
+    known = [duration for repo_durations in profile_repos.values()
+             for duration in repo_durations.values() if duration is not None]
+    default_duration = sum(known) / len(known) if known else DEFAULT_REGENERATION_DURATION
+
+    batch = []
+    batch_cost = 0.0
+    for profile_hash in sorted(profile_repos):
+        repo_durations = profile_repos[profile_hash]
+        cost = sum(default_duration if duration is None else duration
+                   for duration in repo_durations.values())
+        if batch and (batch_cost + cost > batch_duration or len(batch) >= MAX_BATCH_PROFILES):
+            yield batch
+            batch = []
+            batch_cost = 0.0
+        batch.append([profile_hash, sorted(repo_durations)])
+        batch_cost += cost
+    if batch:
+        yield batch
+
+
+class RegenerationProgress(object):
+    """
+    Reports the progress of a batch_regenerate_applicability_for_profiles task in its
+    progress report, at most once a second.
+
+    :ivar task_id: The id of the task, None when not called in a task
+    :type task_id: basestring
+    :ivar counters: The number of profiles and applicabilities to regenerate and regenerated
+    :type counters: dict
+    """
+
+    def __init__(self, task_id, profile_repo_ids):
+        """
+        :param task_id: The id of the task, None when not called in a task
+        :type  task_id: basestring
+        :param profile_repo_ids: The profile hashes and the repo ids of the batch
+        :type  profile_repo_ids: list of [profile_hash, list of repo ids] pairs
+        """
+        self.task_id = task_id
+        self.started = time.time()
+        self.last_report_time = None
+        self.counters = {
+            'profiles_total': len(profile_repo_ids),
+            'profiles_processed': 0,
+            'evaluations_total': sum(len(repo_ids) for profile_hash, repo_ids in profile_repo_ids),
+            'evaluations_processed': 0,
+        }
+
+    def evaluated(self):
+        """
+        Count an applicability as regenerated.
+        """
+        self.counters['evaluations_processed'] += 1
+        self.report()
+
+    def profile_done(self):
+        """
+        Count a profile as regenerated for all its repositories.
+        """
+        self.counters['profiles_processed'] += 1
+        self.report()
+
+    def report(self, force=False):
+        """
+        Save the progress report of the task.
+
+        :param force: if True, save it even if it was saved less than a second ago
+        :type  force: bool
+        """
+        if self.task_id is None:
+            return
+        now = int(time.time())
+        if not force and now == self.last_report_time:
+            return
+        self.last_report_time = now
+        progress = dict(self.counters, duration=time.time() - self.started)
+        qs = model.TaskStatus.objects.filter(task_id=self.task_id)
+        qs.update_one(set__progress_report={'applicability': progress})
+
+
+def summarize_regeneration_progress(task_statuses):
+    """
+    Sum the progress reported by the applicability regeneration tasks of a task group.
+
+    The throughput is the number of applicabilities regenerated per second, from the start of
+    the first task to the end of the last task, or to now if a task has not completed.
+
+    :param task_statuses: The tasks of the task group
+    :type  task_statuses: iterable of pulp.server.db.model.TaskStatus
+    :return:              The summed counters of the progress reports, the total duration of the
+                          tasks and the throughput, or None if no task reported applicability
+                          progress
+    :rtype:               dict or None
+    """
+    summary = None
+    first_start = None
+    last_finish = None
+    incomplete = False
+    for task_status in task_statuses:
+        progress = (task_status.progress_report or {}).get('applicability')
+        if progress is None:
+            continue
+        if summary is None:
+            summary = {'profiles_total': 0, 'profiles_processed': 0, 'evaluations_total': 0,
+                       'evaluations_processed': 0, 'duration': 0.0}
+        for key in summary:
+            summary[key] += progress.get(key, 0)
+        if task_status.start_time:
+            start = dateutils.parse_iso8601_datetime(task_status.start_time)
+            first_start = start if first_start is None else min(first_start, start)
+        if task_status.finish_time:
+            finish = dateutils.parse_iso8601_datetime(task_status.finish_time)
+            last_finish = finish if last_finish is None else max(last_finish, finish)
+        else:
+            incomplete = True
+
+    if summary is None:
+        return None
+    if incomplete or last_finish is None:
+        last_finish = datetime.now(dateutils.utc_tz())
+    elapsed = 0
+    if first_start is not None:
+        elapsed = dateutils.datetime_to_utc_timestamp(last_finish) - \
+            dateutils.datetime_to_utc_timestamp(first_start)
+    summary['evaluations_per_second'] = \
+        summary['evaluations_processed'] / elapsed if elapsed > 0 else 0.0
+    return summary
 
 
 class DoesNotExist(Exception):
@@ -366,7 +754,8 @@ class RepoProfileApplicabilityManager(object):
     """
     This class is useful for querying for RepoProfileApplicability objects in the database.
     """
-    def create(self, profile_hash, repo_id, profile, applicability):
+    def create(self, profile_hash, repo_id, profile, applicability, regenerated=None,
+               duration=None):
         """
         Create and return a RepoProfileApplicability object.
 
@@ -380,12 +769,17 @@ class RepoProfileApplicabilityManager(object):
         :param applicability: A dictionary structure mapping unit type IDs to lists of applicable
                               Unit IDs.
         :type  applicability: dict
+        :param regenerated:   ISO8601 representation of the time the applicability data started
+                              being calculated
+        :type  regenerated:   basestring
+        :param duration:      The number of seconds the applicability data took to calculate
+        :type  duration:      float
         :return:              A new RepoProfileApplicability object
         :rtype:               pulp.server.db.model.consumer.RepoProfileApplicability
         """
         applicability = RepoProfileApplicability(
             profile_hash=profile_hash, repo_id=repo_id, profile=profile,
-            applicability=applicability)
+            applicability=applicability, regenerated=regenerated, duration=duration)
         applicability.save()
         return applicability
 
@@ -462,6 +856,19 @@ class RepoProfileApplicabilityManager(object):
         if missing_profile_hashes:
             rpa_collection.remove({'profile_hash': {'$in': missing_profile_hashes}})
 
+        # Finally, the unit removals recorded before the oldest applicability of their repository
+        # was regenerated are not needed to regenerate it incrementally anymore
+        removal_collection = model.RepositoryContentUnitRemoval._get_collection()
+        oldest_regenerations = rpa_collection.aggregate([
+            {'$match': {'regenerated': {'$ne': None}}},
+            {'$group': {'_id': '$repo_id', 'regenerated': {'$min': '$regenerated'}}}])
+        regenerated_repo_ids = []
+        for oldest in oldest_regenerations:
+            regenerated_repo_ids.append(oldest['_id'])
+            removal_collection.delete_many({'repo_id': oldest['_id'],
+                                            'removed': {'$lt': oldest['regenerated']}})
+        removal_collection.delete_many({'repo_id': {'$nin': regenerated_repo_ids}})
+
 
 # Instantiate one of the managers on the object it manages for convenience
 RepoProfileApplicability.objects = RepoProfileApplicabilityManager()
@@ -525,6 +932,176 @@ def retrieve_consumer_applicability(consumer_criteria, content_types=None):
     return _format_report(consumer_applicability_map)
 
 
+def stream_consumer_applicability(consumer_criteria, content_types=None, skip=0, limit=None):
+    """
+    Query content applicability for consumers matched by a given consumer_criteria, optionally
+    limiting by content type, without loading the applicability of all the consumers in memory.
+
+    The consumers are grouped by MongoDB aggregation pipelines into consumer sets, the consumers
+    that have the same profiles and are bound to the same repositories, which therefore have the
+    same applicability. The report is generated one page of consumer sets at a time, in the same
+    format as retrieve_consumer_applicability:
+
+    {'consumers': ['consumer_1', 'consumer_2'],
+     'applicability': {'content_type_1': ['unit_1', 'unit_3']}}
+
+    Unlike retrieve_consumer_applicability, each consumer appears in a single consumer set, whose
+    applicability is the union of the applicability of its profiles for its repositories.
+    Consumer sets without applicable content are not reported. The consumer sets are ordered by
+    their first consumer id, and the consumers and units of each set are sorted.
+
+    :param consumer_criteria: The consumer selection criteria
+    :type  consumer_criteria: pulp.server.db.model.criteria.Criteria
+    :param content_types:     An optional list of content types that the caller wishes to limit
+                              the results to. Defaults to None, which will return data for all
+                              types
+    :type  content_types:     list
+    :param skip:              The number of consumer sets to skip
+    :type  skip:              int
+    :param limit:             The maximum number of consumer sets to report, None for all
+    :type  limit:             int
+    :return:                  The applicability of each consumer set
+    :rtype:                   generator of dict
+    """
+    # The consumers are queried and grouped before the report is generated, so that an invalid
+    # criteria is raised by this call rather than while the report is iterated.
+    consumer_criteria['fields'] = ['id']
+    consumer_ids = [c['id'] for c in ConsumerQueryManager.find_by_criteria(consumer_criteria)]
+    consumer_sets = _get_consumer_sets(consumer_ids)
+    del consumer_ids
+    return _report_consumer_set_applicability(consumer_sets, content_types, skip, limit)
+
+
+def _report_consumer_set_applicability(consumer_sets, content_types, skip, limit):
+    """
+    Generate the applicability report of consumer sets, one page of consumer sets at a time.
+
+    :param consumer_sets: (consumer_ids, profile_hashes, repo_ids) tuples, as returned by
+                          _get_consumer_sets
+    :type  consumer_sets: list of tuple
+    :param content_types: If not None, the content types to include in the report
+    :type  content_types: list or None
+    :param skip:          The number of consumer sets to skip
+    :type  skip:          int
+    :param limit:         The maximum number of consumer sets to report, None for all
+    :type  limit:         int
+    :return:              The applicability of each consumer set
+    :rtype:               generator of dict
+    """
+    reported = 0
+    for page in paginate(consumer_sets, APPLICABILITY_REPORT_PAGE_SIZE):
+        applicability_map = _get_consumer_set_applicability_map(page, content_types)
+        for consumers, profile_hashes, repo_ids in page:
+            applicability = {}
+            for profile_hash in profile_hashes:
+                for repo_id in repo_ids:
+                    data = applicability_map.get((profile_hash, repo_id), {})
+                    for content_type, unit_ids in data.iteritems():
+                        applicability.setdefault(content_type, set()).update(unit_ids)
+            applicability = dict((content_type, sorted(unit_ids))
+                                 for content_type, unit_ids in applicability.iteritems()
+                                 if unit_ids)
+            if not applicability:
+                continue
+            if skip:
+                skip -= 1
+                continue
+            yield {'consumers': consumers, 'applicability': applicability}
+            reported += 1
+            if limit is not None and reported >= limit:
+                return
+
+
+def _get_consumer_sets(consumer_ids):
+    """
+    Group the given consumers into consumer sets, the consumers that have the same profiles and
+    are bound to the same repositories. Consumers without profile or binding are left out.
+
+    The consumers are grouped by their profile hashes and by their bound repositories with one
+    aggregation pipeline each, and the consumer sets are the intersections of these groups.
+
+    :param consumer_ids: The ids of the consumers to group
+    :type  consumer_ids: list
+    :return:             (consumer_ids, profile_hashes, repo_ids) tuples for each consumer set,
+                         ordered by first consumer id. Each list is sorted.
+    :rtype:              list of tuple
+    """
+    profile_groups = _group_consumers(UnitProfile.get_collection(), consumer_ids, 'profile_hash')
+    repo_groups = _group_consumers(Bind.get_collection(), consumer_ids, 'repo_id')
+
+    profile_group_index = {}
+    for index, (profile_hashes, consumers) in enumerate(profile_groups):
+        for consumer_id in consumers:
+            profile_group_index[consumer_id] = index
+
+    consumer_sets = []
+    for repo_ids, consumers in repo_groups:
+        consumers_by_profiles = {}
+        for consumer_id in consumers:
+            index = profile_group_index.get(consumer_id)
+            if index is not None:
+                consumers_by_profiles.setdefault(index, []).append(consumer_id)
+        for index, consumer_set in consumers_by_profiles.iteritems():
+            consumer_sets.append((sorted(consumer_set), profile_groups[index][0], repo_ids))
+    consumer_sets.sort(key=lambda consumer_set: consumer_set[0][0])
+    return consumer_sets
+
+
+def _group_consumers(collection, consumer_ids, field):
+    """
+    Group consumers by the values of a field of their documents in a collection.
+
+    :param collection:   The collection with a 'consumer_id' field
+    :type  collection:   pymongo.collection.Collection
+    :param consumer_ids: The ids of the consumers to group
+    :type  consumer_ids: list
+    :param field:        The name of the field
+    :type  field:        basestring
+    :return:             The sorted distinct values of the field and the ids of the consumers
+                         having them, for each group
+    :rtype:              list of tuple
+    """
+    groups = collection.aggregate([
+        {'$match': {'consumer_id': {'$in': consumer_ids}}},
+        {'$sort': {'consumer_id': 1, field: 1}},
+        {'$group': {'_id': '$consumer_id', 'values': {'$addToSet': '$' + field}}},
+        {'$unwind': '$values'},
+        {'$sort': {'_id': 1, 'values': 1}},
+        {'$group': {'_id': '$_id', 'values': {'$push': '$values'}}},
+        {'$group': {'_id': '$values', 'consumers': {'$push': '$_id'}}}])
+    return [(group['_id'], group['consumers']) for group in groups]
+
+
+def _get_consumer_set_applicability_map(consumer_sets, content_types):
+    """
+    Query the applicability data of the profiles of the given consumer sets for their
+    repositories.
+
+    :param consumer_sets: (consumer_ids, profile_hashes, repo_ids) tuples
+    :type  consumer_sets: list of tuple
+    :param content_types: If not None, the content types to include in the applicability data
+    :type  content_types: list or None
+    :return:              The applicability data, keyed by (profile_hash, repo_id)
+    :rtype:               dict
+    """
+    profile_hashes = set()
+    repo_ids = set()
+    for consumers, set_profile_hashes, set_repo_ids in consumer_sets:
+        profile_hashes.update(set_profile_hashes)
+        repo_ids.update(set_repo_ids)
+
+    projection = ['profile_hash', 'repo_id']
+    if content_types is None:
+        projection.append('applicability')
+    else:
+        projection.extend('applicability.%s' % content_type for content_type in content_types)
+    applicabilities = RepoProfileApplicability.get_collection().find(
+        {'profile_hash': {'$in': list(profile_hashes)}, 'repo_id': {'$in': list(repo_ids)}},
+        projection=projection)
+    return dict(((a['profile_hash'], a['repo_id']), a.get('applicability', {}))
+                for a in applicabilities)
+
+
 def _add_consumers_to_applicability_map(consumer_map, applicability_map):
     """
     For all consumers in the consumer_map, look for their profiles and repos in the
@@ -60,6 +60,26 @@ class ContentCatalogManager(object):
         entry = ContentCatalog(source_id, expires, type_id, unit_key, url)
         collection.insert(entry)
 
+    def add_entries(self, source_id, expires, entries):
+        """
+        Add entries to the content catalog using a single unordered bulk insert.
+        :param source_id: A content source ID.
+        :type source_id: str
+        :param expires: The entry expiration in seconds.
+        :type expires: int
+        :param entries: A list of: (type_id, unit_key, url).
+        :type entries: list
+        :return: The number of entries added.
+        :rtype: int
+        """
+        documents = [ContentCatalog(source_id, expires, type_id, unit_key, url)
+                     for type_id, unit_key, url in entries]
+        if not documents:
+            return 0
+        collection = ContentCatalog.get_collection()
+        collection.insert_many(documents, ordered=False)
+        return len(documents)
+
     def delete_entry(self, source_id, type_id, unit_key):
         """
         Delete an entry from the content catalog.
@@ -117,12 +137,10 @@ class ContentCatalogManager(object):
         :return: The number of entries purged.
         :rtype: int
         """
-        purged = 0
         collection = ContentCatalog.get_collection()
-        for source_id in collection.distinct('source_id'):
-            if source_id not in valid_ids:
-                purged += self.purge(source_id)
-        return purged
+        query = {'source_id': {'$nin': list(valid_ids)}}
+        result = collection.remove(query)
+        return result['n']
 
     def find(self, type_id, unit_key):
         """
@@ -148,6 +166,35 @@ class ContentCatalogManager(object):
             newest_by_source[entry['source_id']] = entry
         return newest_by_source.values()
 
+    def find_many(self, type_id, unit_keys):
+        """
+        Find entries in the content catalog for many unit keys of the same type
+        using a single query on the indexed locator.  As with find(), only the
+        newest entry for each source is included for each locator.
+        :param type_id: The unit type ID.
+        :type type_id: str
+        :param unit_keys: A list of unit keys.
+        :type unit_keys: list
+        :return: A dictionary of: list of matching entries keyed by locator.
+            Locators without matching entries are omitted.
+        :rtype: dict
+        """
+        locators = list(set(ContentCatalog.get_locator(type_id, k) for k in unit_keys))
+        if not locators:
+            return {}
+        collection = ContentCatalog.get_collection()
+        query = {
+            'locator': {'$in': locators},
+            'expiration': {'$gte': ContentCatalog.get_expiration(0)}
+        }
+        newest_by_source = {}
+        for entry in collection.find(query, sort=[('_id', ASCENDING)]):
+            newest_by_source[(entry['locator'], entry['source_id'])] = entry
+        found = {}
+        for (locator, source_id), entry in newest_by_source.items():
+            found.setdefault(locator, []).append(entry)
+        return found
+
     def has_entries(self, source_id):
         """
         Get whether the specified content source has entries in the catalog.
@@ -1,17 +1,22 @@
 from gettext import gettext as _
-import itertools
+from Queue import Queue
+from threading import Lock, Thread
+import heapq
 import logging
 import os
 import re
 import shutil
+import time
 
 from celery import task
+from pymongo import ASCENDING
 
+from pulp.common.plugins import reporting_constants
 from pulp.plugins.types import database as content_types_db
 from pulp.plugins.loader import api as plugin_api
 from pulp.plugins.util import misc as plugin_misc
 from pulp.server import config as pulp_config, exceptions as pulp_exceptions
-from pulp.server.async.tasks import Task
+from pulp.server.async.tasks import Task, get_current_task_id
 from pulp.server.controllers import units as units_controller
 from pulp.server.db.model.repository import RepoContentUnit
 from pulp.server.db import model
@@ -20,6 +25,14 @@ from pulp.server.exceptions import MissingResource
 
 _logger = logging.getLogger(__name__)
 
+# Number of content units read (and checked for repository associations) per query while
+# searching for orphans. Each page costs one range query against the unit collection and one
+# distinct query against the repo_content_units collection.
+ORPHAN_PAGE_SIZE = 5000
+
+# Number of threads removing the files of deleted orphans from disk.
+ORPHAN_FILE_REMOVAL_THREADS = 4
+
 
 class OrphanManager(object):
 
@@ -47,9 +60,10 @@ class OrphanManager(object):
         :return: count of orphaned units of the given type
         :rtype: int
         """
+        collection = content_types_db.type_units_collection(content_type_id)
         count = 0
-        for unit in OrphanManager.generate_orphans_by_type(content_type_id):
-            count += 1
+        for page in OrphanManager.generate_orphan_pages(collection):
+            count += len(page)
         return count
 
     def generate_all_orphans(self, fields=None):
@@ -85,7 +99,7 @@ class OrphanManager(object):
                 yield content_unit
 
     @staticmethod
-    def generate_orphans_by_type(content_type_id, fields=None):
+    def generate_orphans_by_type(content_type_id, fields=None, content_unit_ids=None):
         """
         Return an generator of all orphaned content units of the given content type.
 
@@ -95,23 +109,95 @@ class OrphanManager(object):
         :type content_type_id: basestring
         :param fields: list of fields to include in each content unit
         :type fields: list or None
+        :param content_unit_ids: list of content unit ids to restrict the search to; None means
+                                 search all units of the type
+        :type content_unit_ids: iterable or None
         :return: generator of orphaned content units for the given content type
         :rtype: generator
         """
-
-        fields = fields if fields is not None else ['_id']
         content_units_collection = content_types_db.type_units_collection(content_type_id)
+
+        for page in OrphanManager.generate_orphan_pages(content_units_collection, fields,
+                                                        content_unit_ids):
+            for content_unit in page:
+                yield content_unit
+
+    @staticmethod
+    def generate_orphan_pages(collection, fields=None, content_unit_ids=None,
+                              page_size=ORPHAN_PAGE_SIZE):
+        """
+        Return a generator of pages of orphaned content units found in the given collection.
+
+        Units are read in ascending `_id` order, one page at a time, and the ids of each page
+        that are associated with any repository are subtracted using a single distinct query.
+        The number of queries is therefore proportional to the number of pages rather than the
+        number of units.
+
+        If fields is not specified, only the `_id` field will be present.
+
+        :param collection: collection holding the content units to search
+        :type collection: pymongo.collection.Collection
+        :param fields: list of fields to include in each content unit
+        :type fields: list or None
+        :param content_unit_ids: list of content unit ids to restrict the search to; None means
+                                 search all units in the collection
+        :type content_unit_ids: iterable or None
+        :param page_size: maximum number of units read per query
+        :type page_size: int
+        :return: generator of lists of orphaned content units; pages are never empty
+        :rtype: generator
+        """
+        fields = list(fields) if fields is not None else ['_id']
         repo_content_units_collection = RepoContentUnit.get_collection()
 
-        for content_unit in content_units_collection.find({}, projection=fields).batch_size(100):
+        for page in OrphanManager._generate_unit_pages(collection, fields, content_unit_ids,
+                                                       page_size):
+            unit_ids = [content_unit['_id'] for content_unit in page]
+            associated_ids = set(repo_content_units_collection.distinct(
+                'unit_id', {'unit_id': {'$in': unit_ids}}))
 
-            repo_content_units_cursor = repo_content_units_collection.find(
-                {'unit_id': content_unit['_id']})
+            orphans = [u for u in page if u['_id'] not in associated_ids]
+            if orphans:
+                yield orphans
 
-            if repo_content_units_cursor.count() > 0:
-                continue
+    @staticmethod
+    def _generate_unit_pages(collection, fields, content_unit_ids, page_size):
+        """
+        Return a generator of pages of content units read from the given collection.
 
-            yield content_unit
+        When content_unit_ids is None the whole collection is walked with range queries on
+        `_id`, which unlike skip() stay cheap no matter how deep into the collection they are.
+        Otherwise the given ids are looked up in pages using $in.
+
+        :param collection: collection holding the content units to read
+        :type collection: pymongo.collection.Collection
+        :param fields: list of fields to include in each content unit
+        :type fields: list
+        :param content_unit_ids: list of content unit ids to read; None means read them all
+        :type content_unit_ids: iterable or None
+        :param page_size: maximum number of units read per query
+        :type page_size: int
+        :return: generator of lists of content units
+        :rtype: generator
+        """
+        if content_unit_ids is not None:
+            if isinstance(content_unit_ids, basestring):
+                content_unit_ids = [content_unit_ids]
+            for id_page in plugin_misc.paginate(content_unit_ids, page_size):
+                page = list(collection.find({'_id': {'$in': list(id_page)}}, projection=fields))
+                if page:
+                    yield page
+            return
+
+        last_id = None
+        while True:
+            spec = {} if last_id is None else {'_id': {'$gt': last_id}}
+            cursor = collection.find(spec, projection=fields).sort('_id', ASCENDING)
+            page = list(cursor.limit(page_size))
+            if not page:
+                return
+            yield page
+            last_id = page[-1]['_id']
 
     @staticmethod
     def generate_orphans_by_type_with_unit_keys(content_type_id):
@@ -150,11 +236,8 @@ class OrphanManager(object):
                                  given content type and unit id
         """
 
-        for content_unit in OrphanManager.generate_orphans_by_type(content_type_id):
-
-            if content_unit['_id'] != content_unit_id:
-                continue
-
+        for content_unit in OrphanManager.generate_orphans_by_type(
+                content_type_id, content_unit_ids=[content_unit_id]):
             return content_unit
 
         raise pulp_exceptions.MissingResource(content_type=content_type_id,
@@ -169,15 +252,20 @@ class OrphanManager(object):
         :rtype: dict
         """
         ret = {}
-        for content_type_id in content_types_db.all_type_ids():
-            count = OrphanManager.delete_orphans_by_type(content_type_id)
-            if count > 0:
-                ret[content_type_id] = count
-
-        for content_type_id in plugin_api.list_unit_models():
-            count = OrphanManager.delete_orphan_content_units_by_type(content_type_id)
-            if count > 0:
-                ret[content_type_id] = count
+        pipeline = OrphanDeletionPipeline()
+        try:
+            for content_type_id in content_types_db.all_type_ids():
+                count = OrphanManager.delete_orphans_by_type(content_type_id, pipeline=pipeline)
+                if count > 0:
+                    ret[content_type_id] = count
+
+            for content_type_id in plugin_api.list_unit_models():
+                count = OrphanManager.delete_orphan_content_units_by_type(content_type_id,
+                                                                          pipeline=pipeline)
+                if count > 0:
+                    ret[content_type_id] = count
+        finally:
+            pipeline.finish()
         return ret
 
     @staticmethod
@@ -206,7 +294,7 @@ class OrphanManager(object):
             OrphanManager.delete_orphans_by_type(content_type_id, content_unit_id_list)
 
     @staticmethod
-    def delete_orphans_by_type(content_type_id, content_unit_ids=None):
+    def delete_orphans_by_type(content_type_id, content_unit_ids=None, pipeline=None):
         """
         Delete the orphaned content units for the given content type.
 
@@ -219,6 +307,9 @@ class OrphanManager(object):
         :type content_type_id: basestring
         :param content_unit_ids: list of content unit ids to delete; None means delete them all
         :type content_unit_ids: iterable or None
+        :param pipeline: pipeline used to remove files and report progress; when None, one is
+                         created and finished before returning
+        :type pipeline: OrphanDeletionPipeline or None
         :return: count of units deleted
         :rtype: int
         """
@@ -233,28 +324,35 @@ class OrphanManager(object):
 
         fields = ('_id', '_storage_path') + unit_key_fields
         count = 0
-        for content_unit in OrphanManager.generate_orphans_by_type(content_type_id, fields=fields):
-
-            if content_unit_ids is not None and content_unit['_id'] not in content_unit_ids:
-                continue
-
-            model.LazyCatalogEntry.objects(
-                unit_id=content_unit['_id'],
-                unit_type_id=content_type_id
-            ).delete()
-            content_units_collection.remove(content_unit['_id'])
+        owns_pipeline = pipeline is None
+        if owns_pipeline:
+            pipeline = OrphanDeletionPipeline()
+        try:
+            orphan_pages = OrphanManager.generate_orphan_pages(
+                content_units_collection, fields=fields, content_unit_ids=content_unit_ids)
+            for orphan_page in orphan_pages:
+                id_list = [content_unit['_id'] for content_unit in orphan_page]
 
-            if hasattr(content_model, 'do_post_delete_actions'):
-                content_model.do_post_delete_actions(content_unit)
+                model.LazyCatalogEntry.objects(
+                    unit_id__in=id_list,
+                    unit_type_id=content_type_id
+                ).delete()
+                content_units_collection.remove({'_id': {'$in': id_list}})
 
-            storage_path = content_unit.get('_storage_path', None)
-            if storage_path is not None:
-                OrphanManager.delete_orphaned_file(storage_path)
-            count += 1
+                if hasattr(content_model, 'do_post_delete_actions'):
+                    for content_unit in orphan_page:
+                        content_model.do_post_delete_actions(content_unit)
+
+                storage_paths = [u.get('_storage_path') for u in orphan_page]
+                pipeline.units_deleted(content_type_id, len(orphan_page), storage_paths)
+                count += len(orphan_page)
+        finally:
+            if owns_pipeline:
+                pipeline.finish()
         return count
 
     @staticmethod
-    def delete_orphan_content_units_by_type(type_id, content_unit_ids=None):
+    def delete_orphan_content_units_by_type(type_id, content_unit_ids=None, pipeline=None):
         """
         Delete the orphaned content units for the given content type.
         This method only applies to new style content units that are loaded via entry points
@@ -265,6 +363,9 @@ class OrphanManager(object):
         :type type_id: basestring
         :param content_unit_ids: list of content unit ids to delete; None means delete them all
         :type content_unit_ids: iterable or None
+        :param pipeline: pipeline used to remove files and report progress; when None, one is
+                         created and finished before returning
+        :type pipeline: OrphanDeletionPipeline or None
         :return: count of units deleted
         :rtype: int
         """
@@ -276,46 +377,35 @@ class OrphanManager(object):
             raise MissingResource(content_type_id=type_id)
 
         fields = ('id', '_storage_path') + unit_key_fields
-        if content_unit_ids:
-            query_sets = []
-            for page in plugin_misc.paginate(content_unit_ids):
-                qs = content_model.objects(id__in=page).only(*fields)
-                query_sets.append(qs)
-            content_units = itertools.chain(*query_sets)
-        else:
-            content_units = content_model.objects.only(*fields)
-
         count = 0
-
-        # Paginate the content units
-        for units_group in plugin_misc.paginate(content_units):
-            # Build the list of ids to search for an easier way to access units in the group by id
-            unit_dict = dict()
-            for unit in units_group:
-                unit_dict[unit.id] = unit
-
-            id_list = list(unit_dict.iterkeys())
-
-            # Clear the units that are currently associated from unit_dict
-            non_orphan = model.RepositoryContentUnit.objects(unit_id__in=id_list)\
-                .distinct('unit_id')
-            for non_orphan_id in non_orphan:
-                unit_dict.pop(non_orphan_id)
-
-            # Remove the unit, lazy catalog entries, and any content in storage.
-            for unit_to_delete in unit_dict.itervalues():
+        owns_pipeline = pipeline is None
+        if owns_pipeline:
+            pipeline = OrphanDeletionPipeline()
+        try:
+            orphan_pages = OrphanManager.generate_orphan_pages(content_model._get_collection(),
+                                                               content_unit_ids=content_unit_ids)
+            for orphan_page in orphan_pages:
+                id_list = [orphan['_id'] for orphan in orphan_page]
+                units_to_delete = list(content_model.objects(id__in=id_list).only(*fields))
+
+                # Remove the units and lazy catalog entries with one query each. Files in
+                # storage are removed by the pipeline.
                 model.LazyCatalogEntry.objects(
-                    unit_id=str(unit_to_delete.id),
+                    unit_id__in=id_list,
                     unit_type_id=str(type_id)
                 ).delete()
-                unit_to_delete.delete()
+                content_model.objects(id__in=id_list).delete()
 
                 if hasattr(content_model, 'do_post_delete_actions'):
-                    content_model.do_post_delete_actions(unit_to_delete)
+                    for unit_to_delete in units_to_delete:
+                        content_model.do_post_delete_actions(unit_to_delete)
 
-                if unit_to_delete._storage_path:
-                    OrphanManager.delete_orphaned_file(unit_to_delete._storage_path)
-                count += 1
+                storage_paths = [u._storage_path for u in units_to_delete]
+                pipeline.units_deleted(type_id, len(units_to_delete), storage_paths)
+                count += len(units_to_delete)
+        finally:
+            if owns_pipeline:
+                pipeline.finish()
 
         return count
 
@@ -326,6 +416,25 @@ class OrphanManager(object):
         @param path: absolute path to the file to delete
         @type  path: str
         """
+        storage_dir = pulp_config.config.get('server', 'storage_dir')
+        parent_dir = OrphanManager.remove_orphaned_file(storage_dir, path)
+        if parent_dir is not None:
+            OrphanManager.prune_empty_directories(storage_dir, [parent_dir])
+
+    @staticmethod
+    def remove_orphaned_file(storage_dir, path):
+        """
+        Delete an orphaned file, leaving its parent directories in place.
+
+        :param storage_dir: The absolute path to the pulp content storage directory.
+        :type storage_dir: str
+        :param path: absolute path to the file to delete
+        :type path: str
+        :return: the parent directory of the deleted file, which may now be empty; None when
+                 nothing was deleted or the file was in shared storage
+        :rtype: str or None
+        :raises ValueError: if path is not absolute
+        """
         if not os.path.lexists(path):
             _logger.debug(_('Path: {p} does not exist').format(p=path))
             return
@@ -335,27 +444,46 @@ class OrphanManager(object):
         if not os.path.isabs(path):
             raise ValueError(_('Path: %(p)s must be absolute path') % {'p': path})
 
-        storage_dir = pulp_config.config.get('server', 'storage_dir')
-
         # shared content
         if OrphanManager.is_shared(storage_dir, path):
             OrphanManager.unlink_shared(path)
             return
 
         OrphanManager.delete(path)
+        return os.path.dirname(path)
+
+    @staticmethod
+    def prune_empty_directories(storage_dir, directories):
+        """
+        Delete the given directories, and their parents, as long as they are empty.
+
+        Directories are visited deepest first, so each one is listed at most once no matter
+        how many of the given directories share it as a parent. The per-type directories
+        directly under <storage_dir>/content are never deleted.
 
-        # delete parent directories on the path as long as they fall empty
+        :param storage_dir: The absolute path to the pulp content storage directory.
+        :type storage_dir: str
+        :param directories: absolute paths of directories that may have become empty
+        :type directories: iterable
+        """
         root_content_regex = re.compile(os.path.join(storage_dir, 'content', '[^/]+/?$'))
-        while True:
-            path = os.path.dirname(path)
+        seen = set(directories)
+        pending = [(-path.count(os.sep), path) for path in seen]
+        heapq.heapify(pending)
+        while pending:
+            depth, path = heapq.heappop(pending)
             if root_content_regex.match(path):
-                break
+                continue
             contents = os.listdir(path)
             if contents:
-                break
+                continue
             if not os.access(path, os.W_OK):
-                break
+                continue
             os.rmdir(path)
+            parent = os.path.dirname(path)
+            if parent not in seen:
+                seen.add(parent)
+                heapq.heappush(pending, (depth + 1, parent))
 
     @staticmethod
     def is_shared(storage_dir, path):
@@ -420,6 +548,115 @@ class OrphanManager(object):
             _logger.error(_('Delete path: %(p)s failed: %(m)s'), {'p': path, 'm': str(e)})
 
 
+class OrphanDeletionPipeline(object):
+    """
+    Removes the files of deleted orphans and reports the progress of the deletion.
+
+    Units are deleted from the database a page at a time by the OrphanManager, which hands the
+    storage paths of each page to units_deleted(). The files are removed by a bounded pool of
+    threads while the next page is being deleted, and the directories they leave empty are
+    pruned once by finish(). Progress is written to the status of the current task, if any,
+    at most once a second.
+
+    :ivar deleted: number of units deleted, keyed by content type id
+    :type deleted: dict
+    :ivar files_removed: number of files removed from disk
+    :type files_removed: int
+    """
+
+    def __init__(self, threads=ORPHAN_FILE_REMOVAL_THREADS):
+        """
+        :param threads: number of threads removing files
+        :type threads: int
+        """
+        self.storage_dir = pulp_config.config.get('server', 'storage_dir')
+        self.deleted = {}
+        self.files_removed = 0
+        self.task_id = get_current_task_id()
+        self.last_report_time = 0
+        self._directories = set()
+        self._lock = Lock()
+        self._queue = Queue(threads * ORPHAN_PAGE_SIZE)
+        self._threads = []
+        for i in range(threads):
+            thread = Thread(target=self._run, name='orphan-file-remover-%d' % i)
+            thread.setDaemon(True)
+            thread.start()
+            self._threads.append(thread)
+
+    def units_deleted(self, content_type_id, count, storage_paths):
+        """
+        Record that units have been deleted and queue their files for removal.
+
+        :param content_type_id: id of the content type of the deleted units
+        :type content_type_id: basestring
+        :param count: number of units deleted
+        :type count: int
+        :param storage_paths: storage paths of the deleted units; None entries are ignored
+        :type storage_paths: iterable
+        """
+        self.deleted[content_type_id] = self.deleted.get(content_type_id, 0) + count
+        for path in storage_paths:
+            if path:
+                self._queue.put(path)
+        self.report(reporting_constants.STATE_RUNNING)
+
+    def finish(self):
+        """
+        Wait for all queued files to be removed, then prune the directories left empty.
+        """
+        for thread in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        OrphanManager.prune_empty_directories(self.storage_dir, self._directories)
+        self.report(reporting_constants.STATE_COMPLETE)
+
+    def report(self, state):
+        """
+        Write the progress of the deletion to the status of the current task.
+
+        Updates are written at most once a second, unless the deletion is complete.
+
+        :param state: the state of the deletion, one of the reporting_constants STATE_* values
+        :type state: basestring
+        """
+        if self.task_id is None:
+            return
+        now = int(time.time())
+        if state == reporting_constants.STATE_RUNNING and now == self.last_report_time:
+            return
+        self.last_report_time = now
+        with self._lock:
+            files_removed = self.files_removed
+        progress = {
+            reporting_constants.PROGRESS_STATE_KEY: state,
+            'units_deleted': dict(self.deleted),
+            'files_removed': files_removed,
+            'files_pending': self._queue.qsize(),
+        }
+        qs = model.TaskStatus.objects.filter(task_id=self.task_id)
+        qs.update_one(set__progress_report={'delete_orphans': progress})
+
+    def _run(self):
+        """
+        Main loop of the file removal threads.
+        """
+        while True:
+            path = self._queue.get()
+            if path is None:
+                return
+            try:
+                parent_dir = OrphanManager.remove_orphaned_file(self.storage_dir, path)
+            except Exception:
+                _logger.exception(_('Deleting orphaned file: %(p)s failed') % {'p': path})
+                continue
+            with self._lock:
+                self.files_removed += 1
+                if parent_dir is not None:
+                    self._directories.add(parent_dir)
+
+
 delete_all_orphans = task(OrphanManager.delete_all_orphans, base=Task)
 delete_orphans_by_id = task(OrphanManager.delete_orphans_by_id, base=Task, ignore_result=True)
 delete_orphans_by_type = task(OrphanManager.delete_orphans_by_type, base=Task, ignore_result=True)
@@ -1,8 +1,11 @@
+from collections import OrderedDict
 from errno import ENOENT
 from gettext import gettext as _
 import logging
 import os
 import sys
+import threading
+import time
 from uuid import uuid4
 
 from celery import task
@@ -21,6 +24,187 @@ from pulp.server.controllers import repository as repo_controller
 
 logger = logging.getLogger(__name__)
 
+# Maximum number of upload files each process keeps open to save uploaded data
+MAX_OPEN_UPLOADS = 32
+
+# Seconds after which an upload file no segment was written to is closed. Uploads deleted by
+# another process are only closed then, and their disk space freed.
+UPLOAD_IDLE_TIMEOUT = 10
+
+
+class _OpenUpload(object):
+    """
+    An upload file opened for writing.
+
+    :ivar fd:   file descriptor, or None once closed
+    :type fd:   int
+    :ivar lock: serializes the writes through the file descriptor
+    :type lock: threading.Lock
+    :ivar used: when the file was last used, in seconds since the epoch
+    :type used: float
+    """
+
+    def __init__(self, fd):
+        self.fd = fd
+        self.lock = threading.Lock()
+        self.used = time.time()
+
+
+class UploadFiles(object):
+    """
+    Keeps the most recently written upload files open, so that the segments of an upload,
+    which clients may send in parallel, are written without opening the file for each one.
+
+    An upload may be deleted by another process, which cannot close the files opened here. Files
+    found deleted when written are closed, and a timer closes the files that were not written
+    for UPLOAD_IDLE_TIMEOUT seconds.
+    """
+
+    def __init__(self, max_open=MAX_OPEN_UPLOADS):
+        """
+        :param max_open: maximum number of files kept open
+        :type  max_open: int
+        """
+        self.max_open = max_open
+        self._lock = threading.Lock()
+        # open uploads by upload ID, least recently used first
+        self._uploads = OrderedDict()
+        # timer closing the idle uploads, while uploads are open
+        self._timer = None
+
+    def write(self, upload_id, file_path, offset, data):
+        """
+        Write data into an upload file at an offset.
+
+        :param upload_id: upload request ID
+        :type  upload_id: str
+        :param file_path: path of the upload file
+        :type  file_path: str
+        :param offset:    position in the file to write at
+        :type  offset:    int
+        :param data:      content to write to the file
+        :type  data:      str
+
+        :raise OSError: if the upload file does not exist
+        """
+        while True:
+            upload = self._open(upload_id, file_path)
+            with upload.lock:
+                if upload.fd is None:
+                    # closed by another thread since it was opened
+                    continue
+                if os.fstat(upload.fd).st_nlink == 0:
+                    # deleted, possibly by another process; opening it again fails
+                    self._forget(upload_id, upload)
+                    os.close(upload.fd)
+                    upload.fd = None
+                    continue
+                os.lseek(upload.fd, offset, os.SEEK_SET)
+                while data:
+                    written = os.write(upload.fd, data)
+                    data = data[written:]
+                return
+
+    def close(self, upload_id):
+        """
+        Close the upload file, if it is open, and stop the timer once no upload is open.
+
+        :param upload_id: upload request ID
+        :type  upload_id: str
+        """
+        with self._lock:
+            upload = self._uploads.pop(upload_id, None)
+            if not self._uploads and self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if upload is not None:
+            self._close(upload)
+
+    def _forget(self, upload_id, upload):
+        """
+        Stop keeping an upload file, without closing it.
+
+        :param upload_id: upload request ID
+        :type  upload_id: str
+        :param upload:    the open upload
+        :type  upload:    _OpenUpload
+        """
+        with self._lock:
+            if self._uploads.get(upload_id) is upload:
+                del self._uploads[upload_id]
+
+    def _open(self, upload_id, file_path):
+        """
+        Get the open upload file, opening it if needed and closing the least recently used ones
+        beyond the maximum.
+
+        :param upload_id: upload request ID
+        :type  upload_id: str
+        :param file_path: path of the upload file
+        :type  file_path: str
+        :return:          the open upload
+        :rtype:           _OpenUpload
+        """
+        evicted = []
+        with self._lock:
+            upload = self._uploads.pop(upload_id, None)
+            if upload is None:
+                upload = _OpenUpload(os.open(file_path, os.O_WRONLY))
+            else:
+                upload.used = time.time()
+            self._uploads[upload_id] = upload
+            while len(self._uploads) > self.max_open:
+                evicted.append(self._uploads.popitem(last=False)[1])
+            self._schedule()
+        for old in evicted:
+            self._close(old)
+        return upload
+
+    def _schedule(self):
+        """
+        Start the timer closing the idle uploads, unless it is already started.
+        Called with the lock held.
+        """
+        if self._timer is None:
+            self._timer = threading.Timer(UPLOAD_IDLE_TIMEOUT, self._close_idle)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _close_idle(self):
+        """
+        Close the uploads that were not used for UPLOAD_IDLE_TIMEOUT seconds, and start the
+        timer again while uploads remain open.
+        """
+        idle = []
+        with self._lock:
+            self._timer = None
+            expired = time.time() - UPLOAD_IDLE_TIMEOUT
+            for upload_id, upload in self._uploads.items():
+                if upload.used > expired:
+                    # the following uploads were used more recently
+                    break
+                idle.append(self._uploads.pop(upload_id))
+            if self._uploads:
+                self._schedule()
+        for upload in idle:
+            self._close(upload)
+
+    @staticmethod
+    def _close(upload):
+        """
+        Close an upload file once the writes in progress are done.
+
+        :param upload: the open upload
+        :type  upload: _OpenUpload
+        """
+        with upload.lock:
+            if upload.fd is not None:
+                os.close(upload.fd)
+                upload.fd = None
+
+
+_upload_files = UploadFiles()
+
 
 class ContentUploadManager(object):
     def initialize_upload(self):
@@ -56,7 +240,7 @@ class ContentUploadManager(object):
         Saves bits into the given upload request starting at an offset value.
         The initialize_upload method should be called prior to this method
         to retrieve the upload_id value and perform any steps necessary before
-        bits can be saved.
+        bits can be saved. Segments may be saved concurrently and in any order.
 
         @param upload_id: upload request ID
         @type  upload_id: str
@@ -72,12 +256,16 @@ class ContentUploadManager(object):
 
         # Make sure the upload was initialized first and hasn't been deleted
         if not os.path.exists(file_path):
+            _upload_files.close(upload_id)
             raise MissingResource(upload_request=upload_id)
 
-        f = open(file_path, 'r+')
-        f.seek(offset)
-        f.write(data)
-        f.close()
+        try:
+            _upload_files.write(upload_id, file_path, offset, data)
+        except OSError as e:
+            if e.errno != ENOENT:
+                raise
+            # deleted since it was checked
+            raise MissingResource(upload_request=upload_id)
 
     def delete_upload(self, upload_id):
         """
@@ -92,6 +280,7 @@ class ContentUploadManager(object):
         """
 
         file_path = ContentUploadManager._upload_file_path(upload_id)
+        _upload_files.close(upload_id)
         try:
             os.remove(file_path)
         except OSError as e:
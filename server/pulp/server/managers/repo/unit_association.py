@@ -53,7 +53,7 @@ class RepoUnitAssociationManager(object):
 
         If there is already an association between the given repo and content
         unit where all other metadata matches the input to this method,
-        this call has no effect.
+        this call only refreshes its updated timestamp.
 
         Both repo and unit must exist in the database prior to this call,
         however this call will not verify that for performance reasons. Care
@@ -76,36 +76,22 @@ class RepoUnitAssociationManager(object):
                                   defaults to True
         @type  update_repo_metadata: bool
 
-        @raise InvalidType: if the given owner type is not of the valid enumeration
+        @return: True if the association was created, False if it already existed
+        @rtype:  bool
+
+        @raise MissingResource: if the repository metadata is updated and the
+                                repository does not exist
         """
+        return bool(self.associate_all_by_ids(repo_id, unit_type_id, [unit_id],
+                                              update_repo_metadata=update_repo_metadata))
 
-        # If the association already exists, no need to do anything else
-        spec = {'repo_id': repo_id,
-                'unit_id': unit_id,
-                'unit_type_id': unit_type_id}
-        existing_association = RepoContentUnit.get_collection().find_one(spec)
-        if existing_association is not None:
-            return
-
-        similar_exists = False
-        if update_repo_metadata:
-            similar_exists = RepoUnitAssociationManager.association_exists(repo_id, unit_id,
-                                                                           unit_type_id)
-
-        # Create the database entry
-        association = RepoContentUnit(repo_id, unit_id, unit_type_id)
-        RepoContentUnit.get_collection().save(association)
-
-        # update the count and times of associated units on the repo object
-        if update_repo_metadata and not similar_exists:
-            repo_controller.update_unit_count(repo_id, unit_type_id, 1)
-            repo_controller.update_last_unit_added(repo_id)
-
-    def associate_all_by_ids(self, repo_id, unit_type_id, unit_id_list):
+    def associate_all_by_ids(self, repo_id, unit_type_id, unit_id_list,
+                             update_repo_metadata=True):
         """
         Creates multiple associations between the given repo and content units.
 
-        See associate_unit_by_id for semantics.
+        See associate_unit_by_id for semantics. The associations are written in
+        bulk and the repository metadata is updated once for all of them.
 
         @param repo_id: identifies the repo
         @type  repo_id: str
@@ -116,27 +102,19 @@ class RepoUnitAssociationManager(object):
         @param unit_id_list: list or generator of unique identifiers for units within the given type
         @type  unit_id_list: list or generator of str
 
+        @param update_repo_metadata: if True, updates the unit association counts
+                                  and the last unit added field of the repo
+                                  when associations are created
+        @type  update_repo_metadata: bool
+
         :return:    number of new units added to the repo
         :rtype:     int
 
-        @raise InvalidType: if the given owner type is not of the valid enumeration
+        @raise MissingResource: if the repository metadata is updated and the
+                                repository does not exist
         """
-
-        # There may be a way to batch this in mongo which would be ideal for a
-        # bulk operation like this. But for deadline purposes, this call will
-        # simply loop and call the single method.
-
-        unique_count = 0
-        for unit_id in unit_id_list:
-            if not RepoUnitAssociationManager.association_exists(repo_id, unit_id, unit_type_id):
-                unique_count += 1
-            self.associate_unit_by_id(repo_id, unit_type_id, unit_id, False)
-
-        # update the count of associated units on the repo object
-        if unique_count:
-            repo_controller.update_unit_count(repo_id, unit_type_id, unique_count)
-            repo_controller.update_last_unit_added(repo_id)
-        return unique_count
+        return repo_controller.associate_unit_ids(repo_id, unit_type_id, unit_id_list,
+                                                  update_repo_metadata=update_repo_metadata)
 
     @staticmethod
     def _units_from_criteria(source_repo, criteria):
@@ -381,24 +359,11 @@ class RepoUnitAssociationManager(object):
             id_list = unit_map.setdefault(unit['unit_type_id'], [])
             id_list.append(unit['unit_id'])
 
-        collection = RepoContentUnit.get_collection()
-
         for unit_type_id, unit_ids in unit_map.items():
-            spec = {
-                'repo_id': repo_id,
-                'unit_type_id': unit_type_id,
-                'unit_id': {'$in': unit_ids}
-            }
-            collection.remove(spec)
-
-            unique_count = sum(
-                1 for unit_id in unit_ids if not RepoUnitAssociationManager.association_exists(
-                    repo_id, unit_id, unit_type_id))
-            if not unique_count:
-                continue
-
-            repo_controller.update_unit_count(repo_id, unit_type_id, -unique_count)
+            repo_controller.disassociate_unit_ids(repo_id, unit_type_id, unit_ids,
+                                                  update_repo_metadata=False)
 
+        repo_controller.rebuild_content_unit_counts(repo)
         repo_controller.update_last_unit_removed(repo_id)
 
         # Match the return type/format as copy
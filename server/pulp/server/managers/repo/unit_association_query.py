@@ -1,11 +1,15 @@
 """
 Contains the manager class for performing queries for repo-unit associations.
 """
+import base64
 import itertools
 
 import pymongo
 
 from pulp.plugins.types import database as types_db
+from pulp.plugins.util.misc import DEFAULT_PAGE_SIZE
+from pulp.server import exceptions
+from pulp.server.compat import json, json_util
 from pulp.server.controllers import units
 from pulp.server.db.model.criteria import UnitAssociationCriteria
 from pulp.server.db.model.repository import RepoContentUnit
@@ -159,6 +163,93 @@ class RepoUnitAssociationQueryManager(object):
         # to a list. Should probably log this. Is there a log-level "stupid"?
         return list(units_generator)
 
+    def get_units_page(self, repo_id, criteria=None):
+        """
+        Get one page of the units associated with the repository based on the
+        provided unit association criteria.
+
+        Pages are read with keyset pagination: the associations are sorted by the
+        association sort of the criteria followed by the unit type and unit ID, which
+        identify an association, and a page resumes after the last association of the
+        previous page, as recorded in the page token of the criteria. Reading page N
+        costs the same as reading the first page, and associations added or removed
+        between two pages do not shift the following pages.
+
+        The limit of the criteria is the page size. Skipping, sorting by unit
+        fields and removing duplicates are not supported.
+
+        :param repo_id: identifies the repository
+        :type  repo_id: str
+
+        :param criteria: if specified will drive the query
+        :type  criteria: UnitAssociationCriteria
+
+        :return: the units of the page, and the token of the next page or None when
+                 no unit follows the page
+        :rtype:  tuple of (list, str or None)
+
+        :raise InvalidValue: if the criteria skips units, sorts by unit fields,
+                             removes duplicates or has a page token that does not
+                             match its sort
+        """
+        criteria = criteria or UnitAssociationCriteria()
+
+        if criteria.skip:
+            raise exceptions.InvalidValue(['skip'])
+        if criteria.unit_sort:
+            raise exceptions.InvalidValue(['sort'])
+        if criteria.remove_duplicates:
+            raise exceptions.InvalidValue(['remove_duplicates'])
+
+        sort = _keyset_sort(criteria.association_sort)
+        limit = criteria.limit or DEFAULT_PAGE_SIZE
+        last = None
+        if criteria.page_token:
+            last = _decode_page_token(criteria.page_token, sort)
+
+        fields = criteria.association_fields
+        if fields is not None:
+            fields = list(set(fields).union(field for field, direction in sort))
+
+        spec = self._unit_associations_spec(repo_id, criteria)
+        collection = RepoContentUnit.get_collection()
+
+        page = []
+        while True:
+            page_spec = spec
+            if last is not None:
+                page_spec = {'$and': [spec, _keyset_spec(sort, last)]}
+            associations = list(collection.find(page_spec, projection=fields).sort(sort)
+                                .limit(limit))
+
+            # Units not matching the unit filters are left out of the page, in which case
+            # the associations following the ones read are read to fill it.
+            unit_ids = {}
+            for association in associations:
+                unit_ids.setdefault(association['unit_type_id'], []).append(
+                    association['unit_id'])
+            units_by_id = {}
+            for unit_type_id, ids in unit_ids.items():
+                for unit in self._associated_units_by_type_cursor(unit_type_id, criteria, ids):
+                    units_by_id[(unit_type_id, unit['_id'])] = unit
+
+            # A batch shorter than the limit holds the last associations.
+            exhausted = len(associations) < limit
+            for index, association in enumerate(associations):
+                last = [association.get(field) for field, direction in sort]
+                unit = units_by_id.get((association['unit_type_id'], association['unit_id']))
+                if unit is None:
+                    continue
+                association['metadata'] = unit
+                page.append(association)
+                if len(page) == limit:
+                    if exhausted and index == len(associations) - 1:
+                        return page, None
+                    return page, _encode_page_token(sort, last)
+
+            if exhausted:
+                return page, None
+
     def get_units_across_types(self, repo_id, criteria=None, as_generator=False):
         """
         DEPRECATED: please use get_units()
@@ -247,14 +338,14 @@ class RepoUnitAssociationQueryManager(object):
     # -- unit association methods ----------------------------------------------
 
     @staticmethod
-    def _unit_associations_cursor(repo_id, criteria):
+    def _unit_associations_spec(repo_id, criteria):
         """
-        Retrieve a pymongo cursor for unit associations for the given repository
+        Build the spec matching the unit associations for the given repository
         that match the given criteria.
 
         :type repo_id: str
         :type criteria: UnitAssociationCriteria
-        :rtype: pymongo.cursor.Cursor
+        :rtype: dict
         """
 
         spec = criteria.association_filters.copy()
@@ -263,6 +354,21 @@ class RepoUnitAssociationQueryManager(object):
         if criteria.type_ids:
             spec['unit_type_id'] = {'$in': criteria.type_ids}
 
+        return spec
+
+    @staticmethod
+    def _unit_associations_cursor(repo_id, criteria):
+        """
+        Retrieve a pymongo cursor for unit associations for the given repository
+        that match the given criteria.
+
+        :type repo_id: str
+        :type criteria: UnitAssociationCriteria
+        :rtype: pymongo.cursor.Cursor
+        """
+
+        spec = RepoUnitAssociationQueryManager._unit_associations_spec(repo_id, criteria)
+
         collection = RepoContentUnit.get_collection()
 
         cursor = collection.find(spec, projection=criteria.association_fields)
@@ -536,3 +642,84 @@ class RepoUnitAssociationQueryManager(object):
                 association = association.copy()
                 association['metadata'] = unit
                 yield association
+
+
+# -- keyset pagination ---------------------------------------------------------
+
+def _keyset_sort(association_sort):
+    """
+    Complete an association sort with the fields identifying an association in a
+    repository, so that the sort is a total order that pages can resume from.
+
+    :param association_sort: ordered list of fields and directions, may be None
+    :type  association_sort: list
+    :return: the association sort followed by the unit type and unit ID, when not
+             already sorted by them
+    :rtype:  list of tuple
+    """
+    sort = [(field, direction) for field, direction in association_sort or []]
+    sorted_fields = [field for field, direction in sort]
+    for field in ('unit_type_id', 'unit_id'):
+        if field not in sorted_fields:
+            sort.append((field, SORT_ASCENDING))
+    return sort
+
+
+def _keyset_spec(sort, last):
+    """
+    Build the spec matching the associations that follow an association in the
+    given sort.
+
+    :param sort: ordered list of fields and directions
+    :type  sort: list of tuple
+    :param last: the values of the sorted fields of the association
+    :type  last: list
+    :rtype: dict
+    """
+    clauses = []
+    for index, (field, direction) in enumerate(sort):
+        clause = dict((f, value) for (f, d), value in zip(sort[:index], last[:index]))
+        operator = '$gt' if direction == SORT_ASCENDING else '$lt'
+        clause[field] = {operator: last[index]}
+        clauses.append(clause)
+    return {'$or': clauses}
+
+
+def _encode_page_token(sort, last):
+    """
+    Encode the position of an association in the given sort as an opaque token.
+
+    :param sort: ordered list of fields and directions
+    :type  sort: list of tuple
+    :param last: the values of the sorted fields of the association
+    :type  last: list
+    :rtype: str
+    """
+    position = {'sort': sort, 'last': last}
+    return base64.urlsafe_b64encode(json.dumps(position, default=json_util.default))
+
+
+def _decode_page_token(page_token, sort):
+    """
+    Decode a token created by _encode_page_token.
+
+    :param page_token: the token
+    :type  page_token: basestring
+    :param sort: the sort of the page being read
+    :type  sort: list of tuple
+    :return: the values of the sorted fields of the last association of the
+             previous page
+    :rtype:  list
+
+    :raise InvalidValue: if the token is not valid or was created for another sort
+    """
+    try:
+        position = json.loads(base64.urlsafe_b64decode(str(page_token)),
+                              object_hook=json_util.object_hook)
+        token_sort = [tuple(s) for s in position['sort']]
+        last = position['last']
+    except (TypeError, ValueError, KeyError):
+        raise exceptions.InvalidValue(['page_token'])
+    if token_sort != sort or not isinstance(last, list) or len(last) != len(sort):
+        raise exceptions.InvalidValue(['page_token'])
+    return last
@@ -3,10 +3,15 @@ This module contains utility code to be used by pulp.server.
 """
 from contextlib import contextmanager
 from gettext import gettext as _
+from multiprocessing.pool import ThreadPool
+from shutil import copyfileobj, copymode, Error
+from threading import Lock
+import errno
+import fcntl
 import hashlib
 import logging
+import mmap
 import os
-from shutil import copy, Error
 
 from pulp.common import error_codes
 
@@ -34,6 +39,18 @@ CHECKSUM_FUNCTIONS = {
     TYPE_SHA256: hashlib.sha256,
 }
 
+# Number of bytes to read into RAM at a time when copying files
+COPY_BUFFER_SIZE = 4 * 1024 * 1024
+
+# Number of files copied in parallel by copytree
+COPY_THREADS = 8
+
+# Number of errors after which copytree gives up
+COPY_ERROR_LIMIT = 100
+
+# ioctl cloning the contents of a file (reflink), from linux/fs.h
+FICLONE = 0x40049409
+
 
 class InvalidChecksumType(ValueError):
     """
@@ -205,7 +222,40 @@ class Delta(dict):
                 self[k] = v
 
 
-def copytree(src, dst, symlinks=False, ignore=None):
+def copy(src, dst, reflink=False):
+    """
+    Copies the contents and permission bits of the src file to dst.
+
+    When reflink is True, the contents are first cloned, which shares the blocks of src with dst
+    until either of them is modified. This is only supported by some filesystems (btrfs, xfs) and
+    only within the same filesystem. Otherwise, the contents are copied using a large buffer.
+
+    :param src: Path to the file to copy
+    :type  src: basestring
+    :param dst: Path to the file to create or overwrite
+    :type  dst: basestring
+    :param reflink: If true, clone the contents if possible
+    :type  reflink: boolean
+
+    :return: True if the contents were cloned, False if they were copied
+    :rtype:  boolean
+    """
+    cloned = False
+    with open(src, 'rb') as src_file:
+        with open(dst, 'wb') as dst_file:
+            if reflink:
+                try:
+                    fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+                    cloned = True
+                except IOError:
+                    pass
+            if not cloned:
+                copyfileobj(src_file, dst_file, COPY_BUFFER_SIZE)
+    copymode(src, dst)
+    return cloned
+
+
+def copytree(src, dst, symlinks=False, ignore=None, link=False):
     """
     Copies src tree to dst
 
@@ -214,6 +264,9 @@ def copytree(src, dst, symlinks=False, ignore=None):
     files from /var/cache/pulp to /var/lib/pulp, we don't want to copy the SELinux security context
     labels.
 
+    The directories are created first, then the files are copied by a pool of threads. The
+    contents of files are cloned when the filesystem supports it, and copied otherwise.
+
     After 100 errors, this function gives up and raises shutil.Error
 
     :param src: Source directory rooted at src
@@ -231,11 +284,66 @@ def copytree(src, dst, symlinks=False, ignore=None):
                    directory (i.e. a subset of the items in its second argument); these names will
                    then be ignored in the copy process.
     :type  ignore: Callable
+    :param link: If true and src and dst are on the same filesystem, files are hard linked instead
+                 of copied. The linked files share their security context labels with the files
+                 in src, so this should only be used when src is itself a published tree.
+    :type  link: boolean
 
     :raises shutil.Error:   If there are one or more errors copying files. After 100 errors, the
                             operation aborts and raises this exception with those errors.
     """
+    files = []
+    errors = _copy_directories(src, dst, symlinks, ignore, files)
+    if files and len(errors) < COPY_ERROR_LIMIT:
+        link = link and os.stat(src).st_dev == os.stat(dst).st_dev
+        errors.extend(_copy_files(files, link, COPY_ERROR_LIMIT - len(errors)))
+    if errors:
+        raise Error(errors)
+
+
+def copytree_to_all(src, dsts, symlinks=False):
+    """
+    Copies src tree to each of the dsts
+
+    The tree is copied once, to the first destination. The other destinations are copied from the
+    first one, hard linking its files when they are on the same filesystem.
 
+    :param src: Source directory rooted at src
+    :type  src: basestring
+    :param dsts: Destination directories, which must not exist
+    :type  dsts: iterable of basestring
+    :param symlinks: If true, symlinks are copied as symlinks
+    :type  symlinks: boolean
+
+    :raises shutil.Error:   If there are one or more errors copying files
+    """
+    first = None
+    for dst in dsts:
+        if first is None:
+            copytree(src, dst, symlinks=symlinks)
+            first = dst
+        else:
+            copytree(first, dst, symlinks=symlinks, link=True)
+
+
+def _copy_directories(src, dst, symlinks, ignore, files):
+    """
+    Creates the directories and symlinks of src tree in dst, and collects the files to copy.
+
+    :param src: Source directory rooted at src
+    :type  src: basestring
+    :param dst: Destination directory
+    :type  dst: basestring
+    :param symlinks: If true, symlinks are copied as symlinks
+    :type  symlinks: boolean
+    :param ignore: If provided, returns the names to ignore in each directory
+    :type  ignore: Callable
+    :param files: The (src, dst) paths of the files to copy are appended to this list
+    :type  files: list
+
+    :return: The (src, dst, reason) of each error
+    :rtype:  list
+    """
     names = os.listdir(src)
     if ignore is not None:
         ignored_names = ignore(src, names)
@@ -254,24 +362,108 @@ def copytree(src, dst, symlinks=False, ignore=None):
                 linkto = os.readlink(srcname)
                 os.symlink(linkto, dstname)
             elif os.path.isdir(srcname):
-                copytree(srcname, dstname, symlinks, ignore)
+                errors.extend(_copy_directories(srcname, dstname, symlinks, ignore, files))
             else:
-                # Copy mtime and atime attributes
-                copy(srcname, dstname)
-                st = os.stat(srcname)
-                os.utime(dstname, (st.st_atime, st.st_mtime))
+                files.append((srcname, dstname))
             # XXX What about devices, sockets etc.?
         except (IOError, os.error) as why:
             errors.append((srcname, dstname, str(why)))
-        # catch the Error from the recursive copytree so that we can
-        # continue with other files
-        except Error as err:
-            errors.extend(err.args[0])
         # give up if there have been too many errors
-        if len(errors) >= 100:
+        if len(errors) >= COPY_ERROR_LIMIT:
             break
-    if errors:
-        raise Error(errors)
+    return errors
+
+
+def _copy_files(files, link, error_limit):
+    """
+    Copies files using a pool of threads.
+
+    :param files: The (src, dst) paths of the files to copy
+    :type  files: list
+    :param link: If true, hard link the files instead of copying them
+    :type  link: boolean
+    :param error_limit: Number of errors after which the copy is aborted
+    :type  error_limit: int
+
+    :return: The (src, dst, reason) of each error
+    :rtype:  list
+    """
+    transfer = _FileTransfer(link, error_limit)
+    pool = ThreadPool(min(COPY_THREADS, len(files)))
+    errors = []
+    try:
+        for error in pool.imap(transfer, files):
+            if error is None:
+                continue
+            errors.append(error)
+            if len(errors) >= error_limit:
+                break
+    finally:
+        pool.terminate()
+        pool.join()
+    return errors
+
+
+class _FileTransfer(object):
+    """
+    Transfers the files of a tree by the fastest way available. Files are hard linked if
+    requested, else their contents are cloned if the filesystem supports it, else copied. A way
+    that fails because the filesystem does not support it is not attempted for the other files.
+
+    Once the error limit is reached, the files that remain are skipped. The pool may already have
+    been handed all of them, so this bounds the transfers attempted after the limit to the ones
+    in progress.
+    """
+
+    def __init__(self, link, error_limit):
+        """
+        :param link: If true, hard link the files
+        :type  link: boolean
+        :param error_limit: Number of errors after which the remaining files are skipped
+        :type  error_limit: int
+        """
+        self.link = link
+        self.reflink = True
+        self.error_limit = error_limit
+        self.errors = 0
+        self.stopped = False
+        self._lock = Lock()
+
+    def __call__(self, paths):
+        """
+        Transfers a file, copying its mtime and atime when it is not hard linked.
+
+        :param paths: The src and dst paths of the file
+        :type  paths: tuple
+
+        :return: The (src, dst, reason) of the error, or None if the file was transferred or
+                 skipped
+        :rtype:  tuple or None
+        """
+        if self.stopped:
+            return None
+        src, dst = paths
+        try:
+            if self.link:
+                try:
+                    os.link(src, dst)
+                    return None
+                except OSError as e:
+                    if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                        raise
+                    if e.errno != errno.EMLINK:
+                        self.link = False
+            if not copy(src, dst, reflink=self.reflink):
+                self.reflink = False
+            # Copy mtime and atime attributes
+            st = os.stat(src)
+            os.utime(dst, (st.st_atime, st.st_mtime))
+        except (IOError, os.error) as why:
+            with self._lock:
+                self.errors += 1
+                if self.errors >= self.error_limit:
+                    self.stopped = True
+            return src, dst, str(why)
 
 
 @contextmanager
@@ -330,6 +522,9 @@ def calculate_checksums(file_object, checksum_types):
     """
     Calculate multiple checksums for the contents of an open file.
 
+    The contents are read once for all the checksum types. Files on disk are memory mapped, so
+    their contents are hashed without being copied.
+
     :param file_object: an open file
     :type  file_object: file
     :param checksum_types: list of checksum types. Must be in CHECKSUM_FUNCTIONS.
@@ -346,10 +541,42 @@ def calculate_checksums(file_object, checksum_types):
             raise InvalidChecksumType('Unknown checksum type [%s]' % checksum_type)
 
     file_object.seek(0)
-    bits = file_object.read(CHECKSUM_CHUNK_SIZE)
-    while bits:
-        for hasher in hashers.values():
-            hasher.update(bits)
+    mapped = _map_file(file_object)
+    if mapped is not None:
+        try:
+            for offset in xrange(0, len(mapped), CHECKSUM_CHUNK_SIZE):
+                bits = buffer(mapped, offset, CHECKSUM_CHUNK_SIZE)
+                for hasher in hashers.values():
+                    hasher.update(bits)
+        finally:
+            mapped.close()
+        file_object.seek(0, os.SEEK_END)
+    else:
         bits = file_object.read(CHECKSUM_CHUNK_SIZE)
+        while bits:
+            for hasher in hashers.values():
+                hasher.update(bits)
+            bits = file_object.read(CHECKSUM_CHUNK_SIZE)
 
     return dict((checksum_type, hasher.hexdigest()) for checksum_type, hasher in hashers.items())
+
+
+def _map_file(file_object):
+    """
+    Memory map the contents of an open file for reading.
+
+    :param file_object: an open file
+    :type  file_object: file
+
+    :return:    the mapped contents, or None if the file is not a non-empty file on disk
+    :rtype:     mmap.mmap or None
+    """
+    try:
+        fileno = file_object.fileno()
+    except (AttributeError, IOError, ValueError):
+        return None
+    try:
+        return mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+    except (EnvironmentError, ValueError):
+        # empty files, pipes and files not opened for reading cannot be mapped
+        return None
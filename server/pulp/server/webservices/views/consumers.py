@@ -1,6 +1,7 @@
 from django.core.urlresolvers import reverse
 from django.http import HttpResponseBadRequest
 from django.views.generic import View
+from pymongo.errors import OperationFailure
 
 from pulp.common import tags
 from pulp.server.async.tasks import TaskResult
@@ -15,7 +16,8 @@ from pulp.server.managers.consumer import bind
 from pulp.server.managers.consumer import profile
 from pulp.server.managers.consumer import query as query_manager
 from pulp.server.managers.consumer.applicability import (regenerate_applicability_for_consumers,
-                                                         retrieve_consumer_applicability)
+                                                         retrieve_consumer_applicability,
+                                                         stream_consumer_applicability)
 from pulp.server.managers.schedule.consumer import (UNIT_INSTALL_ACTION, UNIT_UNINSTALL_ACTION,
                                                     UNIT_UPDATE_ACTION)
 from pulp.server.webservices.views import search
@@ -25,7 +27,9 @@ from pulp.server.webservices.views.util import (_ensure_input_encoding,
                                                 generate_json_response,
                                                 generate_json_response_with_pulp_encoder,
                                                 generate_redirect_response,
-                                                parse_json_body)
+                                                generate_streaming_json_response,
+                                                parse_json_body,
+                                                pulp_json_encoder)
 
 
 def add_link(consumer):
@@ -290,14 +294,14 @@ class ConsumerSearchView(search.SearchView):
     manager = query_manager.ConsumerQueryManager()
 
     @classmethod
-    def get_results(cls, query, search_method, options, *args):
+    def _process_results(cls, results, query, options, *args, **kwargs):
         """
         This overrides the base class implementation so we can include optional information.
 
-        :param query: The criteria that should be used to search for objects
+        :param results: consumers found by the query
+        :type  results: list
+        :param query: The criteria that was used to search for objects
         :type  query: dict
-        :param search_method: function that should be used to search
-        :type  search_method: func
         :param options: additional options for including extra data. In this case, this can contain
                         only 'details' and 'bindings' as keys.
         :type  options: dict
@@ -305,7 +309,6 @@ class ConsumerSearchView(search.SearchView):
         :return: results, expanded and serialized
         :rtype:  list
         """
-        results = list(search_method(query))
         results = expand_consumers(options.get('details', False),
                                    options.get('bindings', False),
                                    results)
@@ -812,7 +815,10 @@ class ConsumerContentApplicabilityView(View):
         Query content applicability for a given consumer criteria query.
 
         body {criteria: <object>,
-              content_types: <array>[optional]}
+              content_types: <array>[optional],
+              stream: <boolean>[optional],
+              skip: <integer>[optional],
+              limit: <integer>[optional]}
 
         This method returns a JSON document containing an array of objects that each have two
         keys: 'consumers', and 'applicability'. 'consumers' will index an array of consumer_ids,
@@ -825,6 +831,11 @@ class ConsumerContentApplicabilityView(View):
          {'consumers': ['consumer_2', 'consumer_3'],
           'applicability': {'content_type_1': ['unit_1', 'unit_2']}}]
 
+        When 'stream' is true, the consumers are grouped into consumer sets of consumers that
+        have the same profiles and repository bindings, each consumer appearing in a single set,
+        and the report is streamed as it is generated. 'skip' and 'limit' page through the
+        consumer sets of a streamed report.
+
         :param request: WSGI request object
         :type request: django.core.handlers.wsgi.WSGIRequest
 
@@ -838,9 +849,22 @@ class ConsumerContentApplicabilityView(View):
         try:
             consumer_criteria = self._get_consumer_criteria(request)
             content_types = self._get_content_types(request)
+            stream, skip, limit = self._get_stream_options(request)
         except InvalidValue, e:
             return HttpResponseBadRequest(str(e))
 
+        if stream:
+            # The consumers and the first page of the report are queried before the response is
+            # returned, so that an invalid criteria is reported with an error status.
+            try:
+                report = search._started(stream_consumer_applicability(
+                    consumer_criteria, content_types, skip, limit))
+            except OperationFailure, e:
+                invalid = InvalidValue('criteria')
+                invalid.add_child_exception(e)
+                return HttpResponseBadRequest(str(invalid))
+            return generate_streaming_json_response(report, default=pulp_json_encoder)
+
         response = retrieve_consumer_applicability(consumer_criteria, content_types)
         return generate_json_response_with_pulp_encoder(response)
 
@@ -890,6 +914,37 @@ class ConsumerContentApplicabilityView(View):
 
         return content_types
 
+    def _get_stream_options(self, request):
+        """
+        Get whether the caller wishes the report to be streamed, and the page of consumer sets
+        to stream.
+
+        :param request: WSGI request object
+        :type request: django.core.handlers.wsgi.WSGIRequest
+
+        :raises InvalidValue: if some parameters were invalid
+
+        :return: whether to stream the report, the number of consumer sets to skip and the
+                 maximum number of consumer sets to report or None
+        :rtype:  tuple
+        """
+        body = request.body_as_json
+
+        stream = body.get('stream', False)
+        if not isinstance(stream, bool):
+            raise InvalidValue('stream must be a boolean.')
+        skip = body.get('skip', 0)
+        limit = body.get('limit', None)
+        if not isinstance(skip, int) or isinstance(skip, bool) or skip < 0:
+            raise InvalidValue('skip must be a non-negative integer.')
+        if limit is not None:
+            if not isinstance(limit, int) or isinstance(limit, bool) or limit < 1:
+                raise InvalidValue('limit must be a positive integer.')
+        if not stream and (skip or limit is not None):
+            raise InvalidValue('skip and limit are only supported when stream is true.')
+
+        return stream, skip, limit
+
 
 class ConsumerContentApplicRegenerationView(View):
     """
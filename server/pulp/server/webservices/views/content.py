@@ -281,18 +281,24 @@ class ContentUnitSearch(search.SearchView):
         return units
 
     @classmethod
-    def get_results(cls, query, search_method, options, *args, **kwargs):
+    def _search(cls, query, search_method, options, *args, **kwargs):
         """
-        Overrides the base class so additional information can optionally be added.
+        Overrides the base class to search the units of the requested type.
         """
-
         type_id = kwargs['type_id']
         serializer = units_controller.get_model_serializer_for_type(type_id)
         if serializer and query.get('filters') is not None:
             # if we have a model serializer, translate the filter for this content unit type
             query['filters'] = serializer.translate_filters(serializer.model, query['filters'])
-        units = list(search_method(type_id, query))
-        units = [_process_content_unit(unit, type_id) for unit in units]
+        return search_method(type_id, query)
+
+    @classmethod
+    def _process_results(cls, results, query, options, *args, **kwargs):
+        """
+        Overrides the base class so additional information can optionally be added.
+        """
+        type_id = kwargs['type_id']
+        units = [_process_content_unit(unit, type_id) for unit in results]
         if options.get('include_repos') is True:
             cls._add_repo_memberships(units, type_id)
         return units
@@ -5,11 +5,11 @@ This module contains decorators for Pulp views.
 import logging
 
 from pulp.common import error_codes
+from pulp.server.auth import permission_cache
 from pulp.server.auth.authorization import CREATE, READ, UPDATE, DELETE, EXECUTE, OPERATION_NAMES
 from pulp.server.config import config
 from pulp.server.compat import wraps
 from pulp.server.controllers import user as user_controller
-from pulp.server.db import model
 from pulp.server.exceptions import PulpCodedAuthenticationException
 from pulp.server.managers import factory
 from pulp.server.webservices import http
@@ -168,7 +168,8 @@ def _verify_auth(self, operation, super_user_only, method, *args, **kwargs):
 
     # Consumers are not part of the User collection
     if not is_consumer:
-        user = model.User.objects.get(login=login)
+        entry = permission_cache.get(login)
+        user = entry.user
         if super_user_only and not user.is_superuser():
             raise PulpCodedAuthenticationException(error_code=error_codes.PLP0026, user=login,
                                                    operation=OPERATION_NAMES[operation])
@@ -183,8 +184,7 @@ def _verify_auth(self, operation, super_user_only, method, *args, **kwargs):
                 raise PulpCodedAuthenticationException(error_code=error_codes.PLP0026,
                                                        user=login,
                                                        operation=OPERATION_NAMES[operation])
-        elif user_controller.is_authorized(http.resource_path(), login, operation):
-            user = model.User.objects.get(login=login)
+        elif user_controller.is_authorized_entry(entry, http.resource_path(), operation):
             principal_manager.set_principal(user)
         else:
             raise PulpCodedAuthenticationException(error_code=error_codes.PLP0026,
@@ -1,4 +1,7 @@
+import functools
+
 import isodate
+from pymongo.errors import OperationFailure
 
 from django.core.urlresolvers import reverse
 from django.views.generic import View
@@ -23,7 +26,8 @@ from pulp.server.webservices.views.serializers import content
 from pulp.server.webservices.views.util import (generate_json_response,
                                                 generate_json_response_with_pulp_encoder,
                                                 generate_redirect_response,
-                                                parse_json_body)
+                                                generate_streaming_json_response,
+                                                parse_json_body, pulp_json_encoder)
 
 
 def _merge_related_objects(name, model, repos):
@@ -79,6 +83,21 @@ def _process_repos(repo_objs, details, importers, distributors):
     return repos
 
 
+def _serialize_units(units):
+    """
+    Serialize the metadata of repository units as they are iterated.
+
+    :param units: units associated with a repository
+    :type  units: iterable of dict
+
+    :return: the same units, serialized
+    :rtype:  generator
+    """
+    for unit in units:
+        content.serialize_unit_with_serializer(unit['metadata'])
+        yield unit
+
+
 class ReposView(View):
     """
     View for all repos.
@@ -232,23 +251,21 @@ class RepoSearch(search.SearchView):
     response_builder = staticmethod(generate_json_response_with_pulp_encoder)
 
     @classmethod
-    def get_results(cls, query, search_method, options, *args, **kwargs):
+    def _process_results(cls, results, query, options, *args, **kwargs):
         """
         This overrides the base class's implementation so we can optionally include extra data.
 
-
-        :param query: The criteria that should be used to search for objects
+        :param results: repositories found by the query
+        :type  results: list
+        :param query: The criteria that was used to search for objects
         :type  query: dict
-        :param search_method: function that should be used to search
-        :type  search_method: func
         :param options: additional options for including extra data
         :type  options: dict
 
         :return: processed results of the query
         :rtype:  list
         """
-        only = query.get('fields', [])
-        results = list(search_method(query))
+        only = list(query.get('fields') or [])
         results = _process_repos(results, options.get('details', False),
                                  options.get('importers', False),
                                  options.get('distributors', False))
@@ -272,6 +289,10 @@ class RepoUnitSearch(search.SearchView):
         This overrides the base class so we can validate repo existance and to choose the search
         method depending on how many unit types we are dealing with.
 
+        When the query contains a page token, one page of units is returned along with the token
+        of the next page, which is null when no unit follows the page. An empty token requests
+        the first page.
+
         :param query: The criteria that should be used to search for objects
         :type  query: dict
         :param options: additional options for including extra data
@@ -282,13 +303,32 @@ class RepoUnitSearch(search.SearchView):
         """
         repo_id = kwargs.get('repo_id')
         model.Repository.objects.get_repo_or_missing_resource(repo_id)
+        paged = 'page_token' in query
         criteria = UnitAssociationCriteria.from_client_input(query)
         manager = manager_factory.repo_unit_association_query_manager()
+        if paged:
+            units, next_page_token = manager.get_units_page(repo_id, criteria=criteria)
+            for unit in units:
+                content.serialize_unit_with_serializer(unit['metadata'])
+            return generate_json_response_with_pulp_encoder(
+                {'units': units, 'next_page_token': next_page_token})
         if criteria.type_ids is not None and len(criteria.type_ids) == 1:
             type_id = criteria.type_ids[0]
-            units = manager.get_units_by_type(repo_id, type_id, criteria=criteria)
+            get_units = functools.partial(manager.get_units_by_type, repo_id, type_id)
         else:
-            units = manager.get_units(repo_id, criteria=criteria)
+            get_units = functools.partial(manager.get_units, repo_id)
+        if options.get(search.STREAM_OPTION):
+            # The first unit is read before the response is returned, so that an invalid
+            # criteria is reported with an error status rather than in a truncated response.
+            try:
+                units = get_units(criteria=criteria, as_generator=True)
+                units = search._started(_serialize_units(units))
+            except OperationFailure, e:
+                invalid = exceptions.InvalidValue('criteria')
+                invalid.add_child_exception(e)
+                raise invalid
+            return generate_streaming_json_response(units, default=pulp_json_encoder)
+        units = get_units(criteria=criteria)
         for unit in units:
             content.serialize_unit_with_serializer(unit['metadata'])
         return generate_json_response_with_pulp_encoder(units)
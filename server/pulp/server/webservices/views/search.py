@@ -2,11 +2,13 @@
 This module contains the SearchView superclass. Your view code should subclass this to create a
 search view for a specific model.
 """
+import itertools
 import json
 
 from django.views import generic
 from pymongo.errors import OperationFailure
 
+from pulp.plugins.util import misc
 from pulp.server import exceptions
 from pulp.server.auth import authorization
 from pulp.server.db.model import criteria
@@ -14,6 +16,13 @@ from pulp.server.webservices.views import util
 from pulp.server.webservices.views.decorators import auth_required
 
 
+# Option selecting a streaming response, supported by every search view.
+STREAM_OPTION = 'stream'
+
+# Number of search results read from the database and serialized at a time when streaming.
+STREAM_BATCH_SIZE = 1000
+
+
 class SearchView(generic.View):
     """
     This class is meant to be subclassed by views that need to provide search functionality on a
@@ -46,6 +55,10 @@ class SearchView(generic.View):
                                model instance, sane serializers are used by default, and this
                                method should not be defined.
     :vartype serializer:       staticmethod
+
+    Every search view accepts the boolean "stream" option. When it is true, the results are read
+    from the database, serialized and sent to the caller in batches of STREAM_BATCH_SIZE rather
+    than all at once, as a JSON array in a streaming response.
     """
 
     response_builder = staticmethod(util.generate_json_response_with_pulp_encoder)
@@ -64,7 +77,8 @@ class SearchView(generic.View):
         :rtype:  tuple containing a 2 dicts
         """
         options = {}
-        for field in filter(args.__contains__, cls.optional_bool_fields):
+        bool_fields = cls.optional_bool_fields + (STREAM_OPTION,)
+        for field in filter(args.__contains__, bool_fields):
             value = args.pop(field)
             if isinstance(value, basestring):
                 options[field] = value.lower() == 'true'
@@ -191,6 +205,10 @@ class SearchView(generic.View):
         # We do not validate all aspects of the criteria object, so if pymongo has a problem we
         # raise an InvalidValue.
         try:
+            if options.get(STREAM_OPTION):
+                results = cls.iter_results(query, search_method, options, *args, **kwargs)
+                return util.generate_streaming_json_response(_started(results),
+                                                             default=util.pulp_json_encoder)
             return cls.response_builder(cls.get_results(query, search_method, options,
                                                         *args, **kwargs))
         except OperationFailure, e:
@@ -214,11 +232,85 @@ class SearchView(generic.View):
         :return: search results
         :rtype:  list
         """
+        results = list(cls._search(query, search_method, options, *args, **kwargs))
+        return cls._process_results(results, query, options, *args, **kwargs)
+
+    @classmethod
+    def iter_results(cls, query, search_method, options, *args, **kwargs):
+        """
+        Like get_results(), but the results are read from the database and processed in batches
+        of STREAM_BATCH_SIZE as they are consumed.
+
+        :param query: The criteria that should be used to search for objects
+        :type  query: dict
+        :param search_method: function that should be used to search
+        :type  search_method: func
+        :param options: additional options for including extra data
+        :type  options: dict
+
+        :return: search results
+        :rtype:  generator
+        """
+        results = cls._search(query, search_method, options, *args, **kwargs)
+        for page in misc.paginate(results, STREAM_BATCH_SIZE):
+            for result in cls._process_results(list(page), query, options, *args, **kwargs):
+                yield result
+
+    @classmethod
+    def _search(cls, query, search_method, options, *args, **kwargs):
+        """
+        Search using the class's search method. This method can be overridden to modify the query
+        or to call the search method differently.
+
+        :param query: The criteria that should be used to search for objects
+        :type  query: dict
+        :param search_method: function that should be used to search
+        :type  search_method: func
+        :param options: additional options for including extra data
+        :type  options: dict
+
+        :return: search results, read from the database as they are iterated
+        :rtype:  iterable
+        """
+        return search_method(query)
+
+    @classmethod
+    def _process_results(cls, results, query, options, *args, **kwargs):
+        """
+        Serialize search results. This method can be overridden to modify the results.
+
+        :param results: search results
+        :type  results: list
+        :param query: The criteria that was used to search for objects
+        :type  query: dict
+        :param options: additional options for including extra data
+        :type  options: dict
+
+        :return: processed search results
+        :rtype:  list
+        """
         only = query.get('fields')
-        results = list(search_method(query))
         return cls._serialize_results(results, only=only)
 
 
+def _started(results):
+    """
+    Start a generator of search results, so that errors running the query are raised before the
+    response streaming the results is returned.
+
+    :param results: search results
+    :type  results: generator
+
+    :return: the same search results
+    :rtype:  iterable
+    """
+    try:
+        first = next(results)
+    except StopIteration:
+        return []
+    return itertools.chain([first], results)
+
+
 def _trim_results(model, results, only):
     """
     Remove key/value pairs from results that are not required or specified by `fields`.
@@ -1,13 +1,18 @@
 """
 This module contains views related to Pulp's task groups.
 """
+import time
+import uuid
+
 from django.views.generic import View
 
 from pulp.common.constants import CALL_STATES
 from pulp.server.async import tasks
 from pulp.server.auth import authorization
+from pulp.server.config import config
 from pulp.server.db.model import TaskStatus
 from pulp.server.exceptions import MissingResource
+from pulp.server.managers.consumer.applicability import summarize_regeneration_progress
 from pulp.server.webservices.views.decorators import auth_required
 from pulp.server.webservices.views.util import generate_json_response, \
     generate_json_response_with_pulp_encoder
@@ -37,7 +42,7 @@ class TaskGroupView(View):
     @auth_required(authorization.DELETE)
     def delete(self, request, group_id):
         """
-        Dispatch tasks.cancel to delete tasks in a single task_group.
+        Cancel the tasks of a single task_group.
 
         :param request: WSGI request object
         :type  request: django.core.handlers.wsgi.WSGIRequest
@@ -52,8 +57,7 @@ class TaskGroupView(View):
         if not raw_tasks:
             raise MissingResource
 
-        for task in raw_tasks:
-            tasks.cancel(task.task_id)
+        tasks.cancel_group(group_id)
         return generate_json_response(None)
 
 
@@ -75,10 +79,92 @@ class TaskGroupSummaryView(View):
         :return: Response containing a serialized dict of the task group summary
         :rtype : django.http.HttpResponse
         """
-        tasks = TaskStatus.objects(group_id=group_id)
-        task_group_total = tasks.count()
-
-        summary = {'total': task_group_total}
-        for state in CALL_STATES:
-            summary[state] = tasks.filter(state=state).count()
+        summary = _summaries.get(group_id)
+        if summary is None:
+            summary = _summarize(group_id)
+            _summaries.add(group_id, summary)
         return generate_json_response_with_pulp_encoder(summary)
+
+
+def _summarize(group_id):
+    """
+    Summarize the states of the tasks of a task group, counted by a single aggregation, and the
+    progress of its applicability regeneration tasks.
+
+    :param group_id: The ID of the task group you wish to summarize
+    :type  group_id: basestring
+
+    :return: The number of tasks in each state, the total number of tasks and the
+             applicability regeneration progress, if any
+    :rtype:  dict
+    """
+    summary = dict((state, 0) for state in CALL_STATES)
+    summary['total'] = 0
+    counts = TaskStatus._get_collection().aggregate([
+        {'$match': {'group_id': uuid.UUID(group_id)}},
+        {'$group': {'_id': '$state', 'count': {'$sum': 1}}}])
+    for count in counts:
+        if count['_id'] in summary:
+            summary[count['_id']] = count['count']
+        summary['total'] += count['count']
+    regenerations = TaskStatus.objects(group_id=group_id,
+                                       progress_report__applicability__exists=True)
+    applicability = summarize_regeneration_progress(
+        regenerations.only('progress_report', 'start_time', 'finish_time'))
+    if applicability is not None:
+        summary['applicability'] = applicability
+    return summary
+
+
+class SummaryCache(object):
+    """
+    Keeps the summaries of task groups for the number of seconds set by the 'group_summary_ttl'
+    setting of the [tasks] section of server.conf, so that dashboards polling large task groups
+    do not summarize them again on every request. Summaries are not kept when it is 0.
+    """
+
+    def __init__(self):
+        # (time added, summary) by task group ID
+        self._summaries = {}
+
+    def get(self, group_id):
+        """
+        :param group_id: The ID of a task group
+        :type  group_id: basestring
+
+        :return: The summary of the task group, or None if it is not kept or has expired
+        :rtype:  dict
+        """
+        entry = self._summaries.get(group_id)
+        if entry is None or time.time() - entry[0] >= self.ttl():
+            return None
+        return entry[1]
+
+    def add(self, group_id, summary):
+        """
+        Keep the summary of a task group and drop the expired ones.
+
+        :param group_id: The ID of a task group
+        :type  group_id: basestring
+        :param summary: The summary of the task group
+        :type  summary: dict
+        """
+        ttl = self.ttl()
+        if ttl <= 0:
+            return
+        now = time.time()
+        for key, entry in self._summaries.items():
+            if now - entry[0] >= ttl:
+                self._summaries.pop(key, None)
+        self._summaries[group_id] = (now, summary)
+
+    @staticmethod
+    def ttl():
+        """
+        :return: The number of seconds summaries are kept
+        :rtype:  float
+        """
+        return config.getfloat('tasks', 'group_summary_ttl')
+
+
+_summaries = SummaryCache()
@@ -6,7 +6,7 @@ import httplib
 import json
 import sys
 
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from django.utils.encoding import iri_to_uri
 
 from pulp.common import dateutils, error_codes
@@ -65,6 +65,32 @@ generate_json_response_with_pulp_encoder = functools.partial(
 )
 
 
+def generate_streaming_json_response(items, default=None,
+                                     content_type='application/json; charset=utf-8'):
+    """
+    Serialize the items of an iterable as a JSON array in a streaming django response, so the
+    items are serialized as they are consumed by the server instead of all at once.
+
+    :param items          : the items to serialize
+    :type  items          : iterable of anything that is serializable by json.dumps
+    :param default        : function used by json.dumps to serialize content (also called default)
+    :type  default        : function or None
+    :param content_type   : type of returned content
+    :type  content_type   : str
+
+    :return               : response streaming the serialized items
+    :rtype                : django.http.StreamingHttpResponse
+    """
+    def chunks():
+        separator = '['
+        for item in items:
+            yield separator + json.dumps(item, default=default)
+            separator = ','
+        yield ']' if separator == ',' else '[]'
+
+    return StreamingHttpResponse(chunks(), content_type=content_type)
+
+
 def generate_redirect_response(response, href):
     response['Location'] = iri_to_uri(href)
     response.status_code = httplib.CREATED
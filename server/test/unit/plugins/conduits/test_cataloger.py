@@ -1,5 +1,7 @@
 from uuid import uuid4
 
+from mock import patch
+
 from ... import base
 from pulp.plugins.conduits.cataloger import CatalogerConduit
 from pulp.server.db.model.content import ContentCatalog
@@ -39,6 +41,10 @@ class TestCatalogerConduit(base.PulpServerTests):
         for unit_key, url in units:
             conduit.add_entry(TYPE_ID, unit_key, url)
         collection = ContentCatalog.get_collection()
+        self.assertEqual(collection.find().count(), 0)
+        self.assertEqual(conduit.added_count, 0)
+        conduit.flush()
+        self.assertEqual(conduit.pending, [])
         self.assertEqual(conduit.source_id, SOURCE_ID)
         self.assertEqual(conduit.expires, EXPIRES)
         self.assertEqual(len(units), collection.find().count())
@@ -56,6 +62,7 @@ class TestCatalogerConduit(base.PulpServerTests):
         conduit = CatalogerConduit(SOURCE_ID, EXPIRES)
         for unit_key, url in units:
             conduit.add_entry(TYPE_ID, unit_key, url)
+        conduit.flush()
         collection = ContentCatalog.get_collection()
         self.assertEqual(len(units), collection.find().count())
         unit_key, url = units[5]
@@ -71,10 +78,26 @@ class TestCatalogerConduit(base.PulpServerTests):
         entry = collection.find_one({'locator': locator})
         self.assertTrue(entry is None)
 
+    @patch('pulp.plugins.conduits.cataloger.BATCH_SIZE', 4)
+    def test_add_batched(self):
+        units = self.units(0, 10)
+        conduit = CatalogerConduit(SOURCE_ID, EXPIRES)
+        for unit_key, url in units:
+            conduit.add_entry(TYPE_ID, unit_key, url)
+        collection = ContentCatalog.get_collection()
+        self.assertEqual(collection.find().count(), 8)
+        self.assertEqual(len(conduit.pending), 2)
+        self.assertEqual(conduit.added_count, 8)
+        conduit.flush()
+        self.assertEqual(collection.find().count(), len(units))
+        self.assertEqual(conduit.added_count, len(units))
+
     def test_reset(self):
         conduit = CatalogerConduit(SOURCE_ID, EXPIRES)
         conduit.added_count = 10
         conduit.deleted_count = 10
+        conduit.pending = [(TYPE_ID, {}, 'url')]
         conduit.reset()
         self.assertEqual(conduit.added_count, 0)
         self.assertEqual(conduit.deleted_count, 0)
+        self.assertEqual(conduit.pending, [])
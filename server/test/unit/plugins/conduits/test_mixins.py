@@ -248,6 +248,38 @@ class SingleRepoUnitsMixinTests(unittest.TestCase):
         # Test
         self.assertRaises(mixins.DistributorConduitException, self.mixin.get_units)
 
+    @mock.patch('pulp.server.controllers.units.get_unit_key_fields_for_type', spec_set=True)
+    @mock.patch('pulp.server.managers.repo.unit_association_query.'
+                'RepoUnitAssociationQueryManager.get_units_page')
+    def test_get_units_page(self, mock_query_call, mock_get_unit_key_fields):
+        # Setup
+        mock_query_call.return_value = ([
+            {'unit_type_id': 'type-1', 'metadata': {'m': 'm1', 'k1': 'v1'}},
+            {'unit_type_id': 'type-2', 'metadata': {'m': 'm1', 'k1': 'v2'}},
+        ], 'next-page')
+
+        mock_get_unit_key_fields.return_value = ('k1',)
+
+        fake_criteria = 'fake-criteria'
+
+        # Test
+        units, next_page_token = self.mixin.get_units_page(criteria=fake_criteria)
+
+        # Verify
+        self.assertEqual(2, len(units))
+        self.assertEqual(units[0].unit_key, {'k1': 'v1'})
+        self.assertEqual(next_page_token, 'next-page')
+        mock_query_call.assert_called_once_with(self.repo_id, criteria=fake_criteria)
+
+    @mock.patch('pulp.server.managers.repo.unit_association_query.'
+                'RepoUnitAssociationQueryManager.get_units_page')
+    def test_get_units_page_server_error(self, mock_query_call):
+        # Setup
+        mock_query_call.side_effect = Exception()
+
+        # Test
+        self.assertRaises(mixins.DistributorConduitException, self.mixin.get_units_page)
+
 
 class MultipleRepoUnitsMixinTests(unittest.TestCase):
 
@@ -289,6 +321,28 @@ class MultipleRepoUnitsMixinTests(unittest.TestCase):
         # Test
         self.assertRaises(mixins.ImporterConduitException, self.mixin.get_units, 'foo')
 
+    @mock.patch('pulp.server.controllers.units.get_unit_key_fields_for_type', spec_set=True)
+    @mock.patch('pulp.server.managers.repo.unit_association_query.'
+                'RepoUnitAssociationQueryManager.get_units_page')
+    def test_get_units_page(self, mock_query_call, mock_get_unit_key_fields):
+        # Setup
+        mock_query_call.return_value = ([
+            {'unit_type_id': 'type-1', 'metadata': {'m': 'm1', 'k1': 'v1'}},
+        ], None)
+
+        mock_get_unit_key_fields.return_value = ('k1',)
+
+        fake_criteria = 'fake-criteria'
+
+        # Test
+        repo_id = 'mr-repo'
+        units, next_page_token = self.mixin.get_units_page(repo_id, criteria=fake_criteria)
+
+        # Verify
+        self.assertEqual(1, len(units))
+        self.assertEqual(next_page_token, None)
+        mock_query_call.assert_called_once_with(repo_id, criteria=fake_criteria)
+
 
 class SearchUnitsMixinTests(unittest.TestCase):
 
@@ -46,3 +46,36 @@ class ImportUnitConduitTests(base.PulpServerTests):
 
         # Verify the correct propagation to the mixin method
         mock_get.assert_called_once_with(self.dest_repo_id, criteria, ImporterConduitException)
+
+    def test_associate_unit(self):
+        manager = mock.MagicMock()
+        self.conduit._ImportUnitConduit__association_manager = manager
+        unit = mock.MagicMock(type_id='t', id='u1')
+
+        self.assertTrue(self.conduit.associate_unit(unit) is unit)
+
+        manager.associate_unit_by_id.assert_called_once_with(
+            self.dest_repo_id, 't', 'u1', update_repo_metadata=False)
+
+    def test_associate_units(self):
+        manager = mock.MagicMock()
+        self.conduit._ImportUnitConduit__association_manager = manager
+        units = [mock.MagicMock(type_id='t1', id='u1'), mock.MagicMock(type_id='t2', id='u2'),
+                 mock.MagicMock(type_id='t1', id='u3')]
+
+        associated = self.conduit.associate_units(iter(units))
+
+        self.assertEqual(associated, units)
+        self.assertEqual(manager.associate_all_by_ids.call_count, 2)
+        manager.associate_all_by_ids.assert_any_call(
+            self.dest_repo_id, 't1', ['u1', 'u3'], update_repo_metadata=False)
+        manager.associate_all_by_ids.assert_any_call(
+            self.dest_repo_id, 't2', ['u2'], update_repo_metadata=False)
+
+    def test_associate_units_error(self):
+        manager = mock.MagicMock()
+        manager.associate_all_by_ids.side_effect = Exception()
+        self.conduit._ImportUnitConduit__association_manager = manager
+
+        self.assertRaises(ImporterConduitException, self.conduit.associate_units,
+                          [mock.MagicMock(type_id='t1', id='u1')])
@@ -5,6 +5,7 @@ import unittest
 import mock
 
 from pulp.plugins.util import manifest_writer
+from pulp.server.util import TYPE_SHA256
 
 
 @contextlib.contextmanager
@@ -57,18 +58,16 @@ class TestMakeManifestForDir(unittest.TestCase):
     @mock.patch('os.path.getsize', return_value=17)
     @mock.patch('os.listdir', spec_set=True)
     @mock.patch('__builtin__.open', spec_set=True)
-    @mock.patch.object(manifest_writer, 'get_sha256_checksum', spec_set=True)
-    def test_value(self, mock_checksum, mock_open, mock_listdir, mock_getsize, mock_isfile):
+    @mock.patch.object(manifest_writer.checksums, 'calculate_many', spec_set=True)
+    def test_value(self, mock_checksums, mock_open, mock_listdir, mock_getsize, mock_isfile):
         mock_listdir.return_value = ['a', 'b']
-        mock_checksum.return_value = 'greatchecksum'
+        mock_checksums.return_value = [{TYPE_SHA256: 'greatchecksum'}] * 2
         fake_file = StringIO()
         mock_open.return_value = giveitback(fake_file)
 
         manifest_writer.make_manifest_for_dir(('/foo/'))
 
-        mock_checksum.assert_any_call('/foo/a')
-        mock_checksum.assert_any_call('/foo/b')
-        self.assertEqual(mock_checksum.call_count, 2)
+        mock_checksums.assert_called_once_with(['/foo/a', '/foo/b'], [TYPE_SHA256])
 
         expected = 'a,greatchecksum,17\r\nb,greatchecksum,17\r\n'
 
@@ -78,16 +77,16 @@ class TestMakeManifestForDir(unittest.TestCase):
     @mock.patch('os.path.getsize', return_value=17)
     @mock.patch('os.listdir', spec_set=True)
     @mock.patch('__builtin__.open', spec_set=True)
-    @mock.patch.object(manifest_writer, 'get_sha256_checksum', spec_set=True)
-    def test_skip_dirs(self, mock_checksum, mock_open, mock_listdir, mock_getsize, mock_isfile):
+    @mock.patch.object(manifest_writer.checksums, 'calculate_many', spec_set=True)
+    def test_skip_dirs(self, mock_checksums, mock_open, mock_listdir, mock_getsize, mock_isfile):
         mock_listdir.return_value = ['a', 'b']
-        mock_checksum.return_value = 'greatchecksum'
+        mock_checksums.return_value = [{TYPE_SHA256: 'greatchecksum'}]
         fake_file = StringIO()
         mock_open.return_value = giveitback(fake_file)
 
         manifest_writer.make_manifest_for_dir('/foo/')
 
-        mock_checksum.assert_called_once_with('/foo/b')
+        mock_checksums.assert_called_once_with(['/foo/b'], [TYPE_SHA256])
 
         expected = 'b,greatchecksum,17'
 
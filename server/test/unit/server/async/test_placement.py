@@ -0,0 +1,86 @@
+import unittest
+
+import mock
+
+from pulp.server.async import placement
+from pulp.server.async.placement import (AffinityPolicy, Candidate, LeastOutstandingPolicy,
+                                         WeightedPolicy, WorkerSelectionPolicy)
+
+
+MODULE = 'pulp.server.async.placement'
+
+
+class TestCandidate(unittest.TestCase):
+
+    def test_load(self):
+        self.assertEqual(Candidate('w1', 1, 4).load, 0.25)
+        self.assertEqual(Candidate('w1', 0, 1).load, 0)
+
+
+class TestWorkerSelectionPolicy(unittest.TestCase):
+
+    def test_select(self):
+        policy = WorkerSelectionPolicy()
+        self.assertRaises(NotImplementedError, policy.select, 'repo1', [Candidate('w1', 0, 1)])
+        policy.placed('repo1', 'w1')
+
+
+class TestLeastOutstandingPolicy(unittest.TestCase):
+
+    def test_select(self):
+        candidates = [Candidate('w3', 2, 4), Candidate('w2', 1, 2), Candidate('w1', 1, 8)]
+        self.assertEqual(LeastOutstandingPolicy().select('repo1', candidates), 'w1')
+
+
+class TestWeightedPolicy(unittest.TestCase):
+
+    def test_select(self):
+        candidates = [Candidate('w1', 1, 2), Candidate('w2', 2, 8), Candidate('w3', 0, 1)]
+        self.assertEqual(WeightedPolicy().select('repo1', candidates), 'w3')
+        candidates = [Candidate('w1', 1, 2), Candidate('w2', 3, 8)]
+        self.assertEqual(WeightedPolicy().select('repo1', candidates), 'w2')
+
+    def test_select_prefers_concurrency(self):
+        candidates = [Candidate('w1', 0, 1), Candidate('w2', 0, 4)]
+        self.assertEqual(WeightedPolicy().select('repo1', candidates), 'w2')
+
+
+class TestAffinityPolicy(unittest.TestCase):
+
+    def test_select_previous(self):
+        policy = AffinityPolicy()
+        policy.placed('repo1', 'w2')
+        candidates = [Candidate('w1', 0, 1), Candidate('w2', 1, 2)]
+        self.assertEqual(policy.select('repo1', candidates), 'w2')
+
+    def test_select_previous_unavailable(self):
+        policy = AffinityPolicy()
+        policy.placed('repo1', 'w3')
+        candidates = [Candidate('w1', 1, 2), Candidate('w2', 0, 1)]
+        self.assertEqual(policy.select('repo1', candidates), 'w2')
+
+    def test_placed(self):
+        policy = AffinityPolicy(max_size=2)
+        policy.placed('repo1', 'w1')
+        policy.placed('repo2', 'w1')
+        policy.placed('repo1', 'w2')
+        policy.placed('repo3', 'w1')
+        self.assertEqual(policy.history.items(), [('repo1', 'w2'), ('repo3', 'w1')])
+
+
+class TestGetPolicy(unittest.TestCase):
+
+    def test_get_policy(self):
+        for name, policy_class in placement.POLICIES.items():
+            self.assertTrue(isinstance(placement.get_policy(name), policy_class))
+
+    @mock.patch(MODULE + '.config')
+    def test_get_policy_configured(self, config):
+        config.get.return_value = 'repo-affinity'
+        self.assertTrue(isinstance(placement.get_policy(), AffinityPolicy))
+        config.get.assert_called_once_with('tasks', 'worker_selection')
+
+    @mock.patch(MODULE + '._logger')
+    def test_get_policy_unknown(self, logger):
+        self.assertTrue(isinstance(placement.get_policy('random'), LeastOutstandingPolicy))
+        self.assertTrue(logger.error.called)
@@ -0,0 +1,233 @@
+"""
+This module contains tests for the pulp.server.async.progress module.
+"""
+import unittest
+
+import mock
+
+from pulp.server.async import progress
+
+
+MODULE = 'pulp.server.async.progress.'
+
+
+@mock.patch(MODULE + 'interval', return_value=1)
+@mock.patch(MODULE + 'time.time', return_value=100)
+@mock.patch(MODULE + 'TaskStatus')
+class TestProgressWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.writer = progress.ProgressWriter()
+        self.writer._schedule = mock.Mock()
+
+    def test_first_update(self, mock_task_status, mock_time, mock_interval):
+        """
+        Test that the whole progress report is written the first time.
+        """
+        self.writer.update('task', 'report', {'items': 1})
+
+        mock_task_status.objects.assert_called_once_with(task_id='task')
+        mock_task_status.objects.return_value.update_one.assert_called_once_with(
+            set__progress_report={'report': {'items': 1}})
+        self.assertFalse(self.writer._schedule.called)
+
+    def test_progress_copied(self, mock_task_status, mock_time, mock_interval):
+        """
+        Test that the progress is copied, so that the caller may keep modifying it.
+        """
+        report = {'items': 1}
+        self.writer.update('task', 'report', report)
+        report['items'] = 2
+        mock_time.return_value = 101
+
+        self.writer.update('task', 'report', report)
+
+        mock_task_status._get_collection.return_value.update_one.assert_called_once_with(
+            {'task_id': 'task'}, {'$set': {'progress_report.report.items': 2}})
+
+    def test_coalesced(self, mock_task_status, mock_time, mock_interval):
+        """
+        Test that the progress reported within the interval is written later.
+        """
+        self.writer.update('task', 'report', {'items': 1})
+        mock_time.return_value = 100.5
+
+        self.writer.update('task', 'report', {'items': 2})
+        self.writer.update('task', 'report', {'items': 3})
+
+        self.assertFalse(mock_task_status._get_collection.called)
+        self.assertEqual(self.writer._schedule.call_count, 2)
+
+        self.writer.flush()
+
+        mock_task_status._get_collection.return_value.update_one.assert_called_once_with(
+            {'task_id': 'task'}, {'$set': {'progress_report.report.items': 3}})
+
+    def test_state_changed(self, mock_task_status, mock_time, mock_interval):
+        """
+        Test that a state change is written immediately.
+        """
+        self.writer.update('task', 'report', {'step': {'state': 'NOT_STARTED', 'items': 0}})
+        mock_time.return_value = 100.5
+
+        self.writer.update('task', 'report', {'step': {'state': 'IN_PROGRESS', 'items': 0}})
+
+        mock_task_status._get_collection.return_value.update_one.assert_called_once_with(
+            {'task_id': 'task'}, {'$set': {'progress_report.report.step.state': 'IN_PROGRESS'}})
+        self.assertFalse(self.writer._schedule.called)
+
+    def test_reports(self, mock_task_status, mock_time, mock_interval):
+        """
+        Test that the reports of a task are written together and that unchanged ones are left out.
+        """
+        self.writer.update('task', 'importer', {'items': 1})
+        mock_time.return_value = 100.5
+        self.writer.update('task', 'distributor', {'items': 1})
+        mock_time.return_value = 102
+
+        self.writer.update('task', 'importer', {'items': 1})
+
+        mock_task_status._get_collection.return_value.update_one.assert_called_once_with(
+            {'task_id': 'task'}, {'$set': {'progress_report.distributor': {'items': 1}}})
+
+    def test_unchanged(self, mock_task_status, mock_time, mock_interval):
+        """
+        Test that nothing is written when the progress did not change.
+        """
+        self.writer.update('task', 'report', {'items': 1})
+        mock_time.return_value = 102
+
+        self.writer.update('task', 'report', {'items': 1})
+
+        self.assertFalse(mock_task_status._get_collection.called)
+
+    def test_finish(self, mock_task_status, mock_time, mock_interval):
+        """
+        Test that the pending progress of a finishing task is written and the task forgotten.
+        """
+        self.writer.update('task', 'report', {'items': 1})
+        mock_time.return_value = 100.5
+        self.writer.update('task', 'report', {'items': 2})
+
+        self.writer.finish('task')
+
+        mock_task_status._get_collection.return_value.update_one.assert_called_once_with(
+            {'task_id': 'task'}, {'$set': {'progress_report.report.items': 2}})
+        self.assertEqual(self.writer._pending, {})
+        self.assertEqual(self.writer._written, {})
+        self.assertEqual(self.writer._write_times, {})
+
+    def test_finish_error(self, mock_task_status, mock_time, mock_interval):
+        """
+        Test that a finishing task is forgotten even when its progress cannot be written.
+        """
+        mock_task_status.objects.return_value.update_one.side_effect = ValueError()
+        self.writer._pending['task'] = {'report': {'items': 1}}
+
+        self.assertRaises(ValueError, self.writer.finish, 'task')
+
+        self.assertEqual(self.writer._pending, {})
+
+    def test_flush_task(self, mock_task_status, mock_time, mock_interval):
+        """
+        Test that only the pending progress of the given task is flushed.
+        """
+        self.writer._pending = {'task': {'report': 1}, 'other': {'report': 2}}
+
+        self.writer.flush('task')
+
+        mock_task_status.objects.assert_called_once_with(task_id='task')
+        self.assertEqual(self.writer._pending, {'other': {'report': 2}})
+
+
+class TestSchedule(unittest.TestCase):
+
+    @mock.patch(MODULE + 'interval', return_value=1)
+    @mock.patch(MODULE + 'threading.Timer')
+    def test_schedule(self, mock_timer, mock_interval):
+        """
+        Test that a single timer flushes the pending progress.
+        """
+        writer = progress.ProgressWriter()
+
+        writer._schedule()
+        mock_timer.return_value.is_alive.return_value = True
+        writer._schedule()
+
+        mock_timer.assert_called_once_with(1, writer._flush_pending)
+        self.assertTrue(mock_timer.return_value.daemon)
+        mock_timer.return_value.start.assert_called_once_with()
+
+    @mock.patch(MODULE + '_logger')
+    def test_flush_pending_error(self, mock_logger):
+        """
+        Test that errors writing the progress from the timer are logged.
+        """
+        writer = progress.ProgressWriter()
+        writer.flush = mock.Mock(side_effect=ValueError())
+
+        writer._flush_pending()
+
+        self.assertTrue(mock_logger.exception.called)
+
+
+class TestChanges(unittest.TestCase):
+
+    def test_nested(self):
+        """
+        Test that only the changed values of nested dictionaries are set.
+        """
+        changes = {}
+        old = {'a': {'b': 1, 'c': 2}, 'd': 3}
+        new = {'a': {'b': 1, 'c': 3, 'e': 4}, 'd': 3}
+
+        progress._changes('root', old, new, changes)
+
+        self.assertEqual(changes, {'root.a.c': 3, 'root.a.e': 4})
+
+    def test_removed_key(self):
+        """
+        Test that a dictionary which lost keys is replaced.
+        """
+        changes = {}
+
+        progress._changes('root', {'a': {'b': 1, 'c': 2}}, {'a': {'b': 1}}, changes)
+
+        self.assertEqual(changes, {'root.a': {'b': 1}})
+
+    def test_invalid_key(self):
+        """
+        Test that a dictionary with keys unusable in a dotted path is replaced.
+        """
+        changes = {}
+
+        progress._changes('root', {'a': {}}, {'a': {'x.y': 1}}, changes)
+
+        self.assertEqual(changes, {'root.a': {'x.y': 1}})
+
+    def test_lists(self):
+        """
+        Test that lists are replaced.
+        """
+        changes = {}
+
+        progress._changes('root', {'a': [1]}, {'a': [1, 2]}, changes)
+
+        self.assertEqual(changes, {'root.a': [1, 2]})
+
+
+class TestStates(unittest.TestCase):
+
+    def test_states(self):
+        """
+        Test that the states are found anywhere in the progress report.
+        """
+        report = {'state': 'a', 'steps': [{'state': 'b'}, {'sub': {'state': 'c'}}], 'items': 1}
+
+        self.assertEqual(progress._states(report), ['a', 'b', 'c'])
+
+    def test_no_states(self):
+        """
+        Test that values without states have none.
+        """
+        self.assertEqual(progress._states('status'), [])
@@ -0,0 +1,298 @@
+from collections import deque
+from Queue import Empty
+from threading import Thread
+import unittest
+
+import mock
+
+from pulp.server.async import reservations
+from pulp.server.async.placement import AffinityPolicy, LeastOutstandingPolicy
+from pulp.server.async.reservations import (ReservationEvents, ReservationScheduler, Ticket,
+                                            RELEASED, WORKER_DELETED, WORKER_DISCOVERED)
+
+
+MODULE = 'pulp.server.async.reservations'
+
+
+class FakeEvents(object):
+    """
+    Reservation events delivered in-process.
+    """
+
+    def __init__(self):
+        self.queue = deque()
+        self.waited = []
+
+    def publish(self, event_type, **fields):
+        fields['type'] = event_type
+        self.queue.append(fields)
+
+    def wait(self, timeout):
+        self.waited.append(timeout)
+        events = list(self.queue)
+        self.queue.clear()
+        return events
+
+
+def worker(name, queue_depth=0, concurrency=1):
+    document = mock.Mock(queue_depth=queue_depth, concurrency=concurrency)
+    document.name = name
+    return document
+
+
+def reserved(task_id, worker_name, resource_id):
+    return mock.Mock(task_id=task_id, worker_name=worker_name, resource_id=resource_id)
+
+
+class TestIsWorker(unittest.TestCase):
+
+    def test_is_worker(self):
+        self.assertTrue(reservations._is_worker('reserved_resource_worker-0@host'))
+        self.assertFalse(reservations._is_worker('scheduler@host'))
+        self.assertFalse(reservations._is_worker('resource_manager@host'))
+
+
+class TestReservationEvents(unittest.TestCase):
+
+    @mock.patch(MODULE + '.celery')
+    def test_publish(self, celery):
+        connection = celery.connection_or_acquire.return_value.__enter__.return_value
+        ReservationEvents.publish(RELEASED, task_id='t1')
+        connection.SimpleQueue.assert_called_once_with(reservations.EVENT_QUEUE)
+        queue = connection.SimpleQueue.return_value
+        queue.put.assert_called_once_with({'type': RELEASED, 'task_id': 't1'}, serializer='json')
+        queue.close.assert_called_once_with()
+
+    @mock.patch(MODULE + '._logger')
+    @mock.patch(MODULE + '.celery')
+    def test_publish_failed(self, celery, logger):
+        celery.connection_or_acquire.side_effect = IOError()
+        ReservationEvents.publish(RELEASED, task_id='t1')
+        self.assertTrue(logger.exception.called)
+
+    @mock.patch(MODULE + '.celery')
+    def test_wait(self, celery):
+        queue = celery.connection.return_value.SimpleQueue.return_value
+        messages = [mock.Mock(payload={'type': RELEASED, 'task_id': 't%d' % n}) for n in range(2)]
+        queue.get.side_effect = messages + [Empty()]
+        events = ReservationEvents().wait(5)
+        self.assertEqual(events, [m.payload for m in messages])
+        for message in messages:
+            message.ack.assert_called_once_with()
+        self.assertEqual(queue.get.call_args_list, [
+            mock.call(block=True, timeout=5),
+            mock.call(block=False, timeout=5),
+            mock.call(block=False, timeout=5),
+        ])
+
+    @mock.patch(MODULE + '.celery')
+    def test_wait_nothing_pending(self, celery):
+        queue = celery.connection.return_value.SimpleQueue.return_value
+        queue.get.side_effect = Empty()
+        self.assertEqual(ReservationEvents().wait(0), [])
+        queue.get.assert_called_once_with(block=False, timeout=0)
+
+    @mock.patch(MODULE + '.time')
+    @mock.patch(MODULE + '._logger')
+    @mock.patch(MODULE + '.celery')
+    def test_wait_failed(self, celery, logger, time):
+        connection = celery.connection.return_value
+        connection.SimpleQueue.return_value.get.side_effect = IOError()
+        events = ReservationEvents()
+        self.assertEqual(events.wait(5), [])
+        time.sleep.assert_called_once_with(5)
+        connection.release.assert_called_once_with()
+        self.assertEqual(events._queue, None)
+
+
+@mock.patch(MODULE + '.ReservedResource')
+@mock.patch(MODULE + '.Worker')
+class TestReservationScheduler(unittest.TestCase):
+
+    def scheduler(self, worker_model, reserved_model, workers, reservations=(), policy=None):
+        worker_model.objects.get_online.return_value.only.return_value = [
+            w if isinstance(w, mock.Mock) else worker(w) for w in workers]
+        reserved_model.objects.only.return_value.no_cache.return_value = list(reservations)
+        return ReservationScheduler(FakeEvents(), sync_interval=60,
+                                    policy=policy or LeastOutstandingPolicy())
+
+    def test_sync(self, worker_model, reserved_model):
+        scheduler = self.scheduler(
+            worker_model, reserved_model,
+            ['w1', 'w2', 'resource_manager@host', 'scheduler@host'],
+            [reserved('t1', 'w1', 'repo1'), reserved('t2', 'w1', 'repo1')])
+        scheduler.sync()
+        self.assertEqual(scheduler.workers, {'w1': set(['t1', 't2']), 'w2': set()})
+        self.assertEqual(scheduler.resources['repo1'].worker_name, 'w1')
+        self.assertEqual(scheduler.resources['repo1'].task_ids, set(['t1', 't2']))
+        self.assertEqual(scheduler.tasks, {'t1': 'repo1', 't2': 'repo1'})
+        self.assertEqual(scheduler.concurrency, {'w1': 1, 'w2': 1})
+
+    def test_sync_corrects_queue_depth(self, worker_model, reserved_model):
+        scheduler = self.scheduler(
+            worker_model, reserved_model,
+            [worker('w1', queue_depth=5), worker('w2', queue_depth=0, concurrency=None)],
+            [reserved('t1', 'w1', 'repo1')])
+        scheduler.sync()
+        worker_model.objects.assert_called_once_with(name='w1')
+        worker_model.objects.return_value.update_one.assert_called_once_with(
+            set__queue_depth=1)
+        self.assertEqual(scheduler.concurrency, {'w1': 1, 'w2': 1})
+
+    def test_reserve_unreserved_worker(self, worker_model, reserved_model):
+        scheduler = self.scheduler(worker_model, reserved_model, ['w1'])
+        self.assertEqual(scheduler.reserve('t1', 'repo1'), 'w1')
+        reserved_model.assert_called_once_with(task_id='t1', worker_name='w1',
+                                               resource_id='repo1')
+        reserved_model.return_value.save.assert_called_once_with()
+        worker_model.objects.assert_called_once_with(name='w1')
+        worker_model.objects.return_value.update_one.assert_called_once_with(
+            inc__queue_depth=1)
+        self.assertEqual(scheduler.workers, {'w1': set(['t1'])})
+        self.assertEqual(scheduler.tasks, {'t1': 'repo1'})
+
+    def test_reserve_least_outstanding(self, worker_model, reserved_model):
+        scheduler = self.scheduler(
+            worker_model, reserved_model,
+            [worker('w1', concurrency=3), worker('w2', concurrency=3)],
+            [reserved('t1', 'w1', 'repo1')])
+        self.assertEqual(scheduler.reserve('t2', 'repo2'), 'w2')
+        self.assertEqual(scheduler.reserve('t3', 'repo3'), 'w1')
+
+    def test_reserve_up_to_concurrency(self, worker_model, reserved_model):
+        scheduler = self.scheduler(
+            worker_model, reserved_model, [worker('w1', concurrency=2)],
+            [reserved('t1', 'w1', 'repo1')])
+        self.assertEqual(scheduler.reserve('t2', 'repo2'), 'w1')
+        self.assertEqual(scheduler._place('repo3'), None)
+        # A resource already reserved is still placed on the worker holding it.
+        self.assertEqual(scheduler._place('repo1'), 'w1')
+
+    def test_reserve_affinity(self, worker_model, reserved_model):
+        scheduler = self.scheduler(worker_model, reserved_model, ['w1', 'w2'],
+                                   policy=AffinityPolicy())
+        scheduler.reserve('t1', 'repo1')
+        scheduler.reserve('t2', 'repo2')
+        scheduler.release('t1')
+        scheduler.release('t2')
+        self.assertEqual(scheduler.reserve('t3', 'repo2'), 'w2')
+        self.assertEqual(scheduler.policy.history, {'repo1': 'w1', 'repo2': 'w2'})
+
+    def test_reserve_reserved_resource(self, worker_model, reserved_model):
+        scheduler = self.scheduler(
+            worker_model, reserved_model, ['w1', 'w2'], [reserved('t1', 'w2', 'repo1')])
+        self.assertEqual(scheduler.reserve('t2', 'repo1'), 'w2')
+        self.assertEqual(scheduler.resources['repo1'].task_ids, set(['t1', 't2']))
+
+    def test_reserve_syncs_once_per_interval(self, worker_model, reserved_model):
+        scheduler = self.scheduler(worker_model, reserved_model, ['w1'])
+        scheduler.reserve('t1', 'repo1')
+        scheduler.reserve('t2', 'repo1')
+        worker_model.objects.get_online.assert_called_once_with()
+
+    def test_reserve_applies_pending_events(self, worker_model, reserved_model):
+        scheduler = self.scheduler(worker_model, reserved_model, ['w1'])
+        scheduler.reserve('t1', 'repo1')
+        scheduler.events.publish(RELEASED, task_id='t1')
+        self.assertEqual(scheduler.reserve('t2', 'repo2'), 'w1')
+        self.assertEqual(scheduler.tasks, {'t2': 'repo2'})
+
+    def test_reserve_waits_for_release(self, worker_model, reserved_model):
+        scheduler = self.scheduler(worker_model, reserved_model, ['w1'])
+        scheduler.reserve('t1', 'repo1')
+        events = scheduler.events
+        wait = events.wait
+
+        def release(timeout):
+            if timeout:
+                events.publish(RELEASED, task_id='t1')
+            return wait(timeout)
+
+        events.wait = release
+        self.assertEqual(scheduler.reserve('t2', 'repo2'), 'w1')
+        self.assertEqual(events.waited, [0, 0, 60])
+        worker_model.objects.get_online.assert_called_once_with()
+
+    def test_reserve_syncs_after_timeout(self, worker_model, reserved_model):
+        scheduler = self.scheduler(worker_model, reserved_model, ['w1'])
+        scheduler.reserve('t1', 'repo1')
+        # A new worker is found in the database when no event is received.
+        worker_model.objects.get_online.return_value.only.return_value = [
+            worker('w1'), worker('w2')]
+        reserved_model.objects.only.return_value.no_cache.return_value = [
+            reserved('t1', 'w1', 'repo1')]
+        self.assertEqual(scheduler.reserve('t2', 'repo2'), 'w2')
+        self.assertEqual(worker_model.objects.get_online.call_count, 2)
+
+    def test_worker_events_sync(self, worker_model, reserved_model):
+        scheduler = self.scheduler(worker_model, reserved_model, ['w1'])
+        for event_type in (WORKER_DISCOVERED, WORKER_DELETED):
+            scheduler._apply([{'type': event_type, 'worker_name': 'w1'}])
+        self.assertEqual(worker_model.objects.get_online.call_count, 2)
+
+    def test_release(self, worker_model, reserved_model):
+        scheduler = self.scheduler(
+            worker_model, reserved_model, ['w1'],
+            [reserved('t1', 'w1', 'repo1'), reserved('t2', 'w1', 'repo1')])
+        scheduler.sync()
+        scheduler.release('t1')
+        self.assertEqual(scheduler.resources['repo1'].task_ids, set(['t2']))
+        scheduler.release('t2')
+        scheduler.release('unknown')
+        self.assertEqual(scheduler.resources, {})
+        self.assertEqual(scheduler.workers, {'w1': set()})
+        self.assertEqual(scheduler.tasks, {})
+
+    def test_dispatch_fair(self, worker_model, reserved_model):
+        scheduler = self.scheduler(worker_model, reserved_model, ['w1', 'w2'])
+        scheduler.sync()
+        tickets = [Ticket('a1', 'A'), Ticket('a2', 'A'), Ticket('a3', 'A'), Ticket('b1', 'B')]
+        scheduler._waiting['A'] = deque(tickets[:3])
+        scheduler._waiting['B'] = deque(tickets[3:])
+        with scheduler._condition:
+            scheduler._dispatch()
+        saved = [c[1]['task_id'] for c in reserved_model.call_args_list]
+        self.assertEqual(saved, ['a1', 'b1', 'a2', 'a3'])
+        self.assertNotEqual(tickets[0].worker_name, tickets[3].worker_name)
+        self.assertEqual(scheduler.waiting(), 0)
+
+    def test_dispatch_save_failed(self, worker_model, reserved_model):
+        scheduler = self.scheduler(worker_model, reserved_model, ['w1'])
+        reserved_model.return_value.save.side_effect = ValueError()
+        self.assertRaises(ValueError, scheduler.reserve, 't1', 'repo1')
+        self.assertEqual(scheduler.tasks, {})
+        self.assertFalse(worker_model.objects.called)
+
+    @mock.patch(MODULE + '._logger')
+    def test_dispatch_queue_depth_failed(self, logger, worker_model, reserved_model):
+        scheduler = self.scheduler(worker_model, reserved_model, ['w1'])
+        worker_model.objects.return_value.update_one.side_effect = ValueError()
+        self.assertEqual(scheduler.reserve('t1', 'repo1'), 'w1')
+        self.assertTrue(logger.exception.called)
+
+    def test_concurrent_reserve(self, worker_model, reserved_model):
+        scheduler = self.scheduler(worker_model, reserved_model, ['w1', 'w2'])
+        events = scheduler.events
+        placed = []
+
+        def run(task_id, resource_id):
+            worker_name = scheduler.reserve(task_id, resource_id)
+            placed.append(task_id)
+            events.publish(RELEASED, task_id=task_id)
+            return worker_name
+
+        threads = [Thread(target=run, args=('t%d' % n, 'repo%d' % (n % 5))) for n in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+        self.assertEqual(sorted(placed), sorted('t%d' % n for n in range(20)))
+
+
+class TestGetScheduler(unittest.TestCase):
+
+    @mock.patch(MODULE + '._scheduler', None)
+    def test_get_scheduler(self):
+        scheduler = reservations.get_scheduler()
+        self.assertTrue(isinstance(scheduler, ReservationScheduler))
+        self.assertTrue(reservations.get_scheduler() is scheduler)
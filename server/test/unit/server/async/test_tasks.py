@@ -1,7 +1,6 @@
 """
 This module contains tests for the pulp.server.async.tasks module.
 """
-from datetime import datetime
 import signal
 import unittest
 import uuid
@@ -15,14 +14,13 @@ from mongoengine import ValidationError
 
 from ...base import PulpServerTests, ResourceReservationTests
 from pulp.common import dateutils
-from pulp.common.constants import (CALL_CANCELED_STATE, CALL_FINISHED_STATE,
-                                   SCHEDULER_WORKER_NAME, RESOURCE_MANAGER_WORKER_NAME)
+from pulp.common.constants import CALL_CANCELED_STATE, CALL_FINISHED_STATE
 from pulp.common.tags import action_tag, resource_tag, RESOURCE_CONSUMER_TYPE
 from pulp.devel.unit.util import compare_dict
 from pulp.server.async import app, tasks
-from pulp.server.db.model import Worker, TaskStatus
+from pulp.server.db.model import TaskStatus
 from pulp.server.db.reaper import queue_reap_expired_documents
-from pulp.server.exceptions import NoWorkers, PulpException, PulpCodedException
+from pulp.server.exceptions import PulpException, PulpCodedException
 from pulp.server.maintenance.monthly import queue_monthly_maintenance
 
 
@@ -35,17 +33,9 @@ WORKER_3 = 'worker-3'
 class TestQueueReservedTask(ResourceReservationTests):
 
     def setUp(self):
-        self.patch_a = mock.patch('pulp.server.async.tasks.get_worker_for_reservation')
-        self.mock_get_worker_for_reservation = self.patch_a.start()
-
-        self.patch_b = mock.patch('pulp.server.async.tasks._get_unreserved_worker')
-        self.mock_get_unreserved_worker = self.patch_b.start()
-
-        self.patch_c = mock.patch('pulp.server.async.tasks.time', autospec=True)
-        self.mock_time = self.patch_c.start()
-
-        self.patch_d = mock.patch('pulp.server.async.tasks.ReservedResource', autospec=True)
-        self.mock_reserved_resource = self.patch_d.start()
+        self.patch_a = mock.patch('pulp.server.async.tasks.get_scheduler')
+        self.mock_get_scheduler = self.patch_a.start()
+        self.mock_get_scheduler.return_value.reserve.return_value = 'worker1'
 
         self.patch_e = mock.patch('pulp.server.async.tasks.celery', autospec=True)
         self.mock_celery = self.patch_e.start()
@@ -58,76 +48,35 @@ class TestQueueReservedTask(ResourceReservationTests):
 
     def tearDown(self):
         self.patch_a.stop()
-        self.patch_b.stop()
-        self.patch_c.stop()
-        self.patch_d.stop()
         self.patch_e.stop()
         self.patch_f.stop()
         super(TestQueueReservedTask, self).tearDown()
 
-    def test_creates_and_saves_reserved_resource(self):
-        self.mock_get_worker_for_reservation.return_value = Worker(
-            name='worker1', last_heartbeat=datetime.utcnow())
+    def test_reserves_resource(self):
         tasks._queue_reserved_task('task_name', 'my_task_id', 'my_resource_id', [1, 2], {'a': 2})
-        self.mock_reserved_resource.assert_called_once_with(task_id='my_task_id',
-                                                            worker_name='worker1',
-                                                            resource_id='my_resource_id')
-        self.mock_reserved_resource.return_value.save.assert_called_once_with()
+        self.mock_get_scheduler.return_value.reserve.assert_called_once_with(
+            'my_task_id', 'my_resource_id')
 
     def test_dispatches_inner_task(self):
-        self.mock_get_worker_for_reservation.return_value = Worker(
-            name='worker1', last_heartbeat=datetime.utcnow())
         tasks._queue_reserved_task('task_name', 'my_task_id', 'my_resource_id', [1, 2], {'a': 2})
         apply_async = self.mock_celery.tasks['task_name'].apply_async
         apply_async.assert_called_once_with(1, 2, a=2, routing_key='worker1', task_id='my_task_id',
                                             exchange='C.dq')
 
     def test_dispatches__release_resource(self):
-        self.mock_get_worker_for_reservation.return_value = Worker(
-            name='worker1', last_heartbeat=datetime.utcnow())
         tasks._queue_reserved_task('task_name', 'my_task_id', 'my_resource_id', [1, 2], {'a': 2})
         self.mock__release_resource.apply_async.assert_called_once_with(('my_task_id',),
                                                                         routing_key='worker1',
                                                                         exchange='C.dq')
 
-    def test_get_worker_for_reservation_breaks_out_of_loop(self):
-        self.mock_get_worker_for_reservation.return_value = Worker(
-            name='worker1', last_heartbeat=datetime.utcnow())
-        tasks._queue_reserved_task('task_name', 'my_task_id', 'my_resource_id', [1, 2], {'a': 2})
-        self.assertTrue(not self.mock_get_unreserved_worker.called)
-        self.assertTrue(not self.mock_time.sleep.called)
-
-    def test_get_unreserved_worker_breaks_out_of_loop(self):
-        self.mock_get_worker_for_reservation.side_effect = NoWorkers()
-        self.mock_get_unreserved_worker.return_value = Worker(name='worker1',
-                                                              last_heartbeat=datetime.utcnow())
-        tasks._queue_reserved_task('task_name', 'my_task_id', 'my_resource_id', [1, 2], {'a': 2})
-        self.assertTrue(not self.mock_time.sleep.called)
-
-    def test_loops_and_sleeps_waiting_for_available_worker(self):
-        self.mock_get_worker_for_reservation.side_effect = NoWorkers()
-        self.mock_get_unreserved_worker.side_effect = NoWorkers()
-
-        class BreakOutException(Exception):
-            pass
-
-        def side_effect(*args):
-            def second_call(*args):
-                raise BreakOutException()
-            self.mock_time.sleep.side_effect = second_call
-            return None
-
-        self.mock_time.sleep.side_effect = side_effect
-
-        try:
-            tasks._queue_reserved_task('task_name', 'my_task_id', 'my_resource_id', [1, 2],
-                                       {'a': 2})
-        except BreakOutException:
-            pass
-        else:
-            self.fail('_queue_reserved_task should have raised a BreakOutException')
-
-        self.mock_time.sleep.assert_has_calls([mock.call(0.25), mock.call(0.25)])
+    def test_dispatch_failure_releases_resource(self):
+        apply_async = self.mock_celery.tasks['task_name'].apply_async
+        apply_async.side_effect = ValueError()
+        self.assertRaises(ValueError, tasks._queue_reserved_task, 'task_name', 'my_task_id',
+                          'my_resource_id', [1, 2], {'a': 2})
+        self.mock__release_resource.apply_async.assert_called_once_with(('my_task_id',),
+                                                                        routing_key='worker1',
+                                                                        exchange='C.dq')
 
 
 class TestDeleteWorker(ResourceReservationTests):
@@ -154,6 +103,9 @@ class TestDeleteWorker(ResourceReservationTests):
         self.patch_i = mock.patch('pulp.server.async.tasks.constants', autospec=True)
         self.mock_constants = self.patch_i.start()
 
+        self.patch_j = mock.patch('pulp.server.async.tasks.ReservationEvents', autospec=True)
+        self.mock_events = self.patch_j.start()
+
         super(TestDeleteWorker, self).setUp()
 
     def tearDown(self):
@@ -164,8 +116,14 @@ class TestDeleteWorker(ResourceReservationTests):
         self.patch_f.stop()
         self.patch_g.stop()
         self.patch_i.stop()
+        self.patch_j.stop()
         super(TestDeleteWorker, self).tearDown()
 
+    def test_notifies_resource_manager(self):
+        tasks._delete_worker('worker1')
+        self.mock_events.publish.assert_called_once_with(tasks.WORKER_DELETED,
+                                                         worker_name='worker1')
+
     def test_normal_shutdown_true_logs_correctly(self):
         tasks._delete_worker('worker1', normal_shutdown=True)
         self.assertTrue(self.mock_gettext.called)
@@ -230,6 +188,12 @@ class TestReleaseResource(unittest.TestCase):
         self.patch_d = mock.patch('pulp.server.async.tasks.constants', autospec=True)
         self.mock_constants = self.patch_d.start()
 
+        self.patch_e = mock.patch('pulp.server.async.tasks.ReservationEvents', autospec=True)
+        self.mock_events = self.patch_e.start()
+
+        self.patch_f = mock.patch('pulp.server.async.tasks.Worker')
+        self.mock_worker = self.patch_f.start()
+
         super(TestReleaseResource, self).setUp()
 
     def tearDown(self):
@@ -237,13 +201,33 @@ class TestReleaseResource(unittest.TestCase):
         self.patch_b.stop()
         self.patch_c.stop()
         self.patch_d.stop()
+        self.patch_e.stop()
+        self.patch_f.stop()
         super(TestReleaseResource, self).tearDown()
 
+    def test_notifies_resource_manager(self):
+        tasks._release_resource('my_task_id')
+        self.mock_events.publish.assert_called_once_with(tasks.RELEASED, task_id='my_task_id')
+
     def test_deletes_reserved_resource(self):
         mock_task_id = mock.Mock()
         tasks._release_resource(mock_task_id)
         self.mock_reserved_resource.objects.assert_called_once_with(task_id=mock_task_id)
-        self.mock_reserved_resource.objects.return_value.delete.assert_called_once_with()
+        self.mock_reserved_resource.objects.return_value.modify.assert_called_once_with(
+            remove=True)
+
+    def test_decrements_queue_depth(self):
+        reservation = self.mock_reserved_resource.objects.return_value.modify.return_value
+        tasks._release_resource('my_task_id')
+        self.mock_worker.objects.assert_called_once_with(name=reservation.worker_name)
+        self.mock_worker.objects.return_value.update_one.assert_called_once_with(
+            dec__queue_depth=1)
+
+    def test_already_released(self):
+        self.mock_reserved_resource.objects.return_value.modify.return_value = None
+        tasks._release_resource('my_task_id')
+        self.assertFalse(self.mock_worker.objects.called)
+        self.mock_events.publish.assert_called_once_with(tasks.RELEASED, task_id='my_task_id')
 
     def test_finds_running_task_by_uuid(self):
         mock_task_id = mock.Mock()
@@ -360,6 +344,43 @@ class TestTaskOnSuccessHandler(ResourceReservationTests):
         # Make sure that parse_iso8601_datetime is able to parse the finish_time without errors
         dateutils.parse_iso8601_datetime(new_task_status['finish_time'])
 
+    @mock.patch('pulp.server.async.tasks.Task.request')
+    @mock.patch('pulp.server.async.progress.writer')
+    def test_writes_pending_progress(self, mock_writer, mock_request):
+        """
+        Test that the progress pending for the task is written and kept when it succeeds.
+        """
+        task_id = str(uuid.uuid4())
+        mock_request.called_directly = False
+        mock_writer.finish.side_effect = lambda task_id: TaskStatus.objects(
+            task_id=task_id).update_one(set__progress_report={'report': 'done'})
+        TaskStatus(task_id).save()
+
+        task = tasks.Task()
+        task.on_success('random_return_value', task_id, [], {})
+
+        mock_writer.finish.assert_called_once_with(task_id)
+        new_task_status = TaskStatus.objects(task_id=task_id).first()
+        self.assertEqual(new_task_status['progress_report'], {'report': 'done'})
+        self.assertEqual(new_task_status['state'], 'finished')
+
+    @mock.patch('pulp.server.async.tasks.Task.request')
+    @mock.patch('pulp.server.async.progress.writer')
+    def test_progress_error(self, mock_writer, mock_request):
+        """
+        Test that the task status is updated even when its pending progress cannot be written.
+        """
+        task_id = str(uuid.uuid4())
+        mock_request.called_directly = False
+        mock_writer.finish.side_effect = ValueError()
+        TaskStatus(task_id).save()
+
+        task = tasks.Task()
+        task.on_success('random_return_value', task_id, [], {})
+
+        new_task_status = TaskStatus.objects(task_id=task_id).first()
+        self.assertEqual(new_task_status['state'], 'finished')
+
     @mock.patch('pulp.server.async.tasks.Task.request')
     def test_spawned_task_status(self, mock_request):
         async_result = AsyncResult('foo-id')
@@ -838,6 +859,85 @@ class TestCancel(PulpServerTests):
         self.assertEqual(task_status['state'], CALL_CANCELED_STATE)
 
 
+class TestCancelGroup(PulpServerTests):
+    """
+    Test the tasks.cancel_group() function.
+    """
+    def setUp(self):
+        PulpServerTests.setUp(self)
+        TaskStatus.objects().delete()
+        self.group_id = uuid.uuid4()
+
+    def tearDown(self):
+        PulpServerTests.tearDown(self)
+        TaskStatus.objects().delete()
+
+    @mock.patch('pulp.server.async.tasks.REVOKE_BATCH_SIZE', 2)
+    @mock.patch('pulp.server.async.tasks.controller.revoke', autospec=True)
+    @mock.patch('pulp.server.async.tasks._logger', autospec=True)
+    def test_cancel_group(self, _logger, revoke):
+        task_ids = ['task-%d' % i for i in range(3)]
+        for task_id in task_ids:
+            TaskStatus(task_id, group_id=self.group_id).save()
+        TaskStatus('other', group_id=uuid.uuid4()).save()
+
+        canceled = tasks.cancel_group(str(self.group_id))
+
+        self.assertEqual(canceled, 3)
+        self.assertEqual(revoke.call_count, 2)
+        revoked = [task_id for c in revoke.call_args_list for task_id in c[0][0]]
+        self.assertEqual(sorted(revoked), task_ids)
+        for task_status in TaskStatus.objects(group_id=self.group_id):
+            self.assertEqual(task_status['state'], CALL_CANCELED_STATE)
+        self.assertEqual(TaskStatus.objects(task_id='other').first()['state'], 'waiting')
+        self.assertEqual(_logger.info.call_count, 1)
+
+    @mock.patch('pulp.server.async.tasks.controller.revoke', autospec=True)
+    @mock.patch('pulp.server.managers.consumer.agent.AgentManager.cancel_request', autospec=True)
+    @mock.patch('pulp.server.async.tasks._logger', autospec=True)
+    def test_agent_cancel(self, logger, cancel, revoke):
+        consumer_id = '18d'
+        tags = [
+            action_tag('UNUSED'),
+            resource_tag(RESOURCE_CONSUMER_TYPE, consumer_id)
+        ]
+        TaskStatus('1234abcd', tags=tags, worker_name='agent', group_id=self.group_id).save()
+
+        tasks.cancel_group(str(self.group_id))
+
+        cancel.assert_called_once_with(mock.ANY, consumer_id, '1234abcd')
+        self.assertFalse(revoke.called)
+        task_status = TaskStatus.objects(task_id='1234abcd').first()
+        self.assertEqual(task_status['state'], CALL_CANCELED_STATE)
+
+    @mock.patch('pulp.server.async.tasks.controller.revoke', autospec=True)
+    @mock.patch('pulp.server.async.tasks._logger', autospec=True)
+    def test_complete_tasks(self, _logger, revoke):
+        """
+        Test that tasks in a complete state are neither revoked nor canceled.
+        """
+        TaskStatus('finished', state=CALL_FINISHED_STATE, group_id=self.group_id).save()
+        TaskStatus('running', state='running', group_id=self.group_id).save()
+
+        canceled = tasks.cancel_group(str(self.group_id))
+
+        self.assertEqual(canceled, 1)
+        revoke.assert_called_once_with(['running'], terminate=True)
+        task_status = TaskStatus.objects(task_id='finished').first()
+        self.assertEqual(task_status['state'], CALL_FINISHED_STATE)
+
+    @mock.patch('pulp.server.async.tasks.controller.revoke', autospec=True)
+    @mock.patch('pulp.server.async.tasks._logger', autospec=True)
+    def test_no_revoke(self, _logger, revoke):
+        TaskStatus('1234abcd', group_id=self.group_id).save()
+
+        tasks.cancel_group(str(self.group_id), revoke_task=False)
+
+        self.assertFalse(revoke.called)
+        task_status = TaskStatus.objects(task_id='1234abcd').first()
+        self.assertEqual(task_status['state'], CALL_CANCELED_STATE)
+
+
 class TestRegisterSigtermHandler(unittest.TestCase):
     """
     Test the register_sigterm_handler() decorator.
@@ -967,98 +1067,6 @@ class TestScheduledTasks(unittest.TestCase):
         mock_monthly_apply_async.assert_called_once_with(tags=[action_tag('monthly')])
 
 
-class TestGetWorkerForReservation(ResourceReservationTests):
-
-    @mock.patch('pulp.server.async.tasks.Worker.objects')
-    @mock.patch('pulp.server.async.tasks.ReservedResource')
-    def test_existing_reservation_correctly_found(self, mock_reserved_resource,
-                                                  mock_worker_objects):
-        get_objects = mock_reserved_resource.objects
-        tasks.get_worker_for_reservation('resource1')
-        get_objects.assert_called_once_with(resource_id='resource1')
-        get_objects.return_value.first.assert_called_once_with()
-
-    @mock.patch('pulp.server.async.tasks.Worker.objects')
-    @mock.patch('pulp.server.async.tasks.ReservedResource')
-    def test_correct_worker_returned(self, mock_reserved_resource, mock_worker_objects):
-        find_one = mock_reserved_resource.objects.return_value.first
-        find_one.return_value = {'worker_name': 'worker1'}
-        mock_worker_objects.return_value.first.return_value = find_one.return_value
-        result = tasks.get_worker_for_reservation('resource1')
-        self.assertTrue(result is find_one.return_value)
-
-    @mock.patch('pulp.server.async.tasks.ReservedResource')
-    def test_no_workers_raised_if_no_reservations(self, mock_reserved_resource):
-        find_one = mock_reserved_resource.objects.return_value.first
-        find_one.return_value = False
-        try:
-            tasks.get_worker_for_reservation('resource1')
-        except NoWorkers:
-            pass
-        else:
-            self.fail("NoWorkers() Exception should have been raised.")
-
-
-class TestGetUnreservedWorker(ResourceReservationTests):
-
-    @mock.patch('pulp.server.async.tasks.ReservedResource')
-    def test_reserved_resources_queried_correctly(self, mock_reserved_resource):
-        find = mock_reserved_resource.objects.all
-        find.return_value = [{'worker_name': 'a'}, {'worker_name': 'b'}]
-        try:
-            tasks._get_unreserved_worker()
-        except NoWorkers:
-            pass
-        else:
-            self.fail("NoWorkers() Exception should have been raised.")
-        find.assert_called_once_with()
-
-    @mock.patch('pulp.server.async.tasks.Worker.objects')
-    @mock.patch('pulp.server.async.tasks.ReservedResource')
-    def test_worker_returned_when_one_worker_is_not_reserved(self, mock_reserved_resource,
-                                                             mock_worker_objects):
-        get_online = mock_worker_objects.get_online
-        get_online.return_value = [{'name': 'a'}, {'name': 'b'}]
-        mock_reserved_resource.objects.all.return_value = [{'worker_name': 'a'}]
-        result = tasks._get_unreserved_worker()
-        self.assertEqual(result, {'name': 'b'})
-
-    @mock.patch('pulp.server.async.tasks.Worker.objects')
-    @mock.patch('pulp.server.async.tasks.ReservedResource')
-    def test_no_workers_raised_when_all_workers_reserved(self, mock_reserved_resource, mock_worker):
-        mock_worker.objects.return_value = [{'name': 'a'}, {'name': 'b'}]
-        find = mock_reserved_resource.objects
-        find.return_value = [{'worker_name': 'a'}, {'worker_name': 'b'}]
-        try:
-            tasks._get_unreserved_worker()
-        except NoWorkers:
-            pass
-        else:
-            self.fail("NoWorkers() Exception should have been raised.")
-
-    @mock.patch('pulp.server.async.tasks.Worker.objects')
-    @mock.patch('pulp.server.async.tasks.ReservedResource')
-    def test_no_workers_raised_when_there_are_no_workers(self, mock_reserved_resource, mock_worker):
-        mock_worker.objects.return_value = []
-        find = mock_reserved_resource.objects
-        find.return_value = [{'worker_name': 'a'}, {'worker_name': 'b'}]
-        try:
-            tasks._get_unreserved_worker()
-        except NoWorkers:
-            pass
-        else:
-            self.fail("NoWorkers() Exception should have been raised.")
-
-    def test_is_worker(self):
-        self.assertTrue(tasks._is_worker("a_worker@some.hostname"))
-
-    def test_is_not_worker_is_scheduler(self):
-        self.assertEquals(tasks._is_worker(SCHEDULER_WORKER_NAME + "@some.hostname"), False)
-
-    def test_is_not_worker_is_resource_mgr(self):
-        self.assertEquals(tasks._is_worker(RESOURCE_MANAGER_WORKER_NAME + "@some.hostname"), False)
-
-
 class TestPulpTask(unittest.TestCase):
 
     def test_check_task_type(self):
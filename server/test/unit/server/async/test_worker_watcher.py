@@ -8,12 +8,15 @@ from pulp.server.async import worker_watcher
 
 class TestHandleWorkerHeartbeat(unittest.TestCase):
 
+    @mock.patch('pulp.server.async.worker_watcher.ReservationEvents')
     @mock.patch('pulp.server.async.worker_watcher.datetime')
     @mock.patch('pulp.server.async.worker_watcher._logger')
     @mock.patch('pulp.server.async.worker_watcher.Worker')
-    def test_handle_worker_heartbeat_new(self, mock_worker, mock_logger, mock_datetime):
+    def test_handle_worker_heartbeat_new(self, mock_worker, mock_logger, mock_datetime,
+                                         mock_events):
         """
-        Ensure that we save a record and log when a new worker comes online.
+        Ensure that we save a record, log and notify the resource manager when a new worker comes
+        online.
         """
         mock_datetime.utcnow.return_value = datetime.datetime(2017, 1, 1, 1, 1, 1)
         mock_worker.objects.return_value.first.return_value = None
@@ -21,11 +24,15 @@ class TestHandleWorkerHeartbeat(unittest.TestCase):
         mock_logger.info.assert_called_once_with('New worker \'fake-worker\' discovered')
         mock_worker.objects.return_value.update_one.\
             assert_called_once_with(set__last_heartbeat=mock_datetime.utcnow(), upsert=True)
+        mock_events.publish.assert_called_once_with(
+            worker_watcher.WORKER_DISCOVERED, worker_name='fake-worker')
 
+    @mock.patch('pulp.server.async.worker_watcher.ReservationEvents')
     @mock.patch('pulp.server.async.worker_watcher.datetime')
     @mock.patch('pulp.server.async.worker_watcher._logger')
     @mock.patch('pulp.server.async.worker_watcher.Worker')
-    def test_handle_worker_heartbeat_update(self, mock_worker, mock_logger, mock_datetime):
+    def test_handle_worker_heartbeat_update(self, mock_worker, mock_logger, mock_datetime,
+                                            mock_events):
         """
         Ensure that we don't log when an existing worker is updated.
         """
@@ -35,6 +42,19 @@ class TestHandleWorkerHeartbeat(unittest.TestCase):
         self.assertEquals(mock_logger.info.called, False)
         mock_worker.objects.return_value.update_one.\
             assert_called_once_with(set__last_heartbeat=mock_datetime.utcnow(), upsert=True)
+        self.assertFalse(mock_events.publish.called)
+
+    @mock.patch('pulp.server.async.worker_watcher.ReservationEvents')
+    @mock.patch('pulp.server.async.worker_watcher.datetime')
+    @mock.patch('pulp.server.async.worker_watcher.Worker')
+    def test_handle_worker_heartbeat_concurrency(self, mock_worker, mock_datetime, mock_events):
+        """
+        Ensure that the concurrency of the worker is recorded when known.
+        """
+        mock_datetime.utcnow.return_value = datetime.datetime(2017, 1, 1, 1, 1, 1)
+        worker_watcher.handle_worker_heartbeat('fake-worker', 4)
+        mock_worker.objects.return_value.update_one.assert_called_once_with(
+            set__last_heartbeat=mock_datetime.utcnow(), set__concurrency=4, upsert=True)
 
 
 class TestHandleWorkerOffline(unittest.TestCase):
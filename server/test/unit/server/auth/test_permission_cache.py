@@ -0,0 +1,156 @@
+import unittest
+
+import mock
+
+from pulp.server.auth import permission_cache
+from pulp.server.auth.authorization import CREATE, READ, UPDATE
+
+
+MODULE = 'pulp.server.auth.permission_cache'
+
+
+class TestPermissionTrie(unittest.TestCase):
+
+    def test_explicit_access(self):
+        """
+        Test that operations granted on a resource are allowed on it.
+        """
+        trie = permission_cache.PermissionTrie()
+        trie.add('/mock/resource/', [READ])
+
+        self.assertTrue(trie.allows('/mock/resource/', READ))
+        self.assertFalse(trie.allows('/mock/resource/', UPDATE))
+        self.assertFalse(trie.allows('/mock/', READ))
+        self.assertFalse(trie.allows('/', READ))
+
+    def test_subdomain_access(self):
+        """
+        Test that operations granted on a resource are allowed on the resources below it.
+        """
+        trie = permission_cache.PermissionTrie()
+        trie.add('/mock/', [READ])
+
+        self.assertTrue(trie.allows('/mock/resource/', READ))
+        self.assertTrue(trie.allows('/mock/other_resource/', READ))
+        self.assertFalse(trie.allows('/other/', READ))
+        self.assertFalse(trie.allows('/', READ))
+
+    def test_root_access(self):
+        """
+        Test that operations granted on the root resource are allowed on every resource.
+        """
+        trie = permission_cache.PermissionTrie()
+        trie.add('/', [READ])
+
+        self.assertTrue(trie.allows('/mock/resource/', READ))
+        self.assertTrue(trie.allows('/', READ))
+        self.assertFalse(trie.allows('/', CREATE))
+
+    def test_merged_operations(self):
+        """
+        Test that operations granted on the same resource more than once are merged.
+        """
+        trie = permission_cache.PermissionTrie()
+        trie.add('/mock/', [READ])
+        trie.add('mock', [UPDATE])
+
+        self.assertTrue(trie.allows('/mock/', READ))
+        self.assertTrue(trie.allows('/mock/', UPDATE))
+
+
+@mock.patch(MODULE + '.PermissionGeneration.get_collection')
+class TestGeneration(unittest.TestCase):
+
+    def test_current_generation(self, get_collection):
+        """
+        Test that the current generation is read from the counter.
+        """
+        collection = get_collection.return_value
+        collection.find_one.return_value = {'_id': 'permissions', 'token': 'abc', 'generation': 3}
+
+        self.assertEqual(permission_cache.current_generation(), ('abc', 3))
+        collection.find_one.assert_called_once_with({'_id': permission_cache.GENERATION_ID})
+        self.assertFalse(collection.update_one.called)
+
+    def test_current_generation_created(self, get_collection):
+        """
+        Test that the counter is created when it does not exist.
+        """
+        collection = get_collection.return_value
+        collection.find_one.side_effect = [None, {'token': 'abc', 'generation': 0}]
+
+        self.assertEqual(permission_cache.current_generation(), ('abc', 0))
+        self.assertEqual(collection.update_one.call_count, 1)
+        self.assertEqual(collection.update_one.call_args[1], {'upsert': True})
+
+    def test_invalidate(self, get_collection):
+        """
+        Test that invalidating increments the counter.
+        """
+        collection = get_collection.return_value
+
+        permission_cache.invalidate()
+
+        query, update = collection.update_one.call_args[0]
+        self.assertEqual(query, {'_id': permission_cache.GENERATION_ID})
+        self.assertEqual(update['$inc'], {'generation': 1})
+        self.assertEqual(collection.update_one.call_args[1], {'upsert': True})
+
+
+@mock.patch(MODULE + '.Role.get_collection')
+@mock.patch(MODULE + '.Permission.get_collection')
+@mock.patch(MODULE + '.model.User')
+@mock.patch(MODULE + '.current_generation')
+class TestGet(unittest.TestCase):
+
+    def setUp(self):
+        permission_cache.clear()
+
+    def tearDown(self):
+        permission_cache.clear()
+
+    def test_resolve(self, current_generation, user_model, get_permissions, get_roles):
+        """
+        Test that the permissions of a user include the permissions granted to its roles.
+        """
+        current_generation.return_value = ('abc', 1)
+        user = user_model.objects.get_or_404.return_value
+        user.roles = ['role-1']
+        get_permissions.return_value.find.return_value = [
+            {'resource': '/v2/repositories/',
+             'users': [{'username': 'other', 'permissions': [UPDATE]},
+                       {'username': 'fred', 'permissions': [READ]}]}]
+        get_roles.return_value.find.return_value = [
+            {'id': 'role-1', 'permissions': [{'resource': '/v2/users/', 'permission': [CREATE]}]}]
+
+        entry = permission_cache.get('fred')
+
+        self.assertEqual(entry.generation, ('abc', 1))
+        self.assertTrue(entry.user is user)
+        self.assertTrue(entry.permissions.allows('/v2/repositories/zoo/', READ))
+        self.assertFalse(entry.permissions.allows('/v2/repositories/zoo/', UPDATE))
+        self.assertTrue(entry.permissions.allows('/v2/users/fred/', CREATE))
+        user_model.objects.get_or_404.assert_called_once_with(login='fred')
+        get_permissions.return_value.find.assert_called_once_with({'users.username': 'fred'})
+        get_roles.return_value.find.assert_called_once_with({'id': {'$in': ['role-1']}})
+
+    def test_cached(self, current_generation, user_model, get_permissions, get_roles):
+        """
+        Test that the permissions of a user are resolved once per generation.
+        """
+        current_generation.return_value = ('abc', 1)
+        user_model.objects.get_or_404.return_value.roles = []
+        get_permissions.return_value.find.return_value = []
+
+        entry = permission_cache.get('fred')
+        self.assertTrue(permission_cache.get('fred') is entry)
+        self.assertEqual(user_model.objects.get_or_404.call_count, 1)
+        self.assertFalse(get_roles.return_value.find.called)
+
+        current_generation.return_value = ('abc', 2)
+        self.assertFalse(permission_cache.get('fred') is entry)
+        self.assertEqual(user_model.objects.get_or_404.call_count, 2)
+
+        current_generation.return_value = ('def', 2)
+        permission_cache.get('fred')
+        self.assertEqual(user_model.objects.get_or_404.call_count, 3)
@@ -295,6 +295,24 @@ class TestBatch(TestCase):
         self.assertEqual(batch.listener, listener)
         self.assertRaises(NotImplementedError, batch)
 
+    @patch(MODULE + '.FIND_SOURCES_PAGE_SIZE', 2)
+    @patch(MODULE + '.Request.find_all_sources')
+    def test_resolved(self, find_all_sources):
+        primary = Mock()
+        container = Mock(sources={'s-1': Mock()})
+        requests = [Mock(), Mock(), Mock()]
+
+        # test
+        batch = Batch(primary, container, iter(requests), Mock())
+        resolved = list(batch.resolved())
+
+        # validation
+        self.assertEqual(resolved, requests)
+        self.assertEqual(
+            find_all_sources.call_args_list,
+            [call(tuple(requests[0:2]), primary, container.sources),
+             call(tuple(requests[2:3]), primary, container.sources)])
+
 
 class TestSerial(TestCase):
 
@@ -313,10 +331,11 @@ class TestSerial(TestCase):
         self.assertEqual(batch.requests, requests)
         self.assertEqual(batch.listener, listener)
 
+    @patch(MODULE + '.Request.find_all_sources')
     @patch(MODULE + '.Started')
     @patch(MODULE + '.Succeeded')
     @patch(MODULE + '.Serial._download')
-    def test_download_succeeded(self, download, succeeded, started):
+    def test_download_succeeded(self, download, succeeded, started, find_all_sources):
         primary = Mock()
         sources = [
             Mock(id=1, url='u1'),
@@ -340,8 +359,7 @@ class TestSerial(TestCase):
         # validation
         self.assertEqual(started.call_args_list, [call(r) for r in requests])
         self.assertEqual(started.return_value.call_count, len(requests))
-        for r in requests:
-            r.find_sources.assert_called_once_with(primary, sources)
+        find_all_sources.assert_called_once_with(tuple(requests), primary, sources)
         self.assertEqual(
             download.call_args_list,
             [call(r.sources[0][1], r.destination, r.sources[0][0]) for r in requests])
@@ -356,10 +374,11 @@ class TestSerial(TestCase):
         self.assertEqual(details.total_succeeded, 1)
         self.assertEqual(details.total_failed, 0)
 
+    @patch(MODULE + '.Request.find_all_sources')
     @patch(MODULE + '.Started')
     @patch(MODULE + '.Failed')
     @patch(MODULE + '.Serial._download')
-    def test_download_failed(self, download, failed, started):
+    def test_download_failed(self, download, failed, started, find_all_sources):
         download.side_effect = DownloadFailed()
         primary = Mock()
         sources = [
@@ -384,8 +403,7 @@ class TestSerial(TestCase):
         # validation
         self.assertEqual(started.call_args_list, [call(r) for r in requests])
         self.assertEqual(started.return_value.call_count, len(requests))
-        for r in requests:
-            r.find_sources.assert_called_once_with(primary, sources)
+        find_all_sources.assert_called_once_with(tuple(requests), primary, sources)
         download_calls = []
         for r in requests:
             for s, u in r.sources:
@@ -559,9 +577,10 @@ class TestThreaded(TestCase):
         self.assertEqual(batch.queues[fake_source.id], fake_queue())
         self.assertEqual(queue, fake_queue())
 
+    @patch(MODULE + '.Request.find_all_sources')
     @patch(MODULE + '.Tracker.wait')
     @patch(MODULE + '.Threaded.dispatch')
-    def test_download(self, fake_dispatch, fake_wait):
+    def test_download(self, fake_dispatch, fake_wait, fake_find):
         primary = Mock()
         sources = [Mock(), Mock()]
         container = Mock(sources=sources)
@@ -585,8 +604,7 @@ class TestThreaded(TestCase):
 
         # validation
         # initial dispatch
-        for request in requests:
-            request.find_sources.assert_called_with(primary, sources)
+        fake_find.assert_called_once_with(tuple(requests), primary, sources)
         calls = fake_dispatch.call_args_list
         self.assertEqual(len(calls), len(requests))
         for i, request in enumerate(requests):
@@ -606,9 +624,10 @@ class TestThreaded(TestCase):
         self.assertEqual(report.downloads['source-2'].total_succeeded, 200)
         self.assertEqual(report.downloads['source-2'].total_failed, 10)
 
+    @patch(MODULE + '.Request.find_all_sources')
     @patch(MODULE + '.Tracker.wait')
     @patch(MODULE + '.Threaded.dispatch')
-    def test_download_nothing(self, fake_dispatch, fake_wait):
+    def test_download_nothing(self, fake_dispatch, fake_wait, fake_find):
         primary = Mock()
         container = Mock(sources=[])
         requests = []
@@ -626,9 +645,10 @@ class TestThreaded(TestCase):
         self.assertEqual(len(report.downloads), 0)
         fake_wait.assert_called_once_with(0)
 
+    @patch(MODULE + '.Request.find_all_sources')
     @patch(MODULE + '.Tracker.wait')
     @patch(MODULE + '.Threaded.dispatch')
-    def test_download_with_exception(self, fake_dispatch, fake_wait):
+    def test_download_with_exception(self, fake_dispatch, fake_wait, fake_find):
         primary = Mock()
         fake_dispatch.side_effect = ValueError()
         sources = [Mock(), Mock()]
@@ -10,6 +10,7 @@ from pulp.server.content.sources import constants
 from pulp.server.content.sources.model import Request, PrimarySource, ContentSource, RefreshReport
 from pulp.server.content.sources.model import DownloadDetails, DownloadReport
 from pulp.server.content.sources.descriptor import DEFAULT
+from pulp.server.db.model.content import ContentCatalog
 
 
 TYPE = '1234'
@@ -147,6 +148,53 @@ class TestRequest(TestCase):
         self.assertEqual(request.sources[4][0].id, primary.id)
         self.assertEqual(request.sources[4][1], url)
 
+    @patch('pulp.server.content.sources.model.managers.content_catalog_manager')
+    def test_find_sources_with_entries(self, fake_manager):
+        primary = PrimarySource(None)
+        alternatives = dict([(s, ContentSource(s, d)) for s, d in DESCRIPTOR])
+
+        # test
+
+        request = Request(TYPE_ID, 1, 'http://redhat.com/repository', '/tmp/123')
+        request.find_sources(primary, alternatives, CATALOG[0:1])
+
+        # validation
+
+        self.assertFalse(fake_manager.called)
+        request.sources = list(request.sources)
+        self.assertEqual(len(request.sources), 2)
+        self.assertEqual(request.sources[0][0].id, 's-1')
+        self.assertEqual(request.sources[0][1], CATALOG[0][constants.URL])
+        self.assertEqual(request.sources[1][0].id, primary.id)
+
+    @patch('pulp.server.content.sources.model.managers.content_catalog_manager')
+    def test_find_all_sources(self, fake_manager):
+        primary = PrimarySource(None)
+        alternatives = dict([(s, ContentSource(s, d)) for s, d in DESCRIPTOR])
+        locator = ContentCatalog.get_locator(TYPE_ID, 1)
+        fake_manager().find_many.return_value = {locator: CATALOG[0:2]}
+
+        # test
+
+        requests = [
+            Request(TYPE_ID, 1, 'http://redhat.com/repository/1', '/tmp/1'),
+            Request(TYPE_ID, 2, 'http://redhat.com/repository/2', '/tmp/2'),
+            Request('other', 3, 'http://redhat.com/repository/3', '/tmp/3'),
+        ]
+        Request.find_all_sources(requests, primary, alternatives)
+
+        # validation
+
+        fake_manager().find_many.assert_any_call(TYPE_ID, [1, 2])
+        fake_manager().find_many.assert_any_call('other', [3])
+        self.assertEqual(fake_manager().find_many.call_count, 2)
+        self.assertFalse(fake_manager().find.called)
+        sources = list(requests[0].sources)
+        self.assertEqual([s[1] for s in sources],
+                         [CATALOG[0][constants.URL], CATALOG[1][constants.URL], requests[0].url])
+        self.assertEqual(list(requests[1].sources), [(primary, requests[1].url)])
+        self.assertEqual(list(requests[2].sources), [(primary, requests[2].url)])
+
     def test_next_source(self):
         sources = [1, 2, 3]
         request = Request('', {}, '', '')
@@ -417,6 +465,7 @@ class TestContentSource(TestCase):
 
         self.assertEqual(conduit.reset.call_count, len(urls))
         self.assertEqual(cataloger.refresh.call_count, len(urls))
+        self.assertEqual(conduit.flush.call_count, len(urls))
 
         n = 0
         added = 10
@@ -455,6 +504,7 @@ class TestContentSource(TestCase):
 
         self.assertEqual(conduit.reset.call_count, len(urls))
         self.assertEqual(cataloger.refresh.call_count, len(urls))
+        self.assertFalse(conduit.flush.called)
 
         n = 0
         for _url in source.urls:
@@ -467,6 +517,30 @@ class TestContentSource(TestCase):
             self.assertEqual(report[n].deleted_count, 0)
             n += 1
 
+    @patch('pulp.server.content.sources.model.ContentSource.urls')
+    def test_refresh_flush_raised(self, fake_urls):
+        url = 'http://xyz.com'
+        urls = ['url-1']
+        fake_urls.__get__ = Mock(return_value=urls)
+
+        conduit = Mock()
+        conduit.flush.side_effect = ValueError('flush failed')
+        cataloger = Mock()
+
+        source = ContentSource('s-1', {constants.BASE_URL: url})
+        source.get_conduit = Mock(return_value=conduit)
+        source.get_cataloger = Mock(return_value=cataloger)
+
+        # test
+
+        report = source.refresh()
+
+        # validation
+
+        conduit.flush.assert_called_once_with()
+        self.assertFalse(report[0].succeeded)
+        self.assertEqual(report[0].errors, ['flush failed'])
+
     def test_dict(self):
         descriptor = {'A': 1, 'B': 2}
 
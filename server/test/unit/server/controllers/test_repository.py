@@ -5,6 +5,7 @@ from bson.objectid import InvalidId
 from mock import call, Mock, MagicMock, patch
 import mock
 import mongoengine
+from pymongo.errors import BulkWriteError
 
 from pulp.common import dateutils, error_codes
 from pulp.common.compat import unittest
@@ -37,22 +38,29 @@ class TestGetAssociatedUnitIDs(unittest.TestCase):
             dict(repo_id='repo1', unit_id='b', unit_type_id='demo_model'),
         ]
 
+    def set_associations(self, mock_objects):
+        ordered = mock_objects.return_value.only.return_value.order_by.return_value
+        ordered.limit.return_value.as_pymongo.return_value = self.associations
+        return ordered
+
     def test_returns_ids(self, mock_objects):
-        mock_objects.return_value.only.return_value.as_pymongo.return_value = self.associations
+        ordered = self.set_associations(mock_objects)
 
         ret = list(repo_controller.get_associated_unit_ids('repo1', 'demo_model'))
 
         self.assertEqual(ret, ['a', 'b'])
+        mock_objects.return_value.only.return_value.order_by.assert_called_once_with('unit_id')
+        ordered.limit.assert_called_once_with(repo_controller.DEFAULT_PAGE_SIZE)
 
     def test_returns_generator(self, mock_objects):
-        mock_objects.return_value.only.return_value.as_pymongo.return_value = self.associations
+        self.set_associations(mock_objects)
 
         ret = repo_controller.get_associated_unit_ids('repo1', 'demo_model')
 
         self.assertTrue(inspect.isgenerator(ret))
 
     def test_uses_q(self, mock_objects):
-        mock_objects.return_value.only.return_value.as_pymongo.return_value = self.associations
+        self.set_associations(mock_objects)
         q = mongoengine.Q(foo='bar')
 
         list(repo_controller.get_associated_unit_ids('repo1', 'demo_model', q))
@@ -60,6 +68,36 @@ class TestGetAssociatedUnitIDs(unittest.TestCase):
         mock_objects.assert_called_once_with(repo_id='repo1', unit_type_id='demo_model', q_obj=q)
 
 
+class TestPaginateQuerySet(unittest.TestCase):
+
+    def test_pages(self):
+        query_set = MagicMock()
+        ordered = query_set.order_by.return_value
+        first = [{'_id': 1}, {'_id': 2}]
+        second = [{'_id': 3}]
+        ordered.limit.return_value.as_pymongo.return_value = first
+        ordered.filter.return_value.limit.return_value.as_pymongo.return_value = second
+
+        pages = list(repo_controller._paginate_query_set(query_set, 'id', db_field='_id',
+                                                         page_size=2))
+
+        self.assertEqual(pages, [first, second])
+        query_set.order_by.assert_called_once_with('id')
+        ordered.filter.assert_called_once_with(id__gt=2)
+        ordered.filter.return_value.limit.assert_called_once_with(2)
+
+    def test_last_page_full(self):
+        query_set = MagicMock()
+        ordered = query_set.order_by.return_value
+        ordered.limit.return_value.as_pymongo.return_value = [{'a': 1}]
+        ordered.filter.return_value.limit.return_value.as_pymongo.return_value = []
+
+        pages = list(repo_controller._paginate_query_set(query_set, 'a', page_size=1))
+
+        self.assertEqual(pages, [[{'a': 1}]])
+        ordered.filter.assert_called_once_with(a__gt=1)
+
+
 @mock.patch.object(repo_controller, 'get_associated_unit_ids')
 @mock.patch.object(DemoModel, 'objects')
 class TestGetUnitModelQuerySets(unittest.TestCase):
@@ -360,19 +398,194 @@ class AssociateSingleUnitTests(unittest.TestCase):
             upsert=True)
 
 
+@patch(MODULE + 'update_last_unit_added')
+@patch(MODULE + 'rebuild_content_unit_counts')
+@patch(MODULE + 'model.RepositoryContentUnit._get_collection')
+class TestAssociateUnits(unittest.TestCase):
+
+    def setUp(self):
+        self.repo = MagicMock(repo_id='foo')
+        self.units = [DemoModel(id='bar', key_field='baz'), DemoModel(id='baz', key_field='baz')]
+
+    @patch(MODULE + 'dateutils.format_iso8601_utc_timestamp', return_value='foo_tstamp')
+    def test_associate_units(self, mock_get_timestamp, mock_get_collection, mock_rebuild,
+                             mock_added):
+        collection = mock_get_collection.return_value
+        collection.bulk_write.return_value.upserted_count = 2
+
+        created = repo_controller.associate_units(self.repo, iter(self.units))
+
+        self.assertEqual(created, 2)
+        self.assertEqual(collection.bulk_write.call_count, 1)
+        requests = collection.bulk_write.call_args[0][0]
+        self.assertEqual(collection.bulk_write.call_args[1], {'ordered': False})
+        self.assertEqual([r._filter for r in requests], [
+            {'repo_id': 'foo', 'unit_type_id': 'demo_model', 'unit_id': 'bar'},
+            {'repo_id': 'foo', 'unit_type_id': 'demo_model', 'unit_id': 'baz'}])
+        self.assertEqual(requests[0]._doc, {'$setOnInsert': {'created': 'foo_tstamp'},
+                                            '$set': {'updated': 'foo_tstamp'}})
+        self.assertTrue(requests[0]._upsert)
+        mock_rebuild.assert_called_once_with(self.repo)
+        mock_added.assert_called_once_with('foo')
+
+    @patch(MODULE + 'paginate')
+    def test_one_write_per_page(self, mock_paginate, mock_get_collection, mock_rebuild,
+                                mock_added):
+        mock_paginate.return_value = [(('demo_model', 'bar'),), (('demo_model', 'baz'),)]
+        collection = mock_get_collection.return_value
+        collection.bulk_write.return_value.upserted_count = 1
+
+        created = repo_controller.associate_units(self.repo, self.units)
+
+        self.assertEqual(created, 2)
+        self.assertEqual(collection.bulk_write.call_count, 2)
+        mock_rebuild.assert_called_once_with(self.repo)
+        mock_added.assert_called_once_with('foo')
+
+    def test_already_associated(self, mock_get_collection, mock_rebuild, mock_added):
+        mock_get_collection.return_value.bulk_write.return_value.upserted_count = 0
+
+        created = repo_controller.associate_units(self.repo, self.units)
+
+        self.assertEqual(created, 0)
+        self.assertFalse(mock_rebuild.called)
+        self.assertFalse(mock_added.called)
+
+    def test_no_metadata_update(self, mock_get_collection, mock_rebuild, mock_added):
+        mock_get_collection.return_value.bulk_write.return_value.upserted_count = 2
+
+        created = repo_controller.associate_units(self.repo, self.units,
+                                                  update_repo_metadata=False)
+
+        self.assertEqual(created, 2)
+        self.assertFalse(mock_rebuild.called)
+        self.assertFalse(mock_added.called)
+
+    def test_empty_iterable(self, mock_get_collection, mock_rebuild, mock_added):
+        created = repo_controller.associate_units(self.repo, [])
+
+        self.assertEqual(created, 0)
+        self.assertFalse(mock_get_collection.return_value.bulk_write.called)
+        self.assertFalse(mock_rebuild.called)
+
+    @patch(MODULE + 'model.Repository.objects')
+    def test_associate_unit_ids(self, mock_repo_qs, mock_get_collection, mock_rebuild,
+                                mock_added):
+        collection = mock_get_collection.return_value
+        collection.bulk_write.return_value.upserted_count = 1
+
+        created = repo_controller.associate_unit_ids('foo', 'type_1', ['a', 'b'])
+
+        self.assertEqual(created, 1)
+        requests = collection.bulk_write.call_args[0][0]
+        self.assertEqual([r._filter for r in requests], [
+            {'repo_id': 'foo', 'unit_type_id': 'type_1', 'unit_id': 'a'},
+            {'repo_id': 'foo', 'unit_type_id': 'type_1', 'unit_id': 'b'}])
+        mock_repo_qs.get_repo_or_missing_resource.assert_called_once_with('foo')
+        mock_rebuild.assert_called_once_with(
+            mock_repo_qs.get_repo_or_missing_resource.return_value)
+        mock_added.assert_called_once_with('foo')
+
+    @patch(MODULE + 'model.Repository.objects')
+    def test_associate_unit_ids_no_metadata_update(self, mock_repo_qs, mock_get_collection,
+                                                   mock_rebuild, mock_added):
+        mock_get_collection.return_value.bulk_write.return_value.upserted_count = 1
+
+        repo_controller.associate_unit_ids('foo', 'type_1', ['a'], update_repo_metadata=False)
+
+        self.assertFalse(mock_repo_qs.get_repo_or_missing_resource.called)
+        self.assertFalse(mock_rebuild.called)
+
+    def test_duplicate_key_error(self, mock_get_collection, mock_rebuild, mock_added):
+        """
+        Test that an association created concurrently by another writer is not an error.
+        """
+        details = {'writeErrors': [{'code': 11000, 'index': 1}], 'writeConcernErrors': [],
+                   'nUpserted': 1}
+        mock_get_collection.return_value.bulk_write.side_effect = BulkWriteError(details)
+
+        created = repo_controller.associate_units(self.repo, self.units)
+
+        self.assertEqual(created, 1)
+        mock_rebuild.assert_called_once_with(self.repo)
+
+    def test_other_write_error(self, mock_get_collection, mock_rebuild, mock_added):
+        details = {'writeErrors': [{'code': 11000, 'index': 0}, {'code': 2, 'index': 1}],
+                   'writeConcernErrors': [], 'nUpserted': 0}
+        mock_get_collection.return_value.bulk_write.side_effect = BulkWriteError(details)
+
+        self.assertRaises(BulkWriteError, repo_controller.associate_units, self.repo, self.units)
+        self.assertFalse(mock_rebuild.called)
+
+
+@patch(MODULE + '_record_unit_removals')
+@patch(MODULE + 'model.Repository.objects')
+@patch(MODULE + 'update_last_unit_removed')
+@patch(MODULE + 'rebuild_content_unit_counts')
+@patch(MODULE + 'model.RepositoryContentUnit._get_collection')
+class TestDisassociateUnitIds(unittest.TestCase):
+
+    @patch(MODULE + 'paginate')
+    def test_disassociate_unit_ids(self, mock_paginate, mock_get_collection, mock_rebuild,
+                                   mock_removed, mock_repo_qs, mock_record):
+        mock_paginate.return_value = [('a', 'b'), ('c',)]
+        collection = mock_get_collection.return_value
+        collection.delete_many.return_value.deleted_count = 1
+
+        removed = repo_controller.disassociate_unit_ids('foo', 'type_1', ['a', 'b', 'c'])
+
+        self.assertEqual(removed, 2)
+        self.assertEqual(collection.delete_many.call_args_list, [
+            call({'repo_id': 'foo', 'unit_type_id': 'type_1', 'unit_id': {'$in': ['a', 'b']}}),
+            call({'repo_id': 'foo', 'unit_type_id': 'type_1', 'unit_id': {'$in': ['c']}})])
+        self.assertEqual([(args[0], list(args[1])) for args, kwargs in mock_record.call_args_list],
+                         [('foo', [('type_1', 'a'), ('type_1', 'b')]), ('foo', [('type_1', 'c')])])
+        mock_rebuild.assert_called_once_with(
+            mock_repo_qs.get_repo_or_missing_resource.return_value)
+        mock_removed.assert_called_once_with('foo')
+
+    def test_nothing_removed(self, mock_get_collection, mock_rebuild, mock_removed, mock_repo_qs,
+                             mock_record):
+        mock_get_collection.return_value.delete_many.return_value.deleted_count = 0
+
+        removed = repo_controller.disassociate_unit_ids('foo', 'type_1', ['a'])
+
+        self.assertEqual(removed, 0)
+        self.assertFalse(mock_record.called)
+        self.assertFalse(mock_rebuild.called)
+        self.assertFalse(mock_removed.called)
+
+    def test_no_metadata_update(self, mock_get_collection, mock_rebuild, mock_removed,
+                                mock_repo_qs, mock_record):
+        mock_get_collection.return_value.delete_many.return_value.deleted_count = 1
+
+        removed = repo_controller.disassociate_unit_ids('foo', 'type_1', ['a'],
+                                                        update_repo_metadata=False)
+
+        self.assertEqual(removed, 1)
+        self.assertFalse(mock_rebuild.called)
+        self.assertFalse(mock_removed.called)
+
+
 class TestDisassociateUnits(unittest.TestCase):
+    @patch('pulp.server.controllers.repository._record_unit_removals')
     @patch('pulp.server.controllers.repository.update_last_unit_removed')
     @patch('pulp.server.controllers.repository.model.RepositoryContentUnit.objects')
-    def test_disassociate_units(self, m_rcu_objects, m_update_last_unit_removed):
+    def test_disassociate_units(self, m_rcu_objects, m_update_last_unit_removed, m_record):
         """"
         Test that multiple objects are all deleted and timestamp for units removal updated
         """
         test_unit1 = DemoModel(id='bar', key_field='baz')
         test_unit2 = DemoModel(id='baz', key_field='baz')
         repo = MagicMock(repo_id='foo')
+        m_rcu_objects.return_value.delete.return_value = 2
         repo_controller.disassociate_units(repo, [test_unit1, test_unit2])
         m_rcu_objects.assert_called_once_with(repo_id='foo', unit_id__in=['bar', 'baz'])
         m_rcu_objects.return_value.delete.assert_called_once()
+        self.assertEqual(m_record.call_args[0][0], 'foo')
+        self.assertEqual(list(m_record.call_args[0][1]),
+                         [(DemoModel._content_type_id.default, 'bar'),
+                          (DemoModel._content_type_id.default, 'baz')])
         m_update_last_unit_removed.assert_called_once_with('foo')
 
     @patch('pulp.server.controllers.repository.update_last_unit_removed')
@@ -385,6 +598,27 @@ class TestDisassociateUnits(unittest.TestCase):
         self.assertFalse(m_update_last_unit_removed.called)
 
 
+class TestRecordUnitRemovals(unittest.TestCase):
+
+    @patch(MODULE + 'dateutils.now_utc_timestamp', return_value=0)
+    @patch(MODULE + 'model.RepositoryContentUnitRemoval._get_collection')
+    def test_record(self, mock_get_collection, mock_now):
+        repo_controller._record_unit_removals('foo', iter([('type_1', 'a'), ('type_2', 'b')]))
+
+        mock_get_collection.return_value.insert_many.assert_called_once_with([
+            {'repo_id': 'foo', 'unit_type_id': 'type_1', 'unit_id': 'a',
+             'removed': '1970-01-01T00:00:00Z', '_ns': 'repo_content_unit_removals'},
+            {'repo_id': 'foo', 'unit_type_id': 'type_2', 'unit_id': 'b',
+             'removed': '1970-01-01T00:00:00Z', '_ns': 'repo_content_unit_removals'}],
+            ordered=False)
+
+    @patch(MODULE + 'model.RepositoryContentUnitRemoval._get_collection')
+    def test_nothing_to_record(self, mock_get_collection):
+        repo_controller._record_unit_removals('foo', [])
+
+        self.assertFalse(mock_get_collection.called)
+
+
 @mock.patch('pulp.server.controllers.repository.dist_controller')
 @mock.patch('pulp.server.controllers.repository.importer_controller')
 @mock.patch('pulp.server.controllers.repository.manager_factory')
@@ -506,6 +740,7 @@ class TestQueueDelete(unittest.TestCase):
         self.assertTrue(async_result is mock_delete.apply_async_with_reservation())
 
 
+@mock.patch('pulp.server.controllers.repository.RepoProfileApplicability')
 @mock.patch('pulp.server.controllers.repository.dist_controller')
 @mock.patch('pulp.server.controllers.repository.importer_controller')
 @mock.patch('pulp.server.controllers.repository.TaskResult')
@@ -520,7 +755,8 @@ class TestDelete(unittest.TestCase):
     """
 
     def test_delete_no_importers_or_distributors(self, m_factory, m_model, m_content, m_publish,
-                                                 m_sync, m_task_result, m_imp_ctrl, m_dist_ctrl):
+                                                 m_sync, m_task_result, m_imp_ctrl, m_dist_ctrl,
+                                                 m_rpa):
         """
         Test a simple repository delete when there are no importers or distributors.
         """
@@ -541,6 +777,9 @@ class TestDelete(unittest.TestCase):
         m_sync.get_collection().remove.assert_called_once_with(pymongo_args, **pymongo_kwargs)
         m_publish.get_collection().remove.assert_called_once_with(pymongo_args, **pymongo_kwargs)
         m_content.get_collection().remove.assert_called_once_with(pymongo_args, **pymongo_kwargs)
+        m_model.RepositoryContentUnitRemoval.objects.assert_called_once_with(repo_id='foo-repo')
+        m_model.RepositoryContentUnitRemoval.objects.return_value.delete.assert_called_once_with()
+        m_rpa.get_collection().remove.assert_called_once_with(pymongo_args, **pymongo_kwargs)
         mock_group_manager.remove_repo_from_groups.assert_called_once_with('foo-repo')
         m_task_result.assert_called_once_with(error=None, spawned_tasks=[])
         self.assertTrue(result is m_task_result.return_value)
@@ -548,7 +787,7 @@ class TestDelete(unittest.TestCase):
     @mock.patch('pulp.server.controllers.repository.consumer_controller')
     def test_delete_imforms_other_collections(self, mock_consumer_ctrl, m_factory, m_model,
                                               m_content, m_publish, m_sync, m_task_result,
-                                              m_imp_ctrl, m_dist_ctrl):
+                                              m_imp_ctrl, m_dist_ctrl, m_rpa):
         """
         Test that other collections are correctly informed when a repository is deleted.
         """
@@ -580,7 +819,8 @@ class TestDelete(unittest.TestCase):
         self.assertTrue(result is m_task_result.return_value)
 
     def test_delete_with_dist_and_imp_errors(self, m_factory, m_model, m_content, m_publish,
-                                             m_sync, m_task_result, m_imp_ctrl, m_dist_ctrl):
+                                             m_sync, m_task_result, m_imp_ctrl, m_dist_ctrl,
+                                             m_rpa):
         """
         Test repository delete when the other collections raise errors.
         """
@@ -628,7 +868,7 @@ class TestDelete(unittest.TestCase):
         self.assertTrue(isinstance(e.child_exceptions[2], MockException))
 
     def test_delete_content_errors(self, m_factory, m_model, m_content, m_publish,
-                                   m_sync, m_task_result, m_imp_ctrl, m_dist_ctrl):
+                                   m_sync, m_task_result, m_imp_ctrl, m_dist_ctrl, m_rpa):
         """
         Test delete repository when the content collection raises errors.
         """
@@ -672,7 +912,8 @@ class TestDelete(unittest.TestCase):
     @mock.patch('pulp.server.controllers.repository.pulp_exceptions.PulpCodedException')
     def test_delete_consumer_bind_error(self, mock_coded_exception, mock_pulp_error,
                                         mock_consumer_ctrl, m_factory, m_model, m_content,
-                                        m_publish, m_sync, m_task_result, m_imp_ctrl, m_dist_ctrl):
+                                        m_publish, m_sync, m_task_result, m_imp_ctrl, m_dist_ctrl,
+                                        m_rpa):
         """
         Test repository delete when consumer bind collection raises an error.
         """
@@ -1704,28 +1945,35 @@ class TestDownloadRepo(unittest.TestCase):
 
 class TestGetDeferredContentUnits(unittest.TestCase):
 
+    def set_deferred(self, mock_qs, entries):
+        query_set = mock_qs.objects.only.return_value.order_by.return_value
+        query_set.limit.return_value.as_pymongo.return_value = entries
+
     @patch(MODULE + 'plugin_api.get_unit_model_by_id')
     @patch(MODULE + 'model.DeferredDownload')
     def test_get_deferred_content_units(self, mock_qs, mock_get_model):
         # Setup
-        mock_unit = Mock(unit_type_id='abc', unit_id='123')
-        mock_qs.objects.filter.return_value = [mock_unit]
+        self.set_deferred(mock_qs, [
+            {'_id': 1, 'unit_type_id': 'abc', 'unit_id': '123'},
+            {'_id': 2, 'unit_type_id': 'abc', 'unit_id': '456'},
+        ])
+        units = [Mock(id='456'), Mock(id='123')]
+        mock_get_model.return_value.objects.filter.return_value = units
 
         # Test
         result = list(repo_controller._get_deferred_content_units())
-        self.assertEqual(1, len(result))
+        self.assertEqual(result, [units[1], units[0]])
         mock_get_model.assert_called_once_with('abc')
         unit_filter = mock_get_model.return_value.objects.filter
-        unit_filter.assert_called_once_with(id='123')
-        unit_filter.return_value.get.assert_called_once_with()
+        unit_filter.assert_called_once_with(id__in=['123', '456'])
+        mock_qs.objects.only.assert_called_once_with('unit_id', 'unit_type_id')
 
     @patch(MODULE + '_logger.error')
     @patch(MODULE + 'plugin_api.get_unit_model_by_id')
     @patch(MODULE + 'model.DeferredDownload')
     def test_get_deferred_content_units_no_model(self, mock_qs, mock_get_model, mock_log):
         # Setup
-        mock_unit = Mock(unit_type_id='abc', unit_id='123')
-        mock_qs.objects.filter.return_value = [mock_unit]
+        self.set_deferred(mock_qs, [{'_id': 1, 'unit_type_id': 'abc', 'unit_id': '123'}])
         mock_get_model.return_value = None
 
         # Test
@@ -1739,10 +1987,8 @@ class TestGetDeferredContentUnits(unittest.TestCase):
     @patch(MODULE + 'model.DeferredDownload')
     def test_get_deferred_content_units_no_unit(self, mock_qs, mock_get_model, mock_log):
         # Setup
-        mock_unit = Mock(unit_type_id='abc', unit_id='123')
-        mock_qs.objects.filter.return_value = [mock_unit]
-        unit_qs = mock_get_model.return_value.objects.filter.return_value
-        unit_qs.get.side_effect = mongoengine.DoesNotExist()
+        self.set_deferred(mock_qs, [{'_id': 1, 'unit_type_id': 'abc', 'unit_id': '123'}])
+        mock_get_model.return_value.objects.filter.return_value = []
 
         # Test
         result = list(repo_controller._get_deferred_content_units())
@@ -1754,6 +2000,7 @@ class TestGetDeferredContentUnits(unittest.TestCase):
 class TestCreateDownloadRequests(unittest.TestCase):
 
     @patch(MODULE + 'Key.load', Mock())
+    @patch(MODULE + '_get_streamer_location', Mock(return_value=('https', 'host', '/s/')))
     @patch(MODULE + 'common_utils.get_working_directory', Mock(return_value='/working/'))
     @patch(MODULE + 'mkdir')
     @patch(MODULE + '_get_streamer_url')
@@ -1761,9 +2008,8 @@ class TestCreateDownloadRequests(unittest.TestCase):
     def test_create_download_requests(self, mock_catalog, mock_get_url, mock_mkdir):
         # Setup
         content_units = [Mock(id='123', type_id='abc', list_files=lambda: ['/file/path'])]
-        filtered_qs = mock_catalog.objects.filter.return_value
-        catalog_entry = filtered_qs.order_by.return_value.first.return_value
-        catalog_entry.path = '/storage/123/path'
+        catalog_entry = Mock(unit_id='123', unit_type_id='abc', path='/file/path', revision=0)
+        mock_catalog.objects.filter.return_value = [catalog_entry]
         expected_data_dict = {
             repo_controller.TYPE_ID: 'abc',
             repo_controller.UNIT_ID: '123',
@@ -1777,20 +2023,67 @@ class TestCreateDownloadRequests(unittest.TestCase):
 
         # Test
         requests = repo_controller._create_download_requests(content_units)
+        self.assertTrue(inspect.isgenerator(requests))
+        requests = list(requests)
         expected_data_dict[repo_controller.REQUEST] = requests[0]
         mock_catalog.objects.filter.assert_called_once_with(
-            unit_id='123',
-            unit_type_id='abc',
-            path='/file/path'
+            path__in=['/file/path'],
+            unit_id__in=['123']
         )
-        filtered_qs.order_by.assert_called_once_with('revision')
-        filtered_qs.order_by.return_value.first.assert_called_once_with()
+        mock_get_url.assert_called_once_with(catalog_entry, repo_controller.Key.load.return_value,
+                                             ('https', 'host', '/s/'))
         mock_mkdir.assert_called_once_with('/working/123')
         self.assertEqual(1, len(requests))
         self.assertEqual(mock_get_url.return_value, requests[0].url)
         self.assertEqual('/working/123/path', requests[0].destination)
         self.assertEqual(expected_data_dict, requests[0].data)
 
+    @patch(MODULE + 'Key.load', Mock())
+    @patch(MODULE + '_get_streamer_location', Mock())
+    @patch(MODULE + 'common_utils.get_working_directory', Mock(return_value='/working/'))
+    @patch(MODULE + 'mkdir', Mock())
+    @patch(MODULE + '_get_streamer_url', Mock(return_value='http://streamer/'))
+    @patch(MODULE + 'paginate')
+    @patch(MODULE + 'model.LazyCatalogEntry')
+    def test_one_query_per_page(self, mock_catalog, mock_paginate):
+        # Setup
+        units = [Mock(id=str(n), type_id='abc', list_files=Mock(return_value=['/a/%d' % n]))
+                 for n in range(4)]
+        mock_paginate.return_value = [units[:2], units[2:]]
+        mock_catalog.objects.filter.side_effect = lambda **kwargs: [
+            Mock(unit_id=u.id, unit_type_id='abc', path='/a/' + u.id, revision=0)
+            for u in units if u.id in kwargs['unit_id__in']]
+
+        # Test
+        requests = list(repo_controller._create_download_requests(iter(units)))
+        self.assertEqual(4, len(requests))
+        self.assertEqual(2, mock_catalog.objects.filter.call_count)
+        self.assertEqual(['/working/%d/%d' % (n, n) for n in range(4)],
+                         [r.destination for r in requests])
+
+
+class TestGetCatalogEntries(unittest.TestCase):
+
+    @patch(MODULE + 'model.LazyCatalogEntry')
+    def test_lowest_revision(self, mock_catalog):
+        unit = Mock(id='123', type_id='abc')
+        entries = [
+            Mock(unit_id='123', unit_type_id='abc', path='/a', revision=2),
+            Mock(unit_id='123', unit_type_id='abc', path='/a', revision=1),
+            Mock(unit_id='123', unit_type_id='xyz', path='/b', revision=0),
+        ]
+        mock_catalog.objects.filter.return_value = entries
+
+        catalog = repo_controller._get_catalog_entries([(unit, ['/a', '/b'])])
+
+        self.assertEqual(catalog, {('abc', '123', '/a'): entries[1],
+                                   ('xyz', '123', '/b'): entries[2]})
+
+    @patch(MODULE + 'model.LazyCatalogEntry')
+    def test_no_files(self, mock_catalog):
+        self.assertEqual(repo_controller._get_catalog_entries([(Mock(), [])]), {})
+        self.assertFalse(mock_catalog.objects.filter.called)
+
 
 class TestGetStreamerUrl(unittest.TestCase):
 
@@ -1882,7 +2175,29 @@ class TestLazyUnitDownloadStep(unittest.TestCase):
         """Assert calls to `_process_block` result in calls to the downloader."""
         self.step.downloader = Mock()
         self.step.start()
-        self.step.downloader.download.assert_called_once_with(self.step.download_requests)
+        requests = self.step.downloader.download.call_args[0][0]
+        self.assertEqual(list(requests), self.step.download_requests)
+
+    def test_count_requests(self):
+        """Assert requests are counted as they are generated."""
+        requests = self.step._count_requests()
+        self.assertEqual(0, self.step.total_units)
+        next(requests)
+        self.assertEqual(1, self.step.total_units)
+        self.assertFalse(self.step.requests_generated)
+        self.assertRaises(StopIteration, next, requests)
+        self.assertTrue(self.step.requests_generated)
+
+    @patch(MODULE + 'model.TaskStatus', Mock())
+    def test_report_complete(self):
+        """Assert the step is complete once all the generated requests are processed."""
+        self.step.total_units = 1
+        self.step.progress_successes = 1
+        self.step.report()
+        self.assertEqual(repo_controller.reporting_constants.STATE_NOT_STARTED, self.step.state)
+        self.step.requests_generated = True
+        self.step.report()
+        self.assertEqual(repo_controller.reporting_constants.STATE_COMPLETE, self.step.state)
 
     @patch(MODULE + 'plugin_api.get_unit_model_by_id')
     @patch(MODULE + 'model.DeferredDownload')
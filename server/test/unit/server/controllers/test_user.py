@@ -49,6 +49,7 @@ class TestCreateUser(unittest.TestCase):
         self.assertTrue(user is mock_model.return_value)
 
 
+@mock.patch('pulp.server.controllers.user.permission_cache')
 @mock.patch('pulp.server.controllers.user.model.User')
 @mock.patch('pulp.server.controllers.user.manager_factory')
 class TestUpdateUser(unittest.TestCase):
@@ -56,7 +57,7 @@ class TestUpdateUser(unittest.TestCase):
     Tests for updating a user.
     """
 
-    def test_update_as_expected(self, mock_f, mock_model):
+    def test_update_as_expected(self, mock_f, mock_model, mock_cache):
         """
         Test the expected path of a successful update.
         """
@@ -72,8 +73,9 @@ class TestUpdateUser(unittest.TestCase):
         m_user.save.assert_called_once_with()
         m_user.roles = ['analyze', 'photograph']
         self.assertTrue(updated is m_user)
+        mock_cache.invalidate.assert_called_once_with()
 
-    def test_invalid_value(self, mock_f, mock_model):
+    def test_invalid_value(self, mock_f, mock_model, mock_cache):
         """
         Test the handling of a Mongoengine Validation error on update.
         """
@@ -82,8 +84,9 @@ class TestUpdateUser(unittest.TestCase):
         m_user.save.side_effect = ValidationError()
         self.assertRaises(pulp_exceptions.InvalidValue, user_controller.update_user,
                           'curiosity', delta)
+        self.assertFalse(mock_cache.invalidate.called)
 
-    def test_extra_param(self, mock_f, mock_model):
+    def test_extra_param(self, mock_f, mock_model, mock_cache):
         """
         Test the handling of a Mongoengine Validation error on update.
         """
@@ -91,7 +94,7 @@ class TestUpdateUser(unittest.TestCase):
         self.assertRaises(pulp_exceptions.InvalidValue, user_controller.update_user,
                           'curiosity', delta)
 
-    def test_invalid_roles(self, mock_f, mock_model):
+    def test_invalid_roles(self, mock_f, mock_model, mock_cache):
         """
         Test the handling of non-list of roles.
         """
@@ -100,6 +103,7 @@ class TestUpdateUser(unittest.TestCase):
                           'curiosity', delta)
 
 
+@mock.patch('pulp.server.controllers.user.permission_cache')
 @mock.patch('pulp.server.controllers.user.is_last_super_user')
 @mock.patch('pulp.server.controllers.user.model.User')
 @mock.patch('pulp.server.controllers.user.manager_factory')
@@ -108,7 +112,7 @@ class TestDeleteUser(unittest.TestCase):
     Tests for deleting a user.
     """
 
-    def test_as_expected(self, mock_f, mock_model, mock_last_su):
+    def test_as_expected(self, mock_f, mock_model, mock_last_su, mock_cache):
         """
         Test delete that works as expected.
         """
@@ -118,8 +122,9 @@ class TestDeleteUser(unittest.TestCase):
 
         m_permission_manager.revoke_all_permissions_from_user.assert_called_once_with('curiosity')
         mock_model.objects.get_or_404.return_value.delete.assert_called_once_with()
+        mock_cache.invalidate.assert_called_once_with()
 
-    def test_last_super_user(self, mock_f, mock_model, mock_last_su):
+    def test_last_super_user(self, mock_f, mock_model, mock_last_su, mock_cache):
         """
         Test an attempted delete of the last super user.
         """
@@ -128,6 +133,7 @@ class TestDeleteUser(unittest.TestCase):
         self.assertRaises(pulp_exceptions.PulpDataException, user_controller.delete_user,
                           'curiosity')
         self.assertFalse(m_permission_manager.revoke_all_permissions_from_user.called)
+        self.assertFalse(mock_cache.invalidate.called)
 
 
 @mock.patch('pulp.server.controllers.user.find_users_belonging_to_role')
@@ -169,85 +175,60 @@ class TestIsLastSuperUser(unittest.TestCase):
         self.assertTrue(user_controller.is_last_super_user('test'))
 
 
-@mock.patch('pulp.server.controllers.user.manager_factory')
-@mock.patch('pulp.server.controllers.user.model.User')
+@mock.patch('pulp.server.controllers.user.permission_cache.get')
 class TestIsAuthorized(unittest.TestCase):
     """
     Tests for determining whether a user is authorized to view a resource.
     """
 
-    def test_super_user(self, mock_model, mock_f):
+    def test_super_user(self, mock_get):
         """
         Ensure that super users have access to everything.
         """
-        m_user = mock_model.objects.get_or_404.return_value
-        m_user.is_superuser.return_value = True
-        self.assertTrue(m_user.is_superuser('some_resource', 'superuser', 'op'))
+        mock_get.return_value.user.is_superuser.return_value = True
 
-    def test_explicit_access(self, mock_model, mock_f):
-        """
-        Ensure that a user with access to a resource url is authorized for it.
-        """
-        m_user = mock_model.objects.get_or_404.return_value
-        m_user.is_superuser.return_value = False
-        mock_pqm = mock_f.permission_query_manager.return_value
-        mock_pqm.find_by_resource.return_value = '/mock/resource/'
-        mock_pqm.find_user_permission.return_value = ['op']
+        self.assertTrue(user_controller.is_authorized('/some/resource/', 'superuser', 'op'))
+        mock_get.assert_called_once_with('superuser')
+        self.assertFalse(mock_get.return_value.permissions.allows.called)
 
-        self.assertTrue(user_controller.is_authorized('/mock/resource/', 'testuser', 'op'))
-        mock_pqm.find_by_resource.assert_called_once_with('/mock/resource/')
-        mock_pqm.find_user_permission.assert_called_once_with('/mock/resource/', 'testuser')
-
-    def test_subdomain_access(self, mock_model, mock_f):
+    def test_permissions(self, mock_get):
         """
-        Ensure that a user with access to the subdomain of a url has access to the url.
+        Ensure that users are authorized by the permissions cached for them.
         """
+        entry = mock_get.return_value
+        entry.user.is_superuser.return_value = False
+        entry.permissions.allows.return_value = False
 
-        def base_only(permission, login):
-            """
-            Simulate permission over a subdomain, but nothing else.
-            """
-            if permission == '/mock/':
-                return ['op']
-            else:
-                return []
+        self.assertFalse(user_controller.is_authorized('/mock/resource/', 'test-user', 'op'))
+        mock_get.assert_called_once_with('test-user')
+        entry.permissions.allows.assert_called_once_with('/mock/resource/', 'op')
 
-        m_user = mock_model.objects.get_or_404.return_value
-        m_user.is_superuser.return_value = False
-        mock_pqm = mock_f.permission_query_manager.return_value
-        mock_pqm.find_by_resource.side_effect = lambda x: x
-        mock_pqm.find_user_permission.side_effect = base_only
 
-        self.assertTrue(user_controller.is_authorized('/mock/resource/', 'test-user', 'op'))
-        self.assertTrue(user_controller.is_authorized('/mock/other_resource/', 'test-user', 'op'))
-        self.assertFalse(user_controller.is_authorized('/other/', 'test-user', 'op'))
-        self.assertFalse(user_controller.is_authorized('/', 'test-user', 'op'))
+class TestIsAuthorizedEntry(unittest.TestCase):
+    """
+    Tests for determining whether a cached user is authorized to view a resource.
+    """
 
-    @mock.patch('pulp.server.controllers.user.Permission.get_collection')
-    def test_root_access(self, mock_perm_collection, mock_model, mock_f):
+    def test_super_user(self):
         """
-        Ensure that a user that has access to the root domain '/' has access to everything.
+        Ensure that super users have access to everything.
         """
+        entry = mock.MagicMock()
+        entry.user.is_superuser.return_value = True
 
-        def root_only(permission, login):
-            """
-            Simulate permission over root domain, but nothing else.
-            """
-            if permission == '/':
-                return ['op']
-            else:
-                return []
+        self.assertTrue(user_controller.is_authorized_entry(entry, '/some/resource/', 'op'))
+        self.assertFalse(entry.permissions.allows.called)
 
-        m_user = mock_model.objects.get_or_404.return_value
-        m_user.is_superuser.return_value = False
-        mock_pqm = mock_f.permission_query_manager.return_value
-        mock_pqm.find_by_resource.side_effect = lambda x: x
-        mock_pqm.find_user_permission.side_effect = root_only
-        mock_perm_collection.return_value.find_one.return_value = '/'
-
-        self.assertTrue(user_controller.is_authorized('/mock/resource/', 'test-user', 'op'))
-        self.assertTrue(user_controller.is_authorized('/mock/other_resource/', 'test-user', 'op'))
-        self.assertTrue(user_controller.is_authorized('/', 'test-user', 'op'))
+    def test_permissions(self):
+        """
+        Ensure that users are authorized by the permissions of the entry.
+        """
+        entry = mock.MagicMock()
+        entry.user.is_superuser.return_value = False
+        entry.permissions.allows.return_value = True
+
+        self.assertTrue(user_controller.is_authorized_entry(entry, '/mock/resource/', 'op'))
+        entry.permissions.allows.assert_called_once_with('/mock/resource/', 'op')
 
 
 @mock.patch('pulp.server.controllers.user.Role.get_collection')
@@ -17,7 +17,7 @@ from pulp.server.db.model import criteria
 FIELDS = set(('sort', 'skip', 'limit', 'filters', 'fields'))
 ASSOCIATION_FIELDS = set(('type_ids', 'association_filters', 'unit_filters', 'association_sort',
                           'unit_sort', 'limit', 'skip', 'association_fields', 'unit_fields',
-                          'remove_duplicates'))
+                          'remove_duplicates', 'page_token'))
 
 
 class TestCriteria(unittest.TestCase):
@@ -424,3 +424,26 @@ class TestUnitAssociationCriteria(unittest.TestCase):
         self.assertEqual(new_criteria.remove_duplicates, remove_duplicates)
         self.assertEqual(new_criteria.unit_sort, unit_sort)
         self.assertEqual(new_criteria.association_filters, association_filters)
+        self.assertEqual(new_criteria.page_token, None)
+
+    def test_from_dict_page_token(self):
+        a_dict = criteria.UnitAssociationCriteria(page_token='abc').to_dict()
+
+        new_criteria = criteria.UnitAssociationCriteria.from_dict(a_dict)
+
+        self.assertEqual(new_criteria.page_token, 'abc')
+
+    def test_from_client_input_page_token(self):
+        c = criteria.UnitAssociationCriteria.from_client_input({'page_token': 'abc', 'limit': 10})
+
+        self.assertEqual(c.page_token, 'abc')
+        self.assertEqual(c.limit, 10)
+
+    def test_from_client_input_empty_page_token(self):
+        c = criteria.UnitAssociationCriteria.from_client_input({'page_token': ''})
+
+        self.assertEqual(c.page_token, None)
+
+    def test_from_client_input_invalid_page_token(self):
+        self.assertRaises(exceptions.InvalidValue,
+                          criteria.UnitAssociationCriteria.from_client_input, {'page_token': 3})
@@ -28,7 +28,8 @@ class TestReaperCollectionConfig(unittest.TestCase):
                                repository.RepoSyncResult,
                                repository.RepoPublishResult,
                                repo_group.RepoGroupPublishResult,
-                               celery_result.CeleryResult]
+                               celery_result.CeleryResult,
+                               model.FileChecksum]
         for key in collections_to_reap:
             self.assertTrue(key in reaper._COLLECTION_TIMEDELTAS)
         # Also check the values.
@@ -43,6 +44,7 @@ class TestReaperCollectionConfig(unittest.TestCase):
                          'repo_group_publish_history')
         self.assertEqual(reaper._COLLECTION_TIMEDELTAS[celery_result.CeleryResult],
                          'task_result_history')
+        self.assertEqual(reaper._COLLECTION_TIMEDELTAS[model.FileChecksum], 'file_checksums')
 
 
 class TestCreateExpiredObjectId(unittest.TestCase):
@@ -1,6 +1,10 @@
+import unittest
+
 import mock
+from pymongo.errors import DuplicateKeyError
 
 from .... import base
+from pulp.common import dateutils
 from pulp.devel import mock_plugins
 from pulp.plugins.loader import api as plugins
 from pulp.server.controllers import distributor as dist_controller
@@ -14,7 +18,10 @@ from pulp.server.managers.consumer.applicability import (
     _add_consumers_to_applicability_map, _add_profiles_to_consumer_map_and_get_hashes,
     _add_repo_ids_to_consumer_map, _format_report, _get_applicability_map,
     _get_consumer_applicability_map, DoesNotExist, MultipleObjectsReturned,
-    retrieve_consumer_applicability, ApplicabilityRegenerationManager)
+    retrieve_consumer_applicability, ApplicabilityRegenerationManager, RepoContentChanges,
+    _plan_profile_batches, RegenerationProgress, summarize_regeneration_progress,
+    stream_consumer_applicability, _get_consumer_sets, _group_consumers,
+    _get_consumer_set_applicability_map)
 from pulp.server.managers.consumer.bind import BindManager
 from pulp.server.managers.consumer.cud import ConsumerManager
 from pulp.server.managers.consumer.profile import ProfileManager
@@ -447,6 +454,574 @@ class ApplicabilityRegenerationManagerTests(base.PulpServerTests):
         mock_get_collection.return_value.find.return_value.batch_size.assert_called_with(5)
 
 
+MODULE = 'pulp.server.managers.consumer.applicability.'
+
+
+class TestIncrementalRegeneration(unittest.TestCase):
+    """
+    Test the regeneration of existing applicabilities from the changes made to the repository.
+    """
+
+    CHANGES = RepoContentChanges(
+        '2016-01-03T00:00:00Z',
+        [('2016-01-01T00:00:00Z', 'rpm', 'rpm-old'),
+         ('2016-01-02T00:00:00Z', 'rpm', 'rpm-new'),
+         ('2016-01-02T00:00:00Z', 'iso', 'iso-new'),
+         ('2016-01-02T12:00:00Z', 'erratum', 'errata-new')],
+        [('2016-01-01T00:00:00Z', 'erratum', 'errata-old'),
+         ('2016-01-02T00:00:00Z', 'rpm', 'rpm-removed'),
+         ('2016-01-02T06:00:00Z', 'erratum', 'errata-new')])
+
+    def test_get_content_delta(self):
+        delta = ApplicabilityRegenerationManager._get_content_delta(
+            '2016-01-02T00:00:00Z', self.CHANGES, ['rpm', 'erratum'])
+
+        # errata-new was removed and associated again, so it is only reported as added
+        self.assertEqual(delta, ({'rpm': ['rpm-new'], 'erratum': ['errata-new']},
+                                 {'rpm': ['rpm-removed']}))
+
+    def test_get_content_delta_nothing_changed(self):
+        delta = ApplicabilityRegenerationManager._get_content_delta(
+            '2016-01-02T00:00:00Z', self.CHANGES, ['drpm'])
+
+        self.assertEqual(delta, ({}, {}))
+
+    def test_get_content_delta_unknown_regeneration(self):
+        delta = ApplicabilityRegenerationManager._get_content_delta(
+            None, self.CHANGES, ['rpm', 'erratum'])
+
+        self.assertTrue(delta is None)
+
+    @mock.patch(MODULE + 'model.RepositoryContentUnitRemoval._get_collection')
+    @mock.patch(MODULE + 'model.RepositoryContentUnit._get_collection')
+    @mock.patch(MODULE + 'dateutils.now_utc_timestamp', return_value=0)
+    def test_get_repo_content_changes(self, mock_now, mock_association_collection,
+                                      mock_removal_collection):
+        mock_association_collection.return_value.find.return_value = [
+            {'updated': 'u', 'unit_type_id': 'rpm', 'unit_id': 'rpm-1'}]
+        mock_removal_collection.return_value.find.return_value = [
+            {'removed': 'r', 'unit_type_id': 'erratum', 'unit_id': 'errata-1'}]
+
+        changes = ApplicabilityRegenerationManager._get_repo_content_changes(
+            'repo-1', ['2016-01-02T00:00:00Z', None, '2016-01-01T00:00:00Z'])
+
+        self.assertEqual(changes, ('1970-01-01T00:00:00Z', [('u', 'rpm', 'rpm-1')],
+                                   [('r', 'erratum', 'errata-1')]))
+        mock_association_collection.return_value.find.assert_called_once_with(
+            {'repo_id': 'repo-1', 'updated': {'$gte': '2016-01-01T00:00:00Z'}},
+            projection=['unit_type_id', 'unit_id', 'updated'])
+        mock_removal_collection.return_value.find.assert_called_once_with(
+            {'repo_id': 'repo-1', 'removed': {'$gte': '2016-01-01T00:00:00Z'}},
+            projection=['unit_type_id', 'unit_id', 'removed'])
+
+    @mock.patch(MODULE + 'model.RepositoryContentUnit._get_collection')
+    def test_get_repo_content_changes_unknown_regeneration(self, mock_association_collection):
+        changes = ApplicabilityRegenerationManager._get_repo_content_changes('repo-1', [None])
+
+        self.assertTrue(changes is None)
+        self.assertFalse(mock_association_collection.called)
+
+    @mock.patch(MODULE + 'UnitProfile.get_collection')
+    def test_get_unit_profiles(self, mock_get_collection):
+        mock_get_collection.return_value.aggregate.return_value = [
+            {'_id': 'hash-1', 'id': 'profile-1', 'content_type': 'rpm'}]
+
+        unit_profiles = ApplicabilityRegenerationManager._get_unit_profiles(['hash-1', 'hash-2'])
+
+        self.assertEqual(unit_profiles,
+                         {'hash-1': {'_id': 'hash-1', 'id': 'profile-1', 'content_type': 'rpm'}})
+        pipeline = mock_get_collection.return_value.aggregate.call_args[0][0]
+        self.assertEqual(pipeline[0], {'$match': {'profile_hash': {'$in': ['hash-1', 'hash-2']}}})
+
+    @mock.patch(MODULE + 'ApplicabilityRegenerationManager.regenerate_applicability')
+    @mock.patch(MODULE + 'ApplicabilityRegenerationManager._get_repo_content_changes')
+    @mock.patch(MODULE + 'ApplicabilityRegenerationManager._get_unit_profiles')
+    def test_regenerate_existing_applicabilities(self, mock_get_unit_profiles,
+                                                 mock_get_changes, mock_regenerate):
+        documents = [
+            {'profile_hash': 'hash-1', 'repo_id': 'repo-1', 'profile': [], 'applicability': {},
+             'regenerated': '2016-01-01T00:00:00Z'},
+            {'profile_hash': 'hash-2', 'repo_id': 'repo-1', 'profile': [], 'applicability': {}}]
+        mock_get_unit_profiles.return_value = {
+            'hash-1': {'id': 'profile-1', 'content_type': 'rpm'}}
+
+        ApplicabilityRegenerationManager._regenerate_existing_applicabilities('repo-1', documents)
+
+        mock_get_unit_profiles.assert_called_once_with(['hash-1', 'hash-2'])
+        mock_get_changes.assert_called_once_with('repo-1', ['2016-01-01T00:00:00Z', None])
+        # The applicability of the profile hash without unit profile is skipped
+        self.assertEqual(mock_regenerate.call_count, 1)
+        args = mock_regenerate.call_args[0]
+        self.assertEqual(args[:4], ('hash-1', 'rpm', 'profile-1', 'repo-1'))
+        self.assertEqual(args[4].profile_hash, 'hash-1')
+        self.assertTrue(args[5] is mock_get_changes.return_value)
+
+
+@mock.patch(MODULE + 'time.time', return_value=100.0)
+@mock.patch(MODULE + 'dateutils.now_utc_timestamp', return_value=0)
+@mock.patch(MODULE + 'RepoProfileApplicability')
+@mock.patch(MODULE + 'ApplicabilityRegenerationManager._get_existing_repo_content_types',
+            return_value=['rpm', 'erratum'])
+@mock.patch(MODULE + 'ApplicabilityRegenerationManager._profiler')
+class TestRegenerateApplicabilityDelta(unittest.TestCase):
+    """
+    Test regenerate_applicability with the changes made to the bound repository.
+    """
+
+    CHANGES = RepoContentChanges(
+        '2016-01-03T00:00:00Z',
+        [('2016-01-02T00:00:00Z', 'rpm', 'rpm-new')],
+        [('2016-01-02T00:00:00Z', 'erratum', 'errata-removed')])
+
+    def setUp(self):
+        self.existing_applicability = mock.MagicMock(
+            profile=['profile'], applicability={'rpm': ['rpm-old']},
+            regenerated='2016-01-01T00:00:00Z')
+        self.profiler = mock.MagicMock()
+        self.profiler.metadata.return_value = {'types': ['rpm', 'erratum']}
+
+    def test_delta(self, mock_profiler, mock_types, mock_rpa, mock_now, mock_time):
+        mock_profiler.return_value = (self.profiler, {})
+        mock_rpa.objects.create.side_effect = DuplicateKeyError('duplicate')
+
+        ApplicabilityRegenerationManager.regenerate_applicability(
+            'hash-1', 'rpm', 'profile-1', 'repo-1', self.existing_applicability, self.CHANGES)
+
+        args = self.profiler.calculate_applicable_units_delta.call_args[0]
+        self.assertEqual(args[:5], (['profile'], 'repo-1', {'rpm': ['rpm-old']},
+                                    {'rpm': ['rpm-new']}, {'erratum': ['errata-removed']}))
+        self.assertFalse(self.profiler.calculate_applicable_units.called)
+        self.assertEqual(self.existing_applicability.applicability,
+                         self.profiler.calculate_applicable_units_delta.return_value)
+        # The applicability reflects the repository as it was when the changes were queried
+        self.assertEqual(self.existing_applicability.regenerated, '2016-01-03T00:00:00Z')
+        self.existing_applicability.save.assert_called_once_with()
+
+    def test_delta_not_implemented(self, mock_profiler, mock_types, mock_rpa, mock_now, mock_time):
+        mock_profiler.return_value = (self.profiler, {})
+        mock_rpa.objects.create.side_effect = DuplicateKeyError('duplicate')
+        self.profiler.calculate_applicable_units_delta.side_effect = NotImplementedError()
+
+        ApplicabilityRegenerationManager.regenerate_applicability(
+            'hash-1', 'rpm', 'profile-1', 'repo-1', self.existing_applicability, self.CHANGES)
+
+        self.profiler.calculate_applicable_units.assert_called_once_with(
+            ['profile'], 'repo-1', mock.ANY, mock.ANY)
+        self.assertEqual(self.existing_applicability.applicability,
+                         self.profiler.calculate_applicable_units.return_value)
+        self.assertEqual(self.existing_applicability.regenerated, '1970-01-01T00:00:00Z')
+
+    def test_nothing_changed(self, mock_profiler, mock_types, mock_rpa, mock_now, mock_time):
+        self.profiler.metadata.return_value = {'types': ['rpm']}
+        mock_profiler.return_value = (self.profiler, {})
+        changes = RepoContentChanges('2016-01-03T00:00:00Z', [], self.CHANGES.removed)
+
+        ApplicabilityRegenerationManager.regenerate_applicability(
+            'hash-1', 'rpm', 'profile-1', 'repo-1', self.existing_applicability, changes)
+
+        self.assertFalse(self.profiler.calculate_applicable_units_delta.called)
+        self.assertFalse(self.profiler.calculate_applicable_units.called)
+        mock_rpa.get_collection.return_value.update.assert_called_once_with(
+            {'_id': self.existing_applicability._id},
+            {'$set': {'regenerated': '2016-01-03T00:00:00Z', 'duration': 0.0}})
+
+    def test_unknown_regeneration(self, mock_profiler, mock_types, mock_rpa, mock_now, mock_time):
+        mock_profiler.return_value = (self.profiler, {})
+        self.existing_applicability.regenerated = None
+
+        ApplicabilityRegenerationManager.regenerate_applicability(
+            'hash-1', 'rpm', 'profile-1', 'repo-1', self.existing_applicability, self.CHANGES)
+
+        self.assertFalse(self.profiler.calculate_applicable_units_delta.called)
+        mock_rpa.objects.create.assert_called_once_with(
+            'hash-1', 'repo-1', ['profile'],
+            self.profiler.calculate_applicable_units.return_value, '1970-01-01T00:00:00Z', 0.0)
+
+
+class TestPlanProfileBatches(unittest.TestCase):
+    """
+    Test the batching of the profiles whose applicability is regenerated in parallel.
+    """
+
+    def test_batch_by_duration(self):
+        profile_repos = {'hash-1': {'repo-1': 20.0, 'repo-2': 20.0},
+                         'hash-2': {'repo-1': 30.0},
+                         'hash-3': {'repo-2': 50.0},
+                         'hash-4': {'repo-1': 5.0}}
+
+        batches = list(_plan_profile_batches(profile_repos, 60))
+
+        self.assertEqual(batches, [[['hash-1', ['repo-1', 'repo-2']]],
+                                   [['hash-2', ['repo-1']]],
+                                   [['hash-3', ['repo-2']], ['hash-4', ['repo-1']]]])
+
+    def test_unknown_duration(self):
+        # Applicabilities of unknown duration are expected to take the average known duration
+        profile_repos = {'hash-1': {'repo-1': 10.0, 'repo-2': None},
+                         'hash-2': {'repo-1': 30.0},
+                         'hash-3': {'repo-1': None}}
+
+        batches = list(_plan_profile_batches(profile_repos, 40))
+
+        self.assertEqual(batches, [[['hash-1', ['repo-1', 'repo-2']]],
+                                   [['hash-2', ['repo-1']]],
+                                   [['hash-3', ['repo-1']]]])
+
+    @mock.patch(MODULE + 'DEFAULT_REGENERATION_DURATION', 2.0)
+    def test_no_duration_known(self):
+        profile_repos = dict(('hash-%d' % i, {'repo-1': None}) for i in range(5))
+
+        batches = list(_plan_profile_batches(profile_repos, 4))
+
+        self.assertEqual([len(batch) for batch in batches], [2, 2, 1])
+
+    @mock.patch(MODULE + 'MAX_BATCH_PROFILES', 2)
+    def test_max_profiles(self):
+        profile_repos = dict(('hash-%d' % i, {'repo-1': 0.1}) for i in range(5))
+
+        batches = list(_plan_profile_batches(profile_repos, 60))
+
+        self.assertEqual([len(batch) for batch in batches], [2, 2, 1])
+
+    def test_empty(self):
+        self.assertEqual(list(_plan_profile_batches({}, 60)), [])
+
+
+class TestQueueRegenerateApplicability(unittest.TestCase):
+    """
+    Test the planning of the parallel regeneration of the applicability of repositories.
+    """
+
+    @mock.patch(MODULE + 'batch_regenerate_applicability_for_profiles_task')
+    @mock.patch(MODULE + 'config')
+    @mock.patch(MODULE + 'RepoProfileApplicability.get_collection')
+    @mock.patch(MODULE + 'model.Repository.objects')
+    def test_queue(self, mock_repo_qs, mock_get_collection, mock_config, mock_task):
+        mock_repo_qs.find_by_criteria.return_value = [Repository(repo_id='repo-1'),
+                                                      Repository(repo_id='repo-2')]
+        mock_get_collection.return_value.find.return_value = [
+            {'profile_hash': 'hash-1', 'repo_id': 'repo-1', 'duration': 40.0},
+            {'profile_hash': 'hash-1', 'repo_id': 'repo-2', 'duration': 40.0},
+            {'profile_hash': 'hash-2', 'repo_id': 'repo-2'}]
+        mock_config.getfloat.return_value = 60.0
+
+        group_id = ApplicabilityRegenerationManager.queue_regenerate_applicability_for_repos(
+            Criteria().as_dict())
+
+        mock_get_collection.return_value.find.assert_called_once_with(
+            {'repo_id': {'$in': ['repo-1', 'repo-2']}},
+            projection=['profile_hash', 'repo_id', 'duration'])
+        mock_config.getfloat.assert_called_once_with('tasks', 'applicability_batch_duration')
+        # Each profile is regenerated for all its repositories by a single task
+        self.assertEqual(mock_task.apply_async.call_args_list, [
+            mock.call(([['hash-1', ['repo-1', 'repo-2']]],), group_id=group_id),
+            mock.call(([['hash-2', ['repo-2']]],), group_id=group_id)])
+
+    @mock.patch(MODULE + 'batch_regenerate_applicability_for_profiles_task')
+    @mock.patch(MODULE + 'RepoProfileApplicability.get_collection')
+    @mock.patch(MODULE + 'model.Repository.objects')
+    def test_queue_no_repos(self, mock_repo_qs, mock_get_collection, mock_task):
+        mock_repo_qs.find_by_criteria.return_value = []
+
+        ApplicabilityRegenerationManager.queue_regenerate_applicability_for_repos(
+            Criteria().as_dict())
+
+        self.assertFalse(mock_get_collection.called)
+        self.assertFalse(mock_task.apply_async.called)
+
+
+@mock.patch(MODULE + 'get_current_task_id', return_value=None)
+@mock.patch(MODULE + 'ApplicabilityRegenerationManager.regenerate_applicability')
+@mock.patch(MODULE + 'ApplicabilityRegenerationManager._get_repo_content_changes')
+@mock.patch(MODULE + 'ApplicabilityRegenerationManager._get_unit_profiles')
+@mock.patch(MODULE + 'RepoProfileApplicability.get_collection')
+class TestBatchRegenerateApplicabilityForProfiles(unittest.TestCase):
+    """
+    Test the regeneration of the applicability of a batch of profiles.
+    """
+
+    def test_regenerate(self, mock_get_collection, mock_get_unit_profiles, mock_get_changes,
+                        mock_regenerate, mock_task_id):
+        collection = mock_get_collection.return_value
+        collection.aggregate.return_value = [{'_id': 'hash-1', 'profile': ['profile-1']},
+                                             {'_id': 'hash-2', 'profile': ['profile-2']}]
+        collection.find.return_value = [
+            {'profile_hash': 'hash-1', 'repo_id': 'repo-1', 'applicability': {},
+             'regenerated': '2016-01-01T00:00:00Z'},
+            {'profile_hash': 'hash-1', 'repo_id': 'repo-2', 'applicability': {}},
+            {'profile_hash': 'hash-2', 'repo_id': 'repo-1', 'applicability': {},
+             'regenerated': '2016-01-02T00:00:00Z'}]
+        mock_get_unit_profiles.return_value = {
+            'hash-1': {'id': 'profile-1', 'content_type': 'rpm'},
+            'hash-2': {'id': 'profile-2', 'content_type': 'rpm'}}
+        mock_get_changes.side_effect = lambda repo_id, regenerated_list: repo_id + '-changes'
+
+        ApplicabilityRegenerationManager.batch_regenerate_applicability_for_profiles(
+            [['hash-1', ['repo-1', 'repo-2']], ['hash-2', ['repo-1']]])
+
+        # The profiles are loaded once, with a single query
+        self.assertEqual(collection.aggregate.call_count, 1)
+        collection.find.assert_called_once_with(
+            {'profile_hash': {'$in': ['hash-1', 'hash-2']},
+             'repo_id': {'$in': mock.ANY}},
+            projection={'profile': False})
+        self.assertEqual(sorted(collection.find.call_args[0][0]['repo_id']['$in']),
+                         ['repo-1', 'repo-2'])
+        mock_get_unit_profiles.assert_called_once_with(['hash-1', 'hash-2'])
+        self.assertEqual(sorted((args[0], sorted(args[1]))
+                                for args, kwargs in mock_get_changes.call_args_list),
+                         [('repo-1', ['2016-01-01T00:00:00Z', '2016-01-02T00:00:00Z']),
+                          ('repo-2', [None])])
+
+        calls = [(args[:4], args[4].profile, args[5])
+                 for args, kwargs in mock_regenerate.call_args_list]
+        self.assertEqual(calls, [
+            (('hash-1', 'rpm', 'profile-1', 'repo-1'), ['profile-1'], 'repo-1-changes'),
+            (('hash-1', 'rpm', 'profile-1', 'repo-2'), ['profile-1'], 'repo-2-changes'),
+            (('hash-2', 'rpm', 'profile-2', 'repo-1'), ['profile-2'], 'repo-1-changes')])
+
+    def test_missing(self, mock_get_collection, mock_get_unit_profiles, mock_get_changes,
+                     mock_regenerate, mock_task_id):
+        collection = mock_get_collection.return_value
+        collection.aggregate.return_value = [{'_id': 'hash-1', 'profile': ['profile-1']}]
+        collection.find.return_value = [
+            {'profile_hash': 'hash-1', 'repo_id': 'repo-1', 'applicability': {}},
+            {'profile_hash': 'hash-2', 'repo_id': 'repo-1', 'applicability': {}}]
+        mock_get_unit_profiles.return_value = {
+            'hash-1': {'id': 'profile-1', 'content_type': 'rpm'}}
+
+        ApplicabilityRegenerationManager.batch_regenerate_applicability_for_profiles(
+            [['hash-1', ['repo-1', 'repo-2']], ['hash-2', ['repo-1']]])
+
+        # hash-1 has no applicability for repo-2 anymore and hash-2 has no unit profile
+        self.assertEqual(mock_regenerate.call_count, 1)
+        self.assertEqual(mock_regenerate.call_args[0][:4], ('hash-1', 'rpm', 'profile-1', 'repo-1'))
+
+
+@mock.patch(MODULE + 'model.TaskStatus.objects')
+@mock.patch(MODULE + 'time.time')
+class TestRegenerationProgress(unittest.TestCase):
+    """
+    Test the progress reports of the applicability regeneration tasks.
+    """
+
+    def test_report(self, mock_time, mock_objects):
+        mock_time.return_value = 100.0
+        progress = RegenerationProgress('task-1', [['hash-1', ['repo-1', 'repo-2']],
+                                                   ['hash-2', ['repo-1']]])
+        progress.report()
+        mock_time.return_value = 100.5
+        progress.evaluated()
+        mock_time.return_value = 101.5
+        progress.profile_done()
+
+        qs = mock_objects.filter.return_value
+        self.assertEqual(qs.update_one.call_count, 2)
+        qs.update_one.assert_called_with(set__progress_report={'applicability': {
+            'profiles_total': 2, 'profiles_processed': 1, 'evaluations_total': 3,
+            'evaluations_processed': 1, 'duration': 1.5}})
+        mock_objects.filter.assert_called_with(task_id='task-1')
+
+    def test_force(self, mock_time, mock_objects):
+        mock_time.return_value = 100.0
+        progress = RegenerationProgress('task-1', [])
+        progress.report()
+        progress.report(force=True)
+
+        self.assertEqual(mock_objects.filter.return_value.update_one.call_count, 2)
+
+    def test_not_in_task(self, mock_time, mock_objects):
+        mock_time.return_value = 100.0
+        progress = RegenerationProgress(None, [['hash-1', ['repo-1']]])
+        progress.evaluated()
+        progress.report(force=True)
+
+        self.assertFalse(mock_objects.filter.called)
+
+
+class TestSummarizeRegenerationProgress(unittest.TestCase):
+    """
+    Test the summary of the progress of a task group regenerating applicability.
+    """
+
+    def test_no_applicability_progress(self):
+        task_statuses = [mock.Mock(progress_report={}), mock.Mock(progress_report=None)]
+
+        self.assertTrue(summarize_regeneration_progress(task_statuses) is None)
+
+    @mock.patch(MODULE + 'datetime')
+    def test_running(self, mock_datetime):
+        mock_datetime.now.return_value = dateutils.parse_iso8601_datetime('2016-01-01T00:00:10Z')
+        progress = {'profiles_total': 1, 'profiles_processed': 0, 'evaluations_total': 10,
+                    'evaluations_processed': 5, 'duration': 5.0}
+        task_statuses = [
+            mock.Mock(progress_report={'applicability': progress},
+                      start_time='2016-01-01T00:00:05Z', finish_time=None),
+            mock.Mock(progress_report={'applicability': {'profiles_total': 1}},
+                      start_time=None, finish_time=None)]
+
+        summary = summarize_regeneration_progress(task_statuses)
+
+        self.assertEqual(summary, {'profiles_total': 2, 'profiles_processed': 0,
+                                   'evaluations_total': 10, 'evaluations_processed': 5,
+                                   'duration': 5.0, 'evaluations_per_second': 1.0})
+
+
+class TestStreamConsumerApplicability(unittest.TestCase):
+    """
+    Test the streamed consumer applicability report.
+    """
+
+    def setUp(self):
+        self.consumer_sets = [(['c1', 'c2'], ['h1'], ['r1', 'r2']),
+                              (['c3'], ['h2'], ['r1']),
+                              (['c4'], ['h1', 'h2'], ['r2'])]
+        self.applicability_map = {
+            ('h1', 'r1'): {'rpm': ['u1', 'u2']},
+            ('h1', 'r2'): {'rpm': ['u2', 'u3'], 'erratum': ['e1']},
+            ('h2', 'r1'): {'rpm': []},
+            ('h2', 'r2'): {'rpm': ['u4']}}
+
+    def _stream(self, **kwargs):
+        criteria = Criteria(filters={'id': {'$in': ['c1', 'c2', 'c3', 'c4']}})
+        module = 'pulp.server.managers.consumer.applicability'
+        with mock.patch(module + '.ConsumerQueryManager') as mock_query, \
+                mock.patch(module + '._get_consumer_sets') as mock_sets, \
+                mock.patch(module + '._get_consumer_set_applicability_map') as mock_map:
+            mock_query.find_by_criteria.return_value = [{'id': 'c1'}, {'id': 'c2'}]
+            mock_sets.return_value = self.consumer_sets
+            mock_map.return_value = self.applicability_map
+            report = list(stream_consumer_applicability(criteria, **kwargs))
+        mock_sets.assert_called_once_with(['c1', 'c2'])
+        self.assertEqual(criteria['fields'], ['id'])
+        return report
+
+    def test_report(self):
+        """
+        Test that the applicability of the profiles of each consumer set for its repositories is
+        merged, and that consumer sets without applicable content are not reported.
+        """
+        report = self._stream()
+
+        self.assertEqual(report, [
+            {'consumers': ['c1', 'c2'],
+             'applicability': {'rpm': ['u1', 'u2', 'u3'], 'erratum': ['e1']}},
+            {'consumers': ['c4'],
+             'applicability': {'rpm': ['u2', 'u3', 'u4'], 'erratum': ['e1']}}])
+
+    def test_skip_and_limit(self):
+        """
+        Test that skip and limit apply to the reported consumer sets.
+        """
+        self.assertEqual([entry['consumers'] for entry in self._stream(skip=1)], [['c4']])
+        self.assertEqual([entry['consumers'] for entry in self._stream(limit=1)], [['c1', 'c2']])
+        self.assertEqual(self._stream(skip=1, limit=1)[0]['consumers'], ['c4'])
+        self.assertEqual(self._stream(skip=2), [])
+
+    @mock.patch('pulp.server.managers.consumer.applicability._get_consumer_sets')
+    @mock.patch('pulp.server.managers.consumer.applicability.ConsumerQueryManager')
+    def test_consumers_queried_eagerly(self, mock_query, mock_sets):
+        """
+        Test that the consumers are queried and grouped before the report is iterated.
+        """
+        mock_query.find_by_criteria.return_value = [{'id': 'c1'}]
+        mock_sets.return_value = []
+
+        report = stream_consumer_applicability(Criteria(filters={}))
+
+        mock_sets.assert_called_once_with(['c1'])
+        self.assertEqual(list(report), [])
+
+
+class TestGetConsumerSets(unittest.TestCase):
+    """
+    Test the grouping of consumers into consumer sets.
+    """
+
+    @mock.patch('pulp.server.managers.consumer.applicability.Bind')
+    @mock.patch('pulp.server.managers.consumer.applicability.UnitProfile')
+    @mock.patch('pulp.server.managers.consumer.applicability._group_consumers')
+    def test_intersection(self, mock_group, mock_profile, mock_bind):
+        """
+        Test that the consumer sets are the intersections of the profile and binding groups.
+        """
+        profile_groups = [(['h1'], ['c2', 'c1', 'c3']), (['h2'], ['c4'])]
+        repo_groups = [(['r1'], ['c1', 'c4', 'c5']), (['r1', 'r2'], ['c3', 'c2'])]
+        mock_group.side_effect = [profile_groups, repo_groups]
+
+        consumer_sets = _get_consumer_sets(['c1', 'c2', 'c3', 'c4', 'c5'])
+
+        self.assertEqual(consumer_sets, [(['c1'], ['h1'], ['r1']),
+                                         (['c2', 'c3'], ['h1'], ['r1', 'r2']),
+                                         (['c4'], ['h2'], ['r1'])])
+        mock_group.assert_has_calls([
+            mock.call(mock_profile.get_collection.return_value, mock.ANY, 'profile_hash'),
+            mock.call(mock_bind.get_collection.return_value, mock.ANY, 'repo_id')])
+
+
+class TestGroupConsumers(unittest.TestCase):
+    """
+    Test the aggregation grouping consumers by field values.
+    """
+
+    def test_group_consumers(self):
+        """
+        Test that the matched consumers are grouped by the sorted values of the field.
+        """
+        collection = mock.MagicMock()
+        collection.aggregate.return_value = iter([
+            {'_id': ['r1', 'r2'], 'consumers': ['c1', 'c2']}, {'_id': ['r3'], 'consumers': ['c3']}])
+
+        groups = _group_consumers(collection, ['c1', 'c2', 'c3'], 'repo_id')
+
+        self.assertEqual(groups, [(['r1', 'r2'], ['c1', 'c2']), (['r3'], ['c3'])])
+        pipeline = collection.aggregate.call_args[0][0]
+        self.assertEqual(pipeline[0], {'$match': {'consumer_id': {'$in': ['c1', 'c2', 'c3']}}})
+        self.assertEqual(pipeline[2], {'$group': {'_id': '$consumer_id',
+                                                  'values': {'$addToSet': '$repo_id'}}})
+        self.assertEqual(pipeline[-1], {'$group': {'_id': '$values',
+                                                   'consumers': {'$push': '$_id'}}})
+
+
+class TestGetConsumerSetApplicabilityMap(unittest.TestCase):
+    """
+    Test the query of the applicability of consumer sets.
+    """
+
+    @mock.patch('pulp.server.managers.consumer.applicability.RepoProfileApplicability')
+    def test_content_types(self, mock_rpa):
+        """
+        Test that only the requested content types are queried.
+        """
+        find = mock_rpa.get_collection.return_value.find
+        find.return_value = [
+            {'profile_hash': 'h1', 'repo_id': 'r1', 'applicability': {'rpm': ['u1']}},
+            {'profile_hash': 'h2', 'repo_id': 'r1'}]
+        consumer_sets = [(['c1'], ['h1'], ['r1']), (['c2'], ['h2', 'h1'], ['r1'])]
+
+        applicability_map = _get_consumer_set_applicability_map(consumer_sets, ['rpm'])
+
+        self.assertEqual(applicability_map, {('h1', 'r1'): {'rpm': ['u1']}, ('h2', 'r1'): {}})
+        spec = find.call_args[0][0]
+        self.assertEqual(sorted(spec['profile_hash']['$in']), ['h1', 'h2'])
+        self.assertEqual(spec['repo_id']['$in'], ['r1'])
+        self.assertEqual(find.call_args[1]['projection'],
+                         ['profile_hash', 'repo_id', 'applicability.rpm'])
+
+    @mock.patch('pulp.server.managers.consumer.applicability.RepoProfileApplicability')
+    def test_all_content_types(self, mock_rpa):
+        """
+        Test that all the applicability is queried when no content types are given.
+        """
+        find = mock_rpa.get_collection.return_value.find
+        find.return_value = []
+
+        _get_consumer_set_applicability_map([(['c1'], ['h1'], ['r1'])], None)
+
+        self.assertEqual(find.call_args[1]['projection'],
+                         ['profile_hash', 'repo_id', 'applicability'])
+
+
 class TestRepoProfileApplicabilityManager(base.PulpServerTests):
     """
     Test the RepoProfileApplicabilityManager.
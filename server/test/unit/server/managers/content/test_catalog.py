@@ -62,6 +62,28 @@ class TestCatalogManager(PulpServerTests):
             self.assertEqual(entry['unit_key'], unit_key)
             self.assertEqual(entry['url'], url)
 
+    def test_add_entries(self):
+        units = self.units(0, 10)
+        manager = ContentCatalogManager()
+        entries = [(TYPE_ID, unit_key, url) for unit_key, url in units]
+        added = manager.add_entries(SOURCE_ID, EXPIRATION, entries)
+        self.assertEqual(added, len(units))
+        collection = ContentCatalog.get_collection()
+        self.assertEqual(len(units), collection.find().count())
+        for unit_key, url in units:
+            locator = ContentCatalog.get_locator(TYPE_ID, unit_key)
+            entry = collection.find_one({'locator': locator})
+            self.assertEqual(entry['source_id'], SOURCE_ID)
+            self.assertEqual(entry['type_id'], TYPE_ID)
+            self.assertEqual(entry['unit_key'], unit_key)
+            self.assertEqual(entry['url'], url)
+
+    def test_add_no_entries(self):
+        manager = ContentCatalogManager()
+        added = manager.add_entries(SOURCE_ID, EXPIRATION, [])
+        self.assertEqual(added, 0)
+        self.assertEqual(ContentCatalog.get_collection().find().count(), 0)
+
     def test_delete(self):
         units = self.units(0, 10)
         manager = ContentCatalogManager()
@@ -171,6 +193,32 @@ class TestCatalogManager(PulpServerTests):
             self.assertEqual(entry['unit_key'], unit_key)
             self.assertEqual(entry['url'], url)
 
+    def test_find_many(self):
+        source_a = 'A'
+        source_b = 'B'
+        units = self.units(0, 10)
+        manager = ContentCatalogManager()
+        for unit_key, url in units:
+            manager.add_entry(source_a, EXPIRATION, TYPE_ID, unit_key, url + '/old')
+            manager.add_entry(source_a, EXPIRATION, TYPE_ID, unit_key, url)
+        for unit_key, url in units[0:5]:
+            manager.add_entry(source_b, EXPIRATION, TYPE_ID, unit_key, url)
+        unit_keys = [unit_key for unit_key, url in units[3:7]]
+        found = manager.find_many(TYPE_ID, unit_keys + [{'name': 'unknown'}])
+        self.assertEqual(len(found), len(unit_keys))
+        for unit_key, url in units[3:7]:
+            locator = ContentCatalog.get_locator(TYPE_ID, unit_key)
+            entries = sorted(found[locator], key=lambda e: e['source_id'])
+            sources = [source_a, source_b] if unit_key in unit_keys[0:2] else [source_a]
+            self.assertEqual([e['source_id'] for e in entries], sources)
+            for entry in entries:
+                self.assertEqual(entry['unit_key'], unit_key)
+                self.assertEqual(entry['url'], url)
+
+    def test_find_many_nothing(self):
+        manager = ContentCatalogManager()
+        self.assertEqual(manager.find_many(TYPE_ID, []), {})
+
     def test_expired(self):
         units = self.units(0, 10)
         manager = ContentCatalogManager()
@@ -15,7 +15,7 @@ from pulp.plugins.types.model import TypeDefinition
 from pulp.server import exceptions as pulp_exceptions
 from pulp.server.db.model.repository import RepoContentUnit
 from pulp.server.managers import factory as manager_factory
-from pulp.server.managers.content.orphan import OrphanManager
+from pulp.server.managers.content.orphan import OrphanDeletionPipeline, OrphanManager
 
 
 MODULE_PATH = 'pulp.server.managers.content.orphan.'
@@ -273,40 +273,207 @@ class OrphanManagerGeneratorTests(OrphanManagerTests):
         self.assertEqual(len(orphans), 0)
         self.assertEqual(self.number_of_files_in_content_root(), 0)
         mock_lazy_catalog_objects.assert_called_once_with(
-            unit_id=unit['_id'],
+            unit_id__in=[unit['_id']],
             unit_type_id=unit['_content_type_id']
         )
         mock_lazy_catalog_objects.return_value.delete.assert_called_once_with()
 
     @patch(MODULE_PATH + 'model.LazyCatalogEntry.objects')
-    @patch(MODULE_PATH + 'OrphanManager.delete_orphaned_file')
-    @patch(MODULE_PATH + 'model.RepositoryContentUnit.objects')
+    @patch(MODULE_PATH + 'OrphanDeletionPipeline')
+    @patch(MODULE_PATH + 'OrphanManager.generate_orphan_pages')
     @patch(MODULE_PATH + 'plugin_api.get_unit_model_by_id')
     def test_delete_content_unit_by_type(
-            self, m_get_model, m_rcu_objects, m_del_orphan, mock_lazy_catalog_objects):
+            self, m_get_model, m_orphan_pages, m_pipeline, mock_lazy_catalog_objects):
         orphan = Mock(_storage_path='test_foo_path', id='orphan')
-        non_orphan = Mock(_storage_path='test_foo_path', id='non_orphan')
-        m_get_model.return_value.objects.only.return_value = [
-            orphan,
-            non_orphan
-        ]
-        m_rcu_objects.return_value.distinct.return_value = ['non_orphan']
-
-        self.orphan_manager.delete_orphan_content_units_by_type('foo_type')
+        m_orphan_pages.return_value = [[{'_id': 'orphan'}]]
+        m_objects = m_get_model.return_value.objects
+        m_objects.return_value.only.return_value = [orphan]
+
+        count = self.orphan_manager.delete_orphan_content_units_by_type('foo_type')
+
+        self.assertEqual(count, 1)
+        m_orphan_pages.assert_called_once_with(
+            m_get_model.return_value._get_collection.return_value, content_unit_ids=None)
+        self.assertEqual(m_objects.call_args_list,
+                         [call(id__in=['orphan']), call(id__in=['orphan'])])
+        m_objects.return_value.delete.assert_called_once_with()
         mock_lazy_catalog_objects.assert_called_once_with(
-            unit_id='orphan',
+            unit_id__in=['orphan'],
             unit_type_id='foo_type'
         )
         mock_lazy_catalog_objects.return_value.delete.assert_called_once_with()
-        m_del_orphan.assert_called_once_with('test_foo_path')
+        m_get_model.return_value.do_post_delete_actions.assert_called_once_with(orphan)
+        m_pipeline.return_value.units_deleted.assert_called_once_with(
+            'foo_type', 1, ['test_foo_path'])
+        m_pipeline.return_value.finish.assert_called_once_with()
+
+    @patch(MODULE_PATH + 'model.LazyCatalogEntry.objects')
+    @patch(MODULE_PATH + 'OrphanDeletionPipeline')
+    @patch(MODULE_PATH + 'OrphanManager.generate_orphan_pages')
+    @patch(MODULE_PATH + 'plugin_api.get_unit_model_by_id')
+    def test_delete_content_unit_by_type_shared_pipeline(
+            self, m_get_model, m_orphan_pages, m_pipeline, mock_lazy_catalog_objects):
+        """
+        Assert that a pipeline passed in by the caller is used but not finished.
+        """
+        pipeline = Mock()
+        m_orphan_pages.return_value = []
+
+        self.orphan_manager.delete_orphan_content_units_by_type('foo_type', pipeline=pipeline)
+
+        self.assertFalse(m_pipeline.called)
+        self.assertFalse(pipeline.finish.called)
 
+    @patch(MODULE_PATH + 'OrphanManager.generate_orphan_pages')
     @patch(MODULE_PATH + 'plugin_api.get_unit_model_by_id')
-    def test_delete_content_unit_by_type_filtered(self, mock_get_model):
-        mock_get_model.return_value.objects.return_value.only.return_value = []
+    def test_delete_content_unit_by_type_filtered(self, mock_get_model, m_orphan_pages):
+        m_orphan_pages.return_value = []
 
         self.orphan_manager.delete_orphan_content_units_by_type('foo_type',
                                                                 content_unit_ids=['orphan2'])
-        mock_get_model.return_value.objects.assert_called_once_with(id__in=('orphan2',))
+        m_orphan_pages.assert_called_once_with(
+            mock_get_model.return_value._get_collection.return_value,
+            content_unit_ids=['orphan2'])
+        self.assertFalse(mock_get_model.return_value.objects.called)
+
+
+class TestPruneEmptyDirectories(TestCase):
+
+    def setUp(self):
+        self.storage_dir = tempfile.mkdtemp(prefix='content_orphan_prune_unittests-')
+        self.type_dir = os.path.join(self.storage_dir, 'content', 'units', 'phony')
+
+    def tearDown(self):
+        shutil.rmtree(self.storage_dir)
+
+    def test_prune_shared_parents(self):
+        """
+        Assert that parents shared by several directories are pruned once all of them are gone.
+        """
+        for path in ('a/b/c', 'a/d'):
+            os.makedirs(os.path.join(self.type_dir, path))
+
+        OrphanManager.prune_empty_directories(
+            self.storage_dir,
+            [os.path.join(self.type_dir, 'a/d'), os.path.join(self.type_dir, 'a/b/c')])
+
+        self.assertEqual(os.listdir(os.path.join(self.storage_dir, 'content', 'units')), [])
+
+    def test_prune_stops_at_non_empty(self):
+        os.makedirs(os.path.join(self.type_dir, 'a/b'))
+        open(os.path.join(self.type_dir, 'a', 'keep'), 'w').close()
+
+        OrphanManager.prune_empty_directories(
+            self.storage_dir, [os.path.join(self.type_dir, 'a/b')])
+
+        self.assertEqual(os.listdir(os.path.join(self.type_dir, 'a')), ['keep'])
+
+
+class TestOrphanDeletionPipeline(TestCase):
+
+    def setUp(self):
+        self.storage_dir = tempfile.mkdtemp(prefix='content_orphan_pipeline_unittests-')
+        self.type_dir = os.path.join(self.storage_dir, 'content', 'units', 'phony')
+
+    def tearDown(self):
+        shutil.rmtree(self.storage_dir)
+
+    @patch(MODULE_PATH + 'get_current_task_id', return_value=None)
+    @patch(MODULE_PATH + 'pulp_config.config')
+    def test_files_removed(self, config, get_task_id):
+        config.get.return_value = self.storage_dir
+        paths = []
+        for name in ('a/1/unit', 'a/2/unit', 'b/unit'):
+            path = os.path.join(self.type_dir, name)
+            os.makedirs(os.path.dirname(path))
+            open(path, 'w').close()
+            paths.append(path)
+
+        pipeline = OrphanDeletionPipeline(threads=2)
+        pipeline.units_deleted('phony', 2, paths[:2])
+        pipeline.units_deleted('phony', 2, [paths[2], None])
+        pipeline.finish()
+
+        self.assertEqual(pipeline.deleted, {'phony': 4})
+        self.assertEqual(pipeline.files_removed, 3)
+        self.assertEqual(os.listdir(os.path.join(self.storage_dir, 'content', 'units')), [])
+
+    @patch(MODULE_PATH + 'model.TaskStatus.objects')
+    @patch(MODULE_PATH + 'get_current_task_id', return_value='task-1')
+    @patch(MODULE_PATH + 'pulp_config.config')
+    def test_report(self, config, get_task_id, m_task_status):
+        config.get.return_value = self.storage_dir
+
+        pipeline = OrphanDeletionPipeline(threads=1)
+        pipeline.units_deleted('phony', 2, [])
+        pipeline.finish()
+
+        m_task_status.filter.assert_called_with(task_id='task-1')
+        m_task_status.filter.return_value.update_one.assert_called_with(
+            set__progress_report={'delete_orphans': {
+                'state': 'FINISHED',
+                'units_deleted': {'phony': 2},
+                'files_removed': 0,
+                'files_pending': 0}})
+
+
+class TestGenerateOrphanPages(TestCase):
+
+    @patch(MODULE_PATH + 'RepoContentUnit.get_collection')
+    def test_pages_by_id_range(self, m_rcu_collection):
+        collection = Mock()
+        cursor = collection.find.return_value.sort.return_value
+        cursor.limit.side_effect = [
+            [{'_id': 'a'}, {'_id': 'b'}],
+            [{'_id': 'c'}, {'_id': 'd'}],
+            [],
+        ]
+        m_rcu_collection.return_value.distinct.side_effect = [['a'], ['c', 'd']]
+
+        pages = list(OrphanManager.generate_orphan_pages(collection, page_size=2))
+
+        # the second page is entirely associated, so it is not yielded
+        self.assertEqual(pages, [[{'_id': 'b'}]])
+        self.assertEqual(collection.find.call_args_list, [
+            call({}, projection=['_id']),
+            call({'_id': {'$gt': 'b'}}, projection=['_id']),
+            call({'_id': {'$gt': 'd'}}, projection=['_id']),
+        ])
+        collection.find.return_value.sort.assert_called_with('_id', 1)
+        cursor.limit.assert_called_with(2)
+        self.assertEqual(m_rcu_collection.return_value.distinct.call_args_list, [
+            call('unit_id', {'unit_id': {'$in': ['a', 'b']}}),
+            call('unit_id', {'unit_id': {'$in': ['c', 'd']}}),
+        ])
+
+    @patch(MODULE_PATH + 'RepoContentUnit.get_collection')
+    def test_pages_by_unit_ids(self, m_rcu_collection):
+        collection = Mock()
+        collection.find.side_effect = [
+            [{'_id': 'a', 'name': 'x'}, {'_id': 'b', 'name': 'y'}],
+            [{'_id': 'c', 'name': 'z'}],
+        ]
+        m_rcu_collection.return_value.distinct.return_value = ['b']
+
+        pages = list(OrphanManager.generate_orphan_pages(
+            collection, fields=('_id', 'name'), content_unit_ids=['a', 'b', 'c'], page_size=2))
+
+        self.assertEqual(pages, [[{'_id': 'a', 'name': 'x'}], [{'_id': 'c', 'name': 'z'}]])
+        self.assertEqual(collection.find.call_args_list, [
+            call({'_id': {'$in': ['a', 'b']}}, projection=['_id', 'name']),
+            call({'_id': {'$in': ['c']}}, projection=['_id', 'name']),
+        ])
+
+    @patch(MODULE_PATH + 'RepoContentUnit.get_collection')
+    def test_single_unit_id(self, m_rcu_collection):
+        collection = Mock()
+        collection.find.return_value = [{'_id': 'unit-1'}]
+        m_rcu_collection.return_value.distinct.return_value = []
+
+        pages = list(OrphanManager.generate_orphan_pages(collection, content_unit_ids='unit-1'))
+
+        self.assertEqual(pages, [[{'_id': 'unit-1'}]])
+        collection.find.assert_called_once_with({'_id': {'$in': ['unit-1']}}, projection=['_id'])
 
 
 class TestDelete(TestCase):
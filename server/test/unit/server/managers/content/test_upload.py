@@ -1,6 +1,8 @@
 import errno
 import os
 import shutil
+import tempfile
+import threading
 
 import unittest
 import mock
@@ -13,7 +15,8 @@ from pulp.server.controllers import importer as importer_controller
 from pulp.server.db import model
 from pulp.server.exceptions import (MissingResource, PulpDataException, PulpExecutionException,
                                     InvalidValue, PulpCodedException)
-from pulp.server.managers.content.upload import ContentUploadManager
+from pulp.server.managers.content.upload import (ContentUploadManager, UploadFiles,
+                                                 UPLOAD_IDLE_TIMEOUT)
 import pulp.server.managers.factory as manager_factory
 
 
@@ -29,6 +32,9 @@ class ContentUploadManagerTests(base.PulpServerTests):
         base.PulpServerTests.tearDown(self)
         mock_plugins.reset()
 
+        # close the upload files kept open
+        for upload_id in self.upload_manager.list_upload_ids():
+            self.upload_manager.delete_upload(upload_id)
         upload_storage_dir = self.upload_manager._upload_storage_dir()
         shutil.rmtree(upload_storage_dir)
 
@@ -87,6 +93,28 @@ class ContentUploadManagerTests(base.PulpServerTests):
 
         self.assertEqual(expected_size, found_size)
 
+    def test_save_data_out_of_order(self):
+
+        # Test
+        upload_id = self.upload_manager.initialize_upload()
+
+        self.upload_manager.save_data(upload_id, 6, 'ghi')
+        self.upload_manager.save_data(upload_id, 0, 'abc')
+        self.upload_manager.save_data(upload_id, 3, 'def')
+
+        # Verify
+        self.assertEqual(self.upload_manager.read_upload(upload_id), 'abcdefghi')
+
+    def test_save_data_deleted(self):
+
+        # Setup
+        upload_id = self.upload_manager.initialize_upload()
+        self.upload_manager.save_data(upload_id, 0, 'abc')
+        os.remove(self.upload_manager._upload_file_path(upload_id))
+
+        # Test
+        self.assertRaises(MissingResource, self.upload_manager.save_data, upload_id, 3, 'def')
+
     def test_save_no_init(self):
 
         # Test
@@ -288,3 +316,143 @@ class TestContentUploadManager(unittest.TestCase):
         my_upload_id = 'asdf'
         mock_os.remove.side_effect = ValueError()
         self.assertRaises(ValueError, ContentUploadManager().delete_upload, my_upload_id)
+
+    @mock.patch.object(ContentUploadManager, '_upload_file_path')
+    @mock.patch('pulp.server.managers.content.upload._upload_files')
+    @mock.patch('pulp.server.managers.content.upload.os.path.exists', return_value=True)
+    def test_save_data_deleted_while_writing(self, mock_exists, mock_upload_files,
+                                             mock__upload_file_path):
+        mock_upload_files.write.side_effect = OSError(errno.ENOENT, os.strerror(errno.ENOENT))
+        self.assertRaises(MissingResource, ContentUploadManager().save_data, 'asdf', 0, 'abc')
+
+
+class TestUploadFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+        self.paths = []
+        for name in ('a', 'b', 'c'):
+            path = os.path.join(self.working_dir, name)
+            open(path, 'w').close()
+            self.paths.append(path)
+        self.upload_files = UploadFiles(max_open=2)
+
+    def tearDown(self):
+        for upload_id in ('a', 'b', 'c'):
+            self.upload_files.close(upload_id)
+        shutil.rmtree(self.working_dir)
+
+    def read(self, path):
+        with open(path) as f:
+            return f.read()
+
+    def test_write(self):
+        self.upload_files.write('a', self.paths[0], 3, 'def')
+        self.upload_files.write('a', self.paths[0], 0, 'abc')
+
+        self.assertEqual(self.read(self.paths[0]), 'abcdef')
+        self.assertEqual(self.upload_files._uploads.keys(), ['a'])
+
+    @mock.patch('pulp.server.managers.content.upload.os.open', side_effect=os.open)
+    def test_kept_open(self, mock_open):
+        self.upload_files.write('a', self.paths[0], 0, 'abc')
+        self.upload_files.write('a', self.paths[0], 3, 'def')
+
+        self.assertEqual(mock_open.call_count, 1)
+
+    def test_least_recently_used_closed(self):
+        self.upload_files.write('a', self.paths[0], 0, 'a')
+        self.upload_files.write('b', self.paths[1], 0, 'b')
+        self.upload_files.write('a', self.paths[0], 1, 'a')
+        upload_b = self.upload_files._uploads['b']
+
+        self.upload_files.write('c', self.paths[2], 0, 'c')
+
+        self.assertEqual(self.upload_files._uploads.keys(), ['a', 'c'])
+        self.assertTrue(upload_b.fd is None)
+        self.assertEqual(self.read(self.paths[1]), 'b')
+
+    def test_close(self):
+        self.upload_files.write('a', self.paths[0], 0, 'abc')
+        upload = self.upload_files._uploads['a']
+
+        self.upload_files.close('a')
+        self.upload_files.close('a')
+
+        self.assertTrue(upload.fd is None)
+        self.assertEqual(self.upload_files._uploads, {})
+
+    @mock.patch('pulp.server.managers.content.upload.threading.Timer')
+    def test_close_last(self, mock_timer):
+        self.upload_files.write('a', self.paths[0], 0, 'a')
+        self.upload_files.write('b', self.paths[1], 0, 'b')
+
+        self.upload_files.close('a')
+        self.assertFalse(mock_timer.return_value.cancel.called)
+        self.upload_files.close('b')
+
+        mock_timer.return_value.cancel.assert_called_once_with()
+        self.assertTrue(self.upload_files._timer is None)
+
+    def test_deleted(self):
+        self.upload_files.write('a', self.paths[0], 0, 'abc')
+        upload = self.upload_files._uploads['a']
+        os.remove(self.paths[0])
+
+        try:
+            self.upload_files.write('a', self.paths[0], 3, 'def')
+        except OSError as e:
+            self.assertEqual(e.errno, errno.ENOENT)
+        else:
+            self.fail('OSError should have been raised')
+
+        self.assertTrue(upload.fd is None)
+        self.assertEqual(self.upload_files._uploads, {})
+
+    @mock.patch('pulp.server.managers.content.upload.threading.Timer')
+    def test_timer_started(self, mock_timer):
+        self.upload_files.write('a', self.paths[0], 0, 'a')
+        self.upload_files.write('b', self.paths[1], 0, 'b')
+
+        mock_timer.assert_called_once_with(UPLOAD_IDLE_TIMEOUT, self.upload_files._close_idle)
+        self.assertTrue(mock_timer.return_value.daemon)
+        mock_timer.return_value.start.assert_called_once_with()
+
+    @mock.patch('pulp.server.managers.content.upload.threading.Timer')
+    def test_idle_closed(self, mock_timer):
+        self.upload_files.write('a', self.paths[0], 0, 'a')
+        self.upload_files.write('b', self.paths[1], 0, 'b')
+        upload_a = self.upload_files._uploads['a']
+        upload_a.used -= UPLOAD_IDLE_TIMEOUT
+
+        self.upload_files._close_idle()
+
+        self.assertTrue(upload_a.fd is None)
+        self.assertEqual(self.upload_files._uploads.keys(), ['b'])
+        # started again for the upload still open
+        self.assertEqual(mock_timer.return_value.start.call_count, 2)
+
+    @mock.patch('pulp.server.managers.content.upload.threading.Timer')
+    def test_all_idle_closed(self, mock_timer):
+        self.upload_files.write('a', self.paths[0], 0, 'a')
+        self.upload_files._uploads['a'].used -= UPLOAD_IDLE_TIMEOUT
+
+        self.upload_files._close_idle()
+
+        self.assertEqual(self.upload_files._uploads, {})
+        self.assertTrue(self.upload_files._timer is None)
+        self.assertEqual(mock_timer.return_value.start.call_count, 1)
+
+    def test_concurrent_writes(self):
+        chunks = [(i * 100, chr(ord('a') + i) * 100) for i in range(20)]
+
+        def write(offset, data):
+            self.upload_files.write('a', self.paths[0], offset, data)
+
+        threads = [threading.Thread(target=write, args=chunk) for chunk in reversed(chunks)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.read(self.paths[0]), ''.join(data for offset, data in chunks))
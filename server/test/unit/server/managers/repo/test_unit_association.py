@@ -111,8 +111,7 @@ class RepoUnitAssociationManagerTests(base.PulpServerTests):
         self.assertTrue('unit-1' in unit_ids)
         self.assertTrue('unit-2' in unit_ids)
 
-    @mock.patch('pulp.server.managers.repo.unit_association.repo_controller')
-    def test_associate_by_id_existing(self, mock_ctrl, mock_repo):
+    def test_associate_by_id_existing(self, mock_repo):
         """
         Tests attempting to create a new association where one already exists.
         """
@@ -136,8 +135,7 @@ class RepoUnitAssociationManagerTests(base.PulpServerTests):
         self.assertEqual(1, len(repo_units))
         self.assertEqual('unit-1', repo_units[0]['unit_id'])
 
-    @mock.patch('pulp.server.managers.repo.unit_association.repo_controller')
-    def test_associate_all(self, mock_ctrl, mock_repo):
+    def test_associate_all(self, mock_repo):
         """
         Tests making multiple associations in a single call.
         """
@@ -152,8 +150,7 @@ class RepoUnitAssociationManagerTests(base.PulpServerTests):
         for unit in repo_units:
             self.assertTrue(unit['unit_id'] in ids)
 
-    @mock.patch('pulp.server.managers.repo.unit_association.repo_controller')
-    def test_unassociate_by_id(self, mock_ctrl, mock_repo):
+    def test_unassociate_by_id(self, mock_repo):
         """
         Tests removing an association that exists by its unit ID.
         """
@@ -274,58 +271,72 @@ class RepoUnitAssociationManagerTests(base.PulpServerTests):
         except exceptions.MissingResource, e:
             self.assertTrue('missing' == e.resources['repo_id'])
 
-    @mock.patch('pulp.server.managers.repo.unit_association.repo_controller')
-    def test_associate_by_id_calls_update_unit_count(self, mock_ctrl, mock_repo):
-        self.manager.associate_unit_by_id(self.repo_id, 'type-1', 'unit-1')
-        mock_ctrl.update_unit_count.assert_called_once_with(self.repo_id, 'type-1', 1)
+    @mock.patch('pulp.server.controllers.repository.update_last_unit_added')
+    @mock.patch('pulp.server.controllers.repository.rebuild_content_unit_counts')
+    def test_associate_by_id_rebuilds_unit_counts(self, mock_rebuild, mock_added, mock_repo):
+        repo = mock_repo.objects.get_repo_or_missing_resource.return_value
+        self.assertTrue(self.manager.associate_unit_by_id(self.repo_id, 'type-1', 'unit-1'))
+        mock_rebuild.assert_called_once_with(repo)
 
-    @mock.patch('pulp.server.managers.repo.unit_association.repo_controller')
-    def test_associate_by_id_calls_update_last_unit_added(self, mock_ctrl, mock_repo):
+    @mock.patch('pulp.server.controllers.repository.update_last_unit_added')
+    @mock.patch('pulp.server.controllers.repository.rebuild_content_unit_counts')
+    def test_associate_by_id_calls_update_last_unit_added(self, mock_rebuild, mock_added,
+                                                          mock_repo):
         self.manager.associate_unit_by_id(self.repo_id, 'type-1', 'unit-1')
-        mock_ctrl.update_last_unit_added.assert_called_once_with(self.repo_id)
+        mock_added.assert_called_once_with(self.repo_id)
 
-    @mock.patch('pulp.server.controllers.repository.update_unit_count')
-    def test_associate_by_id_does_not_call_update_unit_count(self, mock_call, mock_repo):
+    @mock.patch('pulp.server.controllers.repository.update_last_unit_added')
+    @mock.patch('pulp.server.controllers.repository.rebuild_content_unit_counts')
+    def test_associate_by_id_does_not_rebuild_unit_counts(self, mock_rebuild, mock_added,
+                                                          mock_repo):
         """
         This would be the case when doing a bulk update.
         """
         self.manager.associate_unit_by_id(
             self.repo_id, 'type-1', 'unit-1', False)
-        self.assertFalse(mock_call.called)
+        self.assertFalse(mock_rebuild.called)
+        self.assertFalse(mock_added.called)
 
-    @mock.patch('pulp.server.managers.repo.unit_association.repo_controller')
-    def test_associate_non_unique_by_id(self, mock_ctrl, mock_repo):
+    @mock.patch('pulp.server.controllers.repository.update_last_unit_added')
+    @mock.patch('pulp.server.controllers.repository.rebuild_content_unit_counts')
+    def test_associate_non_unique_by_id(self, mock_rebuild, mock_added, mock_repo):
         """
-        non-unique call should not increment the count
+        non-unique call should not rebuild the counts
         """
         self.manager.associate_unit_by_id(self.repo_id, 'type-1', 'unit-1')
 
-        # creates a non-unique association for which the count should not be
-        # incremented
-        self.manager.associate_unit_by_id(self.repo_id, 'type-1', 'unit-1')
-        self.assertEqual(mock_ctrl.update_unit_count.call_count, 1)  # only from first associate
+        # creates a non-unique association for which the counts should not be
+        # rebuilt
+        self.assertFalse(self.manager.associate_unit_by_id(self.repo_id, 'type-1', 'unit-1'))
+        self.assertEqual(mock_rebuild.call_count, 1)  # only from first associate
 
-    @mock.patch('pulp.server.managers.repo.unit_association.repo_controller')
-    def test_associate_all_by_ids_calls_update_unit_count(self, mock_ctrl, mock_repo):
+    @mock.patch('pulp.server.controllers.repository.update_last_unit_added')
+    @mock.patch('pulp.server.controllers.repository.rebuild_content_unit_counts')
+    def test_associate_all_by_ids_rebuilds_unit_counts_once(self, mock_rebuild, mock_added,
+                                                            mock_repo):
+        repo = mock_repo.objects.get_repo_or_missing_resource.return_value
         IDS = ('foo', 'bar', 'baz')
-        self.manager.associate_all_by_ids(self.repo_id, 'type-1', IDS)
-        mock_ctrl.update_unit_count.assert_called_once_with(self.repo_id, 'type-1', len(IDS))
+        self.assertEqual(self.manager.associate_all_by_ids(self.repo_id, 'type-1', IDS), 3)
+        mock_rebuild.assert_called_once_with(repo)
 
-    @mock.patch('pulp.server.managers.repo.unit_association.repo_controller')
-    def test_associate_all_by_id_calls_update_last_unit_added(self, mock_ctrl, mock_repo_qs):
-        self.manager.associate_unit_by_id(self.repo_id, 'type-1', 'unit-1')
-        mock_ctrl.update_last_unit_added.assert_called_once_with(self.repo_id)
+    @mock.patch('pulp.server.controllers.repository.update_last_unit_added')
+    @mock.patch('pulp.server.controllers.repository.rebuild_content_unit_counts')
+    def test_associate_all_by_id_calls_update_last_unit_added(self, mock_rebuild, mock_added,
+                                                              mock_repo_qs):
+        self.manager.associate_all_by_ids(self.repo_id, 'type-1', ['unit-1', 'unit-2'])
+        mock_added.assert_called_once_with(self.repo_id)
 
-    @mock.patch('pulp.server.managers.repo.unit_association.repo_controller')
-    def test_associate_all_non_unique(self, mock_ctrl, mock_repo):
+    @mock.patch('pulp.server.controllers.repository.update_last_unit_added')
+    @mock.patch('pulp.server.controllers.repository.rebuild_content_unit_counts')
+    def test_associate_all_non_unique(self, mock_rebuild, mock_added, mock_repo):
         """
         Makes sure when two identical associations are requested, they only
         get counted once.
         """
         IDS = ('foo', 'bar', 'foo')
 
-        self.manager.associate_all_by_ids(self.repo_id, 'type-1', IDS)
-        mock_ctrl.update_unit_count.assert_called_once_with(self.repo_id, 'type-1', 2)
+        self.assertEqual(self.manager.associate_all_by_ids(self.repo_id, 'type-1', IDS), 2)
+        self.assertEqual(mock_rebuild.call_count, 1)
 
     # This test is skipped for now because it needs to be reworked to reflect the changes from this
     # commit, and we don't have time to do that at the moment.
@@ -365,27 +376,29 @@ class RepoUnitAssociationManagerTests(base.PulpServerTests):
         self.assertTrue(unit_coll.find_one({'repo_id': self.repo_id, 'unit_type_id': 'type-2',
                                             'unit_id': 'unit-2'}) is not None)
 
-    @mock.patch('pulp.server.managers.repo.unit_association.repo_controller')
-    def test_unassociate_by_id_calls_update_unit_count(self, mock_ctrl, mock_repo):
+    @mock.patch('pulp.server.controllers.repository.update_last_unit_removed')
+    @mock.patch('pulp.server.controllers.repository.update_last_unit_added')
+    @mock.patch('pulp.server.controllers.repository.rebuild_content_unit_counts')
+    def test_unassociate_by_id_rebuilds_unit_counts(self, mock_rebuild, mock_added,
+                                                    mock_removed, mock_repo):
+        repo = mock_repo.objects.get_repo_or_missing_resource.return_value
         self.manager.associate_unit_by_id(self.repo_id, self.unit_type_id, self.unit_id)
         self.manager.unassociate_unit_by_id(self.repo_id, self.unit_type_id, self.unit_id)
 
-        self.assertEqual(2, mock_ctrl.update_unit_count.call_count)
-        self.assertEqual(mock_ctrl.update_unit_count.call_args_list[0][0][0], self.repo_id)
-        self.assertEqual(mock_ctrl.update_unit_count.call_args_list[1][0][1], self.unit_type_id)
-        self.assertEqual(mock_ctrl.update_unit_count.call_args_list[0][0][2], 1)
-
-        self.assertEqual(mock_ctrl.update_unit_count.call_args_list[1][0][0], self.repo_id)
-        self.assertEqual(mock_ctrl.update_unit_count.call_args_list[1][0][1], self.unit_type_id)
-        self.assertEqual(mock_ctrl.update_unit_count.call_args_list[1][0][2], -1)
+        self.assertEqual(2, mock_rebuild.call_count)
+        self.assertEqual(mock_rebuild.call_args_list[0][0][0], repo)
+        self.assertEqual(mock_rebuild.call_args_list[1][0][0], repo)
+        mock_removed.assert_called_once_with(self.repo_id)
 
-    @mock.patch('pulp.server.managers.repo.unit_association.repo_controller')
-    def test_unassociate_by_id_non_unique(self, mock_ctrl, mock_repo):
+    @mock.patch('pulp.server.controllers.repository.update_last_unit_removed')
+    @mock.patch('pulp.server.controllers.repository.update_last_unit_added')
+    @mock.patch('pulp.server.controllers.repository.rebuild_content_unit_counts')
+    def test_unassociate_by_id_non_unique(self, mock_rebuild, mock_added, mock_removed,
+                                          mock_repo):
         self.manager.associate_unit_by_id(self.repo_id, 'type-1', 'unit-1')
         self.manager.associate_unit_by_id(self.repo_id, 'type-1', 'unit-1')
         self.manager.unassociate_unit_by_id(self.repo_id, 'type-1', 'unit-1')
-        mock_ctrl.update_unit_count.assert_called_once_with(self.repo_id, 'type-1', 1)
-        mock_ctrl.update_last_unit_added.assert_called_once_with(self.repo_id)
+        mock_added.assert_called_once_with(self.repo_id)
 
     @mock.patch('pymongo.cursor.Cursor.count', return_value=1)
     def test_association_exists_true(self, mock_count, mock_repo):
@@ -400,8 +413,7 @@ class RepoUnitAssociationManagerTests(base.PulpServerTests):
     # This test is skipped for now because it needs to be reworked to reflect the changes from this
     # commit, and we don't have time to do that at the moment.
     @skip.skip_broken
-    @mock.patch('pulp.server.managers.repo.unit_association.repo_controller')
-    def test_unassociate_via_criteria(self, mock_ctrl, mock_repo):
+    def test_unassociate_via_criteria(self, mock_repo):
         self.manager.associate_unit_by_id(self.repo_id, self.unit_type_id, self.unit_id)
         self.manager.associate_unit_by_id(self.repo_id, self.unit_type_id, self.unit_id_2)
 
@@ -417,8 +429,7 @@ class RepoUnitAssociationManagerTests(base.PulpServerTests):
                                                         self.unit_type_id))
         mock_repo.objects.get_repo_or_missing_resource.assert_called_once_with(self.repo_id)
 
-    @mock.patch('pulp.server.managers.repo.unit_association.repo_controller')
-    def test_unassociate_via_criteria_no_matches(self, mock_ctrl, mock_repo):
+    def test_unassociate_via_criteria_no_matches(self, mock_repo):
         self.manager.associate_unit_by_id(self.repo_id, 'type-1', 'unit-1')
         self.manager.associate_unit_by_id(self.repo_id, 'type-1', 'unit-2')
 
@@ -11,6 +11,7 @@ import mock
 from .... import base
 from pulp.common import dateutils
 from pulp.plugins.types import database, model
+from pulp.server import exceptions
 from pulp.server.db.model.criteria import Criteria, UnitAssociationCriteria
 from pulp.server.db.model.repository import RepoContentUnit
 import pulp.server.managers.content.cud as content_cud_manager
@@ -74,6 +75,145 @@ class RepoUnitAssociationQueryManagerTests(unittest.TestCase):
         self.assertEqual(return_value, expected_return_value)
 
 
+class KeysetPaginationTests(unittest.TestCase):
+    """
+    Tests for the keyset pagination of RepoUnitAssociationQueryManager.get_units_page.
+    """
+
+    def setUp(self):
+        self.manager = association_query_manager.RepoUnitAssociationQueryManager()
+        self.sort = [('unit_type_id', 1), ('unit_id', 1)]
+
+    @staticmethod
+    def _association(unit_type_id, unit_id):
+        return {'repo_id': 'repo-1', 'unit_type_id': unit_type_id, 'unit_id': unit_id}
+
+    @staticmethod
+    def _unit(unit_type_id, unit_id):
+        return {'_content_type_id': unit_type_id, '_id': unit_id}
+
+    def test_keyset_sort_default(self):
+        sort = association_query_manager._keyset_sort(None)
+
+        self.assertEqual(sort, self.sort)
+
+    def test_keyset_sort_association_sort(self):
+        sort = association_query_manager._keyset_sort([('created', -1), ('unit_id', -1)])
+
+        self.assertEqual(sort, [('created', -1), ('unit_id', -1), ('unit_type_id', 1)])
+
+    def test_keyset_spec(self):
+        sort = [('created', -1), ('unit_type_id', 1), ('unit_id', 1)]
+
+        spec = association_query_manager._keyset_spec(sort, ['c', 't', 'u'])
+
+        self.assertEqual(spec, {'$or': [
+            {'created': {'$lt': 'c'}},
+            {'created': 'c', 'unit_type_id': {'$gt': 't'}},
+            {'created': 'c', 'unit_type_id': 't', 'unit_id': {'$gt': 'u'}}]})
+
+    def test_page_token(self):
+        token = association_query_manager._encode_page_token(self.sort, ['t', 'u'])
+
+        last = association_query_manager._decode_page_token(token, self.sort)
+
+        self.assertEqual(last, ['t', 'u'])
+
+    def test_page_token_invalid(self):
+        self.assertRaises(exceptions.InvalidValue,
+                          association_query_manager._decode_page_token, 'not a token', self.sort)
+
+    def test_page_token_other_sort(self):
+        token = association_query_manager._encode_page_token(self.sort, ['t', 'u'])
+        sort = [('created', 1)] + self.sort
+
+        self.assertRaises(exceptions.InvalidValue,
+                          association_query_manager._decode_page_token, token, sort)
+
+    def test_skip(self):
+        criteria = UnitAssociationCriteria(skip=10)
+
+        self.assertRaises(exceptions.InvalidValue, self.manager.get_units_page, 'repo-1', criteria)
+
+    def test_unit_sort(self):
+        criteria = UnitAssociationCriteria(unit_sort=[('name', 1)])
+
+        self.assertRaises(exceptions.InvalidValue, self.manager.get_units_page, 'repo-1', criteria)
+
+    def test_remove_duplicates(self):
+        criteria = UnitAssociationCriteria(remove_duplicates=True)
+
+        self.assertRaises(exceptions.InvalidValue, self.manager.get_units_page, 'repo-1', criteria)
+
+    @mock.patch.object(association_query_manager.RepoUnitAssociationQueryManager,
+                       '_associated_units_by_type_cursor')
+    @mock.patch.object(association_query_manager.RepoContentUnit, 'get_collection')
+    def test_first_page(self, mock_get_collection, mock_units):
+        associations = [self._association('t1', 'a'), self._association('t2', 'b')]
+        collection = mock_get_collection.return_value
+        collection.find.return_value.sort.return_value.limit.return_value = associations
+        mock_units.side_effect = lambda unit_type_id, criteria, ids: [
+            self._unit(unit_type_id, i) for i in ids]
+        criteria = UnitAssociationCriteria(limit=2)
+
+        page, next_page_token = self.manager.get_units_page('repo-1', criteria)
+
+        self.assertEqual([a['unit_id'] for a in page], ['a', 'b'])
+        self.assertEqual(page[0]['metadata'], self._unit('t1', 'a'))
+        collection.find.assert_called_once_with({'repo_id': 'repo-1'}, projection=None)
+        collection.find.return_value.sort.assert_called_once_with(self.sort)
+        collection.find.return_value.sort.return_value.limit.assert_called_once_with(2)
+        self.assertEqual(association_query_manager._decode_page_token(next_page_token, self.sort),
+                         ['t2', 'b'])
+
+    @mock.patch.object(association_query_manager.RepoUnitAssociationQueryManager,
+                       '_associated_units_by_type_cursor')
+    @mock.patch.object(association_query_manager.RepoContentUnit, 'get_collection')
+    def test_resume(self, mock_get_collection, mock_units):
+        """
+        Test that a page resumes after the position of the page token and that the
+        associations of units not matching the unit filters are skipped.
+        """
+        batches = [[self._association('t1', 'b'), self._association('t1', 'c')],
+                   [self._association('t1', 'd')]]
+        collection = mock_get_collection.return_value
+        collection.find.return_value.sort.return_value.limit.side_effect = batches
+        # unit 'b' does not match the unit filters
+        mock_units.side_effect = lambda unit_type_id, criteria, ids: [
+            self._unit(unit_type_id, i) for i in ids if i != 'b']
+        token = association_query_manager._encode_page_token(self.sort, ['t1', 'a'])
+        criteria = UnitAssociationCriteria(type_ids=['t1'], limit=2, page_token=token)
+
+        page, next_page_token = self.manager.get_units_page('repo-1', criteria)
+
+        self.assertEqual([a['unit_id'] for a in page], ['c', 'd'])
+        spec = {'repo_id': 'repo-1', 'unit_type_id': {'$in': ['t1']}}
+        self.assertEqual(collection.find.call_args_list, [
+            mock.call({'$and': [spec, association_query_manager._keyset_spec(
+                self.sort, ['t1', 'a'])]}, projection=None),
+            mock.call({'$and': [spec, association_query_manager._keyset_spec(
+                self.sort, ['t1', 'c'])]}, projection=None)])
+        self.assertEqual(next_page_token, None)
+
+    @mock.patch.object(association_query_manager.RepoUnitAssociationQueryManager,
+                       '_associated_units_by_type_cursor')
+    @mock.patch.object(association_query_manager.RepoContentUnit, 'get_collection')
+    def test_association_fields(self, mock_get_collection, mock_units):
+        """
+        Test that the sorted fields are always retrieved, as the page token is built from them.
+        """
+        collection = mock_get_collection.return_value
+        collection.find.return_value.sort.return_value.limit.return_value = []
+        criteria = UnitAssociationCriteria(association_fields=['created'])
+
+        page, next_page_token = self.manager.get_units_page('repo-1', criteria)
+
+        self.assertEqual(page, [])
+        self.assertEqual(next_page_token, None)
+        self.assertEqual(sorted(collection.find.call_args[1]['projection']),
+                         ['created', 'unit_id', 'unit_type_id'])
+
+
 class UnitAssociationQueryTests(base.PulpServerTests):
 
     def clean(self):
@@ -292,6 +432,26 @@ class UnitAssociationQueryTests(base.PulpServerTests):
         self.assertEqual(low_units[0], high_units[0])
         self.assertEqual(low_units[1], high_units[1])
 
+    def test_get_units_page(self):
+        # Test
+        units = []
+        page_token = None
+        while True:
+            criteria = UnitAssociationCriteria(limit=2, page_token=page_token)
+            page, page_token = self.manager.get_units_page('repo-1', criteria)
+            self.assertTrue(len(page) <= 2)
+            units.extend(page)
+            if page_token is None:
+                break
+
+        # Verify
+        all_units = self.manager.get_units_across_types('repo-1')
+        self.assertEqual(len(all_units), len(units))
+        keys = [(u['unit_type_id'], u['unit_id']) for u in units]
+        self.assertEqual(keys, sorted((u['unit_type_id'], u['unit_id']) for u in all_units))
+        for u in units:
+            self._assert_unit_integrity(u)
+
     def test_get_units_skip(self):
         # Test
         skip_criteria = UnitAssociationCriteria(skip=2)
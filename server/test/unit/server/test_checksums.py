@@ -0,0 +1,166 @@
+from cStringIO import StringIO
+import hashlib
+import os
+import shutil
+import tempfile
+
+from mock import Mock, patch, call
+from mongoengine import NotUniqueError
+
+from pulp.common.compat import unittest
+from pulp.server import checksums
+from pulp.server.util import TYPE_MD5, TYPE_SHA256
+
+
+MODULE = 'pulp.server.checksums.'
+
+
+class ChecksumsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.working_dir, 'file')
+        with open(self.path, 'w') as f:
+            f.write('pulp')
+        self.sha256 = hashlib.sha256('pulp').hexdigest()
+        self.md5 = hashlib.md5('pulp').hexdigest()
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+
+
+@patch(MODULE + 'socket.gethostname', return_value='pulp.example.com')
+@patch(MODULE + 'model.FileChecksum')
+class TestCalculateFile(ChecksumsTest):
+
+    def test_not_on_disk(self, mock_model, mock_hostname):
+        """
+        Test that the checksums of files not on disk are calculated without being cached.
+        """
+        ret = checksums.calculate_file(StringIO('pulp'), [TYPE_SHA256])
+
+        self.assertEqual(ret, {TYPE_SHA256: self.sha256})
+        self.assertFalse(mock_model.objects.called)
+
+    def test_calculated(self, mock_model, mock_hostname):
+        """
+        Test that the checksums of a file are calculated and saved.
+        """
+        mock_model.objects.return_value.first.return_value = None
+        stat = os.stat(self.path)
+
+        with open(self.path) as f:
+            ret = checksums.calculate_file(f, [TYPE_SHA256, TYPE_MD5])
+
+        self.assertEqual(ret, {TYPE_SHA256: self.sha256, TYPE_MD5: self.md5})
+        self.assertEqual(mock_model.objects.call_args_list, [
+            call(host='pulp.example.com', device=stat.st_dev, inode=stat.st_ino,
+                 size=stat.st_size, mtime=stat.st_mtime),
+            call(host='pulp.example.com', device=stat.st_dev, inode=stat.st_ino)])
+        mock_model.objects.return_value.update_one.assert_called_once_with(
+            set__size=stat.st_size, set__mtime=stat.st_mtime, set__checksums=ret, upsert=True)
+
+    def test_cached(self, mock_model, mock_hostname):
+        """
+        Test that the checksums of an unchanged file are not calculated again.
+        """
+        cached = mock_model.objects.return_value.first.return_value
+        cached.checksums = {TYPE_SHA256: 'cached', TYPE_MD5: 'also cached'}
+
+        with open(self.path) as f:
+            ret = checksums.calculate_file(f, [TYPE_SHA256])
+
+        self.assertEqual(ret, {TYPE_SHA256: 'cached'})
+        self.assertFalse(cached.save.called)
+        self.assertFalse(mock_model.objects.return_value.update_one.called)
+
+    def test_cached_other_type(self, mock_model, mock_hostname):
+        """
+        Test that checksums of other types are added to the ones of an unchanged file.
+        """
+        cached = mock_model.objects.return_value.first.return_value
+        cached.checksums = {TYPE_MD5: 'cached'}
+
+        with open(self.path) as f:
+            ret = checksums.calculate_file(f, [TYPE_SHA256])
+
+        self.assertEqual(ret, {TYPE_SHA256: self.sha256})
+        self.assertEqual(cached.checksums, {TYPE_MD5: 'cached', TYPE_SHA256: self.sha256})
+        cached.save.assert_called_once_with()
+
+    @patch(MODULE + '_stat')
+    def test_changed_while_read(self, mock_stat, mock_model, mock_hostname):
+        """
+        Test that the checksums are not saved if the file changed while it was read.
+        """
+        mock_stat.side_effect = [Mock(st_size=4, st_mtime=1), Mock(st_size=5, st_mtime=2)]
+        mock_model.objects.return_value.first.return_value = None
+
+        with open(self.path) as f:
+            ret = checksums.calculate_file(f, [TYPE_SHA256])
+
+        self.assertEqual(ret, {TYPE_SHA256: self.sha256})
+        self.assertFalse(mock_model.objects.return_value.update_one.called)
+
+    def test_saved_concurrently(self, mock_model, mock_hostname):
+        """
+        Test that the checksums are returned when another process saved them first.
+        """
+        mock_model.objects.return_value.first.return_value = None
+        mock_model.objects.return_value.update_one.side_effect = NotUniqueError()
+
+        with open(self.path) as f:
+            ret = checksums.calculate_file(f, [TYPE_SHA256])
+
+        self.assertEqual(ret, {TYPE_SHA256: self.sha256})
+
+
+@patch(MODULE + 'calculate_file')
+class TestCalculate(ChecksumsTest):
+
+    def test_calculate(self, mock_calculate_file):
+        """
+        Test that the checksums of the file at a path are calculated.
+        """
+        ret = checksums.calculate(self.path, [TYPE_SHA256])
+
+        self.assertEqual(ret, mock_calculate_file.return_value)
+        f, checksum_types = mock_calculate_file.call_args[0]
+        self.assertEqual(f.name, self.path)
+        self.assertEqual(checksum_types, [TYPE_SHA256])
+
+    def test_missing(self, mock_calculate_file):
+        """
+        Test that an IOError is raised for a missing file.
+        """
+        self.assertRaises(IOError, checksums.calculate, os.path.join(self.working_dir, 'x'),
+                          [TYPE_SHA256])
+
+    def test_calculate_many(self, mock_calculate_file):
+        """
+        Test that the checksums of many files are returned in order.
+        """
+        paths = [os.path.join(self.working_dir, str(i)) for i in range(10)]
+        for path in paths:
+            with open(path, 'w') as f:
+                f.write(path)
+        mock_calculate_file.side_effect = lambda f, checksum_types: f.name
+
+        ret = checksums.calculate_many(paths, [TYPE_SHA256])
+
+        self.assertEqual(ret, paths)
+
+    def test_calculate_many_error(self, mock_calculate_file):
+        """
+        Test that errors reading the files are raised.
+        """
+        paths = [self.path, os.path.join(self.working_dir, 'missing')]
+
+        self.assertRaises(IOError, checksums.calculate_many, paths, [TYPE_SHA256])
+
+    def test_calculate_many_empty(self, mock_calculate_file):
+        """
+        Test that no checksums are calculated without files.
+        """
+        self.assertEqual(checksums.calculate_many([], [TYPE_SHA256]), [])
+        self.assertFalse(mock_calculate_file.called)
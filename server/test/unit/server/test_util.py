@@ -1,6 +1,9 @@
 from cStringIO import StringIO
+import errno
 import hashlib
+import os
 import shutil
+import tempfile
 
 from mock import Mock, patch, call
 
@@ -37,10 +40,11 @@ class TestCopyTree(unittest.TestCase):
         mock_list_dir.assert_has_calls([call('src'), call('src/dir1'), call('src/dir2')])
         mock_isdir.assert_has_calls([call('src/dir1'), call('src/dir1/file1'), call('src/dir2'),
                                      call('src/dir2/file2'), call('src/file3')])
-        # Assert files are copied using copy()
-        mock_copy.assert_has_calls([call('src/dir1/file1', 'dst/dir1/file1'),
-                                    call('src/dir2/file2', 'dst/dir2/file2'),
-                                    call('src/file3', 'dst/file3')])
+        # Assert files are copied using copy(), in parallel
+        mock_copy.assert_has_calls([call('src/dir1/file1', 'dst/dir1/file1', reflink=True),
+                                    call('src/dir2/file2', 'dst/dir2/file2', reflink=True),
+                                    call('src/file3', 'dst/file3', reflink=True)],
+                                   any_order=True)
         # Assert that directories are created using makedirs()
         mock_makedirs.assert_has_calls([call('dst'), call('dst/dir1'), call('dst/dir2')])
 
@@ -65,7 +69,7 @@ class TestCopyTree(unittest.TestCase):
         mock_list_dir.side_effect = [['file'], []]
         mock_isdir.side_effect = [False]
         util.copytree('src', 'dst')
-        mock_copy.assert_called_with('src/file', 'dst/file')
+        mock_copy.assert_called_with('src/file', 'dst/file', reflink=True)
         self.assertFalse(mock_copy2.called)
         self.assertFalse(mock_copystat.called)
 
@@ -94,6 +98,7 @@ class TestCopyTree(unittest.TestCase):
         util.copytree('src', 'dst')
         mock_utime.assert_called_with('dst/file', (1, 2))
 
+    @patch('pulp.server.util.COPY_THREADS', 1)
     @patch('pulp.server.util.os.makedirs')
     @patch('pulp.server.util.copy', autospec=True)
     @patch('pulp.server.util.os.path.isdir')
@@ -121,9 +126,27 @@ class TestCopyTree(unittest.TestCase):
             self.assertEqual('src/%d' % i, src)
             self.assertEqual('dst/%d' % i, dst)
             self.assertEqual('oops', why)
-        # make sure there are 10 more in the iterator, thus those copy operations were definitely
-        # not attempted.
-        self.assertEqual(len(list(mock_list_dir.return_value)), 10)
+        # make sure the 10 remaining files were not attempted
+        self.assertEqual(mock_copy.call_count, 100)
+
+    @patch('pulp.server.util.os.makedirs')
+    @patch('pulp.server.util.copy', autospec=True)
+    @patch('pulp.server.util.os.path.isdir')
+    @patch('pulp.server.util.os.listdir')
+    def test_error_limit_threads(self, mock_list_dir, mock_isdir, mock_copy, mock_makedirs):
+        """
+        Make sure that with several threads, only the copies in progress when the limit is
+        reached are attempted after it.
+        """
+        mock_list_dir.return_value = [str(x) for x in range(1000)]
+        mock_isdir.return_value = False
+        mock_copy.side_effect = OSError('oops')
+
+        with self.assertRaises(shutil.Error) as assertion:
+            util.copytree('src', 'dst')
+
+        self.assertEqual(len(assertion.exception.args[0]), 100)
+        self.assertTrue(mock_copy.call_count < 100 + util.COPY_THREADS)
 
     @patch('pulp.server.util.copy', autospec=True)
     @patch('pulp.server.util.os.path.isdir')
@@ -201,6 +224,179 @@ class TestCopyTree(unittest.TestCase):
         mock_isdir.assert_has_calls([call('src/dir1'), call('src/dir2'), call('src/dir2/file2'),
                                      call('src/file3')])
 
+    @patch('pulp.server.util.os.link')
+    @patch('os.utime', autospec=True)
+    @patch('os.stat', autospec=True)
+    @patch('pulp.server.util.copy')
+    @patch('pulp.server.util.os.path.isdir', return_value=False)
+    @patch('pulp.server.util.os.makedirs')
+    @patch('pulp.server.util.os.listdir', return_value=['file1', 'file2'])
+    def test_link(self, mock_list_dir, mock_makedirs, mock_isdir, mock_copy, mock_stat,
+                  mock_utime, mock_link):
+        """
+        Test that files are hard linked when requested and on the same filesystem.
+        """
+        util.copytree('src', 'dst', link=True)
+
+        mock_link.assert_has_calls([call('src/file1', 'dst/file1'),
+                                    call('src/file2', 'dst/file2')], any_order=True)
+        self.assertFalse(mock_copy.called)
+        self.assertFalse(mock_utime.called)
+
+    @patch('pulp.server.util.os.link')
+    @patch('os.utime', autospec=True)
+    @patch('os.stat', autospec=True)
+    @patch('pulp.server.util.copy')
+    @patch('pulp.server.util.os.path.isdir', return_value=False)
+    @patch('pulp.server.util.os.makedirs')
+    @patch('pulp.server.util.os.listdir', return_value=['file1'])
+    def test_link_other_device(self, mock_list_dir, mock_makedirs, mock_isdir, mock_copy,
+                               mock_stat, mock_utime, mock_link):
+        """
+        Test that files are copied when requested to be linked to another filesystem.
+        """
+        mock_stat.side_effect = [Mock(st_dev=1), Mock(st_dev=2), Mock(st_atime=1, st_mtime=2)]
+
+        util.copytree('src', 'dst', link=True)
+
+        self.assertFalse(mock_link.called)
+        mock_copy.assert_called_once_with('src/file1', 'dst/file1', reflink=True)
+        mock_utime.assert_called_once_with('dst/file1', (1, 2))
+
+
+class TestFileTransfer(unittest.TestCase):
+
+    @patch('os.utime', autospec=True)
+    @patch('os.stat', autospec=True)
+    @patch('pulp.server.util.copy', return_value=True)
+    @patch('pulp.server.util.os.link')
+    def test_link_not_supported(self, mock_link, mock_copy, mock_stat, mock_utime):
+        """
+        Test that files are copied once linking fails because it is not supported.
+        """
+        mock_link.side_effect = OSError(errno.EPERM, 'not permitted')
+        transfer = util._FileTransfer(True, util.COPY_ERROR_LIMIT)
+
+        self.assertEqual(transfer(('src/1', 'dst/1')), None)
+        self.assertEqual(transfer(('src/2', 'dst/2')), None)
+
+        mock_link.assert_called_once_with('src/1', 'dst/1')
+        mock_copy.assert_has_calls([call('src/1', 'dst/1', reflink=True),
+                                    call('src/2', 'dst/2', reflink=True)])
+
+    @patch('os.utime', autospec=True)
+    @patch('os.stat', autospec=True)
+    @patch('pulp.server.util.copy', return_value=False)
+    def test_reflink_not_supported(self, mock_copy, mock_stat, mock_utime):
+        """
+        Test that cloning is not attempted again once it failed.
+        """
+        transfer = util._FileTransfer(False, util.COPY_ERROR_LIMIT)
+
+        transfer(('src/1', 'dst/1'))
+        transfer(('src/2', 'dst/2'))
+
+        mock_copy.assert_has_calls([call('src/1', 'dst/1', reflink=True),
+                                    call('src/2', 'dst/2', reflink=False)])
+
+    @patch('pulp.server.util.copy', side_effect=IOError('oops'))
+    def test_error(self, mock_copy):
+        """
+        Test that errors are returned rather than raised.
+        """
+        transfer = util._FileTransfer(False, util.COPY_ERROR_LIMIT)
+
+        self.assertEqual(transfer(('src/1', 'dst/1')), ('src/1', 'dst/1', 'oops'))
+
+
+class TestCopy(unittest.TestCase):
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+        self.src = os.path.join(self.working_dir, 'src')
+        self.dst = os.path.join(self.working_dir, 'dst')
+        with open(self.src, 'w') as f:
+            f.write('pulp')
+        os.chmod(self.src, 0640)
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+
+    @patch('pulp.server.util.fcntl.ioctl')
+    def test_copy(self, mock_ioctl):
+        """
+        Test that contents and permission bits are copied.
+        """
+        self.assertFalse(util.copy(self.src, self.dst))
+
+        self.assertFalse(mock_ioctl.called)
+        with open(self.dst) as f:
+            self.assertEqual(f.read(), 'pulp')
+        self.assertEqual(os.stat(self.dst).st_mode & 0777, 0640)
+
+    @patch('pulp.server.util.fcntl.ioctl')
+    def test_reflink(self, mock_ioctl):
+        """
+        Test that contents are cloned when requested.
+        """
+        self.assertTrue(util.copy(self.src, self.dst, reflink=True))
+
+        self.assertEqual(mock_ioctl.call_count, 1)
+        self.assertEqual(mock_ioctl.call_args[0][1], util.FICLONE)
+        with open(self.dst) as f:
+            self.assertEqual(f.read(), '')
+
+    @patch('pulp.server.util.fcntl.ioctl', side_effect=IOError(errno.EOPNOTSUPP, 'nope'))
+    def test_reflink_not_supported(self, mock_ioctl):
+        """
+        Test that contents are copied when cloning is not supported.
+        """
+        self.assertFalse(util.copy(self.src, self.dst, reflink=True))
+
+        with open(self.dst) as f:
+            self.assertEqual(f.read(), 'pulp')
+
+
+class TestCopyTreeToAll(unittest.TestCase):
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+        self.src = os.path.join(self.working_dir, 'src')
+        os.makedirs(os.path.join(self.src, 'dir'))
+        with open(os.path.join(self.src, 'dir', 'file'), 'w') as f:
+            f.write('pulp')
+        os.symlink('dir/file', os.path.join(self.src, 'link'))
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+
+    def test_copy(self):
+        """
+        Test that the tree is copied once and linked to the other destinations.
+        """
+        dsts = [os.path.join(self.working_dir, name) for name in ('http', 'https')]
+
+        util.copytree_to_all(self.src, dsts, symlinks=True)
+
+        src_file = os.stat(os.path.join(self.src, 'dir', 'file'))
+        http_file = os.stat(os.path.join(dsts[0], 'dir', 'file'))
+        https_file = os.stat(os.path.join(dsts[1], 'dir', 'file'))
+        self.assertNotEqual(src_file.st_ino, http_file.st_ino)
+        self.assertEqual(http_file.st_ino, https_file.st_ino)
+        for dst in dsts:
+            self.assertEqual(os.readlink(os.path.join(dst, 'link')), 'dir/file')
+            with open(os.path.join(dst, 'dir', 'file')) as f:
+                self.assertEqual(f.read(), 'pulp')
+
+    @patch('pulp.server.util.copytree')
+    def test_no_destinations(self, mock_copytree):
+        """
+        Test that nothing is copied without destinations.
+        """
+        util.copytree_to_all(self.src, [])
+
+        self.assertFalse(mock_copytree.called)
+
 
 class TestPackageListenerDeleting(unittest.TestCase):
     @patch('os.remove')
@@ -287,3 +483,37 @@ class TestCalculateChecksums(unittest.TestCase):
 
         self.assertEqual(ret['sha256'], self.sha256_sum)
         self.assertTrue(len(ret), 1)
+
+    def test_file(self):
+        """
+        Test that the checksums of a file on disk are calculated.
+        """
+        with tempfile.NamedTemporaryFile() as f:
+            f.write('sometext' * 100)
+            f.flush()
+            ret = util.calculate_checksums(f, [util.TYPE_SHA256])
+
+            self.assertEqual(f.tell(), 800)
+        self.assertEqual(ret[util.TYPE_SHA256], hashlib.sha256('sometext' * 100).hexdigest())
+
+    @patch('pulp.server.util.CHECKSUM_CHUNK_SIZE', 3)
+    def test_file_chunks(self):
+        """
+        Test that the checksums of a file on disk are calculated in chunks.
+        """
+        with tempfile.NamedTemporaryFile() as f:
+            f.write('sometext')
+            f.flush()
+            ret = util.calculate_checksums(f, [util.TYPE_SHA256, util.TYPE_MD5])
+
+        self.assertEqual(ret[util.TYPE_SHA256], hashlib.sha256('sometext').hexdigest())
+        self.assertEqual(ret[util.TYPE_MD5], hashlib.md5('sometext').hexdigest())
+
+    def test_empty_file(self):
+        """
+        Test that the checksums of an empty file on disk are calculated.
+        """
+        with tempfile.NamedTemporaryFile() as f:
+            ret = util.calculate_checksums(f, [util.TYPE_SHA256])
+
+        self.assertEqual(ret[util.TYPE_SHA256], hashlib.sha256('').hexdigest())
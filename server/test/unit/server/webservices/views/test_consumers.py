@@ -3,6 +3,7 @@ import unittest
 
 import mock
 from django.http import HttpResponseBadRequest
+from pymongo.errors import OperationFailure
 
 from base import assert_auth_CREATE, assert_auth_DELETE, assert_auth_READ, assert_auth_UPDATE
 from pulp.server.exceptions import (InvalidValue, MissingResource, MissingValue,
@@ -1194,6 +1195,69 @@ class TestConsumerQueryContentApplicabilityView(unittest.TestCase):
         mock_resp.assert_called_once_with(resp)
         self.assertTrue(response is mock_resp.return_value)
 
+    @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
+                new=assert_auth_READ())
+    @mock.patch('pulp.server.webservices.views.consumers.generate_streaming_json_response')
+    @mock.patch('pulp.server.webservices.views.consumers.stream_consumer_applicability')
+    def test_query_consumer_content_applic_stream(self, mock_stream, mock_resp):
+        """
+        Test query consumer content applicability with a streamed report
+        """
+        request = mock.MagicMock()
+        request.body = json.dumps({'criteria': {'filters': {}}, 'content_types': ['type1'],
+                                   'stream': True, 'skip': 10, 'limit': 5})
+        mock_stream.return_value = iter([{'consumers': ['c1'], 'applicability': {}}])
+        consumer_applic = ConsumerContentApplicabilityView()
+        response = consumer_applic.post(request)
+
+        mock_stream.assert_called_once_with(mock.ANY, ['type1'], 10, 5)
+        report = mock_resp.call_args[0][0]
+        self.assertEqual(list(report), [{'consumers': ['c1'], 'applicability': {}}])
+        self.assertEqual(mock_resp.call_args[1], {'default': consumers.pulp_json_encoder})
+        self.assertTrue(response is mock_resp.return_value)
+
+    @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
+                new=assert_auth_READ())
+    @mock.patch('pulp.server.webservices.views.consumers.generate_streaming_json_response')
+    @mock.patch('pulp.server.webservices.views.consumers.stream_consumer_applicability')
+    def test_query_consumer_content_applic_stream_invalid(self, mock_stream, mock_resp):
+        """
+        Test that an invalid criteria is reported before the report is streamed.
+        """
+        def report():
+            raise OperationFailure('invalid')
+            yield
+
+        request = mock.MagicMock()
+        request.body = json.dumps({'criteria': {'filters': {}}, 'stream': True})
+        mock_stream.return_value = report()
+        consumer_applic = ConsumerContentApplicabilityView()
+        response = consumer_applic.post(request)
+
+        self.assertTrue(isinstance(response, HttpResponseBadRequest))
+        self.assertFalse(mock_resp.called)
+
+    def test_get_stream_options_default(self):
+        """
+        Test that the report is not streamed by default.
+        """
+        request = mock.MagicMock()
+        request.body_as_json = {}
+        consumer_applic = ConsumerContentApplicabilityView()
+        self.assertEqual(consumer_applic._get_stream_options(request), (False, 0, None))
+
+    def test_get_stream_options_invalid(self):
+        """
+        Test that invalid stream options raise InvalidValue.
+        """
+        consumer_applic = ConsumerContentApplicabilityView()
+        for body in ({'stream': 'yes'}, {'stream': True, 'skip': -1},
+                     {'stream': True, 'skip': '1'}, {'stream': True, 'limit': 0},
+                     {'stream': True, 'limit': True}, {'limit': 10}, {'skip': 1}):
+            request = mock.MagicMock()
+            request.body_as_json = body
+            self.assertRaises(InvalidValue, consumer_applic._get_stream_options, request)
+
     def test_get_consumer_criteria_no_criteria(self):
         """
         Test get consumer criteria.
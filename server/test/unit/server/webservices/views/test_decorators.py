@@ -68,15 +68,15 @@ class TestAuthenticationMethods(base.PulpServerTests):
     @mock.patch('pulp.server.webservices.http.resource_path', autospec=True)
     @mock.patch('pulp.server.managers.factory.principal_manager', autospec=True)
     @mock.patch('pulp.server.webservices.views.decorators.check_preauthenticated')
-    @mock.patch('pulp.server.webservices.views.decorators.model.User.objects')
-    @mock.patch('pulp.server.webservices.views.decorators.user_controller.is_authorized',
+    @mock.patch('pulp.server.webservices.views.decorators.permission_cache.get')
+    @mock.patch('pulp.server.webservices.views.decorators.user_controller.is_authorized_entry',
                 return_value=False)
-    def test_auth_decorator_not_super(self, mock_is_authed, mock_user_qs, *unused_mocks):
+    def test_auth_decorator_not_super(self, mock_is_authed, mock_get, *unused_mocks):
         """
         Test that if the user is not a super user and the operation requires super user,
         an exception is raised. This test mocks out the authentication portion of the decorator.
         """
-        mock_user_qs.get.return_value.is_superuser.return_value = False
+        mock_get.return_value.user.is_superuser.return_value = False
         decorated_func = decorators.auth_required(0, True)(self.func)
         self.assertRaises(PulpCodedAuthenticationException, decorated_func, None)
         self.assertEqual(0, mock_is_authed.call_count)
@@ -91,7 +91,7 @@ class TestAuthenticationMethods(base.PulpServerTests):
                 return_value=None)
     @mock.patch('pulp.server.webservices.views.decorators.check_preauthenticated',
                 return_value=None)
-    @mock.patch('pulp.server.webservices.views.decorators.model.User.objects')
+    @mock.patch('pulp.server.webservices.views.decorators.permission_cache.get')
     @mock.patch('pulp.server.webservices.views.decorators.is_consumer_authorized',
                 return_value=False)
     def test_auth_decorator_consumer_not_authorized(self, mock_is_authorized, *unused_mocks):
@@ -113,10 +113,10 @@ class TestAuthenticationMethods(base.PulpServerTests):
     @mock.patch('pulp.server.webservices.views.decorators.check_preauthenticated',
                 return_value=None)
     @mock.patch('pulp.server.webservices.views.decorators.factory.principal_manager')
-    @mock.patch('pulp.server.webservices.views.decorators.model.User.objects')
+    @mock.patch('pulp.server.webservices.views.decorators.permission_cache.get')
     @mock.patch('pulp.server.webservices.views.decorators.is_consumer_authorized',
                 return_value=True)
-    def test_auth_decorator_consumer_authorized(self, mock_is_authorized, mock_user_objects,
+    def test_auth_decorator_consumer_authorized(self, mock_is_authorized, mock_get,
                                                 mock_principal_manager, *unused_mocks):
         """
         Test that if the consumer is authorized, no exception is raised.
@@ -125,7 +125,7 @@ class TestAuthenticationMethods(base.PulpServerTests):
         decorated_func = decorators.auth_required(0, False)(lambda *x: None)
         decorated_func(None)
 
-        self.assertEqual(0, mock_user_objects.get.call_count)
+        self.assertEqual(0, mock_get.call_count)
         mock_is_authorized.assert_called_once_with('/', 'gob', 0)
         principal_manager.set_principal.assert_called_once_with()
         principal_manager.clear_principal.assert_called_once_with()
@@ -133,8 +133,8 @@ class TestAuthenticationMethods(base.PulpServerTests):
     @mock.patch('pulp.server.webservices.http.resource_path', autospec=True)
     @mock.patch('pulp.server.managers.factory.principal_manager', autospec=True)
     @mock.patch('pulp.server.webservices.views.decorators.check_preauthenticated')
-    @mock.patch('pulp.server.webservices.views.decorators.model.User.objects')
-    @mock.patch('pulp.server.webservices.views.decorators.user_controller.is_authorized',
+    @mock.patch('pulp.server.webservices.views.decorators.permission_cache.get')
+    @mock.patch('pulp.server.webservices.views.decorators.user_controller.is_authorized_entry',
                 return_value=False)
     def test_auth_decorator_not_authorized(self, mock_is_authorized, *unused_mocks):
         """
@@ -144,3 +144,24 @@ class TestAuthenticationMethods(base.PulpServerTests):
         decorated_func = decorators.auth_required(0, False)(self.func)
         self.assertRaises(PulpCodedAuthenticationException, decorated_func, None)
         self.assertEqual(1, mock_is_authorized.call_count)
+
+    @mock.patch('pulp.server.webservices.http.resource_path', autospec=True, return_value='/')
+    @mock.patch('pulp.server.webservices.views.decorators.factory.principal_manager')
+    @mock.patch('pulp.server.webservices.views.decorators.check_preauthenticated',
+                return_value='admin')
+    @mock.patch('pulp.server.webservices.views.decorators.permission_cache.get')
+    @mock.patch('pulp.server.webservices.views.decorators.user_controller.is_authorized_entry',
+                return_value=True)
+    def test_auth_decorator_authorized(self, mock_is_authorized, mock_get, unused_preauth,
+                                       mock_principal_manager, *unused_mocks):
+        """
+        Test that if a user is authorized, the cached user is set as the principal.
+        """
+        principal_manager = mock_principal_manager.return_value
+        decorated_func = decorators.auth_required(0, False)(lambda *x: None)
+        decorated_func(None)
+
+        mock_get.assert_called_once_with('admin')
+        mock_is_authorized.assert_called_once_with(mock_get.return_value, '/', 0)
+        principal_manager.set_principal.assert_called_once_with(mock_get.return_value.user)
+        principal_manager.clear_principal.assert_called_once_with()
@@ -2,6 +2,7 @@ from operator import itemgetter
 import json
 
 from django import http
+from pymongo.errors import OperationFailure
 import mock
 
 from base import (
@@ -707,6 +708,76 @@ class TestRepoUnitSearch(unittest.TestCase):
         mock_uqm().get_units.assert_called_once_with('mock_repo', criteria=criteria)
         mock_resp.assert_called_once_with(mock_uqm().get_units.return_value)
 
+    @mock.patch('pulp.server.webservices.views.repositories.content')
+    @mock.patch('pulp.server.webservices.views.repositories.manager_factory.'
+                'repo_unit_association_query_manager')
+    @mock.patch('pulp.server.webservices.views.repositories.UnitAssociationCriteria')
+    @mock.patch('pulp.server.webservices.views.repositories.model.Repository.objects')
+    def test__generate_response_stream(self, mock_repo_qs, mock_crit, mock_uqm, mock_content):
+        """
+        Test that units are streamed as they are read when requested.
+        """
+        units = [{'metadata': {'_id': 'a'}}, {'metadata': {'_id': 'b'}}]
+        mock_uqm().get_units_by_type.return_value = iter(units)
+        criteria = mock_crit.from_client_input.return_value
+        criteria.type_ids = ['one_type']
+        repo_unit_search = RepoUnitSearch()
+        response = repo_unit_search._generate_response('mock_q', {'stream': True},
+                                                       repo_id='mock_repo')
+        self.assertEqual(mock_content.serialize_unit_with_serializer.call_count, 1)
+        content = ''.join(response.streaming_content)
+        mock_uqm().get_units_by_type.assert_called_once_with('mock_repo', 'one_type',
+                                                             criteria=criteria, as_generator=True)
+        self.assertEqual(mock_content.serialize_unit_with_serializer.call_count, 2)
+        self.assertEqual(json.loads(content), units)
+
+    @mock.patch('pulp.server.webservices.views.repositories.content')
+    @mock.patch('pulp.server.webservices.views.repositories.manager_factory.'
+                'repo_unit_association_query_manager')
+    @mock.patch('pulp.server.webservices.views.repositories.UnitAssociationCriteria')
+    @mock.patch('pulp.server.webservices.views.repositories.model.Repository.objects')
+    def test__generate_response_stream_invalid(self, mock_repo_qs, mock_crit, mock_uqm,
+                                               mock_content):
+        """
+        Test that an invalid criteria is reported before the units are streamed.
+        """
+        def units():
+            raise OperationFailure('invalid')
+            yield
+
+        mock_uqm().get_units.return_value = units()
+        criteria = mock_crit.from_client_input.return_value
+        criteria.type_ids = None
+        repo_unit_search = RepoUnitSearch()
+        self.assertRaises(exceptions.InvalidValue, repo_unit_search._generate_response,
+                          'mock_q', {'stream': True}, repo_id='mock_repo')
+
+    @mock.patch('pulp.server.webservices.views.repositories.content')
+    @mock.patch(
+        'pulp.server.webservices.views.repositories.generate_json_response_with_pulp_encoder')
+    @mock.patch('pulp.server.webservices.views.repositories.manager_factory.'
+                'repo_unit_association_query_manager')
+    @mock.patch('pulp.server.webservices.views.repositories.UnitAssociationCriteria')
+    @mock.patch('pulp.server.webservices.views.repositories.model.Repository.objects')
+    def test__generate_response_paged(self, mock_repo_qs, mock_crit, mock_uqm, mock_resp,
+                                      mock_content):
+        """
+        Test that a page of units and the next page token are returned when a page token is
+        requested.
+        """
+        unit = {'metadata': {'_id': 'a'}}
+        mock_uqm().get_units_page.return_value = ([unit], 'next')
+        query = {'type_ids': ['one_type'], 'page_token': None, 'limit': 1}
+        criteria = mock_crit.from_client_input.return_value
+        criteria.type_ids = ['one_type']
+        repo_unit_search = RepoUnitSearch()
+        repo_unit_search._generate_response(query, {}, repo_id='mock_repo')
+        mock_crit.from_client_input.assert_called_once_with(query)
+        mock_uqm().get_units_page.assert_called_once_with('mock_repo', criteria=criteria)
+        self.assertFalse(mock_uqm().get_units_by_type.called)
+        mock_content.serialize_unit_with_serializer.assert_called_once_with(unit['metadata'])
+        mock_resp.assert_called_once_with({'units': [unit], 'next_page_token': 'next'})
+
 
 class TestRepoImportersView(unittest.TestCase):
     """
@@ -217,6 +217,53 @@ class TestSearchView(unittest.TestCase):
             {'money': {'$gt': 1000000}})
         FakeSearchView.response_builder.assert_called_once_with(['big money', 'bigger money'])
 
+    def test__generate_response_stream(self):
+        """
+        Test that the results are streamed, serialized one batch at a time, when requested.
+        """
+        class FakeSearchView(search.SearchView):
+            model = mock.MagicMock()
+            serializer = mock.MagicMock(side_effect=lambda r: r.upper())
+
+        query = {'filters': {'money': {'$gt': 1000000}}}
+        FakeSearchView.model.objects.find_by_criteria.return_value = ['big', 'bigger', 'biggest']
+
+        with mock.patch('pulp.server.webservices.views.search.STREAM_BATCH_SIZE', 2):
+            with mock.patch.object(FakeSearchView, '_process_results',
+                                   side_effect=FakeSearchView._process_results) as process:
+                results = FakeSearchView._generate_response(query, {'stream': True})
+                content = ''.join(results.streaming_content)
+
+        self.assertEqual(type(results), http.StreamingHttpResponse)
+        self.assertEqual(content, '["BIG","BIGGER","BIGGEST"]')
+        self.assertEqual([c[1][0] for c in process.mock_calls], [['big', 'bigger'], ['biggest']])
+
+    def test__generate_response_stream_empty(self):
+        """
+        Test that an empty JSON array is streamed when nothing matches the query.
+        """
+        class FakeSearchView(search.SearchView):
+            model = mock.MagicMock()
+            del model.SERIALIZER
+
+        FakeSearchView.model.objects.find_by_criteria.return_value = []
+
+        results = FakeSearchView._generate_response({}, {'stream': True})
+
+        self.assertEqual(''.join(results.streaming_content), '[]')
+
+    def test__generate_response_stream_invalid_criteria(self):
+        """
+        Test that criteria rejected by the database raise InvalidValue before streaming starts.
+        """
+        class FakeSearchView(search.SearchView):
+            model = mock.MagicMock()
+
+        FakeSearchView.model.objects.find_by_criteria.side_effect = OperationFailure('bad')
+
+        self.assertRaises(exceptions.InvalidValue, FakeSearchView._generate_response, {},
+                          {'stream': True})
+
     def test__generate_response_with_dumb_model(self):
         """
         Test the _generate_response() method for the case where the SearchView is configured to
@@ -444,6 +491,14 @@ class TestParseArgs(unittest.TestCase):
 
         self.assertTrue(options['opt_bool'] is False)
 
+    def test_parse_args_stream(self):
+        args = {'opt_bool': 'true', 'stream': 'true'}
+
+        params, options = self.fake_search._parse_args(args)
+
+        self.assertEqual(params, {})
+        self.assertTrue(options['stream'] is True)
+
 
 class TestTrimResults(unittest.TestCase):
     """
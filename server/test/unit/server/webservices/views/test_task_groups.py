@@ -1,31 +1,34 @@
 """
 This module contains tests for the pulp.server.webservices.views.task_groups module.
 """
+import uuid
+
 import mock
 
 from .base import assert_auth_DELETE, assert_auth_READ
 from pulp.common.compat import unittest
 from pulp.server.exceptions import MissingResource
 
+from pulp.server.webservices.views import task_groups
 from pulp.server.webservices.views.task_groups import TaskGroupView, TaskGroupSummaryView
 
 
+GROUP_ID = '9b0e3f5c-7f3e-4b0e-9d4b-1a2b3c4d5e6f'
+
+
 class MockQuerySet(object):
 
     def __init__(self, list_of_objects):
         self.items = list_of_objects
-        self.i = 0
-        self.n = len(self.items)
 
-    def count(self):
-        return len(self.items)
+    def only(self, *fields):
+        return self
 
-    def filter(self, state=None):
-        filtered_list = []
+    def __iter__(self):
         for item in self.items:
-            if item['state'] == state:
-                filtered_list.append(item)
-        return MockQuerySet(filtered_list)
+            yield mock.Mock(progress_report=item.get('progress_report', {}),
+                            start_time=item.get('start_time'),
+                            finish_time=item.get('finish_time'))
 
 
 class TestTaskGroupView(unittest.TestCase):
@@ -55,7 +58,7 @@ class TestTaskGroupView(unittest.TestCase):
         'pulp.server.webservices.views.task_groups.generate_json_response')
     def test_delete_task_resource(self, mock_resp, mock_task, mock_objects):
         """
-        Test delete task_group with one task
+        Test delete task_group with tasks
         """
         mock_request = mock.MagicMock()
         task1 = mock.Mock(task_id='test_foo_path')
@@ -66,10 +69,8 @@ class TestTaskGroupView(unittest.TestCase):
 
         response = task_resource.delete(mock_request, 'mock_task')
 
-        self.assertEqual(mock_task.cancel.call_count, 2)
-
-        mock_task.cancel.assert_any_call('test_foo_path')
-        mock_task.cancel.assert_any_call('test_foo_path1')
+        mock_task.cancel_group.assert_called_once_with('mock_task')
+        self.assertFalse(mock_task.cancel.called)
         self.assertTrue(response is mock_resp.return_value)
 
 
@@ -79,19 +80,20 @@ class TestTaskGroupSummary(unittest.TestCase):
     """
     @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
                 new=assert_auth_READ())
-    @mock.patch('pulp.server.webservices.views.task_groups.TaskStatus.objects')
+    @mock.patch('pulp.server.webservices.views.task_groups.TaskStatus')
     @mock.patch(
         'pulp.server.webservices.views.task_groups.generate_json_response_with_pulp_encoder')
-    def test_get_task_group_summary_nonexistant(self, mock_resp, mock_objects):
+    def test_get_task_group_summary_nonexistant(self, mock_resp, mock_task_status):
         """
         Test get task_group_summary with no tasks
         """
 
         mock_request = mock.MagicMock()
-        mock_objects.return_value = MockQuerySet([])
+        mock_task_status._get_collection.return_value.aggregate.return_value = []
+        mock_task_status.objects.return_value = MockQuerySet([])
 
         task_group_summary = TaskGroupSummaryView()
-        response = task_group_summary.get(mock_request, 'mock_task')
+        response = task_group_summary.get(mock_request, GROUP_ID)
 
         expected_content = {'accepted': 0, 'finished': 0, 'running': 0, 'canceled': 0,
                             'waiting': 0, 'skipped': 0, 'suspended': 0, 'error': 0, 'total': 0}
@@ -100,25 +102,113 @@ class TestTaskGroupSummary(unittest.TestCase):
 
     @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
                 new=assert_auth_READ())
-    @mock.patch('pulp.server.webservices.views.task_groups.TaskStatus.objects')
+    @mock.patch('pulp.server.webservices.views.task_groups.TaskStatus')
     @mock.patch(
         'pulp.server.webservices.views.task_groups.generate_json_response_with_pulp_encoder')
-    def test_get_task_group_summary(self, mock_resp, mock_objects):
+    def test_get_task_group_summary(self, mock_resp, mock_task_status):
         """
         Test get task_group_summary with multiple tasks
         """
         mock_request = mock.MagicMock()
-        mock_objects.return_value = MockQuerySet([{'id': 'mock_task', 'worker_name': 'mock',
-                                                   'state': 'running'},
-                                                  {'id': 'mock_task', 'worker_name': 'mock',
-                                                   'state': 'finished'},
-                                                  {'id': 'mock_task', 'worker_name': 'mock',
-                                                   'state': 'waiting'}])
+        mock_collection = mock_task_status._get_collection.return_value
+        mock_collection.aggregate.return_value = [{'_id': 'running', 'count': 1},
+                                                  {'_id': 'finished', 'count': 2},
+                                                  {'_id': 'waiting', 'count': 1}]
+        mock_task_status.objects.return_value = MockQuerySet([])
 
         task_group_summary = TaskGroupSummaryView()
-        response = task_group_summary.get(mock_request, 'mock_task')
+        response = task_group_summary.get(mock_request, GROUP_ID)
 
-        expected_content = {'accepted': 0, 'finished': 1, 'running': 1, 'canceled': 0,
-                            'waiting': 1, 'skipped': 0, 'suspended': 0, 'error': 0, 'total': 3}
+        expected_content = {'accepted': 0, 'finished': 2, 'running': 1, 'canceled': 0,
+                            'waiting': 1, 'skipped': 0, 'suspended': 0, 'error': 0, 'total': 4}
         mock_resp.assert_called_with(expected_content)
         self.assertTrue(response is mock_resp.return_value)
+        mock_collection.aggregate.assert_called_once_with([
+            {'$match': {'group_id': uuid.UUID(GROUP_ID)}},
+            {'$group': {'_id': '$state', 'count': {'$sum': 1}}}])
+
+    @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
+                new=assert_auth_READ())
+    @mock.patch('pulp.server.webservices.views.task_groups.TaskStatus')
+    @mock.patch(
+        'pulp.server.webservices.views.task_groups.generate_json_response_with_pulp_encoder')
+    def test_get_task_group_summary_applicability(self, mock_resp, mock_task_status):
+        """
+        Test get task_group_summary with applicability regeneration tasks
+        """
+        mock_request = mock.MagicMock()
+        progress = {'profiles_total': 2, 'profiles_processed': 1, 'evaluations_total': 4,
+                    'evaluations_processed': 3, 'duration': 1.5}
+        mock_task_status._get_collection.return_value.aggregate.return_value = [
+            {'_id': 'finished', 'count': 2}]
+        mock_task_status.objects.return_value = MockQuerySet([
+            {'state': 'finished', 'progress_report': {'applicability': progress},
+             'start_time': '2016-01-01T00:00:00Z', 'finish_time': '2016-01-01T00:00:02Z'},
+            {'state': 'finished', 'progress_report': {'applicability': progress},
+             'start_time': '2016-01-01T00:00:01Z', 'finish_time': '2016-01-01T00:00:03Z'}])
+
+        task_group_summary = TaskGroupSummaryView()
+        task_group_summary.get(mock_request, GROUP_ID)
+
+        expected_applicability = {'profiles_total': 4, 'profiles_processed': 2,
+                                  'evaluations_total': 8, 'evaluations_processed': 6,
+                                  'duration': 3.0, 'evaluations_per_second': 2.0}
+        self.assertEqual(mock_resp.call_args[0][0]['applicability'], expected_applicability)
+        self.assertEqual(mock_resp.call_args[0][0]['finished'], 2)
+        mock_task_status.objects.assert_called_once_with(
+            group_id=GROUP_ID, progress_report__applicability__exists=True)
+
+    @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
+                new=assert_auth_READ())
+    @mock.patch('pulp.server.webservices.views.task_groups._summaries', new_callable=mock.Mock)
+    @mock.patch('pulp.server.webservices.views.task_groups._summarize')
+    @mock.patch(
+        'pulp.server.webservices.views.task_groups.generate_json_response_with_pulp_encoder')
+    def test_get_task_group_summary_cached(self, mock_resp, mock_summarize, mock_summaries):
+        """
+        Test get task_group_summary with a summary kept by the cache
+        """
+        mock_request = mock.MagicMock()
+        mock_summaries.get.return_value = {'total': 1}
+
+        task_group_summary = TaskGroupSummaryView()
+        task_group_summary.get(mock_request, GROUP_ID)
+
+        mock_resp.assert_called_once_with({'total': 1})
+        mock_summaries.get.assert_called_once_with(GROUP_ID)
+        self.assertFalse(mock_summarize.called)
+
+
+@mock.patch('pulp.server.webservices.views.task_groups.time.time', return_value=100)
+@mock.patch('pulp.server.webservices.views.task_groups.SummaryCache.ttl', return_value=5)
+class TestSummaryCache(unittest.TestCase):
+    """
+    Tests for SummaryCache
+    """
+    def test_get(self, mock_ttl, mock_time):
+        cache = task_groups.SummaryCache()
+        cache.add('group', {'total': 1})
+        mock_time.return_value = 104
+
+        self.assertEqual(cache.get('group'), {'total': 1})
+        self.assertEqual(cache.get('other'), None)
+
+    def test_expired(self, mock_ttl, mock_time):
+        cache = task_groups.SummaryCache()
+        cache.add('group', {'total': 1})
+        mock_time.return_value = 105
+
+        self.assertEqual(cache.get('group'), None)
+
+        cache.add('other', {'total': 2})
+
+        self.assertEqual(cache._summaries, {'other': (105, {'total': 2})})
+
+    def test_disabled(self, mock_ttl, mock_time):
+        mock_ttl.return_value = 0
+        cache = task_groups.SummaryCache()
+
+        cache.add('group', {'total': 1})
+
+        self.assertEqual(cache.get('group'), None)
+        self.assertEqual(cache._summaries, {})
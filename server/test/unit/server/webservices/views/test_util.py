@@ -2,7 +2,7 @@ import httplib
 import json
 import mock
 
-from django.http import HttpResponse, HttpResponseNotFound
+from django.http import HttpResponse, HttpResponseNotFound, StreamingHttpResponse
 
 from pulp.common.compat import unittest
 from pulp.server.exceptions import InputEncodingError, PulpCodedValidationException
@@ -58,6 +58,26 @@ class TestResponseGenerators(unittest.TestCase):
         util.generate_json_response_with_pulp_encoder(test_content)
         mock_json.dumps.assert_called_once_with(test_content, default=pulp_json_encoder)
 
+    def test_generate_streaming_json_response(self):
+        """
+        Test that the items are streamed as a JSON array.
+        """
+        items = iter([{'foo': 'bar'}, {'foo': 'baz'}])
+        response = util.generate_streaming_json_response(items)
+        self.assertTrue(isinstance(response, StreamingHttpResponse))
+        self.assertEqual(response._headers.get('content-type'),
+                         ('Content-Type', 'application/json; charset=utf-8'))
+        chunks = list(response.streaming_content)
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(json.loads(''.join(chunks)), [{'foo': 'bar'}, {'foo': 'baz'}])
+
+    def test_generate_streaming_json_response_empty(self):
+        """
+        Test that no items are streamed as an empty JSON array.
+        """
+        response = util.generate_streaming_json_response(iter([]))
+        self.assertEqual(json.loads(''.join(response.streaming_content)), [])
+
     @mock.patch('pulp.server.webservices.views.util.iri_to_uri')
     def test_generate_redirect_response(self, mock_iri_to_uri):
         """
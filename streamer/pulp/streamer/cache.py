@@ -1,8 +1,15 @@
+import errno
+import hashlib
+import os
+import shutil
 import sys
+import tempfile
 
+from collections import OrderedDict
+from contextlib import contextmanager
 from gettext import gettext as _
 from logging import getLogger
-from threading import RLock
+from threading import Lock, RLock
 from datetime import datetime, timedelta
 
 log = getLogger(__name__)
@@ -19,22 +26,40 @@ class Cache(object):
     """
     Generic object cache.
 
+    The inventory is kept in least recently used order so that eviction
+    only needs to look at the oldest items.  An item is evicted when it has
+    not been requested within the eviction threshold or, when the cache has
+    a maximum size, to make room for newer items.  Busy items are never evicted.
+
     Attributes:
         eviction_threshold (timedelta): How long an unrequested item will be cached.
+        max_size (int): The maximum total size of the cached items.  The size of
+            each item is determined by size_of().  None means unlimited.
+        hits (int): The number of successful get() calls.
+        misses (int): The number of get() calls that raised NotCached.
+        evictions (int): The number of items evicted.
         _lock (RLock): The object mutex.
-        _inventory (dict): The inventory of cached objects.
-            Each value is an Item.
+        _inventory (OrderedDict): The inventory of cached objects.
+            Each value is an Item.  Ordered from least to most recently requested.
+        _size (int): The total size of the cached items.
+        _key_locks (dict): Locks held through locked(), keyed by caching key.
     """
 
-    def __init__(self, eviction_threshold=None):
+    def __init__(self, eviction_threshold=None, max_size=None):
         """
         Args:
             eviction_threshold (timedelta): How long an unrequested item will be cached.
-
+            max_size (int): The maximum total size of the cached items.
         """
         self.eviction_threshold = eviction_threshold or timedelta(hours=4)
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
         self._lock = RLock()
-        self._inventory = {}
+        self._inventory = OrderedDict()
+        self._size = 0
+        self._key_locks = {}
 
     def add(self, key, object_):
         """
@@ -45,7 +70,9 @@ class Cache(object):
             object_ (object): An object to be cached.
         """
         with self._lock:
-            self._inventory[key] = Item(object_)
+            self._add(key, Item(object_))
+            if self.max_size is not None and self._size > self.max_size:
+                self.evict()
 
     def purge(self, key):
         """
@@ -55,7 +82,9 @@ class Cache(object):
             key (hashable): The caching key.
         """
         with self._lock:
-            return self._inventory.pop(key)
+            item = self._inventory.pop(key)
+            self._size -= self.size_of(item.object)
+            return item
 
     def get(self, key):
         """
@@ -72,16 +101,68 @@ class Cache(object):
         """
         with self._lock:
             try:
-                item = self._inventory[key]
+                item = self._inventory.pop(key)
             except KeyError:
+                self.misses += 1
                 raise NotCached()
+            self.hits += 1
             item.touch()
+            self._inventory[key] = item
             self.evict()
             return item.object
 
+    def get_or_create(self, key, factory):
+        """
+        Get a cached object by key, creating and caching it when not found.
+        Concurrent callers using the same key wait for the first one to
+        create the object instead of each creating their own.
+
+        Args:
+            key (hashable): The caching key.
+            factory (callable): Called without arguments to create the object.
+
+        Returns:
+            object: The cached object.
+        """
+        with self.locked(key):
+            try:
+                return self.get(key)
+            except NotCached:
+                object_ = factory()
+                self.add(key, object_)
+                return object_
+
+    @contextmanager
+    def locked(self, key):
+        """
+        Hold a lock for the specified key.
+        Only callers using the same key are serialized.  Locks are discarded
+        once nobody holds or waits for them.
+
+        Args:
+            key (hashable): The caching key.
+        """
+        with self._lock:
+            lock = self._key_locks.get(key)
+            if lock is None:
+                lock = KeyLock()
+                self._key_locks[key] = lock
+            lock.users += 1
+        try:
+            with lock.lock:
+                yield
+        finally:
+            with self._lock:
+                lock.users -= 1
+                if not lock.users:
+                    del self._key_locks[key]
+
     def evict(self):
         """
-        Evict all unused cached objects.
+        Evict the unused cached objects which have expired or which no longer
+        fit within the maximum size.  Only the least recently requested items
+        are examined.  Busy items are moved to the most recently requested end
+        so that they do not block eviction of the items behind them.
 
         Returns:
             list: The evicted objects.
@@ -90,14 +171,20 @@ class Cache(object):
         evicted = []
         now = Item.now()
         with self._lock:
-            for key, item in self._inventory.items():
-                duration = (now - item.last_requested)
+            while self._inventory and len(busy) < len(self._inventory):
+                key, item = next(self._inventory.iteritems())
                 if item.busy:
+                    del self._inventory[key]
+                    self._inventory[key] = item
                     busy.append(item.object)
                     continue
-                if duration < self.eviction_threshold:
-                    continue
+                duration = (now - item.last_requested)
+                oversized = self.max_size is not None and self._size > self.max_size
+                if duration < self.eviction_threshold and not oversized:
+                    break
                 self.purge(key)
+                self.evictions += 1
+                self.evicted(item.object)
                 evicted.append(item.object)
         log.debug(
             _('Cache.evict(): %(t)d total, %(e)d evicted, %(b)d busy'),
@@ -108,9 +195,63 @@ class Cache(object):
             })
         return evicted
 
+    def size_of(self, object_):
+        """
+        The size of a cached object counted against the maximum size.
+
+        Args:
+            object_ (object): A cached object.
+
+        Returns:
+            int: The size of the object.  Each object counts as one (1) by default.
+        """
+        return 1
+
+    def evicted(self, object_):
+        """
+        Notification that an object has been evicted.
+
+        Args:
+            object_ (object): The evicted object.
+        """
+        pass
+
+    def stats(self):
+        """
+        Usage statistics suitable for monitoring.
+
+        Returns:
+            dict: The number of items, their total size, hits, misses and evictions.
+        """
+        with self._lock:
+            return {
+                'items': len(self._inventory),
+                'size': self._size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def _add(self, key, item):
+        """
+        Add an item to the inventory as the most recently requested.
+
+        Args:
+            key (hashable): The caching key.
+            item (Item): The item to add.
+        """
+        with self._lock:
+            if key in self._inventory:
+                self.purge(key)
+            self._inventory[key] = item
+            self._size += self.size_of(item.object)
+
     def __contains__(self, key):
         return key in self._inventory
 
+    def __len__(self):
+        return len(self._inventory)
+
 
 class Item(object):
     """
@@ -174,3 +315,348 @@ class Item(object):
         Update the last_requested timestamp.
         """
         self.last_requested = self.now()
+
+
+class KeyLock(object):
+    """
+    A lock for a single caching key.
+
+    Attributes:
+        lock (Lock): The mutex.
+        users (int): The number of threads holding or waiting for the lock.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.users = 0
+
+
+class Lookup(object):
+    """
+    The result of a database lookup stored in a LookupCache.
+
+    Attributes:
+        value (object): The value loaded from the database.
+        loaded (datetime): The last UTC naive time the value was loaded or revalidated.
+    """
+
+    def __init__(self, value, loaded):
+        """
+        Args:
+            value (object): The value loaded from the database.
+            loaded (datetime): The UTC naive time the value was loaded.
+        """
+        self.value = value
+        self.loaded = loaded
+
+
+class LookupCache(Cache):
+    """
+    Read-through cache of database lookups.
+
+    A cached value is reused until it is older than the timeout, no matter
+    how often it is requested, so that changes made to the database by other
+    processes are eventually seen.  Once expired, a value is either revalidated
+    or loaded again.  Lookups are disabled when the timeout is zero.
+
+    Attributes:
+        timeout (timedelta): How long a loaded value is used without being revalidated.
+    """
+
+    def __init__(self, timeout, max_size=None):
+        """
+        Args:
+            timeout (timedelta): How long a loaded value is used without being revalidated.
+            max_size (int): The maximum number of cached values.
+        """
+        super(LookupCache, self).__init__(max(timeout, timedelta(seconds=1)), max_size)
+        self.timeout = timeout
+
+    def lookup(self, key, load, validate=None):
+        """
+        Get the value for the key, loading it when not cached or expired.
+        Concurrent lookups of the same key are only loaded once.
+
+        Args:
+            key (hashable): The caching key.
+            load (callable): Called without arguments to load the value.
+            validate (callable): Called with an expired value.  Returns True
+                when the value is still current and can be used for another
+                timeout period.  Expired values are always loaded again when
+                not specified.
+
+        Returns:
+            object: The value.
+        """
+        if not self.timeout:
+            return load()
+        with self.locked(key):
+            now = Item.now()
+            try:
+                lookup = self.get(key)
+            except NotCached:
+                lookup = None
+            if lookup is not None:
+                if now - lookup.loaded < self.timeout:
+                    return lookup.value
+                if validate is not None and validate(lookup.value):
+                    lookup.loaded = now
+                    return lookup.value
+            value = load()
+            self.add(key, Lookup(value, now))
+            return value
+
+    def discard(self, key):
+        """
+        Discard the value cached using the specified key, if any, so that
+        the next lookup loads it again.
+
+        Args:
+            key (hashable): The caching key.
+        """
+        with self._lock:
+            if key in self._inventory:
+                self.purge(key)
+
+
+class CachedFile(object):
+    """
+    A file stored in the file cache.
+    Readers hold a reference while the file is open so that
+    it is not evicted while being read.
+
+    Attributes:
+        path (str): The absolute path to the file.
+        size (int): The file size in bytes.
+    """
+
+    def __init__(self, path, size):
+        """
+        Args:
+            path (str): The absolute path to the file.
+            size (int): The file size in bytes.
+        """
+        self.path = path
+        self.size = size
+
+
+class FileCache(Cache):
+    """
+    Content addressed cache of downloaded files.
+
+    Files are stored under the root directory by checksum when the checksum
+    is known and by a digest of the download URL otherwise.  Files are written
+    to a Spool and only become visible in the cache once completely written
+    and, when the checksum is known, validated.
+
+    Attributes:
+        root (str): The absolute path to the cache directory.
+        tmp_dir (str): The directory in which files are spooled.
+    """
+
+    TMP_DIR = 'tmp'
+
+    def __init__(self, root, max_size, eviction_threshold=None):
+        """
+        Args:
+            root (str): The absolute path to the cache directory.
+            max_size (int): The maximum total size of the cached files in bytes.
+            eviction_threshold (timedelta): How long an unrequested file will be cached.
+        """
+        super(FileCache, self).__init__(eviction_threshold, max_size)
+        self.root = root
+        self.tmp_dir = os.path.join(root, self.TMP_DIR)
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+        os.makedirs(self.tmp_dir)
+        self.load()
+
+    @staticmethod
+    def key(entry):
+        """
+        Get the cache key for the file referenced by a catalog entry.
+
+        Args:
+            entry (pulp.server.db.model.LazyCatalogEntry): A catalog entry.
+
+        Returns:
+            tuple: The cache key: (<algorithm>, <digest>).
+        """
+        if entry.checksum and entry.checksum_algorithm:
+            return entry.checksum_algorithm, entry.checksum.lower()
+        return 'url', hashlib.sha256(entry.url.encode('utf-8')).hexdigest()
+
+    def path(self, key):
+        """
+        Get the absolute path of the file stored using the specified key.
+
+        Args:
+            key (tuple): The cache key.
+
+        Returns:
+            str: The absolute path.
+        """
+        algorithm, digest = key
+        return os.path.join(self.root, algorithm, digest[:2], digest)
+
+    def load(self):
+        """
+        Add the files already stored in the root directory to the
+        inventory, least recently modified first.
+        """
+        found = []
+        for algorithm in os.listdir(self.root):
+            if algorithm == self.TMP_DIR:
+                continue
+            for dir_path, dir_names, file_names in os.walk(os.path.join(self.root, algorithm)):
+                for name in file_names:
+                    stat = os.stat(os.path.join(dir_path, name))
+                    found.append((stat.st_mtime, stat.st_size, (algorithm, name)))
+        found.sort()
+        with self._lock:
+            for mtime, size, key in found:
+                item = Item(CachedFile(self.path(key), size))
+                item.last_requested = datetime.utcfromtimestamp(mtime)
+                self._add(key, item)
+            self.evict()
+
+    def open(self, key):
+        """
+        Get a cached file.
+        The caller should hold the returned object for as long as the file
+        is being read to prevent it from being evicted.
+
+        Args:
+            key (tuple): The cache key.
+
+        Returns:
+            CachedFile: The cached file.
+
+        Raises:
+            NotCached: When not found in the cache.
+        """
+        cached = self.get(key)
+        if not os.path.exists(cached.path):
+            with self._lock:
+                if key in self:
+                    self.purge(key)
+            raise NotCached()
+        return cached
+
+    def spool(self, key, checksum_algorithm=None, checksum=None):
+        """
+        Start writing a file into the cache.
+
+        Args:
+            key (tuple): The cache key.
+            checksum_algorithm (str): The algorithm used to validate the file.
+            checksum (str): The expected checksum of the file.
+
+        Returns:
+            Spool: A file-like object to which the file content is written.
+        """
+        return Spool(self, key, checksum_algorithm, checksum)
+
+    def size_of(self, object_):
+        """
+        Files count against the maximum size by their size in bytes.
+
+        Args:
+            object_ (CachedFile): A cached file.
+
+        Returns:
+            int: The file size.
+        """
+        return object_.size
+
+    def evicted(self, object_):
+        """
+        Delete the evicted file.
+
+        Args:
+            object_ (CachedFile): The evicted file.
+        """
+        try:
+            os.unlink(object_.path)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                log.warn(_('Unable to delete cached file %(p)s: %(e)s'),
+                         {'p': object_.path, 'e': e})
+
+
+class Spool(object):
+    """
+    A file being written into the file cache.
+
+    Attributes:
+        cache (FileCache): The file cache.
+        key (tuple): The cache key.
+        checksum (str): The expected checksum, if known.
+        size (int): The number of bytes written.
+        tmp_path (str): The path of the file being written.
+        _fp (file): The open file.
+        _digest (hashlib.HASH): Used to calculate the checksum.
+    """
+
+    def __init__(self, cache, key, checksum_algorithm=None, checksum=None):
+        """
+        Args:
+            cache (FileCache): The file cache.
+            key (tuple): The cache key.
+            checksum_algorithm (str): The algorithm used to validate the file.
+            checksum (str): The expected checksum of the file.
+        """
+        self.cache = cache
+        self.key = key
+        self.checksum = checksum.lower() if checksum else None
+        self.size = 0
+        fd, self.tmp_path = tempfile.mkstemp(dir=cache.tmp_dir)
+        self._fp = os.fdopen(fd, 'wb')
+        self._digest = None
+        if checksum_algorithm and checksum:
+            self._digest = hashlib.new(checksum_algorithm)
+
+    def write(self, data):
+        """
+        Write file content.
+
+        Args:
+            data (str): The data to write.
+        """
+        self._fp.write(data)
+        self.size += len(data)
+        if self._digest:
+            self._digest.update(data)
+
+    def commit(self):
+        """
+        Add the completely written file to the cache.
+        The file is discarded when it does not match the expected checksum.
+
+        Returns:
+            bool: True when added to the cache.
+        """
+        self._fp.close()
+        if self._digest and self._digest.hexdigest() != self.checksum:
+            log.warn(_('Checksum mismatch, not caching: %(k)s'), {'k': '/'.join(self.key)})
+            self.abort()
+            return False
+        path = self.cache.path(self.key)
+        try:
+            os.makedirs(os.path.dirname(path))
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        os.rename(self.tmp_path, path)
+        self.cache.add(self.key, CachedFile(path, self.size))
+        return True
+
+    def abort(self):
+        """
+        Discard the file.
+        """
+        self._fp.close()
+        try:
+            os.unlink(self.tmp_path)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
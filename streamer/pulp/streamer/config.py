@@ -9,6 +9,9 @@ DEFAULT_VALUES = {
         'port': '8751',
         'interfaces': 'localhost',
         'cache_timeout': '86400',
+        'file_cache_dir': '',
+        'file_cache_size': '10240',
+        'lookup_cache_timeout': '60',
     },
 }
 
@@ -0,0 +1,238 @@
+import os
+import tempfile
+
+from gettext import gettext as _
+from logging import getLogger
+from threading import Lock
+
+log = getLogger(__name__)
+
+
+# The size of the chunks in which the content already received by a flight
+# is replayed to a request that joins it.
+REPLAY_CHUNK_SIZE = 1024 * 1024
+
+
+class Flight(object):
+    """
+    A download in progress that is shared by all the concurrent requests for
+    the same content.
+
+    The request that starts the download is the leader. Everything written to
+    the flight is appended to a temporary file and forwarded to the requests
+    that joined the flight (the followers) as it is received. A follower that
+    joins after the download has started is first sent the content already
+    written to the temporary file.
+
+    The response headers set on the leader by the time the first data is
+    written are copied to the followers.
+
+    :ivar key: The key identifying the content being downloaded.
+    :type key: hashable
+    :ivar request: The leading twisted client HTTP request.
+    :type request: twisted.web.server.Request
+    :ivar path: The absolute path to the temporary file.
+    :type path: str
+    :ivar size: The number of bytes written.
+    :type size: int
+    :ivar headers: The response headers copied to the followers, once known.
+    :type headers: list
+    :ivar followers: The (request, responder) of each follower.
+    :type followers: list
+    :ivar landed: The leader is done and no more followers are accepted.
+    :type landed: bool
+    """
+
+    def __init__(self, key, request, directory=None):
+        """
+        :param key: The key identifying the content being downloaded.
+        :type key: hashable
+        :param request: The leading twisted client HTTP request.
+        :type request: twisted.web.server.Request
+        :param directory: The directory in which the temporary file is created.
+            The system default is used when not specified.
+        :type directory: str
+        """
+        self.key = key
+        self.request = request
+        fd, self.path = tempfile.mkstemp(prefix='flight-', dir=directory)
+        self.size = 0
+        self.headers = None
+        self.followers = []
+        self.landed = False
+        self._fp = os.fdopen(fd, 'wb')
+        self._lock = Lock()
+
+    def follow(self, request, responder):
+        """
+        Add a follower.
+        The content already received is written to the responder before
+        returning.
+
+        :param request: A twisted client HTTP request for the same content.
+        :type request: twisted.web.server.Request
+        :param responder: The file-like object to which the content is written.
+        :type responder: pulp.streamer.server.Responder
+        :return: True when added, False when the flight has already landed.
+        :rtype: bool
+        """
+        with self._lock:
+            if self.landed:
+                return False
+            if self.headers is not None:
+                self._send_headers(request)
+            if self.size:
+                self._fp.flush()
+                self._replay(responder)
+            self.followers.append((request, responder))
+            return True
+
+    def write(self, data):
+        """
+        Write data received by the leader.
+
+        :param data: A string to write.
+        :type data: str
+        """
+        with self._lock:
+            if self.headers is None:
+                self._capture_headers()
+            self._fp.write(data)
+            self.size += len(data)
+            for request, responder in self.followers:
+                responder.write(data)
+
+    def land(self, succeeded):
+        """
+        The leader is done.
+        The temporary file is deleted.
+
+        :param succeeded: The leader has successfully sent the content.
+        :type succeeded: bool
+        :return: The (request, responder) of each follower.
+        :rtype: list
+        """
+        with self._lock:
+            if succeeded and self.headers is None and self.followers:
+                self._capture_headers()
+            self.landed = True
+            self._fp.close()
+            try:
+                os.unlink(self.path)
+            except OSError:
+                log.exception(_('Failed to delete {path}.').format(path=self.path))
+            followers = self.followers
+            self.followers = []
+        return followers
+
+    def _capture_headers(self):
+        """
+        Copy the response headers set on the leader and send them to the
+        followers that have already joined.
+        """
+        self.headers = list(self.request.responseHeaders.getAllRawHeaders())
+        for request, responder in self.followers:
+            self._send_headers(request)
+
+    def _send_headers(self, request):
+        """
+        Set the captured response headers on a follower.
+
+        :param request: A follower.
+        :type request: twisted.web.server.Request
+        """
+        for name, values in self.headers:
+            request.responseHeaders.setRawHeaders(name, values)
+
+    def _replay(self, responder):
+        """
+        Write the content written to the temporary file so far.
+
+        :param responder: The file-like object to which the content is written.
+        :type responder: pulp.streamer.server.Responder
+        """
+        remaining = self.size
+        with open(self.path, 'rb') as fp:
+            while remaining:
+                data = fp.read(min(REPLAY_CHUNK_SIZE, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+                responder.write(data)
+
+
+class SingleFlight(object):
+    """
+    Coalesces concurrent requests for the same content so that it is only
+    downloaded once.
+
+    The first request for the content starts a Flight and becomes its leader.
+    Requests for the same content received before the leader has landed follow
+    the flight instead of starting another download.
+
+    :ivar directory: The directory in which flights create temporary files.
+    :type directory: str
+    :ivar coalesced: The number of requests that followed a flight.
+    :type coalesced: int
+    """
+
+    def __init__(self, directory=None):
+        """
+        :param directory: The directory in which flights create temporary files.
+            The system default is used when not specified.
+        :type directory: str
+        """
+        self.directory = directory
+        self.coalesced = 0
+        self._lock = Lock()
+        self._flights = {}
+
+    def join(self, key, request, responder):
+        """
+        Join the flight for the content identified by the key.
+        A new flight is started, led by the request, when none is in progress.
+        Otherwise, the request follows the flight in progress and the leader
+        becomes responsible for finishing it.
+
+        :param key: The key identifying the content.
+        :type key: hashable
+        :param request: A twisted client HTTP request.
+        :type request: twisted.web.server.Request
+        :param responder: The file-like object to which the content is written.
+        :type responder: pulp.streamer.server.Responder
+        :return: A tuple of: (flight, leading).  Leading is True when a new
+            flight was started.
+        :rtype: tuple
+        """
+        while True:
+            with self._lock:
+                flight = self._flights.get(key)
+                if flight is None:
+                    flight = Flight(key, request, self.directory)
+                    self._flights[key] = flight
+                    return flight, True
+            # The content already received is replayed without holding the
+            # lock so that other requests are not blocked.  The flight may
+            # land in the meantime, in which case a new one is started.
+            if flight.follow(request, responder):
+                with self._lock:
+                    self.coalesced += 1
+                return flight, False
+
+    def land(self, flight, succeeded):
+        """
+        The leader of the flight is done.
+
+        :param flight: A flight started by join().
+        :type flight: Flight
+        :param succeeded: The leader has successfully sent the content.
+        :type succeeded: bool
+        :return: The (request, responder) of each follower.
+        :rtype: list
+        """
+        with self._lock:
+            self._flights.pop(flight.key, None)
+        return flight.land(succeeded)
+
+    def __len__(self):
+        return len(self._flights)
@@ -1,5 +1,7 @@
 import logging
+import mimetypes
 
+from datetime import timedelta
 from gettext import gettext as _
 from httplib import NOT_FOUND, INTERNAL_SERVER_ERROR
 from urlparse import urlparse
@@ -15,10 +17,11 @@ from pulp.plugins.loader import api as plugin_api
 from pulp.server.constants import PULP_STREAM_REQUEST_HEADER
 from pulp.server.content.sources.container import ContentContainer
 from pulp.server.content.sources.model import Request as ContainerRequest
-from pulp.server.db.model import DeferredDownload, LazyCatalogEntry
+from pulp.server.db.model import DeferredDownload, Importer, LazyCatalogEntry
 from pulp.server.controllers import repository as repo_controller
 from pulp.plugins.loader.exceptions import PluginNotFound
-from pulp.streamer.cache import Cache, NotCached
+from pulp.streamer.cache import Cache, FileCache, LookupCache, NotCached
+from pulp.streamer.flight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
@@ -40,6 +43,31 @@ HOP_BY_HOP_HEADERS = [
     'upgrade',
 ]
 
+# The maximum number of HTTP sessions kept for reuse.
+MAX_SESSIONS = 100
+
+# The size of the chunks in which files are read from the file cache.
+FILE_CACHE_CHUNK_SIZE = 1024 * 1024
+
+# How often, in seconds, the cache statistics are logged.
+CACHE_STATS_INTERVAL = 300
+
+# The maximum number of objects kept in each of the database lookup caches.
+MAX_LOOKUPS = 10000
+
+
+def cache_control(config):
+    """
+    Get the value of the Cache-Control header added to responses.
+
+    :param config: The streamer configuration.
+    :type  config: ConfigParser.SafeConfigParser
+    :return: The header value, using the max-age loaded from the configuration.
+    :rtype: str
+    """
+    max_age = config.get('streamer', 'cache_timeout')
+    return 'public, s-maxage={m}, max-age={m}'.format(m=max_age)
+
 
 class DownloadFailed(Exception):
     """
@@ -78,9 +106,7 @@ class DownloadListener(AggregatingEventListener):
             if key.lower() not in HOP_BY_HOP_HEADERS:
                 self.request.setHeader(key, value)
         # additions
-        max_age = self.streamer.config.get('streamer', 'cache_timeout')
-        cache_control = 'public, s-maxage={m}, max-age={m}'.format(m=max_age)
-        self.request.setHeader('Cache-Control', cache_control)
+        self.request.setHeader('Cache-Control', cache_control(self.streamer.config))
 
     def download_failed(self, report):
         """
@@ -112,7 +138,51 @@ class Streamer(Resource):
         """
         Resource.__init__(self)
         self.config = config
-        self.session_cache = SessionCache()
+        self.session_cache = SessionCache(max_size=MAX_SESSIONS)
+        self.file_cache = self._create_file_cache(config)
+        self.flights = SingleFlight(
+            self.file_cache.tmp_dir if self.file_cache is not None else None)
+        timeout = timedelta(seconds=config.getint('streamer', 'lookup_cache_timeout'))
+        self.catalog_cache = LookupCache(timeout, max_size=MAX_LOOKUPS)
+        self.unit_cache = LookupCache(timeout, max_size=MAX_LOOKUPS)
+        self.importer_cache = LookupCache(timeout, max_size=MAX_LOOKUPS)
+
+    @staticmethod
+    def _create_file_cache(config):
+        """
+        Create the cache of downloaded files.
+
+        :param config: The configuration for this streamer instance.
+        :type  config: ConfigParser.SafeConfigParser
+        :return: The file cache, or None when it is not configured.
+        :rtype: FileCache
+        """
+        root = config.get('streamer', 'file_cache_dir')
+        if not root:
+            return None
+        max_size = config.getint('streamer', 'file_cache_size') * 1024 * 1024
+        threshold = timedelta(seconds=config.getint('streamer', 'cache_timeout'))
+        return FileCache(root, max_size, eviction_threshold=threshold)
+
+    def log_cache_stats(self):
+        """
+        Log the usage statistics of the caches.
+        """
+        caches = (
+            ('session', self.session_cache),
+            ('file', self.file_cache),
+            ('catalog', self.catalog_cache),
+            ('unit', self.unit_cache),
+            ('importer', self.importer_cache),
+        )
+        for name, cache in caches:
+            if cache is None:
+                continue
+            stats = cache.stats()
+            logger.info(_('Cache [{name}]: items={items} size={size} hits={hits} '
+                          'misses={misses} evictions={evictions}').format(name=name, **stats))
+        logger.info(_('Coalesced requests: {coalesced} in-flight={flights}').format(
+            coalesced=self.flights.coalesced, flights=len(self.flights)))
 
     def render_GET(self, request):
         """
@@ -139,34 +209,101 @@ class Streamer(Resource):
         Download the requested content using the content unit catalog and dispatch
         a celery task that causes Pulp to download the newly cached unit.
 
+        Concurrent requests for the same path share a single download. The request
+        that starts the download leads it and the others follow it, in which case
+        the leader finishes them once the download is done.
+
         :param request: The original twisted client HTTP request being handled by the streamer.
         :type  request: twisted.web.server.Request
         """
-        with Responder(request) as responder:
-            try:
-                path = urlparse(request.uri).path
-                q_set = LazyCatalogEntry.objects.filter(path=path)
-                q_set = q_set.order_by('-_id', '-revision')
-                count = q_set.count()
-                if not count:
-                    logger.error(_('No catalog entry found. path={p}'.format(p=path)))
-                    request.setResponseCode(NOT_FOUND)
-                    return
-                for entry in q_set.all():
-                    logger.info('Trying URL: {url}'.format(url=entry.url))
-                    try:
-                        last_report = self._download(request, entry, responder)
-                        self._on_succeeded(entry, request, last_report)
-                        return
-                    except (DownloadFailed, DoesNotExist, PluginNotFound):
-                        # try another
-                        continue
-                # Failed
-                self._on_all_failed(request)
-            except Exception:
-                logger.exception(_('An unexpected error occurred: {url}').format(url=request.uri))
-                request.setResponseCode(INTERNAL_SERVER_ERROR)
-                request.setHeader('Content-Length', '0')
+        responder = Responder(request)
+        following = False
+        try:
+            following = self._stream(request, responder)
+        except Exception:
+            logger.exception(_('An unexpected error occurred: {url}').format(url=request.uri))
+            request.setResponseCode(INTERNAL_SERVER_ERROR)
+            request.setHeader('Content-Length', '0')
+        finally:
+            if not following:
+                responder.close()
+
+    def _stream(self, request, responder):
+        """
+        Stream the requested content from the file cache, from a download already
+        in progress for the same path or from a new download.
+
+        :param request: The original twisted client HTTP request being handled by the streamer.
+        :type  request: twisted.web.server.Request
+        :param responder: The file-like object to which the content is written.
+        :type  responder: Responder
+        :return: True when the request follows a download in progress and will
+            be finished by its leader.
+        :rtype: bool
+        """
+        path = urlparse(request.uri).path
+        entries = self._get_entries(path)
+        if not entries:
+            logger.error(_('No catalog entry found. path={p}'.format(p=path)))
+            request.setResponseCode(NOT_FOUND)
+            return False
+        for entry in entries:
+            if self._serve_cached(request, entry, responder):
+                self._on_succeeded(entry, request, None)
+                return False
+        flight, leading = self.flights.join(path, request, responder)
+        if not leading:
+            logger.debug(_('Following the download in progress: {path}').format(path=path))
+            return True
+        succeeded = False
+        destination = Tee(responder, flight)
+        try:
+            for entry in entries:
+                # The file may have been cached by a download that just landed.
+                if self._serve_cached(request, entry, destination):
+                    self._on_succeeded(entry, request, None)
+                    succeeded = True
+                    return False
+                logger.info('Trying URL: {url}'.format(url=entry.url))
+                try:
+                    last_report = self._download(request, entry, destination)
+                    self._on_succeeded(entry, request, last_report)
+                    succeeded = True
+                    return False
+                except (DownloadFailed, DoesNotExist, PluginNotFound):
+                    # try another
+                    continue
+            # Failed
+            self.catalog_cache.discard(path)
+            self._on_all_failed(request)
+            return False
+        finally:
+            for follower, follower_responder in self.flights.land(flight, succeeded):
+                if not succeeded:
+                    self._on_all_failed(follower)
+                follower_responder.close()
+
+    def _get_entries(self, path):
+        """
+        Get the catalog entries for a path, most recent first.
+        The entries are cached for the lookup cache timeout so that
+        they are not queried for every request.
+
+        :param path: The requested path.
+        :type path: str
+        :return: The catalog entries.
+        :rtype: list
+        """
+        def load():
+            q_set = LazyCatalogEntry.objects.filter(path=path)
+            q_set = q_set.order_by('-_id', '-revision')
+            return list(q_set.all())
+
+        entries = self.catalog_cache.lookup(path, load)
+        if not entries:
+            # Do not remember paths without entries; they may be added at any time.
+            self.catalog_cache.discard(path)
+        return entries
 
     def _on_succeeded(self, entry, request, report):
         """
@@ -195,9 +332,44 @@ class Streamer(Resource):
         request.setHeader('Content-Length', '0')
         request.setResponseCode(NOT_FOUND)
 
+    def _serve_cached(self, request, entry, responder):
+        """
+        Serve the file referenced by the catalog entry from the file cache.
+
+        :param request: The original twisted client HTTP request being handled by the streamer.
+        :type  request: twisted.web.server.Request
+        :param entry: A catalog entry.
+        :type  entry: pulp.server.db.model.LazyCatalogEntry
+        :param responder: The file-like object to which the file is written.
+        :type  responder: Responder
+        :return: True when served from the cache.
+        :rtype: bool
+        """
+        if self.file_cache is None:
+            return False
+        try:
+            cached = self.file_cache.open(FileCache.key(entry))
+            fp = open(cached.path, 'rb')
+        except (NotCached, IOError):
+            return False
+        with fp:
+            logger.debug(_('Serving {path} from the file cache.').format(path=entry.path))
+            content_type = mimetypes.guess_type(entry.path)[0] or 'application/octet-stream'
+            request.setHeader('Content-Type', content_type)
+            request.setHeader('Content-Length', str(cached.size))
+            request.setHeader('Cache-Control', cache_control(self.config))
+            while True:
+                data = fp.read(FILE_CACHE_CHUNK_SIZE)
+                if not data:
+                    break
+                responder.write(data)
+        return True
+
     def _download(self, request, entry, responder):
         """
         Download the file.
+        When the file cache is configured, the file is also written to the
+        cache as it is streamed to the client.
 
         :param request: The original twisted client HTTP request being handled by the streamer.
         :type  request: twisted.web.server.Request
@@ -209,23 +381,34 @@ class Streamer(Resource):
         :rtype: nectar.report.DownloadReport
         """
         downloader = None
+        spool = None
 
         try:
             unit = self._get_unit(entry)
             downloader = self._get_downloader(request, entry)
+            destination = responder
+            if self.file_cache is not None:
+                spool = self.file_cache.spool(
+                    FileCache.key(entry), entry.checksum_algorithm, entry.checksum)
+                destination = Tee(responder, spool)
             alt_request = ContainerRequest(
                 entry.unit_type_id,
                 unit.unit_key,
                 entry.url,
-                responder)
+                destination)
             listener = downloader.event_listener
             container = ContentContainer(threaded=False)
             container.download(downloader, [alt_request], listener)
             if listener.succeeded_reports:
+                if spool is not None:
+                    spool.commit()
+                    spool = None
                 return listener.succeeded_reports[0]
             else:
                 raise DownloadFailed()
         finally:
+            if spool is not None:
+                spool.abort()
             try:
                 downloader.config.finalize()
             except Exception:
@@ -246,9 +429,7 @@ class Streamer(Resource):
         :raise: DoesNotExist: when importer not found.
         """
         try:
-            importer, config, model = \
-                repo_controller.get_importer_by_id(entry.importer_id)
-            model.config = config.flatten()
+            importer, model = self._get_importer(entry.importer_id)
             downloader = importer.get_downloader_for_db_importer(
                 model, entry.url, working_dir='/tmp')
             listener = DownloadListener(self, request)
@@ -260,21 +441,49 @@ class Streamer(Resource):
             logger.error(msg.format(path=entry.path))
             raise
 
-    @staticmethod
-    def _get_unit(entry):
+    def _get_importer(self, importer_id):
+        """
+        Get the importer plugin and the importer model with its configuration
+        flattened. Both are cached and reused until the importer is updated.
+
+        :param importer_id: The importer ID.
+        :type  importer_id: str
+        :return: A tuple of: (pulp.plugins.importer.Importer, pulp.server.db.model.Importer)
+        :rtype: tuple
+        :raise: PluginNotFound: when plugin not found.
+        """
+        def load():
+            importer, config, model = repo_controller.get_importer_by_id(importer_id)
+            model.config = config.flatten()
+            return importer, model
+
+        def validate(cached):
+            importer, model = cached
+            q_set = Importer.objects.filter(id=model.id).only('last_updated')
+            current = q_set.first()
+            return current is not None and current.last_updated == model.last_updated
+
+        return self.importer_cache.lookup(importer_id, load, validate)
+
+    def _get_unit(self, entry):
         """
         Get the content unit referenced by the catalog entry.
+        Only the unit key fields are loaded. Units are cached for the lookup
+        cache timeout.
 
         :param entry: A catalog entry.
         :type  entry: LazyCatalogEntry
         :return: The unit.
         :raises DoesNotExist: when not found.
         """
-        try:
+        def load():
             model = plugin_api.get_unit_model_by_id(entry.unit_type_id)
             q_set = model.objects.filter(id=entry.unit_id)
             q_set = q_set.only(*model.unit_key_fields)
             return q_set.get()
+
+        try:
+            return self.unit_cache.lookup((entry.unit_type_id, entry.unit_id), load)
         except DoesNotExist:
             msg = _('The catalog entry for {path} references unknown unit: {unit_type}:{id}')
             logger.error(msg.format(
@@ -376,6 +585,29 @@ class Responder(object):
         reactor.callFromThread(self.request.write, data)
 
 
+class Tee(object):
+    """
+    A file-like object that forwards all writes to several other file-like objects.
+    """
+
+    def __init__(self, *destinations):
+        """
+        :param destinations: The file-like objects to which data is written.
+        :type  destinations: tuple
+        """
+        self.destinations = destinations
+
+    def write(self, data):
+        """
+        Write the data to all destinations.
+
+        :param data: A string to write.
+        :type  data: str
+        """
+        for destination in self.destinations:
+            destination.write(data)
+
+
 class SessionCache(Cache):
     """
     Session cache.
@@ -420,11 +652,9 @@ class SessionCache(Cache):
         :return: A cached session.
         :rtype: Session
         """
-        key = self.key(url, downloader)
-        try:
-            session = self.get(key)
-        except NotCached:
+        def create():
             session = Session()
             session.stream = True
-            self.add(key, session)
-        return session
+            return session
+
+        return super(SessionCache, self).get_or_create(self.key(url, downloader), create)
@@ -1,8 +1,15 @@
+from datetime import datetime, timedelta
+from threading import Thread
 from unittest import TestCase
+import hashlib
+import os
+import shutil
+import tempfile
+import time
 
 from mock import Mock, patch
 
-from pulp.streamer.cache import Cache, Item, NotCached
+from pulp.streamer.cache import Cache, CachedFile, FileCache, Item, LookupCache, NotCached
 
 MODULE = 'pulp.streamer.cache'
 
@@ -76,6 +83,187 @@ class TestCache(TestCase):
         cache.evict()
         self.assertTrue('t1' in cache)
 
+    def test_evict_lru(self):
+        cache = Cache(max_size=2)
+        cache.add('t1', Mock())
+        cache.add('t2', Mock())
+        cache.get('t1')
+        cache.add('t3', Mock())
+        self.assertTrue('t1' in cache)
+        self.assertFalse('t2' in cache)
+        self.assertTrue('t3' in cache)
+        self.assertEqual(cache.evictions, 1)
+
+    def test_evict_lru_busy(self):
+        t1 = Mock()  # hold ref to make it busy.
+        cache = Cache(max_size=1)
+        cache.add('t1', t1)
+        cache.add('t2', Mock())  # busy while being added.
+        self.assertTrue('t2' in cache)
+        cache.evict()
+        self.assertTrue('t1' in cache)
+        self.assertFalse('t2' in cache)
+
+    def test_stats(self):
+        cache = Cache()
+        cache.add('t1', Mock())
+        cache.get('t1')
+        self.assertRaises(NotCached, cache.get, 'xx')
+        self.assertEqual(
+            cache.stats(),
+            {'items': 1, 'size': 1, 'hits': 1, 'misses': 1, 'evictions': 0})
+
+    def test_get_or_create(self):
+        factory = Mock()
+        cache = Cache()
+        self.assertEqual(cache.get_or_create('t1', factory), factory.return_value)
+        self.assertEqual(cache.get_or_create('t1', factory), factory.return_value)
+        factory.assert_called_once_with()
+
+    def test_get_or_create_concurrent(self):
+        created = []
+
+        def factory():
+            time.sleep(0.1)
+            created.append(Mock())
+            return created[-1]
+
+        cache = Cache()
+        threads = [Thread(target=cache.get_or_create, args=('t1', factory)) for n in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(created), 1)
+        self.assertEqual(cache._key_locks, {})
+
+
+class TestFileCache(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='streamer-file-cache-')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_key(self):
+        entry = Mock(checksum='ABC', checksum_algorithm='sha256')
+        self.assertEqual(FileCache.key(entry), ('sha256', 'abc'))
+
+    def test_key_no_checksum(self):
+        entry = Mock(checksum=None, checksum_algorithm=None, url='http://pulp.org/bear.rpm')
+        digest = hashlib.sha256('http://pulp.org/bear.rpm').hexdigest()
+        self.assertEqual(FileCache.key(entry), ('url', digest))
+
+    def test_spool_commit(self):
+        cache = FileCache(self.root, 1024)
+        key = ('sha256', '88d4266fd4e6338d13b845fcf289579d209c897823b9217da3e161936f031589')
+        spool = cache.spool(key, 'sha256', key[1])
+        spool.write('abcd')
+        self.assertTrue(spool.commit())
+        cached = cache.open(key)
+        self.assertEqual(cached.path, os.path.join(self.root, 'sha256', '88', key[1]))
+        self.assertEqual(cached.size, 4)
+        self.assertEqual(cache.stats()['size'], 4)
+        self.assertEqual(os.listdir(cache.tmp_dir), [])
+
+    def test_spool_checksum_mismatch(self):
+        cache = FileCache(self.root, 1024)
+        key = ('sha256', '00')
+        spool = cache.spool(key, 'sha256', '00')
+        spool.write('abcd')
+        self.assertFalse(spool.commit())
+        self.assertRaises(NotCached, cache.open, key)
+        self.assertEqual(os.listdir(cache.tmp_dir), [])
+
+    def test_spool_abort(self):
+        cache = FileCache(self.root, 1024)
+        spool = cache.spool(('url', 'ab'))
+        spool.write('abcd')
+        spool.abort()
+        self.assertRaises(NotCached, cache.open, ('url', 'ab'))
+        self.assertEqual(os.listdir(cache.tmp_dir), [])
+
+    def test_evict_by_size(self):
+        cache = FileCache(self.root, 6)
+        for digest in ('aa', 'bb'):
+            spool = cache.spool(('url', digest))
+            spool.write('abcd')
+            spool.commit()
+        self.assertFalse(('url', 'aa') in cache)
+        self.assertFalse(os.path.exists(cache.path(('url', 'aa'))))
+        self.assertTrue(('url', 'bb') in cache)
+
+    def test_load(self):
+        cache = FileCache(self.root, 1024)
+        spool = cache.spool(('url', 'aa'))
+        spool.write('abcd')
+        spool.commit()
+        cache = FileCache(self.root, 1024, eviction_threshold=timedelta(days=1))
+        self.assertTrue(('url', 'aa') in cache)
+        self.assertEqual(cache.stats()['size'], 4)
+
+    def test_open_deleted(self):
+        cache = FileCache(self.root, 1024)
+        cache.add(('url', 'aa'), CachedFile(cache.path(('url', 'aa')), 4))
+        self.assertRaises(NotCached, cache.open, ('url', 'aa'))
+        self.assertFalse(('url', 'aa') in cache)
+
+
+class TestLookupCache(TestCase):
+
+    def test_lookup(self):
+        load = Mock(return_value='value')
+        cache = LookupCache(timedelta(seconds=60))
+        self.assertEqual(cache.lookup('k', load), 'value')
+        self.assertEqual(cache.lookup('k', load), 'value')
+        load.assert_called_once_with()
+
+    @patch(MODULE + '.Item.now')
+    def test_lookup_expired(self, now):
+        now.return_value = datetime(2017, 1, 1)
+        load = Mock(side_effect=['v1', 'v2'])
+        cache = LookupCache(timedelta(seconds=60))
+        cache.lookup('k', load)
+        now.return_value += timedelta(seconds=61)
+        self.assertEqual(cache.lookup('k', load), 'v2')
+        self.assertEqual(load.call_count, 2)
+
+    @patch(MODULE + '.Item.now')
+    def test_lookup_validated(self, now):
+        now.return_value = datetime(2017, 1, 1)
+        load = Mock(side_effect=['v1', 'v2'])
+        validate = Mock(return_value=True)
+        cache = LookupCache(timedelta(seconds=60))
+        cache.lookup('k', load, validate)
+        now.return_value += timedelta(seconds=61)
+        self.assertEqual(cache.lookup('k', load, validate), 'v1')
+        self.assertEqual(cache.lookup('k', load, validate), 'v1')
+        validate.assert_called_once_with('v1')
+        load.assert_called_once_with()
+
+    def test_lookup_disabled(self):
+        load = Mock(return_value='value')
+        cache = LookupCache(timedelta(0))
+        cache.lookup('k', load)
+        cache.lookup('k', load)
+        self.assertEqual(load.call_count, 2)
+        self.assertEqual(len(cache), 0)
+
+    def test_lookup_failed(self):
+        cache = LookupCache(timedelta(seconds=60))
+        self.assertRaises(ValueError, cache.lookup, 'k', Mock(side_effect=ValueError))
+        self.assertEqual(len(cache), 0)
+
+    def test_discard(self):
+        load = Mock(return_value='value')
+        cache = LookupCache(timedelta(seconds=60))
+        cache.lookup('k', load)
+        cache.discard('k')
+        cache.discard('k')
+        cache.lookup('k', load)
+        self.assertEqual(load.call_count, 2)
+
 
 class TestItem(TestCase):
 
@@ -0,0 +1,169 @@
+from threading import Thread
+from unittest import TestCase
+import os
+import shutil
+import tempfile
+
+from mock import Mock
+from twisted.web.http_headers import Headers
+
+from pulp.streamer.flight import Flight, SingleFlight
+
+
+class FakeResponder(object):
+
+    def __init__(self):
+        self.data = []
+
+    def write(self, data):
+        self.data.append(data)
+
+    def getvalue(self):
+        return ''.join(self.data)
+
+
+class TestFlight(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp(prefix='streamer-flight-')
+        self.leader = Mock(responseHeaders=Headers())
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_init(self):
+        flight = Flight('k', self.leader, self.tmp_dir)
+        self.assertEqual(flight.key, 'k')
+        self.assertEqual(flight.request, self.leader)
+        self.assertEqual(os.path.dirname(flight.path), self.tmp_dir)
+        self.assertEqual(flight.size, 0)
+        flight.land(False)
+
+    def test_write(self):
+        self.leader.responseHeaders.setRawHeaders('content-length', ['8'])
+        follower = Mock(responseHeaders=Headers())
+        responder = FakeResponder()
+        flight = Flight('k', self.leader, self.tmp_dir)
+        flight.follow(follower, responder)
+
+        # test
+        flight.write('bear')
+        flight.write('-cub')
+
+        # validation
+        self.assertEqual(responder.getvalue(), 'bear-cub')
+        self.assertEqual(flight.size, 8)
+        self.assertEqual(follower.responseHeaders.getRawHeaders('content-length'), ['8'])
+        flight.land(True)
+
+    def test_follow_replay(self):
+        self.leader.responseHeaders.setRawHeaders('content-length', ['8'])
+        follower = Mock(responseHeaders=Headers())
+        responder = FakeResponder()
+        flight = Flight('k', self.leader, self.tmp_dir)
+        flight.write('bear')
+
+        # test
+        added = flight.follow(follower, responder)
+        flight.write('-cub')
+
+        # validation
+        self.assertTrue(added)
+        self.assertEqual(responder.getvalue(), 'bear-cub')
+        self.assertEqual(follower.responseHeaders.getRawHeaders('content-length'), ['8'])
+        flight.land(True)
+
+    def test_land(self):
+        follower = Mock(responseHeaders=Headers())
+        responder = FakeResponder()
+        flight = Flight('k', self.leader, self.tmp_dir)
+        flight.follow(follower, responder)
+        self.leader.responseHeaders.setRawHeaders('content-length', ['0'])
+
+        # test
+        followers = flight.land(True)
+
+        # validation
+        self.assertEqual(followers, [(follower, responder)])
+        self.assertEqual(flight.followers, [])
+        self.assertFalse(os.path.exists(flight.path))
+        self.assertEqual(follower.responseHeaders.getRawHeaders('content-length'), ['0'])
+        self.assertFalse(flight.follow(Mock(), FakeResponder()))
+
+    def test_land_failed(self):
+        follower = Mock(responseHeaders=Headers())
+        flight = Flight('k', self.leader, self.tmp_dir)
+        flight.follow(follower, FakeResponder())
+        self.leader.responseHeaders.setRawHeaders('content-length', ['0'])
+
+        # test
+        flight.land(False)
+
+        # validation
+        self.assertFalse(follower.responseHeaders.hasHeader('content-length'))
+
+
+class TestSingleFlight(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp(prefix='streamer-flight-')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_join(self):
+        flights = SingleFlight(self.tmp_dir)
+        leader = Mock(responseHeaders=Headers())
+        follower = Mock(responseHeaders=Headers())
+        responder = Mock()
+
+        # test
+        flight, leading = flights.join('k', leader, Mock())
+        followed, following_leading = flights.join('k', follower, responder)
+
+        # validation
+        self.assertTrue(leading)
+        self.assertFalse(following_leading)
+        self.assertTrue(flight is followed)
+        self.assertEqual(flights.coalesced, 1)
+        self.assertEqual(len(flights), 1)
+        self.assertEqual(flights.land(flight, True), [(follower, responder)])
+        self.assertEqual(len(flights), 0)
+
+    def test_join_after_land(self):
+        flights = SingleFlight(self.tmp_dir)
+        flight, leading = flights.join('k', Mock(responseHeaders=Headers()), Mock())
+        flights.land(flight, True)
+
+        # test
+        second, leading = flights.join('k', Mock(responseHeaders=Headers()), Mock())
+
+        # validation
+        self.assertTrue(leading)
+        self.assertFalse(flight is second)
+        self.assertEqual(flights.coalesced, 0)
+        flights.land(second, True)
+
+    def test_concurrent(self):
+        flights = SingleFlight(self.tmp_dir)
+        leader = Mock(responseHeaders=Headers())
+        flight, leading = flights.join('k', leader, Mock())
+        responders = [FakeResponder() for n in range(20)]
+
+        def join(responder):
+            flights.join('k', Mock(responseHeaders=Headers()), responder)
+
+        threads = [Thread(target=join, args=(r,)) for r in responders]
+        flight.write('bear')
+        for t in threads:
+            t.start()
+        flight.write('-cub')
+        for t in threads:
+            t.join()
+        followers = flights.land(flight, True)
+
+        # validation
+        self.assertEqual(len(followers), len(responders))
+        self.assertEqual(flights.coalesced, len(responders))
+        for responder in responders:
+            self.assertEqual(responder.getvalue(), 'bear-cub')
@@ -1,4 +1,8 @@
+from datetime import datetime, timedelta
 from httplib import NOT_FOUND, INTERNAL_SERVER_ERROR
+import os
+import shutil
+import tempfile
 
 from mock import Mock, patch, call
 from mongoengine import DoesNotExist, NotUniqueError
@@ -8,8 +12,10 @@ from pulp.common.compat import unittest
 from pulp.devel.unit.util import SideEffect
 from pulp.plugins.loader.exceptions import PluginNotFound
 from pulp.server import constants
+from pulp.streamer.cache import FileCache
+from pulp.streamer.config import load_configuration
 from pulp.streamer.server import (
-    Responder, SessionCache, Streamer, DownloadListener, DownloadFailed, HOP_BY_HOP_HEADERS
+    Responder, SessionCache, Streamer, DownloadListener, DownloadFailed, HOP_BY_HOP_HEADERS, Tee
 )
 
 
@@ -80,7 +86,7 @@ class TestStreamer(unittest.TestCase):
         request = Mock()
 
         # test
-        streamer = Streamer(Mock())
+        streamer = Streamer(load_configuration([]))
         streamer.render_GET(request)
 
         # validation
@@ -98,7 +104,6 @@ class TestStreamer(unittest.TestCase):
          The 3rd is not tried.
         """
         request = Mock(uri='http://content-world.com/content/bear.rpm')
-        responder.return_value.__enter__.return_value = responder.return_value
         report = DownloadReport('', '')
         _download.side_effect = SideEffect(
             DownloadFailed(report),
@@ -113,7 +118,7 @@ class TestStreamer(unittest.TestCase):
         model.objects.filter.return_value.order_by.return_value.count.return_value = len(catalog)
 
         # test
-        streamer = Streamer(Mock())
+        streamer = Streamer(load_configuration([]))
         streamer._handle_get(request)
 
         # validation
@@ -123,11 +128,16 @@ class TestStreamer(unittest.TestCase):
         responder.assert_called_once_with(request)
         _on_succeeded.assert_called_once_with(catalog[1], request, report)
         self.assertEqual(
-            _download.call_args_list,
+            [c[0][:2] for c in _download.call_args_list],
             [
-                call(request, catalog[0], responder.return_value),
-                call(request, catalog[1], responder.return_value)
+                (request, catalog[0]),
+                (request, catalog[1])
             ])
+        destination = _download.call_args[0][2]
+        self.assertEqual(destination.destinations[0], responder.return_value)
+        responder.return_value.close.assert_called_once_with()
+        self.assertFalse(request.setResponseCode.called)
+        self.assertEqual(len(streamer.flights), 0)
 
     @patch(MODULE_PREFIX + 'Responder')
     @patch(MODULE_PREFIX + 'Streamer._on_all_failed')
@@ -140,7 +150,6 @@ class TestStreamer(unittest.TestCase):
          All (3) failed.
         """
         request = Mock(uri='http://content-world.com/content/bear.rpm')
-        responder.return_value.__enter__.return_value = responder.return_value
         report = DownloadReport('', '')
         _download.side_effect = SideEffect(
             PluginNotFound(),
@@ -155,7 +164,7 @@ class TestStreamer(unittest.TestCase):
         model.objects.filter.return_value.order_by.return_value.count.return_value = len(catalog)
 
         # test
-        streamer = Streamer(Mock())
+        streamer = Streamer(load_configuration([]))
         streamer._handle_get(request)
 
         # validation
@@ -164,13 +173,16 @@ class TestStreamer(unittest.TestCase):
             assert_called_once_with('-_id', '-revision')
         responder.assert_called_once_with(request)
         _on_all_failed.assert_called_once_with(request)
+        self.assertFalse('/content/bear.rpm' in streamer.catalog_cache)
         self.assertEqual(
-            _download.call_args_list,
+            [c[0][:2] for c in _download.call_args_list],
             [
-                call(request, catalog[0], responder.return_value),
-                call(request, catalog[1], responder.return_value),
-                call(request, catalog[2], responder.return_value)
+                (request, catalog[0]),
+                (request, catalog[1]),
+                (request, catalog[2])
             ])
+        responder.return_value.close.assert_called_once_with()
+        self.assertEqual(len(streamer.flights), 0)
 
     @patch(MODULE_PREFIX + 'Responder')
     @patch(MODULE_PREFIX + 'Streamer._download')
@@ -180,14 +192,13 @@ class TestStreamer(unittest.TestCase):
         """
         No catalog entries matched.
         """
-        responder.return_value.__enter__.return_value = responder.return_value
         request = Mock(uri='http://content-world.com/content/bear.rpm')
         catalog = []
         model.objects.filter.return_value.order_by.return_value.all.return_value = catalog
         model.objects.filter.return_value.order_by.return_value.count.return_value = len(catalog)
 
         # test
-        streamer = Streamer(Mock())
+        streamer = Streamer(load_configuration([]))
         streamer._handle_get(request)
 
         # validation
@@ -197,6 +208,66 @@ class TestStreamer(unittest.TestCase):
         request.setResponseCode.assert_called_once_with(NOT_FOUND)
         self.assertFalse(_download.called)
 
+    @patch(MODULE_PREFIX + 'Responder')
+    @patch(MODULE_PREFIX + 'Streamer._on_all_failed')
+    @patch(MODULE_PREFIX + 'Streamer._download')
+    @patch(MODULE_PREFIX + 'LazyCatalogEntry')
+    @patch(MODULE_PREFIX + 'reactor', Mock())
+    def test_handle_get_following(self, model, _download, _on_all_failed, responder):
+        """
+        A download of the same path is in progress.
+        The request follows it and is finished by the leader.
+        """
+        request = Mock(uri='http://content-world.com/content/bear.rpm')
+        catalog = [Mock(url='url-a')]
+        model.objects.filter.return_value.order_by.return_value.all.return_value = catalog
+        model.objects.filter.return_value.order_by.return_value.count.return_value = len(catalog)
+        streamer = Streamer(load_configuration([]))
+        flight, leading = streamer.flights.join('/content/bear.rpm', Mock(), Mock())
+
+        # test
+        streamer._handle_get(request)
+
+        # validation
+        self.assertTrue(leading)
+        self.assertFalse(_download.called)
+        self.assertFalse(responder.return_value.close.called)
+        self.assertEqual(streamer.flights.coalesced, 1)
+        self.assertEqual(flight.followers, [(request, responder.return_value)])
+        streamer.flights.land(flight, False)
+
+    @patch(MODULE_PREFIX + 'Responder')
+    @patch(MODULE_PREFIX + 'Streamer._on_all_failed')
+    @patch(MODULE_PREFIX + 'Streamer._download')
+    @patch(MODULE_PREFIX + 'LazyCatalogEntry')
+    @patch(MODULE_PREFIX + 'reactor', Mock())
+    def test_handle_get_leading(self, model, _download, _on_all_failed, responder):
+        """
+        The leader finishes the followers when its download fails.
+        """
+        request = Mock(uri='http://content-world.com/content/bear.rpm')
+        follower = Mock()
+        follower_responder = Mock()
+        streamer = Streamer(load_configuration([]))
+
+        def download(request, entry, destination):
+            streamer.flights.join('/content/bear.rpm', follower, follower_responder)
+            raise DownloadFailed()
+
+        _download.side_effect = download
+        catalog = [Mock(url='url-a')]
+        model.objects.filter.return_value.order_by.return_value.all.return_value = catalog
+        model.objects.filter.return_value.order_by.return_value.count.return_value = len(catalog)
+
+        # test
+        streamer._handle_get(request)
+
+        # validation
+        self.assertEqual(_on_all_failed.call_args_list, [call(request), call(follower)])
+        follower_responder.close.assert_called_once_with()
+        responder.return_value.close.assert_called_once_with()
+        self.assertEqual(len(streamer.flights), 0)
+
     @patch(MODULE_PREFIX + 'LazyCatalogEntry')
     @patch(MODULE_PREFIX + 'reactor', Mock())
     def test_handle_get_failed_badly(self, model):
@@ -204,12 +275,103 @@ class TestStreamer(unittest.TestCase):
         model.objects.filter.side_effect = ValueError()
 
         # test
-        streamer = Streamer(Mock())
+        streamer = Streamer(load_configuration([]))
         streamer._handle_get(request)
 
         # validation
         request.setResponseCode.assert_called_once_with(INTERNAL_SERVER_ERROR)
 
+    @patch(MODULE_PREFIX + 'LazyCatalogEntry')
+    def test_get_entries(self, model):
+        catalog = [Mock(url='url-a')]
+        model.objects.filter.return_value.order_by.return_value.all.return_value = catalog
+
+        # test
+        streamer = Streamer(load_configuration([]))
+        entries = streamer._get_entries('/content/bear.rpm')
+        entries_again = streamer._get_entries('/content/bear.rpm')
+
+        # validation
+        self.assertEqual(entries, catalog)
+        self.assertEqual(entries_again, catalog)
+        model.objects.filter.assert_called_once_with(path='/content/bear.rpm')
+
+    @patch(MODULE_PREFIX + 'LazyCatalogEntry')
+    def test_get_entries_not_found(self, model):
+        model.objects.filter.return_value.order_by.return_value.all.return_value = []
+
+        # test
+        streamer = Streamer(load_configuration([]))
+        entries = streamer._get_entries('/content/bear.rpm')
+
+        # validation
+        self.assertEqual(entries, [])
+        self.assertEqual(len(streamer.catalog_cache), 0)
+
+    @patch(MODULE_PREFIX + 'LazyCatalogEntry')
+    def test_get_entries_disabled(self, model):
+        config = load_configuration([])
+        config.set('streamer', 'lookup_cache_timeout', '0')
+        model.objects.filter.return_value.order_by.return_value.all.return_value = [Mock()]
+
+        # test
+        streamer = Streamer(config)
+        streamer._get_entries('/content/bear.rpm')
+        streamer._get_entries('/content/bear.rpm')
+
+        # validation
+        self.assertEqual(model.objects.filter.call_count, 2)
+        self.assertEqual(len(streamer.catalog_cache), 0)
+
+    @patch(MODULE_PREFIX + 'Importer')
+    @patch(MODULE_PREFIX + 'repo_controller')
+    def test_get_importer(self, controller, importer_model):
+        importer = Mock()
+        config = Mock()
+        model = Mock(id='123')
+        controller.get_importer_by_id.return_value = (importer, config, model)
+
+        # test
+        streamer = Streamer(load_configuration([]))
+        plugin = streamer._get_importer('123')
+        plugin_again = streamer._get_importer('123')
+
+        # validation
+        self.assertEqual(plugin, (importer, model))
+        self.assertEqual(plugin_again, (importer, model))
+        self.assertEqual(model.config, config.flatten.return_value)
+        controller.get_importer_by_id.assert_called_once_with('123')
+        self.assertFalse(importer_model.objects.filter.called)
+
+    @patch('pulp.streamer.cache.Item.now')
+    @patch(MODULE_PREFIX + 'Importer')
+    @patch(MODULE_PREFIX + 'repo_controller')
+    def test_get_importer_expired(self, controller, importer_model, now):
+        now.return_value = datetime(2017, 1, 1)
+        model = Mock(id='123', last_updated=1)
+        controller.get_importer_by_id.return_value = (Mock(), Mock(), model)
+        current = Mock(last_updated=1)
+        first = importer_model.objects.filter.return_value.only.return_value.first
+        first.return_value = current
+        streamer = Streamer(load_configuration([]))
+        streamer._get_importer('123')
+
+        # test: not updated
+        now.return_value += timedelta(seconds=61)
+        streamer._get_importer('123')
+
+        # validation
+        importer_model.objects.filter.assert_called_once_with(id='123')
+        self.assertEqual(controller.get_importer_by_id.call_count, 1)
+
+        # test: updated
+        now.return_value += timedelta(seconds=61)
+        current.last_updated = 2
+        streamer._get_importer('123')
+
+        # validation
+        self.assertEqual(controller.get_importer_by_id.call_count, 2)
+
     @patch(MODULE_PREFIX + 'Streamer._insert_deferred')
     def test_on_succeeded_client_requested(self, _insert_deferred):
         entry = Mock(url='url-a')
@@ -224,7 +386,7 @@ class TestStreamer(unittest.TestCase):
         }
 
         # test
-        streamer = Streamer(Mock())
+        streamer = Streamer(load_configuration([]))
         streamer._on_succeeded(entry, request, report)
 
         # validation
@@ -244,7 +406,7 @@ class TestStreamer(unittest.TestCase):
         }
 
         # test
-        streamer = Streamer(Mock())
+        streamer = Streamer(load_configuration([]))
         streamer._on_succeeded(entry, request, report)
 
         # validation
@@ -257,7 +419,7 @@ class TestStreamer(unittest.TestCase):
         }.__getitem__
 
         # test
-        streamer = Streamer(Mock())
+        streamer = Streamer(load_configuration([]))
         streamer._on_all_failed(request)
 
         # validation
@@ -283,7 +445,7 @@ class TestStreamer(unittest.TestCase):
         _get_downloader.return_value = downloader
 
         # test
-        streamer = Streamer(Mock())
+        streamer = Streamer(load_configuration([]))
         report = streamer._download(twisted_request, entry, responder)
 
         # validation
@@ -319,7 +481,7 @@ class TestStreamer(unittest.TestCase):
         _get_downloader.return_value = downloader
 
         # test
-        streamer = Streamer(Mock())
+        streamer = Streamer(load_configuration([]))
         self.assertRaises(DownloadFailed, streamer._download, twisted_request, entry, responder)
 
         # validation
@@ -347,7 +509,7 @@ class TestStreamer(unittest.TestCase):
         controller.get_importer_by_id.return_value = plugin
 
         # test
-        streamer = Streamer(Mock())
+        streamer = Streamer(load_configuration([]))
         downloader = streamer._get_downloader(request, entry)
 
         # validation
@@ -367,7 +529,7 @@ class TestStreamer(unittest.TestCase):
         controller.get_importer_by_id.side_effect = PluginNotFound()
 
         # test
-        streamer = Streamer(Mock())
+        streamer = Streamer(load_configuration([]))
         self.assertRaises(PluginNotFound, streamer._get_downloader, Mock(), entry)
 
     @patch(MODULE_PREFIX + 'plugin_api')
@@ -382,7 +544,7 @@ class TestStreamer(unittest.TestCase):
         plugin_api.get_unit_model_by_id.return_value = model
 
         # test
-        streamer = Streamer(Mock())
+        streamer = Streamer(load_configuration([]))
         unit = streamer._get_unit(entry)
 
         # validation
@@ -391,6 +553,10 @@ class TestStreamer(unittest.TestCase):
         q_set.only.assert_called_once_with(*model.unit_key_fields)
         self.assertEqual(unit, q_set.get.return_value)
 
+        # cached
+        self.assertEqual(streamer._get_unit(entry), unit)
+        q_set.get.assert_called_once_with()
+
     @patch(MODULE_PREFIX + 'plugin_api')
     def test_get_unit_not_found(self, plugin_api):
         q_set = Mock()
@@ -404,7 +570,7 @@ class TestStreamer(unittest.TestCase):
         q_set.get.side_effect = DoesNotExist
 
         # test
-        streamer = Streamer(Mock())
+        streamer = Streamer(load_configuration([]))
         self.assertRaises(DoesNotExist, streamer._get_unit, entry)
 
     @patch(MODULE_PREFIX + 'DeferredDownload')
@@ -413,7 +579,7 @@ class TestStreamer(unittest.TestCase):
         model.return_value.save.side_effect = NotUniqueError()
 
         # test
-        streamer = Streamer(Mock())
+        streamer = Streamer(load_configuration([]))
         streamer._insert_deferred(entry)
 
         # validation
@@ -421,6 +587,119 @@ class TestStreamer(unittest.TestCase):
         model.return_value.save.assert_called_once_with()
 
 
+class TestStreamerFileCache(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='streamer-file-cache-')
+        self.config = load_configuration([])
+        self.config.set('streamer', 'file_cache_dir', self.root)
+        self.entry = Mock(
+            url='http://content-world.com/content/bear.rpm',
+            path='/var/lib/pulp/content/bear.txt',
+            checksum=None,
+            checksum_algorithm=None)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_init(self):
+        streamer = Streamer(self.config)
+        self.assertEqual(streamer.file_cache.root, self.root)
+        self.assertEqual(streamer.file_cache.max_size, 10240 * 1024 * 1024)
+
+    def test_init_disabled(self):
+        streamer = Streamer(load_configuration([]))
+        self.assertEqual(streamer.file_cache, None)
+
+    def test_serve_cached(self):
+        streamer = Streamer(self.config)
+        spool = streamer.file_cache.spool(FileCache.key(self.entry))
+        spool.write('bear')
+        spool.commit()
+        request = Mock()
+        responder = Mock()
+
+        # test
+        served = streamer._serve_cached(request, self.entry, responder)
+
+        # validation
+        self.assertTrue(served)
+        responder.write.assert_called_once_with('bear')
+        request.setHeader.assert_has_calls([
+            call('Content-Type', 'text/plain'),
+            call('Content-Length', '4'),
+            call('Cache-Control', 'public, s-maxage=86400, max-age=86400'),
+        ])
+
+    def test_serve_not_cached(self):
+        streamer = Streamer(self.config)
+        responder = Mock()
+
+        # test
+        served = streamer._serve_cached(Mock(), self.entry, responder)
+
+        # validation
+        self.assertFalse(served)
+        self.assertFalse(responder.write.called)
+
+    @patch(MODULE_PREFIX + 'ContainerRequest')
+    @patch(MODULE_PREFIX + 'ContentContainer')
+    @patch(MODULE_PREFIX + 'Streamer._get_downloader')
+    @patch(MODULE_PREFIX + 'Streamer._get_unit')
+    def test_download_spooled(self, _get_unit, _get_downloader, container, request):
+        listener = Mock(succeeded_reports=[Mock()], failed_reports=[])
+        _get_downloader.return_value = Mock(event_listener=listener)
+        responder = Mock()
+
+        def download(downloader, requests, listener):
+            requests[0].destination.write('bear')
+
+        container.return_value.download.side_effect = download
+        request.side_effect = lambda type_id, unit_key, url, destination: Mock(
+            destination=destination)
+
+        # test
+        streamer = Streamer(self.config)
+        streamer._download(Mock(), self.entry, responder)
+
+        # validation
+        responder.write.assert_called_once_with('bear')
+        cached = streamer.file_cache.open(FileCache.key(self.entry))
+        with open(cached.path) as fp:
+            self.assertEqual(fp.read(), 'bear')
+
+    @patch(MODULE_PREFIX + 'ContainerRequest')
+    @patch(MODULE_PREFIX + 'ContentContainer')
+    @patch(MODULE_PREFIX + 'Streamer._get_downloader')
+    @patch(MODULE_PREFIX + 'Streamer._get_unit')
+    def test_download_failed_not_spooled(self, _get_unit, _get_downloader, container, request):
+        listener = Mock(succeeded_reports=[], failed_reports=[Mock()])
+        _get_downloader.return_value = Mock(event_listener=listener)
+
+        # test
+        streamer = Streamer(self.config)
+        self.assertRaises(DownloadFailed, streamer._download, Mock(), self.entry, Mock())
+
+        # validation
+        self.assertEqual(len(streamer.file_cache), 0)
+        self.assertEqual(os.listdir(streamer.file_cache.tmp_dir), [])
+
+    @patch(MODULE_PREFIX + 'logger')
+    def test_log_cache_stats(self, logger):
+        streamer = Streamer(self.config)
+        streamer.log_cache_stats()
+        self.assertEqual(logger.info.call_count, 6)
+
+
+class TestTee(unittest.TestCase):
+
+    def test_write(self):
+        destinations = (Mock(), Mock())
+        Tee(*destinations).write('data')
+        for destination in destinations:
+            destination.write.assert_called_once_with('data')
+
+
 class TestResponder(unittest.TestCase):
 
     def test_enter(self):
@@ -529,3 +808,5 @@ class TestSessionCache(unittest.TestCase):
         ssn = cache.get_or_create(url, downloader)
         self.assertEqual(ssn, session.return_value)
         self.assertEqual(cache.get_or_create(url, downloader), session.return_value)
+        session.assert_called_once_with()
+        self.assertTrue(ssn.stream)